@@ -7,8 +7,11 @@ from pydantic import BaseModel
 from sqlalchemy import func
 from sqlalchemy.orm import Session as DbSession
 
+from backend import dump_store, telegram_outbox
 from backend.database import get_db
 from backend.auth import require_admin
+from backend.dump_jobs import queue_stats
+from backend.dump_store import totals as storage_totals
 from backend.models import User, Slot, Session, QueueEntry
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -54,9 +57,47 @@ class SlotCreate(BaseModel):
     login: str | None = None
     password: str | None = None
     chrome_profile: str | None = None
+    session_cookie: str | None = None
     is_active: bool = True
 
 
+class StorageKindOut(BaseModel):
+    kind: str
+    files: int
+    bytes: int
+
+
+class DumpStorageOut(BaseModel):
+    files: int
+    bytes: int
+    kinds: list[StorageKindOut]
+
+
+class DumpHostQueueOut(BaseModel):
+    host: str
+    queued: int
+    running: int
+
+
+class DumpQueueOut(BaseModel):
+    queued: int
+    running: int
+    hosts: list[DumpHostQueueOut]
+    delivered: int  # in the last 24 h
+    delivery_p50_sec: float | None
+    delivery_p90_sec: float | None
+    delivery_p99_sec: float | None
+
+
+class DumpForwardIn(BaseModel):
+    chat_id: str | None = None  # default: the admin's own Telegram
+
+
+class DumpForwardOut(BaseModel):
+    message_id: int
+    chat_id: str
+
+
 class SlotUpdate(BaseModel):
     service_name: str | None = None
     tier: str | None = None
@@ -67,6 +108,7 @@ class SlotUpdate(BaseModel):
     login: str | None = None
     password: str | None = None
     chrome_profile: str | None = None
+    session_cookie: str | None = None
     is_active: bool | None = None
 
 
@@ -189,6 +231,7 @@ def create_admin_slot(
         login_encrypted=body.login,
         password_encrypted=body.password,
         chrome_profile=body.chrome_profile,
+        session_cookie=body.session_cookie,
         is_active=body.is_active,
     )
     db.add(slot)
@@ -240,6 +283,8 @@ def update_admin_slot(
         slot.password_encrypted = body.password
     if body.chrome_profile is not None:
         slot.chrome_profile = body.chrome_profile
+    if body.session_cookie is not None:
+        slot.session_cookie = body.session_cookie
     if body.is_active is not None:
         slot.is_active = body.is_active
 
@@ -259,3 +304,58 @@ def update_admin_slot(
         chrome_profile=slot.chrome_profile,
         is_active=slot.is_active,
     )
+
+
+# ── Dump storage ──
+
+@router.get("/dumps/storage", response_model=DumpStorageOut)
+def get_dump_storage(
+    db: DbSession = Depends(get_db),
+    _admin: User = Depends(require_admin),
+):
+    """Dump storage use from the running totals (no disk walk)."""
+    kinds = [
+        StorageKindOut(kind=kind, files=t["files"], bytes=t["bytes"])
+        for kind, t in sorted(storage_totals(db).items())
+    ]
+    return DumpStorageOut(
+        files=sum(k.files for k in kinds),
+        bytes=sum(k.bytes for k in kinds),
+        kinds=kinds,
+    )
+
+
+@router.get("/dumps/queue", response_model=DumpQueueOut)
+def get_dump_queue(
+    db: DbSession = Depends(get_db),
+    _admin: User = Depends(require_admin),
+):
+    """Dump queue depth per VM host and time-to-delivery percentiles (24 h)."""
+    return DumpQueueOut(**queue_stats(db))
+
+
+@router.post("/sessions/{session_id}/dump/forward", response_model=DumpForwardOut, status_code=202)
+def forward_dump(
+    session_id: int,
+    body: DumpForwardIn,
+    db: DbSession = Depends(get_db),
+    admin: User = Depends(require_admin),
+):
+    """Send a session's dump to a Telegram chat through the outbox.
+
+    A dump Telegram has seen before goes out by its file_id, without upload.
+    """
+    chat_id = body.chat_id or admin.telegram_id
+    if not chat_id:
+        raise HTTPException(status_code=400, detail="Telegram не привязан")
+    session = db.query(Session).filter(Session.id == session_id).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Сессия не найдена")
+    if not dump_store.is_manifest(session.dump_path):
+        raise HTTPException(status_code=404, detail="Дамп сессии недоступен")
+    owner = session.user.name if session.user else "?"
+    msg = telegram_outbox.enqueue(
+        db, chat_id, f"📤 Дамп сессии #{session.id}\nСлот: {session.slot_id}\nПользователь: {owner}",
+        session_id=session.id,
+    )
+    return DumpForwardOut(message_id=msg.id, chat_id=msg.chat_id)
@@ -57,14 +57,21 @@ def create_token(user_id: int) -> str:
     )
 
 
+def decode_token(token: str) -> int | None:
+    """Return the user id from a JWT, or None if it is invalid/expired."""
+    try:
+        payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
+        return int(payload["sub"])
+    except (JWTError, KeyError, ValueError):
+        return None
+
+
 def get_current_user(
     creds: HTTPAuthorizationCredentials = Depends(security),
     db: DbSession = Depends(get_db),
 ) -> User:
-    try:
-        payload = jwt.decode(creds.credentials, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
-        user_id = int(payload["sub"])
-    except (JWTError, KeyError, ValueError):
+    user_id = decode_token(creds.credentials)
+    if user_id is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
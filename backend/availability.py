@@ -0,0 +1,163 @@
+"""Free/busy grid of slots in CELL_MIN-minute cells, for the booking modal.
+
+A slot-day is one int used as a bit array: bit i set means cell i (from
+local midnight, in booking_timezone) is busy. Bookings are ORed in with
+one shifted mask each, over one query for every slot-day not yet cached.
+Slot-days are cached for CACHE_TTL_SEC and dropped once a transaction that
+inserted or changed a Booking commits (database.invalidate_on_commit). The
+TTL bounds staleness for changes made by other processes, or read by a
+request racing the commit; expired entries are pruned whenever days are
+cached.
+
+Running sessions are laid over the cached days on each request, since
+they change by the minute: a session's slot is busy from its start to the
+end of the current cell.
+"""
+
+from __future__ import annotations
+
+import base64
+import math
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy.orm import Session as DbSession
+
+from backend.config import settings
+from backend.database import invalidate_on_commit
+from backend.models import Booking, Session
+
+CELL_MIN = 15
+CACHE_TTL_SEC = 60
+MAX_DAYS = 31  # per request; also how far back a grid may start
+MAX_AHEAD_DAYS = 2 * 366  # how far ahead of today a grid may start
+
+_cache: dict[tuple[str, date], tuple[int, float]] = {}
+_lock = threading.Lock()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)  # naive UTC, like the DB columns
+
+
+def day_window(day: date) -> tuple[datetime, datetime]:
+    """A local day as a naive UTC interval (23 or 25 h long on DST changes)."""
+    tz = ZoneInfo(settings.booking_timezone)
+
+    def utc(d: date) -> datetime:
+        return datetime(d.year, d.month, d.day, tzinfo=tz).astimezone(timezone.utc).replace(tzinfo=None)
+
+    return utc(day), utc(day + timedelta(days=1))
+
+
+def _cells(start: datetime, end: datetime) -> int:
+    return int((end - start).total_seconds() // 60) // CELL_MIN
+
+
+def _mark(mask: int, origin: datetime, cells: int, start: datetime, end: datetime) -> int:
+    """OR the cells touched by [start, end) into `mask` (grid of `cells` from `origin`)."""
+    cell_sec = CELL_MIN * 60
+    first = max(0, int((start - origin).total_seconds() // cell_sec))
+    last = min(cells, math.ceil((end - origin).total_seconds() / cell_sec))
+    if last <= first:
+        return mask
+    return mask | (((1 << (last - first)) - 1) << first)
+
+
+def _booked(db: DbSession, slot_ids: list[str], days: list[date]) -> dict[tuple[str, date], int]:
+    """Booking bitmaps for slot-days, from the cache or one query for the rest."""
+    now = time.monotonic()
+    out: dict[tuple[str, date], int] = {}
+    with _lock:
+        for key in ((s, d) for s in slot_ids for d in days):
+            hit = _cache.get(key)
+            if hit and hit[1] > now:
+                out[key] = hit[0]
+    missing = [(s, d) for s in slot_ids for d in days if (s, d) not in out]
+    if not missing:
+        return out
+
+    windows = {d: day_window(d) for _, d in missing}
+    lo = min(w[0] for w in windows.values())
+    hi = max(w[1] for w in windows.values())
+    rows = (
+        db.query(Booking.slot_id, Booking.starts_at, Booking.ends_at)
+        .filter(
+            Booking.slot_id.in_({s for s, _ in missing}),
+            Booking.status == "active",
+            Booking.starts_at > lo - timedelta(days=1),  # bookings are at most a day long
+            Booking.starts_at < hi,
+            Booking.ends_at > lo,
+        )
+        .all()
+    )
+    masks = dict.fromkeys(missing, 0)
+    for slot_id, start, end in rows:
+        for d, (day_start, day_end) in windows.items():
+            key = (slot_id, d)
+            if key in masks and start < day_end and end > day_start:
+                masks[key] = _mark(masks[key], day_start, _cells(day_start, day_end), start, end)
+    expires = now + CACHE_TTL_SEC
+    with _lock:
+        for key in [k for k, (_, until) in _cache.items() if until <= now]:
+            del _cache[key]
+        for key, mask in masks.items():
+            _cache[key] = (mask, expires)
+    out.update(masks)
+    return out
+
+
+def grid(db: DbSession, slot_ids: list[str], first: date, last: date) -> dict:
+    """Busy bitmaps for `slot_ids` over the local days first..last.
+
+    Returns {start, cell_min, cells, slots: {slot_id: base64}} — each
+    bitmap is little-endian: cell i is bit i % 8 of byte i // 8.
+    """
+    days = [first + timedelta(days=n) for n in range((last - first).days + 1)]
+    booked = _booked(db, slot_ids, days)
+    origin, end = day_window(first)[0], day_window(last)[1]
+    cells = _cells(origin, end)
+
+    masks = dict.fromkeys(slot_ids, 0)
+    for slot_id in slot_ids:
+        offset = 0
+        for d in days:
+            day_start, day_end = day_window(d)
+            masks[slot_id] |= booked[(slot_id, d)] << offset
+            offset += _cells(day_start, day_end)
+
+    now = _now()
+    running = (
+        db.query(Session.slot_id, Session.started_at)
+        .filter(Session.slot_id.in_(slot_ids), Session.ended_at.is_(None))
+        .all()
+    )
+    for slot_id, started_at in running:
+        start = (started_at or now).replace(tzinfo=None)
+        masks[slot_id] = _mark(masks[slot_id], origin, cells, start, max(now, start) + timedelta(seconds=1))
+
+    size = (cells + 7) // 8
+    return {
+        "start": origin.isoformat(),
+        "cell_min": CELL_MIN,
+        "cells": cells,
+        "slots": {s: base64.b64encode(m.to_bytes(size, "little")).decode() for s, m in masks.items()},
+    }
+
+
+def invalidate(*slot_ids: str) -> None:
+    """Drop the cached days of these slots (their bookings changed)."""
+    stale = set(slot_ids)
+    with _lock:
+        for key in [k for k in _cache if k[0] in stale]:
+            del _cache[key]
+
+
+def clear() -> None:
+    with _lock:
+        _cache.clear()
+
+
+invalidate_on_commit(Booking, lambda booking: (booking.slot_id,), invalidate)
@@ -0,0 +1,390 @@
+"""Booking scheduler — reminders before bookings, the handover at their start, expiry.
+
+Timers live in a min-heap keyed on time. Each active booking has:
+
+- "remind", REMIND_BEFORE ahead of its start: a Telegram reminder to the
+  booker, and a warning to whoever is on the slot that their session will
+  be ended;
+- "start": a session on the slot by someone else is ended (end_reason
+  "preempted", dump queued as for any release) and the booker is told the
+  slot is theirs — occupy keeps everyone else off it from now on
+  (reservations.py);
+- "no_show", NO_SHOW_AFTER the start: if the booker hasn't occupied the
+  slot, the booking is dropped and the slot offered to its queue;
+- "expire" at its end: the booking is set to "expired" and the slot, if
+  free, offered to its queue.
+
+The heap is loaded from the database when this process becomes the
+scheduler and updated in place when a booking is created or cancelled
+here (bookings.py calls schedule()/unschedule()). Cancelled bookings are
+dropped lazily: their entries stay in the heap and are skipped when
+popped.
+
+With several backend processes, one owns the scheduler through the
+"booking_scheduler" lease (leases.py); the others only keep their heaps
+current in case they take over. The owner picks up bookings created
+elsewhere each time it renews the lease, by polling for active bookings
+that start within CATCH_UP_AHEAD and aren't on its heap yet (ids commit
+out of order across processes, so a high-water mark would skip some),
+and re-checks every booking's status in the database before acting on
+it. reminded_at guards against a second reminder after
+a takeover. Entries popped for a round that fails (database busy, …) go
+back on the heap and are retried RETRY_AFTER later.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session as DbSession
+
+from backend.database import SessionLocal
+from backend.models import Booking, Session
+
+logger = logging.getLogger(__name__)
+
+REMIND_BEFORE = timedelta(minutes=5)
+NO_SHOW_AFTER = timedelta(minutes=15)  # the booker hasn't occupied the slot by then: booking dropped
+KINDS = ("remind", "start", "no_show", "expire")
+LEASE = "booking_scheduler"
+LEASE_TTL = timedelta(seconds=60)
+LEASE_RENEW_SEC = 20  # also how often bookings made by other processes are picked up
+RETRY_AFTER = timedelta(seconds=10)  # a round of due entries that failed
+CATCH_UP_AHEAD = timedelta(hours=1)  # bookings made elsewhere are scheduled this long before their start
+
+_task: asyncio.Task | None = None
+_loop: asyncio.AbstractEventLoop | None = None
+_wakeup: asyncio.Event | None = None
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)  # naive UTC, like the DB columns
+
+
+class BookingTimers:
+    """Min-heap of (when, seq, kind, booking_id); thread-safe."""
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[datetime, int, str, int]] = []
+        self._active: set[int] = set()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, booking_id: int) -> bool:
+        with self._lock:
+            return booking_id in self._active
+
+    def clear(self) -> None:
+        with self._lock:
+            self._heap.clear()
+            self._active.clear()
+
+    def schedule(
+        self, booking_id: int, start: datetime, end: datetime,
+        remind: bool = True, begin: bool = True, no_show: bool = True,
+    ) -> None:
+        with self._lock:
+            self._active.add(booking_id)
+            entries = [(end, "expire")]
+            if remind:
+                entries.append((start - REMIND_BEFORE, "remind"))
+            if begin:
+                entries.append((start, "start"))
+            if no_show:
+                entries.append((start + NO_SHOW_AFTER, "no_show"))
+            for when, kind in entries:
+                heapq.heappush(self._heap, (when, next(self._seq), kind, booking_id))
+
+    def unschedule(self, booking_id: int) -> None:
+        with self._lock:
+            self._active.discard(booking_id)
+
+    def next_at(self) -> datetime | None:
+        """When the earliest live entry is due."""
+        with self._lock:
+            while self._heap and self._heap[0][3] not in self._active:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> dict[str, list[int]]:
+        """Booking ids due as of `now`, by kind (every kind in KINDS is present)."""
+        due: dict[str, list[int]] = {kind: [] for kind in KINDS}
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, _, kind, booking_id = heapq.heappop(self._heap)
+                if booking_id not in self._active:
+                    continue
+                due[kind].append(booking_id)
+                if kind == "expire":
+                    self._active.discard(booking_id)
+        return due
+
+    def requeue(self, due: dict[str, list[int]], when: datetime) -> None:
+        """Put popped entries back, due at `when` (their round failed)."""
+        with self._lock:
+            for kind, ids in due.items():
+                for booking_id in ids:
+                    self._active.add(booking_id)
+                    heapq.heappush(self._heap, (when, next(self._seq), kind, booking_id))
+
+
+timers = BookingTimers()
+
+
+def _add(booking: Booking, now: datetime) -> None:
+    from backend.bookings import booking_window
+
+    try:
+        start, end = booking_window(booking)
+    except ValueError:
+        logger.warning("Booking %d has an unreadable time: %s %s", booking.id, booking.date, booking.start_time)
+        return
+    # A reminder after the start is no use; a late one before it still is.
+    # The handover is still worth doing until the no-show deadline; the
+    # no-show check until the end (overdue after downtime: it runs at once).
+    timers.schedule(
+        booking.id, start, end,
+        remind=booking.reminded_at is None and start > now,
+        begin=now < start + NO_SHOW_AFTER,
+        no_show=now < end,
+    )
+
+
+def schedule(booking: Booking) -> None:
+    """A booking was created (called by bookings.py after the commit)."""
+    _add(booking, _now())
+    _wake()
+
+
+def unschedule(booking_id: int) -> None:
+    """A booking was cancelled."""
+    timers.unschedule(booking_id)
+
+
+def load(db: DbSession, now: datetime | None = None) -> int:
+    """(Re)build the heap from every active booking. Returns how many."""
+    now = now or _now()
+    timers.clear()
+    bookings = db.query(Booking).filter(Booking.status == "active").all()
+    for booking in bookings:
+        _add(booking, now)
+    return len(bookings)
+
+
+def catch_up(db: DbSession, now: datetime | None = None) -> int:
+    """Schedule active bookings made elsewhere, once they start within CATCH_UP_AHEAD.
+
+    Bookings already on the heap are skipped. Returns how many were added.
+    """
+    now = now or _now()
+    bookings = (
+        db.query(Booking)
+        .filter(Booking.status == "active", Booking.starts_at <= now + CATCH_UP_AHEAD)
+        .all()
+    )
+    added = [booking for booking in bookings if booking.id not in timers]
+    for booking in added:
+        _add(booking, now)
+    return len(added)
+
+
+def _session_on(db: DbSession, slot_id: str) -> Session | None:
+    return db.query(Session).filter(Session.slot_id == slot_id, Session.ended_at.is_(None)).first()
+
+
+def _warn(db: DbSession, booking: Booking, messages: list) -> None:
+    """Tell whoever is on the booked slot that their session ends at the start."""
+    from backend.telegram_bot import preempt_warning_text
+
+    session = _session_on(db, booking.slot_id)
+    if session and session.user_id != booking.user_id and session.user.telegram_id:
+        messages.append((session.user.telegram_id, preempt_warning_text(booking.slot_id, booking.starts_at)))
+
+
+def _begin(db: DbSession, booking: Booking, now: datetime, messages: list, events: list) -> None:
+    """The booked window opened: end a session in its way, hand the slot to the booker."""
+    from backend.dump_jobs import enqueue_dump
+    from backend.telegram_bot import booking_started_text, preempted_text
+
+    session = _session_on(db, booking.slot_id)
+    if session and session.user_id == booking.user_id:
+        return  # already on it
+    if session:
+        session.ended_at = now
+        session.end_reason = "preempted"
+        enqueue_dump(db, session)
+        if session.user.telegram_id:
+            messages.append((session.user.telegram_id, preempted_text(booking.slot_id, booking.user.name)))
+        logger.info("Session %d on %s preempted by booking %d", session.id, booking.slot_id, booking.id)
+    if booking.user.telegram_id:
+        no_show_min = int(NO_SHOW_AFTER.total_seconds() // 60)
+        messages.append((booking.user.telegram_id, booking_started_text(booking.slot_id, booking.ends_at, no_show_min)))
+    events.append(("slot_reserved", {
+        "slot_id": booking.slot_id,
+        "next_in_queue": booking.user.name,
+        "hold_until": booking.ends_at.isoformat(),
+    }))
+
+
+def _no_show(db: DbSession, booking: Booking, messages: list) -> bool:
+    """Drop the booking if the booker never took the slot. Returns True if dropped."""
+    from backend.telegram_bot import no_show_text
+
+    showed = db.query(Session.id).filter(
+        Session.slot_id == booking.slot_id,
+        Session.user_id == booking.user_id,
+        or_(Session.ended_at.is_(None), Session.ended_at > booking.starts_at),
+    ).first()
+    if showed:
+        return False
+    booking.status = "expired"
+    timers.unschedule(booking.id)
+    if booking.user.telegram_id:
+        messages.append((booking.user.telegram_id, no_show_text(booking.slot_id)))
+    logger.info("Booking %d on %s dropped: no show", booking.id, booking.slot_id)
+    return True
+
+
+def fire(db: DbSession, due: dict[str, list[int]], now: datetime | None = None) -> tuple[list[tuple], list[tuple]]:
+    """Act on due timers: reminders, handovers, no-shows, expiry. Commits.
+
+    Returns (reminders, events): (chat_id, slot_id, start_time) for each
+    reminder to send, and (event, payload) for each WebSocket broadcast.
+    Other Telegram messages are queued in the outbox here.
+    """
+    now = now or _now()
+    reminders, messages, events = [], [], []
+    freed: set[str] = set()  # slots a booking let go of: offered to their queues
+
+    def active(kind: str):
+        ids = due.get(kind)
+        if not ids:
+            return []
+        return db.query(Booking).filter(Booking.id.in_(ids), Booking.status == "active").all()
+
+    for booking in active("remind"):
+        if booking.reminded_at is not None:
+            continue
+        booking.reminded_at = now
+        if booking.user.telegram_id:
+            reminders.append((booking.user.telegram_id, booking.slot_id, booking.start_time))
+        _warn(db, booking, messages)
+    ended = set(due.get("expire", ()))  # a whole booking passed unattended (e.g. downtime)
+    for booking in active("start"):
+        if booking.id not in ended:
+            _begin(db, booking, now, messages, events)
+    for booking in active("no_show"):
+        if booking.id not in ended and _no_show(db, booking, messages):
+            freed.add(booking.slot_id)
+    expired = active("expire")
+    for booking in expired:
+        booking.status = "expired"
+        freed.add(booking.slot_id)
+    db.commit()
+
+    if expired:
+        logger.info("Expired %d bookings", len(expired))
+    for slot_id in sorted(freed):
+        if _session_on(db, slot_id) is None:
+            from backend import queue_handoff
+            handoff = queue_handoff.offer(db, slot_id, now)
+            events.append(("slot_reserved" if handoff["next_in_queue"] else "slot_released", handoff))
+    if messages:
+        from backend.telegram_outbox import enqueue
+        for chat_id, text in messages:
+            enqueue(db, chat_id, text)
+    return reminders, events
+
+
+async def run_due(now: datetime | None = None) -> int:
+    """Handle every entry due by `now`. Returns how many reminders were queued."""
+    now = now or _now()
+    due = timers.pop_due(now)
+    if not any(due.values()):
+        return 0
+    try:
+        reminders, events = await asyncio.to_thread(_with_db, fire, due, now)
+    except Exception:
+        timers.requeue(due, now + RETRY_AFTER)
+        raise
+    from backend.telegram_bot import notify_booking_reminder
+    from backend.websocket import broadcast
+
+    for chat_id, slot_id, start_time in reminders:
+        await notify_booking_reminder(chat_id, slot_id, start_time)
+    for event, payload in events:
+        await broadcast(event, payload)
+    return len(reminders)
+
+
+def _with_db(fn, *args):
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+def _wake() -> None:
+    """Nudge the scheduler (safe to call from worker threads)."""
+    if _loop and _wakeup and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+async def _run_forever() -> None:
+    from backend import leases
+
+    owner = False
+    while True:
+        delay = LEASE_RENEW_SEC
+        try:
+            held = await asyncio.to_thread(_with_db, leases.acquire, LEASE, LEASE_TTL)
+            if held and not owner:
+                count = await asyncio.to_thread(_with_db, load)
+                logger.info("Booking scheduler: owner, %d active bookings", count)
+            elif held:
+                await asyncio.to_thread(_with_db, catch_up)
+            owner = held
+            if owner:
+                await run_due()
+                if (next_at := timers.next_at()) is not None:
+                    delay = min(delay, max(0.0, (next_at - _now()).total_seconds()))
+        except Exception as e:
+            logger.error("Booking scheduler error: %s", e)
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def start_scheduler() -> None:
+    """Start the booking scheduler (called from app lifespan)."""
+    global _task, _loop, _wakeup
+    if _task is not None:
+        return
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    _task = asyncio.create_task(_run_forever())
+
+
+async def stop_scheduler() -> None:
+    global _task, _loop, _wakeup
+    if _task:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        from backend import leases
+        await asyncio.to_thread(_with_db, leases.release, LEASE)
+    _task = _loop = _wakeup = None
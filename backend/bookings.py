@@ -1,14 +1,17 @@
 """Bookings API: create, list, cancel bookings."""
 
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from pydantic import BaseModel
 from sqlalchemy.orm import Session as DbSession
 
+from backend import availability, booking_scheduler
 from backend.database import get_db
 from backend.auth import get_current_user
-from backend.models import Booking, User
+from backend.config import settings
+from backend.models import Booking, Slot, User
 
 router = APIRouter(prefix="/bookings", tags=["bookings"])
 
@@ -32,35 +35,118 @@ class BookingOut(BaseModel):
     created_at: str
 
 
+class BookingConflict(BaseModel):
+    slot_id: str
+    booking_id: int
+    date: str
+    start_time: str
+    end_time: str
+    user_name: str | None = None  # admins only
+
+
+class AvailabilityOut(BaseModel):
+    start: str  # UTC start of cell 0: local midnight of `from`
+    cell_min: int
+    cells: int
+    slots: dict[str, str]  # slot_id → base64 busy bitmap, cell i = bit i % 8 of byte i // 8
+
+
 # ── Helpers ──
 
-def _time_to_minutes(t: str) -> int:
-    """Convert 'HH:MM' to minutes since midnight."""
-    h, m = t.split(":")
-    return int(h) * 60 + int(m)
+MAX_DURATION_MIN = 24 * 60
 
 
-def _check_conflict(db: DbSession, slot_id: str, date: str, start_time: str, duration_min: int, exclude_id: int | None = None):
-    """Check if a booking conflicts with existing active bookings."""
-    new_start = _time_to_minutes(start_time)
-    new_end = new_start + duration_min
+def _parse_local(date: str, start_time: str) -> datetime:
+    return datetime.strptime(f"{date} {start_time}", "%Y-%m-%d %H:%M")
+
+
+def _to_utc(local: datetime) -> datetime:
+    return local.replace(tzinfo=ZoneInfo(settings.booking_timezone)).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def booking_window(booking: Booking) -> tuple[datetime, datetime]:
+    """A booking's start and end as naive UTC datetimes, like the DB columns."""
+    if booking.starts_at and booking.ends_at:
+        return booking.starts_at, booking.ends_at
+    start = _to_utc(_parse_local(booking.date, booking.start_time))
+    return start, start + timedelta(minutes=booking.duration_min or 0)
+
 
-    existing = db.query(Booking).filter(
-        Booking.slot_id == slot_id,
-        Booking.date == date,
+def _end_time(booking: Booking) -> str:
+    """Local end time; "+1" when the booking runs past midnight."""
+    start = _parse_local(booking.date, booking.start_time)
+    end = start + timedelta(minutes=booking.duration_min)
+    return f"{end:%H:%M}" + (f" (+{(end.date() - start.date()).days})" if end.date() != start.date() else "")
+
+
+def find_conflicts(
+    db: DbSession,
+    slot_ids: list[str],
+    start: datetime,
+    end: datetime,
+    exclude_id: int | None = None,
+) -> list[Booking]:
+    """Active bookings on any of `slot_ids` overlapping [start, end), in one query.
+
+    The lower bound on starts_at is implied by overlap (a booking is at
+    most MAX_DURATION_MIN long) and turns the lookup into a range scan of
+    ix_bookings_slot_status_start.
+    """
+    query = db.query(Booking).filter(
+        Booking.slot_id.in_(slot_ids),
         Booking.status == "active",
-    ).all()
+        Booking.starts_at > start - timedelta(minutes=MAX_DURATION_MIN),
+        Booking.starts_at < end,
+        Booking.ends_at > start,
+    )
+    if exclude_id is not None:
+        query = query.filter(Booking.id != exclude_id)
+    return query.order_by(Booking.slot_id, Booking.starts_at).all()
+
+
+def conflict_report(conflicts: list[Booking], viewer: User) -> list[BookingConflict]:
+    return [
+        BookingConflict(
+            slot_id=b.slot_id,
+            booking_id=b.id,
+            date=b.date,
+            start_time=b.start_time,
+            end_time=_end_time(b),
+            user_name=b.user.name if viewer.is_admin and b.user else None,
+        )
+        for b in conflicts
+    ]
 
-    for b in existing:
-        if exclude_id and b.id == exclude_id:
-            continue
-        b_start = _time_to_minutes(b.start_time)
-        b_end = b_start + b.duration_min
-        if new_start < b_end and new_end > b_start:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail=f"Конфликт с бронью {b.start_time}–{b_start + b.duration_min // 60}:{b.duration_min % 60:02d}",
-            )
+
+def validate_window(date: str, start_time: str, duration_min: int) -> tuple[datetime, datetime]:
+    """Check a requested booking; returns its UTC (start, end)."""
+    # Validate date is not in the past
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    if date < today:
+        raise HTTPException(status_code=400, detail="Дата не может быть в прошлом")
+
+    # Validate time format
+    try:
+        local = _parse_local(date, start_time)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Неверный формат времени")
+    if not 0 < duration_min <= MAX_DURATION_MIN:
+        raise HTTPException(status_code=400, detail="Неверная длительность")
+    start = _to_utc(local)
+    if start < datetime.now(timezone.utc).replace(tzinfo=None):
+        raise HTTPException(status_code=400, detail="Время начала уже прошло")
+    return start, start + timedelta(minutes=duration_min)
+
+
+def _check_conflict(db: DbSession, slot_id: str, start: datetime, end: datetime, exclude_id: int | None = None):
+    """Check if a booking conflicts with existing active bookings."""
+    conflicts = find_conflicts(db, [slot_id], start, end, exclude_id)
+    if conflicts:
+        b = conflicts[0]
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Конфликт с бронью {b.start_time}–{_end_time(b)}",
+        )
 
 
 # ── Endpoints ──
@@ -90,25 +176,46 @@ def list_bookings(
     ]
 
 
+@router.get("/availability", response_model=AvailabilityOut)
+def get_availability(
+    date_from: str = Query(..., alias="from"),
+    date_to: str | None = Query(None, alias="to"),
+    slots: str | None = Query(None, description="Comma-separated slot ids; all active slots if omitted"),
+    db: DbSession = Depends(get_db),
+    _user: User = Depends(get_current_user),
+):
+    """Free/busy grid per slot over the days from..to (inclusive, "YYYY-MM-DD").
+
+    Busy means booked or, right now, occupied by a running session.
+    """
+    try:
+        first = datetime.strptime(date_from, "%Y-%m-%d").date()
+        last = datetime.strptime(date_to, "%Y-%m-%d").date() if date_to else first
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Неверный формат даты")
+    today = datetime.now(timezone.utc).date()
+    earliest = today - timedelta(days=availability.MAX_DAYS)
+    if not earliest <= first <= today + timedelta(days=availability.MAX_AHEAD_DAYS):
+        raise HTTPException(status_code=400, detail="Дата вне доступного диапазона")
+    if last < first or (last - first).days >= availability.MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Диапазон — от 1 до {availability.MAX_DAYS} дней")
+    query = db.query(Slot.id).filter(Slot.is_active == True)
+    if slots:
+        query = query.filter(Slot.id.in_([s.strip() for s in slots.split(",") if s.strip()]))
+    slot_ids = sorted(row.id for row in query)
+    return AvailabilityOut(**availability.grid(db, slot_ids, first, last))
+
+
 @router.post("", response_model=BookingOut, status_code=201)
 def create_booking(
     body: BookingCreate,
     db: DbSession = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
-    # Validate date is not in the past
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    if body.date < today:
-        raise HTTPException(status_code=400, detail="Дата не может быть в прошлом")
-
-    # Validate time format
-    try:
-        _time_to_minutes(body.start_time)
-    except (ValueError, IndexError):
-        raise HTTPException(status_code=400, detail="Неверный формат времени")
+    start, end = validate_window(body.date, body.start_time, body.duration_min)
 
     # Check conflicts
-    _check_conflict(db, body.slot_id, body.date, body.start_time, body.duration_min)
+    _check_conflict(db, body.slot_id, start, end)
 
     booking = Booking(
         user_id=user.id,
@@ -116,10 +223,13 @@ def create_booking(
         date=body.date,
         start_time=body.start_time,
         duration_min=body.duration_min,
+        starts_at=start,
+        ends_at=end,
     )
     db.add(booking)
     db.commit()
     db.refresh(booking)
+    booking_scheduler.schedule(booking)
 
     return BookingOut(
         id=booking.id,
@@ -144,5 +254,6 @@ def cancel_booking(
 
     booking.status = "cancelled"
     db.commit()
+    booking_scheduler.unschedule(booking_id)
 
     return {"ok": True, "id": booking_id}
@@ -0,0 +1,97 @@
+"""Telegram chat_id → user identity cache for the bot.
+
+Every bot command starts by resolving the sender's chat_id to a user (and
+whether they are an admin). The mapping changes rarely, so it is kept in
+memory: warmed with all linked users when the bot starts, then filled on
+demand — unknown chats are cached too, so a stranger spamming /status
+doesn't cost a query each time.
+
+A user's entries are dropped once a transaction that changed their User
+row through the ORM commits (/start linking, PUT /api/profile, admin
+edits, seeding; database.invalidate_on_commit). TTL_SEC bounds staleness
+for changes made by another backend process, or read by a lookup racing
+the commit; admin commands don't rely on it and re-read a cached admin
+from the database (telegram_bot).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session as DbSession
+
+from backend.database import invalidate_on_commit
+from backend.models import User
+
+TTL_SEC = 300
+
+
+@dataclass(frozen=True)
+class ChatIdentity:
+    user_id: int
+    is_admin: bool
+    name: str
+
+
+MISS = object()
+_cache: dict[str, tuple[ChatIdentity | None, float]] = {}
+_lock = threading.Lock()
+
+
+def _store(chat_id: str, identity: ChatIdentity | None) -> None:
+    with _lock:
+        _cache[chat_id] = (identity, time.monotonic() + TTL_SEC)
+
+
+def _identity(user: User) -> ChatIdentity:
+    return ChatIdentity(user_id=user.id, is_admin=bool(user.is_admin), name=user.name)
+
+
+def cached(chat_id: str):
+    """The cached identity (None: not linked), or MISS if unknown or expired."""
+    with _lock:
+        entry = _cache.get(chat_id)
+    if entry is None or entry[1] < time.monotonic():
+        return MISS
+    return entry[0]
+
+
+def load(db: DbSession, chat_id: str) -> ChatIdentity | None:
+    """Look a chat up in the database and cache the answer."""
+    user = db.query(User).filter(User.telegram_id == chat_id).first()
+    identity = _identity(user) if user else None
+    _store(chat_id, identity)
+    return identity
+
+
+def warm(db: DbSession) -> int:
+    """Cache every linked user (called at bot start). Returns how many."""
+    users = db.query(User).filter(User.telegram_id.isnot(None)).all()
+    with _lock:
+        _cache.clear()
+    for user in users:
+        _store(user.telegram_id, _identity(user))
+    return len(users)
+
+
+def invalidate(*chat_ids: str | None) -> None:
+    with _lock:
+        for chat_id in chat_ids:
+            if chat_id:
+                _cache.pop(str(chat_id), None)
+
+
+def clear() -> None:
+    with _lock:
+        _cache.clear()
+
+
+def _chat_ids(user: User) -> list[str | None]:
+    # The old chat_id too, if the account was re-linked
+    return [user.telegram_id, *(inspect(user).attrs.telegram_id.history.deleted or ())]
+
+
+invalidate_on_commit(User, _chat_ids, invalidate)
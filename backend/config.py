@@ -15,12 +15,42 @@ class Settings(BaseSettings):
     # Telegram
     telegram_bot_token: str = ""
     telegram_admin_chat_id: str = ""
+    telegram_webhook_url: str = ""  # public base URL, e.g. https://taxi.example.com; empty = polling
+    telegram_webhook_secret: str = ""  # defaults to one derived from the bot token
+    public_url: str = ""  # links in Telegram messages (dumps over the upload limit); empty = send volumes
 
     # Timeweb SSH
     timeweb_host: str = ""
     timeweb_ssh_user: str = "root"
     timeweb_ssh_password: str = ""
 
+    # Service session checks (health)
+    service_check_interval_sec: int = 300  # 0 disables the background checker
+    service_check_concurrency: int = 4
+    service_check_host_interval_sec: float = 2.0  # min gap between hits to one host
+    service_check_timeout_sec: float = 10.0
+
+    # Session dumps (dump_jobs.py)
+    dump_ssh_host: str = ""  # falls back to timeweb_host when Session.vm_id is unset
+    dump_ssh_user: str = "vdi"
+    dump_ssh_key_path: str = ""
+    dump_workers: int = 6  # concurrent dumps in total
+    dump_workers_per_host: int = 2  # …and against any one VM
+    dump_max_attempts: int = 4
+    dump_retry_base_sec: int = 30
+    dump_retry_max_sec: int = 600
+
+    # Queue handoff: a freed slot is held this long for the head of its queue
+    queue_hold_sec: int = 180
+
+    # Bookings — dates and times are wall-clock in this zone
+    booking_timezone: str = "UTC"
+
+    # Health monitoring
+    vpn_interface: str = "wg0"
+    vpn_peer_stale_sec: int = 180  # WireGuard handshakes every ~2 min when alive
+    health_alert_cooldown_sec: int = 600  # same transition alerts at most this often
+
     model_config = {"env_prefix": "VDI_", "env_file": ".env", "extra": "ignore"}
 
 
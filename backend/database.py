@@ -1,5 +1,7 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from typing import Callable, Hashable, Iterable
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase, object_session
 
 from backend.config import settings
 
@@ -20,3 +22,35 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def invalidate_on_commit(
+    mapper: type,
+    keys: Callable[[object], Iterable[Hashable | None]],
+    invalidate: Callable[..., None],
+) -> None:
+    """Call invalidate(*keys) for rows of `mapper` a transaction changed, once it commits.
+
+    keys(row) names the cache entries an inserted, updated or deleted row
+    touches. They are collected at flush and dropped on rollback, so an
+    entry isn't invalidated before the new rows are visible. A lookup that
+    read the old rows just before the commit can still cache them after
+    the invalidation; the caller's TTL bounds how long that lasts.
+    """
+    stale = object()  # this cache's key in db.info
+
+    def changed(mapper_, connection, row) -> None:
+        db = object_session(row)
+        if db is not None:
+            db.info.setdefault(stale, set()).update(key for key in keys(row) if key)
+
+    for name in ("after_insert", "after_update", "after_delete"):
+        event.listen(mapper, name, changed)
+
+    @event.listens_for(Session, "after_commit")
+    def after_commit(db: Session) -> None:
+        invalidate(*db.info.pop(stale, ()))
+
+    @event.listens_for(Session, "after_rollback")
+    def after_rollback(db: Session) -> None:
+        db.info.pop(stale, None)
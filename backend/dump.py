@@ -3,23 +3,28 @@
 The actual SSH transfer requires VM credentials (BLOCKED until SSH keys configured).
 This module provides the logic for:
 - Triggering dump collection on a VM via SSH
-- Downloading the archive via SCP
-- Storing the dump path in the sessions table
-- Cleanup of expired dumps (>14 days)
+- Streaming the archive from the VM with SHA-256 verification and resume
+- Storing the dump path and metadata (session_dumps) in the database
+  (chunk storage: dump_store.py)
+
+Queueing, retries and the worker pool live in dump_jobs.py.
 """
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
 import logging
 import os
-import shutil
-from datetime import datetime, timedelta, timezone
+import time
 from pathlib import Path
+from typing import Callable
 
 from sqlalchemy.orm import Session as DbSession
 
-from backend.models import Session
+from backend.models import Session, SessionDump
+from backend.ssh_pool import pool
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +32,15 @@ logger = logging.getLogger(__name__)
 DUMP_STORAGE = Path(os.getenv("VDI_DUMP_STORAGE", "./dumps"))
 DUMP_RETENTION_DAYS = 14
 
+COLLECT_SCRIPT = "/opt/vdi/collect_dump.sh"
+STREAM_CHUNK = 256 * 1024
+STREAM_TIMEOUT_SEC = 120  # no bytes for this long → treat the stream as dead
+SINCE_DEFAULT_SEC = 2 * 3600  # History window when the session start is unknown
+
+# Dump format 1: full History copy, gzip. Format 2: session-window rows in
+# history.json, zstd. Compression → archive suffix.
+ARCHIVE_FORMATS = {"gzip": ".tar.gz", "zstd": ".tar.zst"}
+
 
 def ensure_storage() -> Path:
     """Create dump storage directory if it doesn't exist."""
@@ -34,67 +48,174 @@ def ensure_storage() -> Path:
     return DUMP_STORAGE
 
 
-async def collect_dump_from_vm(
+class StagingMissing(Exception):
+    """The VM no longer has the staged dump (rebooted / cleaned) — start over."""
+
+
+def _hash_file(path: Path, hasher) -> int:
+    """Feed an existing partial file into a running hash; returns its size."""
+    size = 0
+    with open(path, "rb") as f:
+        while block := f.read(STREAM_CHUNK):
+            hasher.update(block)
+            size += len(block)
+    return size
+
+
+def _stream_archive(
+    vm_host: str, session_id: int, part: Path, offset: int, hasher, auth: dict,
+) -> int:
+    """Append the remote archive stream (from `offset`) to `part`. Returns bytes read."""
+    received = 0
+    with pool.open_channel(
+        vm_host,
+        f"{COLLECT_SCRIPT} stream {session_id} {offset}",
+        timeout=STREAM_TIMEOUT_SEC,
+        **auth,
+    ) as channel, open(part, "ab") as out:
+        while data := channel.recv(STREAM_CHUNK):
+            out.write(data)
+            hasher.update(data)
+            received += len(data)
+        out.flush()
+        os.fsync(out.fileno())
+        status = channel.recv_exit_status()
+    if status == 3:
+        raise StagingMissing(f"staging dir for session {session_id} is gone")
+    if status != 0:
+        raise RuntimeError(f"stream exited with {status} after {received} bytes")
+    return received
+
+
+def collect_dump(
     session_id: int,
     vm_host: str,
     chrome_profile: str = "Default",
     ssh_user: str = "vdi",
     ssh_key_path: str | None = None,
+    since: int | None = None,
+    until: int | None = None,
+    may_stage: Callable[[], bool] | None = None,
+    on_staged: Callable[[], None] | None = None,
 ) -> dict:
-    """SSH into VM, run collect_dump.sh, download archive.
+    """SSH into VM, stage the dump, stream the archive into DUMP_STORAGE.
+
+    `collect_dump.sh prepare` stages the artifacts and reports the SHA-256
+    and size of the archive stream; `stream` then pipes the archive straight
+    from the remote stdout into a local .part file (no temp archive on either
+    side). The rolling hash is checked against the VM's before the .part is
+    renamed into place.
+
+    Interrupted transfers resume: the .part file and the prepare metadata
+    (.part.json) are kept, and the next attempt streams from the current
+    offset. If the VM lost its staging dir, the transfer starts over.
+
+    `since` and `until` (unix seconds, usually the session start and end)
+    bound the History rows extracted on the VM, so visits made by the
+    slot's next user are left out. Format 2 dumps arrive as .tar.zst, format 1
+    (or VMs without zstd) as .tar.gz — see ARCHIVE_FORMATS.
 
-    Returns metadata dict with tabs_count, files_count, archive_path.
+    Staging captures the VM's live state (screen, clipboard, Downloads),
+    so it must happen before anyone else uses the slot: `may_stage` is
+    asked first and can veto it ({"error", "superseded": True}), and
+    `on_staged` is called once the artifacts are frozen in the staging
+    dir — streaming them later is safe whoever is on the VM by then.
 
-    [BLOCKED: needs SSH key/credentials to connect to VM]
+    Blocking (paramiko) — call it from a worker thread, never from the event
+    loop. dump_jobs.py runs it in its worker pool.
+
+    Returns metadata dict with tabs_count, files_count, archive_path and
+    transfer stats, or a dict with "error" on failure.
     """
     storage = ensure_storage()
-    archive_name = f"session_{session_id}_dump.tar.gz"
-    meta_name = f"session_{session_id}_dump_meta.json"
-    local_archive = storage / archive_name
-    local_meta = storage / meta_name
+    local_meta = storage / f"session_{session_id}_dump_meta.json"
+    part = storage / f"session_{session_id}_dump.part"
+    state = storage / f"session_{session_id}_dump.part.json"
+    auth = {"user": ssh_user, "key_path": ssh_key_path}
+    prepare = f"{COLLECT_SCRIPT} prepare {session_id} {chrome_profile}"
+    if until is not None and since is None:
+        since = until - SINCE_DEFAULT_SEC  # the script's default window
+    if since is not None:
+        prepare += f" {int(since)}"
+    if until is not None:
+        prepare += f" {int(until)}"
 
     try:
-        import paramiko
+        meta = None
+        if part.exists() and state.exists():
+            meta = json.loads(state.read_text())
+        else:
+            if may_stage is not None and not may_stage():
+                return {"error": "slot reused before the dump was staged", "superseded": True,
+                        "tabs_count": 0, "files_count": 0}
+            part.unlink(missing_ok=True)
+            exit_status, out, err = pool.exec(vm_host, prepare, **auth)
+            if exit_status != 0:
+                err = err.decode(errors="replace")
+                logger.error("Dump collection failed on %s: %s", vm_host, err)
+                return {"error": err, "tabs_count": 0, "files_count": 0}
+            meta = json.loads(out)
+            state.write_text(json.dumps(meta))
+            part.touch()
+        if on_staged is not None:
+            on_staged()
 
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        hasher = hashlib.sha256()
+        offset = _hash_file(part, hasher)
+        if offset:
+            logger.info("Resuming dump for session %d at %d bytes", session_id, offset)
 
-        connect_kwargs: dict = {"username": ssh_user}
-        if ssh_key_path:
-            connect_kwargs["key_filename"] = ssh_key_path
-        ssh.connect(vm_host, **connect_kwargs)
+        started = time.monotonic()
+        try:
+            received = _stream_archive(vm_host, session_id, part, offset, hasher, auth)
+        except StagingMissing:
+            part.unlink(missing_ok=True)
+            state.unlink(missing_ok=True)
+            raise
+        seconds = max(time.monotonic() - started, 1e-6)
 
-        # Run collection script
-        _, stdout, stderr = ssh.exec_command(
-            f"/opt/vdi/collect_dump.sh {session_id} {chrome_profile}"
-        )
-        exit_status = stdout.channel.recv_exit_status()
-        if exit_status != 0:
-            err = stderr.read().decode()
-            logger.error("Dump collection failed on %s: %s", vm_host, err)
-            return {"error": err, "tabs_count": 0, "files_count": 0}
-
-        # Download files via SFTP
-        sftp = ssh.open_sftp()
-        sftp.get(f"/tmp/{archive_name}", str(local_archive))
-        sftp.get(f"/tmp/{meta_name}", str(local_meta))
-        sftp.close()
-        ssh.close()
-
-        # Parse metadata
-        with open(local_meta) as f:
-            meta = json.load(f)
+        size = offset + received
+        digest = hasher.hexdigest()
+        if size != meta["archive_size"] or digest != meta["archive_sha256"]:
+            part.unlink(missing_ok=True)
+            state.unlink(missing_ok=True)
+            return {
+                "error": (
+                    f"checksum mismatch: got {size} bytes sha256={digest[:12]}, "
+                    f"expected {meta['archive_size']} bytes sha256={meta['archive_sha256'][:12]}"
+                ),
+                "tabs_count": 0,
+                "files_count": 0,
+            }
+
+        suffix = ARCHIVE_FORMATS.get(meta.get("compression", "gzip"), ".tar.gz")
+        local_archive = storage / f"session_{session_id}_dump{suffix}"
+        os.replace(part, local_archive)
+        local_meta.write_text(json.dumps(meta))
+        state.unlink(missing_ok=True)
+        try:
+            pool.exec(vm_host, f"{COLLECT_SCRIPT} cleanup {session_id}", **auth)
+        except Exception as e:
+            logger.warning("Dump cleanup on %s failed: %s", vm_host, e)
 
         logger.info(
-            "Dump collected for session %d: tabs=%d, files=%d",
+            "Dump collected for session %d: tabs=%d, files=%d, %d bytes in %.1fs (%.0f KB/s)%s",
             session_id,
             meta.get("tabs_count", 0),
             meta.get("files_count", 0),
+            received,
+            seconds,
+            received / seconds / 1024,
+            f", resumed at {offset}" if offset else "",
         )
         return {
             "archive_path": str(local_archive),
             "meta_path": str(local_meta),
             **meta,
+            "bytes_transferred": received,
+            "resumed_from": offset,
+            "transfer_seconds": round(seconds, 3),
+            "throughput_bps": round(received / seconds),
         }
 
     except ImportError:
@@ -105,6 +226,21 @@ async def collect_dump_from_vm(
         return {"error": str(e), "tabs_count": 0, "files_count": 0}
 
 
+async def collect_dump_from_vm(
+    session_id: int,
+    vm_host: str,
+    chrome_profile: str = "Default",
+    ssh_user: str = "vdi",
+    ssh_key_path: str | None = None,
+    since: int | None = None,
+    until: int | None = None,
+) -> dict:
+    """Async wrapper around collect_dump — runs it off the event loop."""
+    return await asyncio.to_thread(
+        collect_dump, session_id, vm_host, chrome_profile, ssh_user, ssh_key_path, since, until,
+    )
+
+
 def save_dump_path(db: DbSession, session_id: int, dump_path: str) -> None:
     """Store the dump archive path in the session record."""
     session = db.query(Session).filter(Session.id == session_id).first()
@@ -113,34 +249,21 @@ def save_dump_path(db: DbSession, session_id: int, dump_path: str) -> None:
         db.commit()
 
 
-def cleanup_expired_dumps() -> int:
-    """Delete dump archives older than DUMP_RETENTION_DAYS. Returns count deleted."""
-    storage = ensure_storage()
-    cutoff = datetime.now(timezone.utc) - timedelta(days=DUMP_RETENTION_DAYS)
-    deleted = 0
-
-    for path in storage.iterdir():
-        if path.is_file() and path.stat().st_mtime < cutoff.timestamp():
-            path.unlink()
-            deleted += 1
-            logger.info("Deleted expired dump: %s", path.name)
-
-    return deleted
+def save_dump_meta(db: DbSession, session_id: int, meta: dict) -> SessionDump:
+    """Store the dump's metadata in session_dumps (replacing earlier runs).
 
-
-def cleanup_expired_dumps_db(db: DbSession) -> int:
-    """Clear dump_path for sessions with expired dumps."""
-    cutoff = datetime.now(timezone.utc) - timedelta(days=DUMP_RETENTION_DAYS)
-    sessions = (
-        db.query(Session)
-        .filter(Session.dump_path.isnot(None), Session.ended_at < cutoff)
-        .all()
-    )
-    count = 0
-    for session in sessions:
-        if session.dump_path and not os.path.exists(session.dump_path):
-            session.dump_path = None
-            count += 1
-    if count:
-        db.commit()
-    return count
+    Only adds/updates the row — the caller commits.
+    """
+    row = db.query(SessionDump).filter(SessionDump.session_id == session_id).first()
+    if row is None:
+        row = SessionDump(session_id=session_id)
+        db.add(row)
+    row.format_version = int(meta.get("format_version", 1))
+    row.tabs_count = int(meta.get("tabs_count") or 0)
+    row.files_count = int(meta.get("files_count") or 0)
+    row.chrome_profile = meta.get("chrome_profile")
+    row.hostname = meta.get("hostname")
+    row.collected_at = meta.get("collected_at")
+    row.archive_sha256 = meta.get("archive_sha256")
+    row.archive_size = meta.get("archive_size")
+    return row
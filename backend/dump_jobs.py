@@ -0,0 +1,521 @@
+"""Dump jobs — collect session dumps off the event loop, with retries.
+
+Ending a session (release, force-release, /kick) only enqueues a row in
+dump_jobs; the request returns immediately. A dispatcher task on the event
+loop claims due jobs and runs dump.collect_dump in a bounded thread pool
+(paramiko is blocking). Status transitions:
+
+    queued → running → done
+                     → queued   (retry, exponential backoff)
+                     → failed   (after dump_max_attempts)
+
+Staging (collect_dump.sh prepare) captures the VM's live state, so it
+has to happen before the slot's next user starts: occupy refuses the slot
+while its last session's dump is unstaged (staging(), at most STAGE_WAIT),
+unstaged jobs are claimed before anything else, and a job that finds the
+slot reused before it could stage gives up rather than capture someone
+else's screen, clipboard and Downloads. Retries after staging only stream
+the frozen staging dir.
+
+A successful dump is ingested into the chunk store (dump_store.py), its
+tabs are indexed for search (dump_search.py), and the archive rebuilt from
+it is queued for the user's Telegram (telegram_outbox.py).
+Jobs are persisted, so a restart picks up where it left off: rows stuck in
+"running" from a crashed process are re-queued once they go stale.
+
+At shift end many sessions end within minutes, all against the same few
+VMs. Concurrency is capped in total (dump_workers) and per VM host
+(dump_workers_per_host, counted from the running rows, so it holds across
+backend processes). Due jobs are claimed in priority order: users with
+Telegram linked first (someone is waiting for the message), then smallest
+expected archive first — shortest-job-first keeps the average time to
+delivery down for a burst. queue_stats() reports the queue depth and
+time-to-delivery percentiles.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session as DbSession, sessionmaker
+
+from backend import dump, dump_search, dump_store, thumbnails
+from backend.config import settings
+from backend.database import SessionLocal
+from backend.models import DumpJob, Session, User
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL_SEC = 5
+STALE_RUNNING_AFTER = timedelta(minutes=30)  # longer than any sane dump
+SIZE_HINT_SAMPLES = 5  # earlier dumps of a profile averaged for size_hint
+STATS_WINDOW = timedelta(hours=24)
+STAGE_WAIT = timedelta(minutes=2)  # occupy waits this long for the previous dump's staging
+_WAKE_KEY = "dump_jobs_wake"  # db.info flag: a job was added, wake the dispatcher on commit
+
+_pool: ThreadPoolExecutor | None = None
+_task: asyncio.Task | None = None
+_loop: asyncio.AbstractEventLoop | None = None
+_wakeup: asyncio.Event | None = None
+_in_flight: set[asyncio.Task] = set()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)  # naive UTC, like the DB columns
+
+
+def resolve_vm_host(session: Session) -> str | None:
+    """SSH host to collect a session's dump from."""
+    return session.vm_id or settings.dump_ssh_host or settings.timeweb_host or None
+
+
+def backoff_delay(attempts: int) -> timedelta:
+    """Delay before retry number `attempts` (1-based): base · 2^(n-1), capped."""
+    seconds = settings.dump_retry_base_sec * (2 ** max(0, attempts - 1))
+    return timedelta(seconds=min(seconds, settings.dump_retry_max_sec))
+
+
+def enqueue_dump(db: DbSession, session: Session) -> DumpJob | None:
+    """Queue dump collection for an ended session.
+
+    Only adds the row — the caller commits together with its own changes
+    (ended_at etc.), so a release and its dump job are saved atomically.
+    The dispatcher is woken once that commit lands, not before: woken
+    earlier it would find nothing to claim and sleep a full poll interval.
+    """
+    host = resolve_vm_host(session)
+    if not host:
+        logger.info("Dump for session %s skipped: no VM host configured", session.id)
+        return None
+    profile = (session.slot.chrome_profile if session.slot else None) or "Default"
+    job = DumpJob(
+        session_id=session.id,
+        vm_host=host,
+        chrome_profile=profile,
+        status="queued",
+        priority=0 if session.user and session.user.telegram_id else 1,
+        size_hint=size_hint(db, host, profile),
+        next_attempt_at=_now(),
+    )
+    db.add(job)
+    db.info[_WAKE_KEY] = True
+    return job
+
+
+def size_hint(db: DbSession, vm_host: str, chrome_profile: str) -> int | None:
+    """Expected archive size: the mean of the profile's last few dumps."""
+    sizes = [
+        size for (size,) in db.query(DumpJob.archive_size)
+        .filter(
+            DumpJob.vm_host == vm_host,
+            DumpJob.chrome_profile == chrome_profile,
+            DumpJob.status == "done",
+            DumpJob.archive_size.isnot(None),
+        )
+        .order_by(DumpJob.finished_at.desc())
+        .limit(SIZE_HINT_SAMPLES)
+    ]
+    return sum(sizes) // len(sizes) if sizes else None
+
+
+def superseded(db: DbSession, session: Session) -> bool:
+    """Has the slot been occupied again since `session`? Its VM state is gone then."""
+    return db.query(Session.id).filter(
+        Session.slot_id == session.slot_id, Session.id > session.id,
+    ).first() is not None
+
+
+def staging(db: DbSession, slot_id: str, now: datetime | None = None) -> DumpJob | None:
+    """The slot's last session's dump, if it is still to be staged and worth waiting for.
+
+    occupy refuses the slot meanwhile, so the next user's screen and files
+    don't end up in it. After STAGE_WAIT the slot is let go; the job then
+    finds the slot reused and gives up (see superseded()).
+    """
+    now = now or _now()
+    return (
+        db.query(DumpJob)
+        .join(Session, Session.id == DumpJob.session_id)
+        .filter(
+            Session.slot_id == slot_id,
+            DumpJob.status.in_(("queued", "running")),
+            DumpJob.staged_at.is_(None),
+            DumpJob.created_at > now - STAGE_WAIT,
+        )
+        .first()
+    )
+
+
+def _wake() -> None:
+    """Nudge the dispatcher (safe to call from sync endpoints' worker threads)."""
+    if _loop and _wakeup and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+@event.listens_for(DbSession, "after_commit")
+def _after_commit(db: DbSession) -> None:
+    if db.info.pop(_WAKE_KEY, False):
+        _wake()
+
+
+@event.listens_for(DbSession, "after_rollback")
+def _after_rollback(db: DbSession) -> None:
+    db.info.pop(_WAKE_KEY, None)
+
+
+def claim_due_jobs(db: DbSession, limit: int, per_host: int | None = None) -> list[int]:
+    """Atomically move up to `limit` due jobs from queued to running.
+
+    Jobs go in priority order (Telegram users first, then smallest
+    size_hint; no hint sorts last), skipping hosts that already run
+    `per_host` jobs. The conditional UPDATE makes a claim exclusive even
+    with several backend workers polling the same table.
+    """
+    if limit <= 0:
+        return []
+    per_host = per_host or settings.dump_workers_per_host
+    now = _now()
+    running = dict(
+        db.query(DumpJob.vm_host, func.count(DumpJob.id))
+        .filter(DumpJob.status == "running")
+        .group_by(DumpJob.vm_host)
+        .all()
+    )
+    full = [host for host, n in running.items() if n >= per_host]
+    # The whole due queue — tens of rows even at shift end — so a full
+    # host's jobs can't crowd out the others' in a LIMIT
+    candidates = (
+        db.query(DumpJob.id, DumpJob.vm_host)
+        .filter(
+            DumpJob.status == "queued",
+            DumpJob.next_attempt_at <= now,
+            DumpJob.vm_host.notin_(full),
+        )
+        .order_by(
+            DumpJob.staged_at.isnot(None),  # a slot may be waiting for its staging
+            DumpJob.priority,
+            DumpJob.size_hint.is_(None),
+            DumpJob.size_hint,
+            DumpJob.next_attempt_at,
+            DumpJob.id,
+        )
+        .all()
+    )
+    claimed = []
+    for job_id, host in candidates:
+        if len(claimed) == limit:
+            break
+        if running.get(host, 0) >= per_host:
+            continue
+        updated = (
+            db.query(DumpJob)
+            .filter(DumpJob.id == job_id, DumpJob.status == "queued")
+            .update(
+                {"status": "running", "started_at": now, "attempts": DumpJob.attempts + 1},
+                synchronize_session=False,
+            )
+        )
+        if updated:
+            claimed.append(job_id)
+            running[host] = running.get(host, 0) + 1
+    db.commit()
+    return claimed
+
+
+def _index_tabs(db: DbSession, session: Session, manifest: dict) -> None:
+    """Add the dump's tabs to the search index; never fails the job."""
+    try:
+        with db.begin_nested():
+            dump_search.index_session(db, session.id, session.user_id, manifest)
+    except Exception as e:
+        logger.warning("Search indexing for session %d failed: %s", session.id, e)
+
+
+def run_job(job_id: int, session_factory: sessionmaker = SessionLocal) -> bool:
+    """Collect one dump (blocking; runs in the worker pool). Returns success."""
+    db = session_factory()
+    try:
+        job = db.query(DumpJob).filter(DumpJob.id == job_id).first()
+        if not job:
+            return False
+        session = db.query(Session).filter(Session.id == job.session_id).first()
+        since = until = None
+        if session and session.started_at:
+            since = int(session.started_at.replace(tzinfo=timezone.utc).timestamp())
+        if session and session.ended_at:
+            until = int(session.ended_at.replace(tzinfo=timezone.utc).timestamp())
+
+        def staged() -> None:
+            if job.staged_at is None:
+                job.staged_at = _now()
+                db.commit()
+
+        result = dump.collect_dump(
+            job.session_id,
+            job.vm_host,
+            chrome_profile=job.chrome_profile,
+            ssh_user=settings.dump_ssh_user,
+            ssh_key_path=settings.dump_ssh_key_path or None,
+            since=since,
+            until=until,
+            may_stage=lambda: session is None or not superseded(db, session),
+            on_staged=staged,
+        )
+
+        if "error" not in result:
+            try:
+                manifest = dump_store.ingest_archive(db, job.session_id, result["archive_path"], result)
+            except Exception as e:
+                db.rollback()
+                result = {"error": f"ingest failed: {e}"}
+            else:
+                _discard_archive(result)
+
+        if "error" not in result:
+            job.status = "done"
+            job.archive_path = str(manifest)
+            job.archive_sha256 = result.get("archive_sha256")
+            job.archive_size = result.get("archive_size")
+            job.bytes_transferred = result.get("bytes_transferred")
+            job.transfer_seconds = result.get("transfer_seconds")
+            job.throughput_bps = result.get("throughput_bps")
+            job.last_error = None
+            job.finished_at = _now()
+            meta = dump.save_dump_meta(db, job.session_id, result)
+            stored = dump_store.load_manifest(job.session_id) or {"members": []}
+            meta.has_screenshot = bool(dump_store.find_member(stored, thumbnails.SCREENSHOT))
+            if session:
+                _index_tabs(db, session, stored)
+            dump.save_dump_path(db, job.session_id, str(manifest))
+            db.commit()  # save_dump_path only commits when the session row still exists
+            if meta.has_screenshot:
+                try:  # eager; lazily re-made if evicted, so it never fails the job
+                    thumbnails.ensure_thumbnail(db, job.session_id)
+                except Exception as e:
+                    db.rollback()
+                    logger.warning("Thumbnail for session %d failed: %s", job.session_id, e)
+            return True
+
+        job.last_error = str(result["error"])[:500]
+        if result.get("superseded") or job.attempts >= settings.dump_max_attempts:
+            job.status = "failed"
+            job.finished_at = _now()
+            logger.error(
+                "Dump job %d (session %d) failed after %d attempts: %s",
+                job.id, job.session_id, job.attempts, job.last_error,
+            )
+        else:
+            job.status = "queued"
+            job.next_attempt_at = _now() + backoff_delay(job.attempts)
+        db.commit()
+        return False
+    finally:
+        db.close()
+
+
+def _discard_archive(result: dict) -> None:
+    """The chunk store now holds the dump; drop the transferred archive."""
+    for key in ("archive_path", "meta_path"):
+        if result.get(key):
+            Path(result[key]).unlink(missing_ok=True)
+
+
+def requeue_stale(db: DbSession) -> int:
+    """Jobs left "running" by a crashed process go back to the queue.
+
+    Only jobs running for longer than STALE_RUNNING_AFTER are touched, so a
+    second backend worker doesn't steal jobs the first one is still running.
+    """
+    now = _now()
+    count = (
+        db.query(DumpJob)
+        .filter(DumpJob.status == "running", DumpJob.started_at < now - STALE_RUNNING_AFTER)
+        .update({"status": "queued", "next_attempt_at": now}, synchronize_session=False)
+    )
+    db.commit()
+    if count:
+        logger.info("Re-queued %d interrupted dump jobs", count)
+    return count
+
+
+def _delivery_info(job_id: int) -> tuple | None:
+    db = SessionLocal()
+    try:
+        job = db.query(DumpJob).filter(DumpJob.id == job_id).first()
+        session = db.query(Session).filter(Session.id == job.session_id).first() if job else None
+        if not session:
+            return None
+        user = db.query(User).filter(User.id == session.user_id).first()
+        if not user or not user.telegram_id:
+            return None
+        duration = 0
+        if session.started_at and session.ended_at:
+            duration = int((session.ended_at - session.started_at).total_seconds() / 60)
+        counts = (session.dump.tabs_count, session.dump.files_count) if session.dump else (0, 0)
+        # Chunk-store dumps are rebuilt by the outbox when it sends them
+        archive = None if dump_store.is_manifest(session.dump_path) else session.dump_path
+        return user.telegram_id, session.id, session.slot_id, duration, archive, counts
+    finally:
+        db.close()
+
+
+def mark_session_delivered(db: DbSession, session_id: int, commit: bool = True) -> None:
+    """The session's dump reached the user's Telegram (called by the outbox)."""
+    db.query(Session).filter(Session.id == session_id).update(
+        {"dump_sent": True}, synchronize_session=False,
+    )
+    db.query(DumpJob).filter(
+        DumpJob.session_id == session_id, DumpJob.status == "done", DumpJob.delivered_at.is_(None),
+    ).update({"delivered_at": _now()}, synchronize_session=False)
+    if commit:
+        db.commit()
+
+
+def mark_delivered(db: DbSession, job_id: int, sent: bool) -> None:
+    """Record delivery: sent to Telegram, or ready on the web (no Telegram)."""
+    job = db.query(DumpJob).filter(DumpJob.id == job_id).first()
+    if not job:
+        return
+    if sent:
+        mark_session_delivered(db, job.session_id, commit=False)
+    job.delivered_at = job.delivered_at or _now()
+    db.commit()
+
+
+def _mark_delivered(job_id: int, sent: bool) -> None:
+    db = SessionLocal()
+    try:
+        mark_delivered(db, job_id, sent)
+    finally:
+        db.close()
+
+
+async def _deliver(job_id: int) -> None:
+    """Send a finished dump to the user's Telegram."""
+    info = await asyncio.to_thread(_delivery_info, job_id)
+    if not info:
+        await asyncio.to_thread(_mark_delivered, job_id, False)
+        return
+    chat_id, session_id, slot_id, duration, dump_path, (tabs_count, files_count) = info
+    from backend.telegram_bot import send_session_dump
+
+    # Queued in the outbox, which marks the dump delivered once Telegram has it
+    await send_session_dump(
+        chat_id, session_id, slot_id, duration,
+        tabs_count=tabs_count,
+        files_count=files_count,
+        dump_path=dump_path,
+    )
+
+
+def _percentile(values: list[float], pct: float) -> float | None:
+    """Nearest-rank percentile of sorted `values`."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+
+def queue_stats(db: DbSession, window: timedelta = STATS_WINDOW) -> dict:
+    """Queue depth per host and time-to-delivery percentiles.
+
+    Time to delivery runs from enqueue (the session's end) to the dump
+    reaching the user, over jobs delivered within `window`.
+    """
+    hosts: dict[str, dict] = {}
+    for host, status, count in (
+        db.query(DumpJob.vm_host, DumpJob.status, func.count(DumpJob.id))
+        .filter(DumpJob.status.in_(("queued", "running")))
+        .group_by(DumpJob.vm_host, DumpJob.status)
+    ):
+        hosts.setdefault(host, {"host": host, "queued": 0, "running": 0})[status] = count
+
+    since = _now() - window
+    delays = sorted(
+        (delivered - created).total_seconds()
+        for created, delivered in db.query(DumpJob.created_at, DumpJob.delivered_at)
+        .filter(DumpJob.delivered_at >= since)
+    )
+    return {
+        "queued": sum(h["queued"] for h in hosts.values()),
+        "running": sum(h["running"] for h in hosts.values()),
+        "hosts": sorted(hosts.values(), key=lambda h: h["host"]),
+        "delivered": len(delays),
+        "delivery_p50_sec": _percentile(delays, 50),
+        "delivery_p90_sec": _percentile(delays, 90),
+        "delivery_p99_sec": _percentile(delays, 99),
+    }
+
+
+async def _execute(job_id: int) -> None:
+    ok = await asyncio.get_running_loop().run_in_executor(_pool, run_job, job_id)
+    if ok:
+        try:
+            await _deliver(job_id)
+        except Exception as e:
+            logger.error("Dump delivery for job %d failed: %s", job_id, e)
+
+
+def _claim(limit: int) -> list[int]:
+    db = SessionLocal()
+    try:
+        requeue_stale(db)
+        return claim_due_jobs(db, limit)
+    finally:
+        db.close()
+
+
+async def _dispatch_forever() -> None:
+    while True:
+        try:
+            free = settings.dump_workers - len(_in_flight)
+            for job_id in await asyncio.to_thread(_claim, free):
+                task = asyncio.create_task(_execute(job_id))
+                _in_flight.add(task)
+                task.add_done_callback(_on_done)
+        except Exception as e:
+            logger.error("Dump dispatcher error: %s", e)
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=POLL_INTERVAL_SEC)
+        except asyncio.TimeoutError:
+            pass
+
+
+def _on_done(task: asyncio.Task) -> None:
+    _in_flight.discard(task)
+    _wake()  # a worker freed up — look for more jobs
+
+
+async def start_dump_worker() -> None:
+    """Start the worker pool and dispatcher (called from app lifespan)."""
+    global _pool, _task, _loop, _wakeup
+    if _task is not None:
+        return
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    _pool = ThreadPoolExecutor(max_workers=settings.dump_workers, thread_name_prefix="dump")
+    _task = asyncio.create_task(_dispatch_forever())
+    logger.info("Dump worker started (%d threads)", settings.dump_workers)
+
+
+async def stop_dump_worker() -> None:
+    global _pool, _task, _loop, _wakeup
+    if _task:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+    if _pool:
+        # Running jobs finish; anything left "running" is re-queued on next start
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+    _loop = None
+    _wakeup = None
@@ -0,0 +1,153 @@
+"""Dump retention sweeper — expire stored dumps from the dump_files index.
+
+Every stored file is indexed in dump_files with an expires_at (dump
+manifests: DUMP_RETENTION_DAYS, rebuilt archives: a day). The sweeper runs
+hourly and deletes expired files oldest-first in batches of SWEEP_BATCH
+rows, committing after each batch, so a backlog after downtime never
+turns into one long transaction. An expired manifest releases its chunk
+references; chunks left without references are then garbage-collected in
+batches too.
+
+Pre-chunk-store archives referenced by sessions.dump_path are indexed on
+the fly (one row per session, once) so they expire the same way.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session as DbSession
+
+from backend import dump, dump_store
+from backend.database import SessionLocal
+from backend.models import DumpFile, Session
+
+logger = logging.getLogger(__name__)
+
+SWEEP_INTERVAL_SEC = 3600
+SWEEP_BATCH = 200
+MAX_BATCHES_PER_RUN = 50  # the rest waits for the next run
+
+_task: asyncio.Task | None = None
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)  # naive UTC, like the DB columns
+
+
+def index_legacy_archives(db: DbSession, limit: int = SWEEP_BATCH) -> int:
+    """Index .tar.gz dumps that predate dump_files. Returns how many."""
+    sessions = (
+        db.query(Session)
+        .filter(
+            Session.dump_path.isnot(None),
+            Session.dump_path.like("%.tar.gz"),
+            ~Session.dump_path.in_(select(DumpFile.path)),
+        )
+        .limit(limit)
+        .all()
+    )
+    for session in sessions:
+        try:
+            size = os.path.getsize(session.dump_path)
+        except OSError:
+            session.dump_path = None  # already gone
+            continue
+        ended = session.ended_at or _now()
+        dump_store.index_file(
+            db, session.dump_path, "archive", size, session_id=session.id,
+            expires_at=ended + timedelta(days=dump.DUMP_RETENTION_DAYS),
+        )
+    db.commit()
+    return len(sessions)
+
+
+def sweep_batch(db: DbSession, now: datetime | None = None, limit: int = SWEEP_BATCH) -> int:
+    """Delete up to `limit` expired files. Returns how many rows were handled."""
+    now = now or _now()
+    rows = (
+        db.query(DumpFile)
+        .filter(DumpFile.expires_at <= now)
+        .order_by(DumpFile.expires_at)
+        .limit(limit)
+        .all()
+    )
+    for row in rows:
+        if row.kind == "manifest":
+            # Drops the manifest, its cached archive and their index rows
+            dump_store.release(db, row.session_id, commit=False)
+        if row.kind in ("manifest", "archive"):
+            db.query(Session).filter(
+                Session.id == row.session_id, Session.dump_path == row.path,
+            ).update({"dump_path": None}, synchronize_session=False)
+        dump_store.unindex_file(db, row.path)  # no-op if release() already did
+    db.commit()
+    return len(rows)
+
+
+def sweep(db: DbSession, now: datetime | None = None) -> dict:
+    """One retention run: index legacy dumps, expire files, collect chunks."""
+    indexed = 0
+    while (n := index_legacy_archives(db)) == SWEEP_BATCH:
+        indexed += n
+    indexed += n
+
+    expired = 0
+    for _ in range(MAX_BATCHES_PER_RUN):
+        n = sweep_batch(db, now)
+        expired += n
+        if n < SWEEP_BATCH:
+            break
+
+    chunks = 0
+    for _ in range(MAX_BATCHES_PER_RUN):
+        n = dump_store.collect_garbage(db, limit=SWEEP_BATCH)
+        chunks += n
+        if n < SWEEP_BATCH:
+            break
+
+    if indexed or expired or chunks:
+        logger.info(
+            "Dump retention: %d legacy indexed, %d files expired, %d chunks freed",
+            indexed, expired, chunks,
+        )
+    return {"indexed": indexed, "expired": expired, "chunks_freed": chunks}
+
+
+def _sweep_once() -> dict:
+    db = SessionLocal()
+    try:
+        return sweep(db)
+    finally:
+        db.close()
+
+
+async def _run_forever() -> None:
+    while True:
+        try:
+            await asyncio.to_thread(_sweep_once)
+        except Exception as e:
+            logger.error("Dump retention sweep failed: %s", e)
+        await asyncio.sleep(SWEEP_INTERVAL_SEC)
+
+
+async def start_sweeper() -> None:
+    """Start the hourly retention sweep (called from app lifespan)."""
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_run_forever())
+
+
+async def stop_sweeper() -> None:
+    global _task
+    if _task:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
@@ -0,0 +1,142 @@
+"""Full-text search over the tabs saved in session dumps.
+
+At ingest the dump's tab list — history.json (format v2) or tabs.txt
+(format v1) — is written into the session_tabs_fts FTS5 table, one row per
+distinct URL. The index outlives the dump files themselves: rows are a few
+hundred bytes per tab, so "which session did I research X in?" can be
+answered months after the archive has expired.
+
+Rows are keyed by rowid = session_id << SESSION_SHIFT | n, so re-indexing a
+session deletes a rowid range instead of scanning the table, and a hit maps
+back to its session without a join. Queries are ranked by bm25 (FTS5's
+rank) and grouped per session in Python: the best-ranked tab decides the
+session's place, up to MAX_MATCHES tabs are shown as snippets.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session as DbSession
+
+from backend import dump_store
+from backend.models import SESSION_TABS_FTS
+
+logger = logging.getLogger(__name__)
+
+SESSION_SHIFT = 20
+MAX_TABS_INDEXED = 5000  # per session; far below 1 << SESSION_SHIFT
+MAX_QUERY_TERMS = 8
+MAX_MATCHES = 3  # snippets per session
+ROWS_PER_SESSION = 10  # FTS rows fetched per requested session before grouping
+HIGHLIGHT = ("**", "**")
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+def _history_tabs(data: bytes) -> list[tuple[str, str]]:
+    rows = json.loads(data).get("urls") or []
+    return [(r.get("url") or "", r.get("title") or "") for r in rows]
+
+
+def _tabs_txt(data: bytes) -> list[tuple[str, str]]:
+    tabs = []
+    for line in data.decode("utf-8", errors="replace").splitlines():
+        url, _, title = line.partition("|")  # sqlite3 CLI default separator
+        tabs.append((url.strip(), title.strip()))
+    return tabs
+
+
+def extract_tabs(manifest: dict) -> list[tuple[str, str]]:
+    """(url, title) for each distinct URL in a stored dump, newest first."""
+    tabs: list[tuple[str, str]] = []
+    if member := dump_store.find_member(manifest, "history.json"):
+        try:
+            tabs = _history_tabs(b"".join(dump_store.iter_member(member)))
+        except (ValueError, AttributeError) as e:
+            logger.warning("Unreadable history.json in session %s: %s", manifest.get("session_id"), e)
+    if not tabs and (member := dump_store.find_member(manifest, "tabs.txt")):
+        tabs = _tabs_txt(b"".join(dump_store.iter_member(member)))
+
+    seen: dict[str, str] = {}
+    for url, title in tabs:
+        if url and not seen.get(url):  # first title that isn't empty
+            seen[url] = title
+    return list(seen.items())[:MAX_TABS_INDEXED]
+
+
+def _rowid_range(session_id: int) -> tuple[int, int]:
+    first = session_id << SESSION_SHIFT
+    return first, first + (1 << SESSION_SHIFT) - 1
+
+
+def index_session(db: DbSession, session_id: int, user_id: int, manifest: dict) -> int:
+    """(Re)index one session's tabs. Does not commit. Returns how many."""
+    first, last = _rowid_range(session_id)
+    db.execute(
+        text(f"DELETE FROM {SESSION_TABS_FTS} WHERE rowid BETWEEN :first AND :last"),
+        {"first": first, "last": last},
+    )
+    tabs = extract_tabs(manifest)
+    if tabs:
+        db.execute(
+            text(f"INSERT INTO {SESSION_TABS_FTS} (rowid, url, title, user_id) VALUES (:rowid, :url, :title, :user_id)"),
+            [
+                {"rowid": first + n, "url": url, "title": title, "user_id": user_id}
+                for n, (url, title) in enumerate(tabs)
+            ],
+        )
+    return len(tabs)
+
+
+def match_query(q: str) -> str | None:
+    """User input → FTS5 query: every word must match, as a prefix.
+
+    Words are quoted, so FTS5 operators and punctuation in the input are
+    just text and can never be a syntax error.
+    """
+    terms = _TERM.findall(q)[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+def search(db: DbSession, q: str, user_id: int | None = None, limit: int = 20) -> list[dict]:
+    """Sessions whose tabs match `q`, best first.
+
+    `user_id` scopes the search to one user's sessions (None: everyone's).
+    Each hit: {session_id, score, matches: [{url, title}]} — snippets
+    have the matched words wrapped in HIGHLIGHT.
+    """
+    query = match_query(q)
+    if query is None:
+        return []
+    scope = "AND user_id = :user_id" if user_id is not None else ""
+    open_, close = HIGHLIGHT
+    rows = db.execute(
+        text(
+            f"SELECT rowid >> {SESSION_SHIFT} AS session_id, url, rank,"
+            f" snippet({SESSION_TABS_FTS}, 1, :open, :close, '…', 12) AS title"
+            f" FROM {SESSION_TABS_FTS} WHERE {SESSION_TABS_FTS} MATCH :query {scope}"
+            " ORDER BY rank LIMIT :rows"
+        ),
+        {
+            "query": query, "user_id": user_id, "open": open_, "close": close,
+            "rows": limit * ROWS_PER_SESSION,
+        },
+    ).all()
+
+    hits: dict[int, dict] = {}
+    for row in rows:
+        hit = hits.get(row.session_id)
+        if hit is None:
+            if len(hits) == limit:
+                continue
+            # bm25 is lower-is-better and negative; flip it for the API
+            hit = hits[row.session_id] = {"session_id": row.session_id, "score": -row.rank, "matches": []}
+        if len(hit["matches"]) < MAX_MATCHES:
+            hit["matches"].append({"url": row.url, "title": row.title})
+    return list(hits.values())
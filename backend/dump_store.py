@@ -0,0 +1,503 @@
+"""Content-addressed dump storage — chunks shared between sessions.
+
+Every dump carries a copy of the slot's Chrome History, and the same
+profile's History barely changes between sessions. Instead of keeping one
+.tar.gz per session, the archive is unpacked at ingest and each member is
+split into chunks stored once under their SHA-256:
+
+    DUMP_STORAGE/chunks/ab/ab12…   zlib-compressed chunk
+    DUMP_STORAGE/manifests/session_<id>.json
+    DUMP_STORAGE/manifests/session_<id>.thumb.webp   screenshot thumbnail
+    DUMP_STORAGE/cache/session_<id>_dump.tar.gz   rebuilt on demand
+
+SQLite files are cut at page boundaries (pages change in place, so
+unchanged pages dedup exactly); everything else uses content-defined
+chunking with a Gear rolling hash, so an insertion only changes the chunks
+around it. The manifest lists each member's chunks in order plus the dump
+metadata. dump_chunks holds one reference per manifest using a chunk;
+releasing a session drops its references and garbage collection deletes
+chunks nobody refers to any more.
+
+Manifests, cached archives and thumbnails are indexed in dump_files with their expiry,
+and storage_totals keeps running counts for each kind, so retention
+(dump_retention.py) and the admin view never walk the disk. A file
+dropped from the index is deleted only once that transaction commits.
+
+Writing chunks and counting their references (ingest) and deleting
+unreferenced ones (collect_garbage) take the chunk-store lock — a flock
+on chunks/.lock, so it holds across backend processes. Without it an
+ingest could find a chunk file present, then count a reference to it
+just after GC removed it.
+
+Blocking file I/O — call from worker threads.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import io
+import json
+import logging
+import fcntl
+import os
+import tarfile
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterator
+
+from sqlalchemy import event, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session as DbSession
+
+from backend import dump
+from backend.models import DumpChunk, DumpFile, StorageTotal, TelegramFile
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+# Content-defined chunking: cut where the top AVG_BITS of the Gear hash are 0
+MIN_CHUNK = 2 * 1024
+MAX_CHUNK = 64 * 1024
+AVG_BITS = 13  # ~8 KiB average
+_CUT_MASK = ((1 << AVG_BITS) - 1) << (64 - AVG_BITS)
+_GEAR = [int.from_bytes(hashlib.sha256(bytes([b])).digest()[:8], "big") for b in range(256)]
+
+SQLITE_MAGIC = b"SQLite format 3\x00"
+SQLITE_PAGES_PER_CHUNK = 4
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+CACHE_TTL = timedelta(days=1)  # rebuilt archives: kept a day past their last use
+
+_UNLINK_KEY = "dump_store_unlink"
+_thread_lock = threading.Lock()
+
+
+# ── Chunking ──
+
+def _cdc_boundaries(data: bytes) -> Iterator[tuple[int, int]]:
+    n = len(data)
+    start = 0
+    gear = _GEAR
+    while start < n:
+        end = min(start + MAX_CHUNK, n)
+        cut = end
+        h = 0
+        for i in range(min(start + MIN_CHUNK, end), end):
+            h = ((h << 1) + gear[data[i]]) & 0xFFFFFFFFFFFFFFFF
+            if not h & _CUT_MASK:
+                cut = i + 1
+                break
+        yield start, cut
+        start = cut
+
+
+def _sqlite_page_size(data: bytes) -> int | None:
+    if len(data) < 100 or not data.startswith(SQLITE_MAGIC):
+        return None
+    size = int.from_bytes(data[16:18], "big")
+    return 65536 if size == 1 else size or None
+
+
+def chunk_boundaries(data: bytes) -> Iterator[tuple[int, int]]:
+    """(start, end) offsets of the chunks `data` is split into."""
+    page = _sqlite_page_size(data)
+    if page:
+        step = page * SQLITE_PAGES_PER_CHUNK
+        for start in range(0, len(data), step):
+            yield start, min(start + step, len(data))
+    else:
+        yield from _cdc_boundaries(data)
+
+
+# ── Layout ──
+
+def _root() -> Path:
+    return dump.ensure_storage()
+
+
+def chunk_path(digest: str) -> Path:
+    return _root() / "chunks" / digest[:2] / digest
+
+
+def manifest_path(session_id: int) -> Path:
+    return _root() / "manifests" / f"session_{session_id}.json"
+
+
+def cache_path(session_id: int) -> Path:
+    return _root() / "cache" / f"session_{session_id}_dump.tar.gz"
+
+
+def thumb_path(session_id: int) -> Path:
+    """Screenshot thumbnail, next to the manifest (see thumbnails.py)."""
+    return _root() / "manifests" / f"session_{session_id}.thumb.webp"
+
+
+def is_manifest(dump_path: str | None) -> bool:
+    return bool(dump_path) and dump_path.endswith(".json") and "manifests" in Path(dump_path).parts
+
+
+def _tmp_path(path: Path) -> Path:
+    """Per-process, per-thread temp name next to `path` (renamed into place)."""
+    return path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _tmp_path(path)
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def load_manifest(session_id: int) -> dict | None:
+    try:
+        return json.loads(manifest_path(session_id).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+@contextmanager
+def _chunk_lock() -> Iterator[None]:
+    """Exclusive access to chunk files and their refs, across threads and processes."""
+    path = _root() / "chunks" / ".lock"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _thread_lock, open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# ── Ingest / read ──
+
+@contextmanager
+def open_archive(path: str | Path) -> Iterator[tarfile.TarFile]:
+    """Open a dump archive for sequential reading: .tar.gz (format 1) or .tar.zst (format 2)."""
+    with open(path, "rb") as f:
+        if f.read(4) != ZSTD_MAGIC:
+            f.seek(0)
+            with tarfile.open(fileobj=f, mode="r:*") as tar:
+                yield tar
+            return
+        import zstandard
+
+        f.seek(0)
+        with zstandard.ZstdDecompressor().stream_reader(f) as reader, \
+                tarfile.open(fileobj=reader, mode="r|") as tar:
+            yield tar
+
+
+def _store_chunk(data: bytes) -> tuple[str, int, bool]:
+    """Write a chunk unless already present. Returns (digest, stored size, written).
+
+    Call under _chunk_lock(), and count the reference before releasing it.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    path = chunk_path(digest)
+    if path.exists():
+        return digest, path.stat().st_size, False
+    packed = zlib.compress(data, 6)
+    write_atomic(path, packed)
+    return digest, len(packed), True
+
+
+def _ingest_chunks(db: DbSession, session_id: int, archive_path: str | Path) -> list[dict]:
+    """Store an archive's chunks and commit their references. Returns the manifest members.
+
+    Drops the session's previous references in the same transaction.
+    Call under _chunk_lock().
+    """
+    members = []
+    chunks: dict[str, tuple[int, int]] = {}  # digest → (size, stored_size)
+    written = [0, 0]  # new chunk files, bytes
+    with open_archive(archive_path) as tar:
+        for info in tar:
+            if not info.isfile():
+                continue
+            # "session_<id>_dump/History" → "History"
+            name = info.name.split("/", 1)[1] if "/" in info.name else info.name
+            data = tar.extractfile(info).read()
+            entry = {
+                "name": name,
+                "size": len(data),
+                "mode": info.mode,
+                "sha256": hashlib.sha256(data).hexdigest(),
+                "chunks": [],
+            }
+            for start, end in chunk_boundaries(data):
+                piece = data[start:end]
+                digest, stored, new = _store_chunk(piece)
+                chunks[digest] = (len(piece), stored)
+                if new:
+                    written[0] += 1
+                    written[1] += stored
+                entry["chunks"].append([digest, len(piece)])
+            members.append(entry)
+
+    release(db, session_id, commit=False)
+    for digest, (size, stored) in chunks.items():
+        stmt = sqlite_insert(DumpChunk).values(hash=digest, size=size, stored_size=stored, refs=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["hash"], set_={"refs": DumpChunk.refs + 1},
+        )
+        db.execute(stmt)
+    _bump(db, "chunk", *written)
+    db.commit()
+    return members
+
+
+def ingest_archive(db: DbSession, session_id: int, archive_path: str | Path, meta: dict | None = None) -> Path:
+    """Unpack a dump archive into the chunk store and write its manifest.
+
+    Chunk references are committed before the manifest is written, so a
+    crash in between leaves extra references (harmless) rather than a
+    manifest pointing at collectable chunks. Re-ingesting a session
+    replaces its previous manifest.
+    """
+    with _chunk_lock():
+        members = _ingest_chunks(db, session_id, archive_path)
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "session_id": session_id,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "meta": {k: v for k, v in (meta or {}).items() if not k.endswith("_path")},
+        "members": members,
+    }
+    path = manifest_path(session_id)
+    encoded = json.dumps(manifest).encode()
+    write_atomic(path, encoded)
+    index_file(
+        db, path, "manifest", len(encoded),
+        session_id=session_id, expires_at=_now() + timedelta(days=dump.DUMP_RETENTION_DAYS),
+    )
+    db.commit()
+    logger.info(
+        "Dump for session %d stored: %d members, %d chunks",
+        session_id, len(members), sum(len(m["chunks"]) for m in members),
+    )
+    return path
+
+
+def read_chunk(digest: str) -> bytes:
+    return zlib.decompress(chunk_path(digest).read_bytes())
+
+
+def find_member(manifest: dict, name: str) -> dict | None:
+    return next((m for m in manifest["members"] if m["name"] == name), None)
+
+
+def iter_member(member: dict, start: int = 0, end: int | None = None) -> Iterator[bytes]:
+    """Yield the bytes [start, end) of a member, one chunk at a time."""
+    end = member["size"] if end is None else min(end, member["size"])
+    offset = 0
+    for digest, size in member["chunks"]:
+        chunk_end = offset + size
+        if chunk_end > start and offset < end:
+            data = read_chunk(digest)
+            yield data[max(start - offset, 0):min(end - offset, size)]
+        offset = chunk_end
+        if offset >= end:
+            break
+
+
+class _MemberReader(io.RawIOBase):
+    """File-like view of a member, for tarfile.addfile."""
+
+    def __init__(self, member: dict):
+        self._chunks = iter_member(member)
+        self._buf = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buf:
+            try:
+                self._buf = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+
+def archive_etag(manifest: dict) -> str:
+    """Strong ETag of the rebuilt archive: it is a pure function of the members."""
+    h = hashlib.sha256()
+    for m in manifest["members"]:
+        h.update(f"{m['name']}\0{m['mode']}\0{m['sha256']}\n".encode())
+    return h.hexdigest()[:32]
+
+
+def materialize(db: DbSession, session_id: int) -> Path | None:
+    """Rebuild a session's .tar.gz (Telegram delivery, downloads) from its chunks.
+
+    The output is deterministic (sorted manifest order, zero mtimes, gzip
+    header without timestamp), so archive_etag() identifies it. The result
+    is cached; every use pushes its expiry CACHE_TTL further out.
+    """
+    manifest = load_manifest(session_id)
+    if manifest is None:
+        return None
+    path = cache_path(session_id)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = _tmp_path(path)
+        # filename="" and mtime=0 keep the gzip header free of per-build values
+        with open(tmp, "wb") as f, \
+                gzip.GzipFile(filename="", fileobj=f, mode="wb", compresslevel=6, mtime=0) as gz, \
+                tarfile.open(fileobj=gz, mode="w") as tar:
+            for member in manifest["members"]:
+                info = tarfile.TarInfo(f"session_{session_id}_dump/{member['name']}")
+                info.size = member["size"]
+                info.mode = member["mode"]
+                tar.addfile(info, io.BufferedReader(_MemberReader(member)))
+        os.replace(tmp, path)
+    index_file(
+        db, path, "cache", path.stat().st_size,
+        session_id=session_id, expires_at=_now() + CACHE_TTL,
+    )
+    db.commit()
+    return path
+
+
+# ── Index and totals ──
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)  # naive UTC, like the DB columns
+
+
+def _bump(db: DbSession, kind: str, files: int, nbytes: int) -> None:
+    if not files and not nbytes:
+        return
+    stmt = sqlite_insert(StorageTotal).values(kind=kind, files=files, bytes=nbytes)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["kind"],
+        set_={
+            "files": StorageTotal.files + stmt.excluded.files,
+            "bytes": StorageTotal.bytes + stmt.excluded.bytes,
+        },
+    )
+    db.execute(stmt)
+
+
+def index_file(
+    db: DbSession, path: str | Path, kind: str, size: int,
+    session_id: int | None = None, expires_at: datetime | None = None,
+) -> None:
+    """Record (or refresh) a stored file in dump_files and the running totals."""
+    path = str(path)
+    db.info.get(_UNLINK_KEY, set()).discard(path)  # rewritten after an unindex_file()
+    row = db.query(DumpFile).filter(DumpFile.path == path).first()
+    if row is None:
+        row = DumpFile(path=path, kind=kind, size=0, session_id=session_id)
+        db.add(row)
+        _bump(db, kind, 1, 0)
+    _bump(db, kind, 0, size - row.size)
+    row.size = size
+    row.expires_at = expires_at or _now() + timedelta(days=dump.DUMP_RETENTION_DAYS)
+    db.flush()  # sessions don't autoflush; later lookups by path must see it
+
+
+def unindex_file(db: DbSession, path: str | Path) -> None:
+    """Delete a file's dump_files row, updating the totals.
+
+    The file itself is deleted once the transaction commits, so a rollback
+    never leaves a row pointing at a missing file.
+    """
+    path = str(path)
+    db.info.setdefault(_UNLINK_KEY, set()).add(path)
+    row = db.query(DumpFile).filter(DumpFile.path == path).first()
+    if row is not None:
+        _bump(db, row.kind, -1, -row.size)
+        db.delete(row)
+        db.flush()
+
+
+def totals(db: DbSession) -> dict[str, dict[str, int]]:
+    return {t.kind: {"files": t.files, "bytes": t.bytes} for t in db.query(StorageTotal).all()}
+
+
+# ── Retention ──
+
+def release(db: DbSession, session_id: int, commit: bool = True) -> bool:
+    """Drop a session's chunk references and its manifest. Returns whether it had one."""
+    manifest = load_manifest(session_id)
+    if manifest is None:
+        return False
+    digests = {digest for m in manifest["members"] for digest, _ in m["chunks"]}
+    if digests:
+        db.query(DumpChunk).filter(DumpChunk.hash.in_(digests)).update(
+            {"refs": DumpChunk.refs - 1}, synchronize_session=False,
+        )
+    unindex_file(db, manifest_path(session_id))
+    unindex_file(db, cache_path(session_id))
+    unindex_file(db, thumb_path(session_id))
+    # Telegram still has the file, but the dump is gone: stop resending it
+    db.query(TelegramFile).filter(TelegramFile.session_id == session_id).delete(synchronize_session=False)
+    if commit:
+        db.commit()
+    return True
+
+
+def collect_garbage(db: DbSession, limit: int | None = None) -> int:
+    """Delete chunks no manifest refers to. Returns how many were freed.
+
+    Runs under _chunk_lock(), and each row is deleted conditionally (refs
+    still 0, re-checked under the lock) and committed before its file is
+    removed, so a chunk re-referenced by an ingest survives.
+    """
+    freed = 0
+    orphans = (
+        db.query(DumpChunk.hash, DumpChunk.stored_size)
+        .filter(DumpChunk.refs <= 0)
+        .limit(limit)
+        .all()
+    )
+    if not orphans:
+        return 0
+    with _chunk_lock():
+        for digest, stored in orphans:
+            deleted = (
+                db.query(DumpChunk)
+                .filter(DumpChunk.hash == digest, DumpChunk.refs <= 0)
+                .delete(synchronize_session=False)
+            )
+            if deleted:
+                _bump(db, "chunk", -1, -stored)
+            db.commit()
+            if deleted:
+                chunk_path(digest).unlink(missing_ok=True)
+                freed += 1
+    if freed:
+        logger.info("Freed %d unreferenced dump chunks", freed)
+    return freed
+
+
+def usage(db: DbSession) -> dict:
+    """Logical vs stored bytes of the chunk store."""
+    chunks, stored, logical = db.query(
+        func.count(DumpChunk.hash),
+        func.coalesce(func.sum(DumpChunk.stored_size), 0),
+        func.coalesce(func.sum(DumpChunk.size * DumpChunk.refs), 0),
+    ).one()
+    return {"chunks": chunks, "stored_bytes": stored, "logical_bytes": logical}
+
+
+@event.listens_for(DbSession, "after_commit")
+def _after_commit(db: DbSession) -> None:
+    for path in db.info.pop(_UNLINK_KEY, ()):
+        Path(path).unlink(missing_ok=True)
+
+
+@event.listens_for(DbSession, "after_rollback")
+def _after_rollback(db: DbSession) -> None:
+    db.info.pop(_UNLINK_KEY, None)
@@ -7,15 +7,18 @@ For now, returns data from vm_status table + slot active checks.
 from __future__ import annotations
 
 import logging
+import subprocess
+import time
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 from sqlalchemy.orm import Session as DbSession
 
+from backend.config import settings
 from backend.database import get_db
 from backend.auth import require_admin
-from backend.models import VmStatus, Slot, Session, User
+from backend.models import VmStatus, Slot, Session, User, ServiceCheck
 
 logger = logging.getLogger(__name__)
 
@@ -38,12 +41,23 @@ class ServiceStatus(BaseModel):
     service_name: str
     status: str  # "ok" | "warn" | "error"
     detail: str | None = None
+    latency_ms: int | None = None
+    checked_at: str | None = None
+    last_failure: str | None = None
+
+
+class VpnPeer(BaseModel):
+    public_key: str
+    endpoint: str | None
+    last_handshake_sec: int | None  # seconds since last handshake, None = never
+    stale: bool
 
 
 class VpnStatus(BaseModel):
     connected: bool
     ip: str | None
     interface: str
+    peers: list[VpnPeer] = []
 
 
 class HealthResponse(BaseModel):
@@ -52,13 +66,63 @@ class HealthResponse(BaseModel):
     vpn: VpnStatus
 
 
+class HealthHistory(BaseModel):
+    step: int  # bucket size, seconds
+    series: dict[str, list[list[float]]]  # name → [[bucket_ts, avg, min, max], ...]
+
+
+# ── Helpers ──
+
+def _run(cmd: list[str]) -> str | None:
+    try:
+        out = subprocess.run(cmd, capture_output=True, text=True, timeout=2)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return out.stdout if out.returncode == 0 else None
+
+
+def _read_wireguard(interface: str) -> VpnStatus | None:
+    """Parse `wg show <iface> dump`. None if WireGuard isn't available here."""
+    dump = _run(["wg", "show", interface, "dump"])
+    if dump is None:
+        return None
+
+    now = int(time.time())
+    peers = []
+    # First line describes the interface itself; one line per peer follows:
+    # pubkey psk endpoint allowed-ips latest-handshake rx tx keepalive
+    for line in dump.strip().splitlines()[1:]:
+        fields = line.split("\t")
+        if len(fields) < 5:
+            continue
+        handshake = int(fields[4]) if fields[4].isdigit() else 0
+        age = now - handshake if handshake else None
+        peers.append(VpnPeer(
+            public_key=fields[0][:8],
+            endpoint=None if fields[2] == "(none)" else fields[2],
+            last_handshake_sec=age,
+            stale=age is None or age > settings.vpn_peer_stale_sec,
+        ))
+
+    ip = None
+    addr = _run(["ip", "-o", "-4", "addr", "show", "dev", interface])
+    if addr:
+        parts = addr.split()
+        if "inet" in parts:
+            ip = parts[parts.index("inet") + 1].split("/")[0]
+
+    return VpnStatus(
+        connected=any(not p.stale for p in peers),
+        ip=ip,
+        interface=interface,
+        peers=peers,
+    )
+
+
 # ── Endpoints ──
 
-@router.get("/health", response_model=HealthResponse)
-def get_health(
-    db: DbSession = Depends(get_db),
-    _admin: User = Depends(require_admin),
-):
+def build_health(db: DbSession) -> HealthResponse:
+    """Point-in-time health snapshot (shared by the API and the health prober)."""
     # 1. VM statuses from database
     vm_records = db.query(VmStatus).all()
     vms = []
@@ -84,8 +148,9 @@ def get_health(
                 updated_at=None,
             ))
 
-    # 2. Service statuses — check if slots have active sessions
+    # 2. Service statuses — last result of the session checker (service_checker.py)
     slots = db.query(Slot).filter(Slot.is_active == True).all()
+    checks = {c.slot_id: c for c in db.query(ServiceCheck).all()}
     services = []
     for slot in slots:
         active_session = (
@@ -93,11 +158,13 @@ def get_health(
             .filter(Session.slot_id == slot.id, Session.ended_at == None)
             .first()
         )
-        # Simple status: if slot exists and is active → ok
-        # Future: check cookies, auth status via curl
-        status = "ok"
+        check = checks.get(slot.id)
+        # Not checked yet (no URL or checker hasn't run) → assume ok
+        status = check.status if check else "ok"
         detail = None
-        if active_session:
+        if check and check.status != "ok":
+            detail = check.last_failure
+        elif active_session:
             user = db.query(User).filter(User.id == active_session.user_id).first()
             detail = f"Занят: {user.name}" if user else "Занят"
 
@@ -106,19 +173,68 @@ def get_health(
             service_name=slot.service_name,
             status=status,
             detail=detail,
+            latency_ms=check.latency_ms if check else None,
+            checked_at=check.checked_at.isoformat() if check and check.checked_at else None,
+            last_failure=check.last_failure if check else None,
         ))
 
-    # 3. VPN status — placeholder until WireGuard integration
-    # In production: subprocess.run(["wg", "show"], capture_output=True)
-    vpn = VpnStatus(
+    # 3. VPN status — from `wg show`; placeholder where WireGuard isn't installed (dev)
+    vpn = _read_wireguard(settings.vpn_interface) or VpnStatus(
         connected=True,  # placeholder
-        ip=None,  # needs `wg show` output
-        interface="wg0",
+        ip=None,
+        interface=settings.vpn_interface,
     )
 
     return HealthResponse(vms=vms, services=services, vpn=vpn)
 
 
+@router.get("/health", response_model=HealthResponse)
+def get_health(
+    db: DbSession = Depends(get_db),
+    _admin: User = Depends(require_admin),
+):
+    return build_health(db)
+
+
+@router.get("/health/history", response_model=HealthHistory)
+def get_health_history(
+    series: list[str] | None = Query(default=None),
+    prefix: str | None = None,
+    hours: int = Query(default=24, ge=1, le=24 * 365),
+    db: DbSession = Depends(get_db),
+    _admin: User = Depends(require_admin),
+):
+    """Downsampled health history for sparklines (e.g. prefix=vm:, hours=168)."""
+    from backend import health_history
+
+    step, data = health_history.query(
+        db, series, since=time.time() - hours * 3600, prefix=prefix,
+    )
+    return HealthHistory(step=step, series=data)
+
+
+@router.post("/services/check", response_model=list[ServiceStatus])
+async def run_service_check(
+    db: DbSession = Depends(get_db),
+    _admin: User = Depends(require_admin),
+):
+    """Run the service session checker right now instead of waiting for the schedule."""
+    from backend.service_checker import check_services
+
+    results = await check_services(db)
+    names = {s.id: s.service_name for s in db.query(Slot).all()}
+    return [
+        ServiceStatus(
+            slot_id=r["slot_id"],
+            service_name=names.get(r["slot_id"], r["slot_id"]),
+            status=r["status"],
+            detail=r["reason"],
+            latency_ms=r["latency_ms"],
+        )
+        for r in results
+    ]
+
+
 @router.post("/vm/{vm_id}/reboot")
 def reboot_vm(
     vm_id: str,
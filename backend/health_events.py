@@ -0,0 +1,111 @@
+"""Health transitions — diff successive prober snapshots, push to admins.
+
+Each health probe produces a HealthResponse snapshot. Comparing it with the
+previous one yields transitions:
+
+    vm        VM-4 up → down
+    service   ppx-1 ok → warn
+    vpn       connected → disconnected
+    vpn_peer  peer abcd1234 fresh → stale
+
+Transitions are broadcast on the admin WebSocket (/ws/admin) so HealthTab
+updates immediately, and forwarded to admins via Telegram. Alerts are
+deduplicated: the same subject reaching the same state again within
+health_alert_cooldown_sec is not re-sent (a flapping VM alerts once).
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+
+from backend.config import settings
+from backend.health import HealthResponse
+from backend.websocket import broadcast_admin
+
+logger = logging.getLogger(__name__)
+
+_previous: HealthResponse | None = None
+_last_alert: dict[tuple[str, str, str], float] = {}  # (kind, subject, state) → ts
+
+
+def _states(snapshot: HealthResponse) -> dict[tuple[str, str], str]:
+    states: dict[tuple[str, str], str] = {}
+    for vm in snapshot.vms:
+        states[("vm", vm.vm_id)] = "up" if vm.is_healthy else "down"
+    for svc in snapshot.services:
+        states[("service", svc.slot_id)] = svc.status
+    vpn = snapshot.vpn
+    states[("vpn", vpn.interface)] = "connected" if vpn.connected else "disconnected"
+    for peer in vpn.peers:
+        states[("vpn_peer", peer.public_key)] = "stale" if peer.stale else "fresh"
+    return states
+
+
+def diff_snapshots(prev: HealthResponse | None, cur: HealthResponse) -> list[dict]:
+    """Transitions between two snapshots. Nothing for the first snapshot."""
+    if prev is None:
+        return []
+    before = _states(prev)
+    after = _states(cur)
+    details = {("service", s.slot_id): s.detail for s in cur.services}
+
+    transitions = []
+    for key, state in after.items():
+        old = before.get(key)
+        if old is None or old == state:
+            continue
+        kind, subject = key
+        transitions.append({
+            "kind": kind,
+            "subject": subject,
+            "from": old,
+            "to": state,
+            "detail": details.get(key),
+        })
+    return transitions
+
+
+def _alert_text(t: dict) -> str:
+    labels = {
+        "vm": "VM",
+        "service": "Сервис",
+        "vpn": "VPN",
+        "vpn_peer": "VPN-пир",
+    }
+    text = f"{labels.get(t['kind'], t['kind'])} {t['subject']}: {t['from']} → {t['to']}"
+    if t.get("detail"):
+        text += f"\n{t['detail']}"
+    return text
+
+
+def _should_alert(t: dict, now: float) -> bool:
+    key = (t["kind"], t["subject"], t["to"])
+    last = _last_alert.get(key)
+    if last is not None and now - last < settings.health_alert_cooldown_sec:
+        return False
+    _last_alert[key] = now
+    return True
+
+
+async def process_snapshot(snapshot: HealthResponse) -> list[dict]:
+    """Diff against the previous snapshot, publish and alert. Returns transitions."""
+    global _previous
+    transitions = diff_snapshots(_previous, snapshot)
+    _previous = snapshot
+    if not transitions:
+        return []
+
+    now = time.time()
+    for t in transitions:
+        await broadcast_admin("health_transition", {**t, "at": now})
+
+    to_alert = [t for t in transitions if _should_alert(t, now)]
+    if to_alert:
+        logger.info("Health transitions: %s", "; ".join(_alert_text(t) for t in to_alert))
+        try:
+            from backend.telegram_bot import send_admin_alert
+            await send_admin_alert("\n\n".join(_alert_text(t) for t in to_alert))
+        except Exception as e:
+            logger.error("Failed to send health alert: %s", e)
+    return transitions
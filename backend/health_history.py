@@ -0,0 +1,252 @@
+"""Health time-series store — history for VM and service probes.
+
+Samples are recorded into fixed-size in-memory ring buffers (one per series,
+e.g. "vm:VM-4:up" or "service:ppx-1:latency_ms") and flushed to SQLite in
+downsampled tiers:
+
+    raw   — 1-minute buckets, kept 2 days
+    15min — 15-minute buckets, kept 30 days
+    1h    — hourly buckets, kept 1 year
+
+Each bucket row stores count/sum/min/max, so flushes only ever add to a
+bucket and averages stay exact across tiers. The health prober records a
+snapshot every 15 s and flushes; the admin API queries the tier that
+fits the requested range for HealthTab sparklines. Each snapshot is also
+handed to health_events to push transitions to admins.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session as DbSession
+
+from backend.database import SessionLocal
+from backend.health import HealthResponse, build_health
+from backend.health_events import process_snapshot
+from backend.models import HealthSample
+
+logger = logging.getLogger(__name__)
+
+# Tier step (seconds) → retention (seconds)
+TIERS: dict[int, int] = {
+    60: 2 * 86400,
+    900: 30 * 86400,
+    3600: 365 * 86400,
+}
+RING_SIZE = 720  # samples per series kept in memory (3 h at one per 15 s)
+PROBE_INTERVAL_SEC = 15
+
+STATUS_VALUES = {"ok": 1.0, "warn": 0.5, "error": 0.0}
+
+
+class RingBuffer:
+    """Fixed-size buffer of (ts, value) samples; oldest are overwritten."""
+
+    def __init__(self, size: int = RING_SIZE):
+        self._ts = [0.0] * size
+        self._val = [0.0] * size
+        self._size = size
+        self._next = 0  # total samples ever written
+
+    def append(self, ts: float, value: float) -> None:
+        i = self._next % self._size
+        self._ts[i] = ts
+        self._val[i] = value
+        self._next += 1
+
+    def since(self, seq: int) -> tuple[list[tuple[float, float]], int]:
+        """Samples written after sequence number `seq`, plus the new seq.
+
+        If the buffer wrapped past `seq`, only what is still held is returned.
+        """
+        start = max(seq, self._next - self._size)
+        out = [
+            (self._ts[i % self._size], self._val[i % self._size])
+            for i in range(start, self._next)
+        ]
+        return out, self._next
+
+
+_lock = threading.Lock()
+_buffers: dict[str, RingBuffer] = {}
+_flushed_seq: dict[str, int] = {}
+_task: asyncio.Task | None = None
+
+
+def record(series: str, value: float, ts: float | None = None) -> None:
+    """Record one sample. Cheap and thread-safe; no I/O."""
+    with _lock:
+        buf = _buffers.get(series)
+        if buf is None:
+            buf = _buffers[series] = RingBuffer()
+        buf.append(ts if ts is not None else time.time(), float(value))
+
+
+def recent(series: str) -> list[tuple[float, float]]:
+    """All samples of a series still held in memory."""
+    with _lock:
+        buf = _buffers.get(series)
+        return buf.since(0)[0] if buf else []
+
+
+def flush(db: DbSession, now: float | None = None) -> int:
+    """Aggregate unflushed samples into every tier and apply retention.
+
+    Returns the number of samples flushed.
+    """
+    with _lock:
+        pending: dict[str, list[tuple[float, float]]] = {}
+        for series, buf in _buffers.items():
+            samples, seq = buf.since(_flushed_seq.get(series, 0))
+            if samples:
+                pending[series] = samples
+            _flushed_seq[series] = seq
+
+    # (series, step, bucket) → [count, sum, min, max]
+    buckets: dict[tuple[str, int, int], list[float]] = {}
+    flushed = 0
+    for series, samples in pending.items():
+        flushed += len(samples)
+        for ts, value in samples:
+            for step in TIERS:
+                key = (series, step, int(ts) // step * step)
+                agg = buckets.get(key)
+                if agg is None:
+                    buckets[key] = [1, value, value, value]
+                else:
+                    agg[0] += 1
+                    agg[1] += value
+                    agg[2] = min(agg[2], value)
+                    agg[3] = max(agg[3], value)
+
+    for (series, step, bucket), (count, total, vmin, vmax) in buckets.items():
+        stmt = sqlite_insert(HealthSample).values(
+            series=series, step=step, bucket=bucket,
+            count=count, sum=total, min=vmin, max=vmax,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["series", "step", "bucket"],
+            set_={
+                "count": HealthSample.count + stmt.excluded.count,
+                "sum": HealthSample.sum + stmt.excluded.sum,
+                # Two-argument min/max are SQLite scalar functions
+                "min": func.min(HealthSample.min, stmt.excluded.min),
+                "max": func.max(HealthSample.max, stmt.excluded.max),
+            },
+        )
+        db.execute(stmt)
+
+    now = now if now is not None else time.time()
+    for step, retention in TIERS.items():
+        db.query(HealthSample).filter(
+            HealthSample.step == step,
+            HealthSample.bucket < now - retention,
+        ).delete(synchronize_session=False)
+    db.commit()
+    return flushed
+
+
+def pick_step(range_sec: int) -> int:
+    """Coarsest-enough tier so a sparkline has at most a few hundred points."""
+    if range_sec <= 6 * 3600:
+        return 60
+    if range_sec <= 7 * 86400:
+        return 900
+    return 3600
+
+
+def query(
+    db: DbSession,
+    series: list[str] | None,
+    since: float,
+    step: int | None = None,
+    prefix: str | None = None,
+) -> tuple[int, dict[str, list[list[float]]]]:
+    """Return (step, {series: [[bucket, avg, min, max], ...]}) ordered by time."""
+    if step is None:
+        step = pick_step(int(time.time() - since))
+    q = db.query(HealthSample).filter(
+        HealthSample.step == step,
+        HealthSample.bucket >= int(since) // step * step,
+    )
+    if series:
+        q = q.filter(HealthSample.series.in_(series))
+    if prefix:
+        q = q.filter(HealthSample.series.startswith(prefix))
+    out: dict[str, list[list[float]]] = {}
+    for row in q.order_by(HealthSample.series, HealthSample.bucket):
+        out.setdefault(row.series, []).append(
+            [row.bucket, round(row.sum / row.count, 3), row.min, row.max]
+        )
+    return step, out
+
+
+# ── Prober ──
+
+def probe(db: DbSession) -> HealthResponse:
+    """Record one health snapshot into the store and return it."""
+    snapshot = build_health(db)
+    now = time.time()
+    for vm in snapshot.vms:
+        if vm.updated_at is None:  # placeholder VM, nothing real to record
+            continue
+        record(f"vm:{vm.vm_id}:up", 1.0 if vm.is_healthy else 0.0, now)
+        record(f"vm:{vm.vm_id}:busy", 1.0 if vm.active_user else 0.0, now)
+    for svc in snapshot.services:
+        record(f"service:{svc.slot_id}:status", STATUS_VALUES.get(svc.status, 0.0), now)
+    record("vpn:connected", 1.0 if snapshot.vpn.connected else 0.0, now)
+    return snapshot
+
+
+def _probe_and_flush() -> HealthResponse:
+    db = SessionLocal()
+    try:
+        snapshot = probe(db)
+        flush(db)
+        return snapshot
+    finally:
+        db.close()
+
+
+async def _run_forever() -> None:
+    while True:
+        try:
+            snapshot = await asyncio.to_thread(_probe_and_flush)
+            await process_snapshot(snapshot)
+        except Exception as e:
+            logger.error("Health probe failed: %s", e)
+        await asyncio.sleep(PROBE_INTERVAL_SEC)
+
+
+async def start_prober() -> None:
+    """Start the periodic probe + flush task (called from app lifespan)."""
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_run_forever())
+
+
+async def stop_prober() -> None:
+    global _task
+    if _task:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+        # Final flush so the last minute isn't lost on restart
+        await asyncio.to_thread(_flush_once)
+
+
+def _flush_once() -> None:
+    db = SessionLocal()
+    try:
+        flush(db)
+    finally:
+        db.close()
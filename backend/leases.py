@@ -0,0 +1,60 @@
+"""Leases — one backend process at a time does a job (SQLite-backed).
+
+With several uvicorn workers, some jobs must run exactly once: the
+Telegram bot's webhook registration and outbox, for instance. A process
+holds a named lease by keeping a row in `leases` with its holder id and an
+expiry, renewing it well before it runs out. If the holder dies, the row
+expires and the next process to ask takes over.
+
+The acquire is a single conditional upsert — insert, or take the row over
+if it has expired or is already ours — so two processes can never both
+believe they hold it.
+"""
+
+from __future__ import annotations
+
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session as DbSession
+
+from backend.models import Lease
+
+# This process, as a lease holder
+HOLDER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)  # naive UTC, like the DB columns
+
+
+def acquire(db: DbSession, name: str, ttl: timedelta, holder: str = HOLDER) -> bool:
+    """Take or renew the lease for `ttl`. Returns whether `holder` has it. Commits."""
+    now = _now()
+    stmt = sqlite_insert(Lease).values(name=name, holder=holder, expires_at=now + ttl)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"holder": holder, "expires_at": now + ttl},
+        where=(Lease.expires_at < now) | (Lease.holder == holder),
+    )
+    db.execute(stmt)
+    db.commit()
+    return db.query(Lease.holder).filter(Lease.name == name).scalar() == holder
+
+
+def release(db: DbSession, name: str, holder: str = HOLDER) -> None:
+    """Give the lease up (on shutdown), so another process needn't wait it out."""
+    db.query(Lease).filter(Lease.name == name, Lease.holder == holder).delete()
+    db.commit()
+
+
+def holder_of(db: DbSession, name: str) -> str | None:
+    """Current unexpired holder of a lease, if any."""
+    return (
+        db.query(Lease.holder)
+        .filter(Lease.name == name, Lease.expires_at >= _now())
+        .scalar()
+    )
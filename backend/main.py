@@ -6,6 +6,7 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from backend import migrations
 from backend.database import engine, Base
 from backend.auth import router as auth_router
 from backend.slots import router as slots_router
@@ -17,11 +18,13 @@ from backend.admin import router as admin_router
 from backend.sessions import router as sessions_router
 from backend.health import router as health_router
 from backend.websocket import router as ws_router
+from backend.telegram_webhook import router as telegram_router
 
 logger = logging.getLogger(__name__)
 
-# Create tables on startup
+# Create tables on startup, and add columns new since the database was made
 Base.metadata.create_all(bind=engine)
+migrations.upgrade(engine)
 
 
 @asynccontextmanager
@@ -38,9 +41,32 @@ async def lifespan(app: FastAPI):
     else:
         logger.info("Telegram bot skipped (no token)")
 
+    from backend.service_checker import start_checker, stop_checker
+    from backend.health_history import start_prober, stop_prober
+    from backend.dump_jobs import start_dump_worker, stop_dump_worker
+    from backend.dump_retention import start_sweeper, stop_sweeper
+    from backend.booking_scheduler import start_scheduler, stop_scheduler
+    from backend.queue_handoff import start_handoff, stop_handoff
+    await start_checker()
+    await start_prober()
+    await start_dump_worker()
+    await start_sweeper()
+    await start_scheduler()
+    await start_handoff()
+
     yield
 
     # Shutdown
+    await stop_checker()
+    await stop_prober()
+    await stop_dump_worker()
+    await stop_sweeper()
+    await stop_scheduler()
+    await stop_handoff()
+    from backend.thumbnails import shutdown as stop_thumbnails
+    stop_thumbnails()
+    from backend.ssh_pool import pool
+    pool.close_all()
     try:
         from backend.telegram_bot import stop_bot
         await stop_bot()
@@ -70,6 +96,7 @@ app.include_router(admin_router, prefix="/api")
 app.include_router(sessions_router, prefix="/api")
 app.include_router(health_router, prefix="/api")
 app.include_router(ws_router, prefix="/api")
+app.include_router(telegram_router, prefix="/api")
 
 
 @app.get("/api/health")
@@ -0,0 +1,152 @@
+"""Schema upgrades for databases created by an earlier version.
+
+Base.metadata.create_all() creates missing tables but never alters an
+existing one, so a column added to a model would be missing from every
+deployed vdi_taxi.db ("no such column" on the first query). upgrade()
+runs at startup right after create_all (main.py, seed.py) and brings old
+tables up to date:
+
+- COLUMNS are added with ALTER TABLE … ADD COLUMN, typed from the model;
+  the optional SQL default fills the column for existing rows;
+- INDEXES (declared on the models) are created if missing;
+- BACKFILLS fill tables or columns from data written before they existed.
+
+Every step checks the live schema (or, for backfills, which rows still
+lack the data) first, so running it again — or on a fresh database,
+where create_all already made everything — does nothing.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from typing import Callable
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session as DbSession
+
+from backend import bookings, dump, dump_store, thumbnails
+from backend.database import Base
+from backend.models import Booking, Session, SessionDump
+
+logger = logging.getLogger(__name__)
+
+# (table, column, SQL default for existing rows or None), oldest first
+COLUMNS: list[tuple[str, str, str | None]] = [
+    ("slots", "session_cookie", None),
+    ("dump_jobs", "staged_at", None),
+    ("dump_jobs", "priority", "1"),
+    ("dump_jobs", "size_hint", None),
+    ("dump_jobs", "delivered_at", None),
+    ("bookings", "reminded_at", None),
+    ("queue_entries", "hold_until", None),
+    ("bookings", "starts_at", None),
+    ("bookings", "ends_at", None),
+    ("sessions", "ends_by", None),
+]
+
+# Index names, as declared on the models
+INDEXES: list[str] = [
+    "ix_users_telegram_id",
+    "ix_bookings_slot_status_start",
+]
+
+
+def _index(name: str):
+    for table in Base.metadata.tables.values():
+        for index in table.indexes:
+            if index.name == name:
+                return index
+    raise KeyError(name)
+
+
+def _legacy_meta(dump_path: str) -> dict:
+    """Metadata of a dump stored before session_dumps: from its manifest,
+    or <dump>_meta.json next to a legacy archive; {} if missing or unreadable."""
+    if dump_store.is_manifest(dump_path):
+        try:
+            with open(dump_path) as f:
+                return json.load(f).get("meta", {})
+        except (OSError, ValueError):
+            return {}
+    try:
+        with open(dump_path.replace(".tar.gz", "_meta.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _session_dumps(db: DbSession) -> int:
+    """A session_dumps row for every dump collected before the table existed.
+
+    A dump whose metadata can't be read still gets a row (zero counts), so
+    the files are read once, not on every start.
+    """
+    sessions = (
+        db.query(Session.id, Session.dump_path)
+        .outerjoin(SessionDump, SessionDump.session_id == Session.id)
+        .filter(Session.dump_path.isnot(None), SessionDump.session_id.is_(None))
+        .all()
+    )
+    for session_id, dump_path in sessions:
+        row = dump.save_dump_meta(db, session_id, _legacy_meta(dump_path))
+        if dump_store.is_manifest(dump_path):
+            manifest = dump_store.load_manifest(session_id) or {"members": []}
+            row.has_screenshot = bool(dump_store.find_member(manifest, thumbnails.SCREENSHOT))
+    return len(sessions)
+
+
+def _booking_intervals(db: DbSession) -> int:
+    """starts_at/ends_at for bookings made before the interval columns.
+
+    Conflict checks and the reservation timeline only see bookings that
+    have them. One with an unreadable date is left as it is.
+    """
+    filled = 0
+    for booking in db.query(Booking).filter(Booking.starts_at.is_(None)):
+        try:
+            booking.starts_at, booking.ends_at = bookings.booking_window(booking)
+        except ValueError:
+            continue
+        filled += 1
+    return filled
+
+
+# (what is filled, step returning how many rows it filled), oldest first
+BACKFILLS: list[tuple[str, Callable[[DbSession], int]]] = [
+    ("session_dumps", _session_dumps),
+    ("bookings.starts_at", _booking_intervals),
+]
+
+
+def upgrade(engine: Engine) -> list[str]:
+    """Add the columns, indexes and data an older database lacks. Returns what was added."""
+    schema = inspect(engine)
+    added = []
+    with engine.begin() as conn:
+        for table, column, default in COLUMNS:
+            if not schema.has_table(table):
+                continue  # created by create_all, complete
+            if column in {c["name"] for c in schema.get_columns(table)}:
+                continue
+            col_type = Base.metadata.tables[table].c[column].type.compile(engine.dialect)
+            ddl = f"ALTER TABLE {table} ADD COLUMN {column} {col_type}"
+            if default is not None:
+                ddl += f" DEFAULT {default}"
+            conn.execute(text(ddl))
+            added.append(f"{table}.{column}")
+        for name in INDEXES:
+            index = _index(name)
+            if name not in {i["name"] for i in schema.get_indexes(index.table.name)}:
+                index.create(conn)
+                added.append(name)
+    with DbSession(bind=engine) as db:
+        for name, step in BACKFILLS:
+            filled = step(db)
+            db.commit()
+            if filled:
+                added.append(f"{name} ({filled} rows)")
+    if added:
+        logger.info("Schema upgraded: %s", ", ".join(added))
+    return added
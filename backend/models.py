@@ -1,7 +1,7 @@
 from datetime import datetime
 
 from sqlalchemy import (
-    Column, Integer, String, Boolean, Float, DateTime, ForeignKey, Text, JSON,
+    DDL, Column, Integer, String, Boolean, Float, DateTime, ForeignKey, Text, JSON, Index, event,
 )
 from sqlalchemy.orm import relationship
 
@@ -16,7 +16,7 @@ class User(Base):
     username = Column(String, unique=True, nullable=False, index=True)
     password_hash = Column(String, nullable=False)
     totp_secret = Column(String, nullable=True)
-    telegram_id = Column(String, nullable=True)
+    telegram_id = Column(String, nullable=True, index=True)
     is_admin = Column(Boolean, default=False)
     is_first_login = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -39,6 +39,7 @@ class Slot(Base):
     login_encrypted = Column(String, nullable=True)
     password_encrypted = Column(String, nullable=True)
     chrome_profile = Column(String, nullable=True)
+    session_cookie = Column(Text, nullable=True)  # Cookie header for service checks
     is_active = Column(Boolean, default=True)
 
     sessions = relationship("Session", back_populates="slot")
@@ -54,12 +55,14 @@ class Session(Base):
     vm_id = Column(String, nullable=True)
     started_at = Column(DateTime, default=datetime.utcnow)
     ended_at = Column(DateTime, nullable=True)
-    end_reason = Column(String, nullable=True)  # manual / timeout / disconnect
+    end_reason = Column(String, nullable=True)  # manual / timeout / disconnect / preempted
+    ends_by = Column(DateTime, nullable=True)  # walk-up session ahead of a booking (reservations.py)
     dump_path = Column(String, nullable=True)
     dump_sent = Column(Boolean, default=False)
 
     user = relationship("User", back_populates="sessions")
     slot = relationship("Slot", back_populates="sessions")
+    dump = relationship("SessionDump", uselist=False, back_populates="session")
 
 
 class Booking(Base):
@@ -73,10 +76,18 @@ class Booking(Base):
     duration_min = Column(Integer, default=60)
     status = Column(String, default="active")  # active / cancelled / expired
     created_at = Column(DateTime, default=datetime.utcnow)
+    reminded_at = Column(DateTime, nullable=True)  # Telegram reminder queued (booking_scheduler.py)
+    # date + start_time + duration_min as a UTC interval, for indexed overlap checks
+    starts_at = Column(DateTime, nullable=True)
+    ends_at = Column(DateTime, nullable=True)
 
     user = relationship("User", back_populates="bookings")
     slot = relationship("Slot", back_populates="bookings")
 
+    __table_args__ = (
+        Index("ix_bookings_slot_status_start", "slot_id", "status", "starts_at"),
+    )
+
 
 class Template(Base):
     __tablename__ = "templates"
@@ -118,6 +129,168 @@ class QueueEntry(Base):
     slot_id = Column(String, ForeignKey("slots.id"), nullable=False)
     position = Column(Integer, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    hold_until = Column(DateTime, nullable=True)  # freed slot reserved for this entry (queue_handoff.py)
 
     user = relationship("User")
     slot = relationship("Slot")
+
+
+class ServiceCheck(Base):
+    __tablename__ = "service_checks"
+
+    slot_id = Column(String, ForeignKey("slots.id"), primary_key=True)
+    status = Column(String, default="ok")  # ok / warn / error
+    latency_ms = Column(Integer, nullable=True)
+    http_status = Column(Integer, nullable=True)
+    checked_at = Column(DateTime, nullable=True)
+    last_failure = Column(String, nullable=True)
+    last_failure_at = Column(DateTime, nullable=True)
+
+
+class HealthSample(Base):
+    """Downsampled health time-series bucket (see health_history.py)."""
+    __tablename__ = "health_samples"
+
+    series = Column(String, primary_key=True)  # e.g. "vm:VM-4:up"
+    step = Column(Integer, primary_key=True)  # tier: 60 / 900 / 3600 seconds
+    bucket = Column(Integer, primary_key=True)  # bucket start, unix seconds
+    count = Column(Integer, nullable=False)
+    sum = Column(Float, nullable=False)
+    min = Column(Float, nullable=False)
+    max = Column(Float, nullable=False)
+
+
+class DumpJob(Base):
+    """Queued session dump collection (see dump_jobs.py)."""
+    __tablename__ = "dump_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("sessions.id"), nullable=False, index=True)
+    vm_host = Column(String, nullable=False)
+    chrome_profile = Column(String, default="Default")
+    status = Column(String, default="queued", index=True)  # queued / running / done / failed
+    priority = Column(Integer, default=1)  # 0: the user waits for it in Telegram
+    size_hint = Column(Integer, nullable=True)  # expected archive bytes, from earlier dumps
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    last_error = Column(String, nullable=True)
+    archive_path = Column(String, nullable=True)
+    archive_sha256 = Column(String, nullable=True)
+    archive_size = Column(Integer, nullable=True)
+    bytes_transferred = Column(Integer, nullable=True)  # last attempt (less if resumed)
+    transfer_seconds = Column(Float, nullable=True)
+    throughput_bps = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    staged_at = Column(DateTime, nullable=True)  # artifacts frozen on the VM; the slot may be reused
+    finished_at = Column(DateTime, nullable=True)
+    delivered_at = Column(DateTime, nullable=True)  # sent to Telegram, or finished if not linked
+
+
+class OutboxMessage(Base):
+    """Queued outgoing Telegram message (see telegram_outbox.py)."""
+    __tablename__ = "telegram_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    chat_id = Column(String, nullable=False, index=True)
+    text = Column(Text, nullable=False)  # message, or the document's caption
+    document_path = Column(String, nullable=True)
+    session_id = Column(Integer, ForeignKey("sessions.id"), nullable=True)  # a session dump
+    status = Column(String, default="pending", index=True)  # pending / sent / failed
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+    upload_bytes = Column(Integer, nullable=True)  # bytes uploaded to Telegram (0: sent by file_id)
+    upload_ms = Column(Integer, nullable=True)  # time spent in the Bot API calls
+
+
+class TelegramFile(Base):
+    """Telegram file_id of an uploaded dump archive or volume, for re-sending without upload."""
+    __tablename__ = "telegram_files"
+
+    session_id = Column(Integer, ForeignKey("sessions.id"), primary_key=True)
+    part = Column(Integer, primary_key=True)  # 0: the whole archive, 1..parts: volumes
+    parts = Column(Integer, nullable=False)
+    etag = Column(String, nullable=False)  # dump_store.archive_etag() of the uploaded archive
+    file_id = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class Lease(Base):
+    """Named lease held by one backend process at a time (see leases.py)."""
+    __tablename__ = "leases"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class DumpChunk(Base):
+    """Content-addressed dump chunk with a reference count (see dump_store.py)."""
+    __tablename__ = "dump_chunks"
+
+    hash = Column(String, primary_key=True)  # sha256 of the raw chunk
+    size = Column(Integer, nullable=False)  # raw bytes
+    stored_size = Column(Integer, nullable=False)  # bytes on disk (zlib)
+    refs = Column(Integer, nullable=False, default=0, index=True)  # manifests using it
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DumpFile(Base):
+    """Index of stored dump files with their expiry (see dump_retention.py)."""
+    __tablename__ = "dump_files"
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("sessions.id"), nullable=True, index=True)
+    path = Column(String, unique=True, nullable=False)
+    kind = Column(String, nullable=False)  # manifest / cache / thumb / archive (pre-chunk-store)
+    size = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class StorageTotal(Base):
+    """Running totals of dump storage per kind, kept in step with dump_files
+    and dump_chunks so nobody has to walk the disk."""
+    __tablename__ = "storage_totals"
+
+    kind = Column(String, primary_key=True)  # manifest / cache / thumb / archive / chunk
+    files = Column(Integer, nullable=False, default=0)
+    bytes = Column(Integer, nullable=False, default=0)
+
+
+class SessionDump(Base):
+    """Dump metadata parsed once at ingest, so summaries never read files."""
+    __tablename__ = "session_dumps"
+
+    session_id = Column(Integer, ForeignKey("sessions.id"), primary_key=True)
+    format_version = Column(Integer, default=1)
+    tabs_count = Column(Integer, default=0)
+    files_count = Column(Integer, default=0)
+    chrome_profile = Column(String, nullable=True)
+    hostname = Column(String, nullable=True)
+    collected_at = Column(String, nullable=True)  # as reported by the VM (ISO 8601)
+    archive_sha256 = Column(String, nullable=True)
+    archive_size = Column(Integer, nullable=True)
+    has_screenshot = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    session = relationship("Session", back_populates="dump")
+
+
+# Full-text index of the tabs in each dump (see dump_search.py). FTS5
+# virtual tables can't be declared as models, so the table is created and
+# dropped together with the metadata. rowid = session_id << 20 | n, so one
+# session's rows are a rowid range.
+SESSION_TABS_FTS = "session_tabs_fts"
+
+event.listen(Base.metadata, "after_create", DDL(
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SESSION_TABS_FTS} USING fts5("
+    "url, title, user_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+).execute_if(dialect="sqlite"))
+event.listen(Base.metadata, "before_drop", DDL(
+    f"DROP TABLE IF EXISTS {SESSION_TABS_FTS}"
+).execute_if(dialect="sqlite"))
@@ -4,11 +4,12 @@ from datetime import timezone
 
 from fastapi import APIRouter, Depends, Query
 from pydantic import BaseModel
-from sqlalchemy.orm import Session as DbSession
+from sqlalchemy.orm import Session as DbSession, selectinload
 
 from backend.database import get_db
 from backend.auth import get_current_user
 from backend.models import User, UserFavorite, Session
+from backend.sessions import thumbnail_url
 
 router = APIRouter(prefix="/profile", tags=["profile"])
 
@@ -39,6 +40,9 @@ class SessionHistoryItem(BaseModel):
     duration_min: int
     end_reason: str | None
     dump_path: str | None
+    tabs_count: int = 0
+    files_count: int = 0
+    thumbnail_url: str | None = None
 
 
 # ── Endpoints ──
@@ -100,6 +104,8 @@ def get_session_history(
         .filter(Session.user_id == user.id, Session.ended_at.isnot(None))
         .order_by(Session.started_at.desc())
         .limit(limit)
+        # One batched query each for slots and dump metadata, not one per row
+        .options(selectinload(Session.slot), selectinload(Session.dump))
         .all()
     )
     result = []
@@ -119,5 +125,8 @@ def get_session_history(
             duration_min=duration,
             end_reason=s.end_reason,
             dump_path=s.dump_path,
+            tabs_count=s.dump.tabs_count if s.dump else 0,
+            files_count=s.dump.files_count if s.dump else 0,
+            thumbnail_url=thumbnail_url(s),
         ))
     return result
@@ -5,9 +5,11 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session as DbSession
 from sqlalchemy import func
 
+from backend import queue_handoff, reservations
 from backend.database import get_db
 from backend.auth import get_current_user
 from backend.models import QueueEntry, Slot, Session, User
+from backend.websocket import broadcast_sync
 
 router = APIRouter(tags=["queue"])
 
@@ -41,6 +43,12 @@ def join_queue(
     # Check if slot is actually occupied (no point queuing for free slot)
     active = db.query(Session).filter(Session.slot_id == slot_id, Session.ended_at == None).first()
     if not active:
+        queue_handoff.expire_holds(db, slot_id=slot_id)
+    if (
+        not active
+        and not queue_handoff.active_hold(db, slot_id)
+        and reservations.walk_up(db, slot_id, user.id)[0] is None
+    ):
         raise HTTPException(status_code=400, detail="Слот свободен — можно занять напрямую")
 
     # Check if already in queue
@@ -77,8 +85,13 @@ def leave_queue(
     if not entry:
         raise HTTPException(status_code=404, detail="Вы не в очереди")
 
+    held = entry.hold_until is not None
     db.delete(entry)
     db.commit()
+    if held:
+        # Giving up a held slot passes it on at once
+        handoff = queue_handoff.offer(db, slot_id)
+        broadcast_sync("slot_reserved" if handoff["next_in_queue"] else "slot_released", handoff)
     return {"ok": True}
 
 
@@ -0,0 +1,203 @@
+"""Queue handoff — a freed slot is held for the head of its queue.
+
+When a session ends and someone is queued for the slot, the first entry
+gets hold_until = now + queue_hold_sec. Until then only that user can
+occupy the slot; they are pinged over WebSocket ("slot_reserved") and
+Telegram. A hold that lapses drops its entry and passes the slot to the
+next in line, or frees it if the queue is empty.
+
+A slot booked by someone else (reservations.py) is not held: the queue
+waits until booking_scheduler offers the slot again when the booking ends.
+
+Lapsed holds are handled by a small task that sleeps until the earliest
+hold_until, and also on the spot by occupy and join-queue, so a slot is
+never blocked by a hold nobody has processed yet. Each entry is deleted
+with a conditional DELETE, so with several backend processes exactly one
+of them promotes the next user.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import Session as DbSession
+
+from backend import reservations
+from backend.config import settings
+from backend.database import SessionLocal
+from backend.models import QueueEntry, Session
+
+logger = logging.getLogger(__name__)
+
+IDLE_POLL_SEC = 30  # holds created by other processes are noticed within this
+
+_task: asyncio.Task | None = None
+_loop: asyncio.AbstractEventLoop | None = None
+_wakeup: asyncio.Event | None = None
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)  # naive UTC, like the DB columns
+
+
+def active_hold(db: DbSession, slot_id: str, now: datetime | None = None) -> QueueEntry | None:
+    """The entry the slot is currently held for, if any."""
+    return (
+        db.query(QueueEntry)
+        .filter(QueueEntry.slot_id == slot_id, QueueEntry.hold_until > (now or _now()))
+        .first()
+    )
+
+
+def _event(entry: QueueEntry | None, slot_id: str) -> dict:
+    return {
+        "slot_id": slot_id,
+        "next_in_queue": entry.user.name if entry else None,
+        "hold_until": entry.hold_until.isoformat() if entry else None,
+    }
+
+
+def offer(db: DbSession, slot_id: str, now: datetime | None = None) -> dict:
+    """Hold a just-freed slot for the head of its queue and ping them. Commits.
+
+    Returns the WebSocket payload (next_in_queue is None if nobody waits).
+    """
+    now = now or _now()
+    head = (
+        db.query(QueueEntry)
+        .filter(QueueEntry.slot_id == slot_id)
+        .order_by(QueueEntry.position)
+        .first()
+    )
+    if head is None or _booked_for_other(db, slot_id, head.user_id, now):
+        db.commit()
+        return _event(None, slot_id)
+    head.hold_until = now + timedelta(seconds=settings.queue_hold_sec)
+    db.commit()
+
+    if head.user.telegram_id:
+        from backend.telegram_bot import slot_available_text
+        from backend.telegram_outbox import enqueue
+
+        enqueue(db, head.user.telegram_id, slot_available_text(slot_id, head.hold_until))
+    _wake()
+    logger.info("Slot %s held for %s until %s", slot_id, head.user.name, head.hold_until)
+    return _event(head, slot_id)
+
+
+def _booked_for_other(db: DbSession, slot_id: str, user_id: int, now: datetime) -> bool:
+    blocking, _ = reservations.walk_up(db, slot_id, user_id, now)
+    return blocking is not None
+
+
+def claim(db: DbSession, slot_id: str, user_id: int, now: datetime | None = None) -> QueueEntry | None:
+    """Occupy check: the hold keeping `user_id` off the slot, if any.
+
+    A lapsed hold is passed on first. If nothing blocks the user, their
+    own queue entry is removed — they are getting the slot (not
+    committed: the caller commits it with the new session).
+    """
+    now = now or _now()
+    expire_holds(db, now, slot_id=slot_id)
+    hold = active_hold(db, slot_id, now)
+    if hold and hold.user_id != user_id:
+        return hold
+    db.query(QueueEntry).filter(
+        QueueEntry.slot_id == slot_id, QueueEntry.user_id == user_id,
+    ).delete(synchronize_session=False)
+    return None
+
+
+def expire_holds(db: DbSession, now: datetime | None = None, slot_id: str | None = None) -> list[dict]:
+    """Drop lapsed holds and offer each slot to the next in line.
+
+    Returns the WebSocket payloads of the handoffs made. Commits.
+    """
+    now = now or _now()
+    query = db.query(QueueEntry.id, QueueEntry.slot_id).filter(
+        QueueEntry.hold_until.isnot(None), QueueEntry.hold_until <= now,
+    )
+    if slot_id is not None:
+        query = query.filter(QueueEntry.slot_id == slot_id)
+    events = []
+    for entry_id, entry_slot in query.all():
+        # Conditional: another process may have got here first
+        dropped = db.query(QueueEntry).filter(
+            QueueEntry.id == entry_id, QueueEntry.hold_until <= now,
+        ).delete(synchronize_session=False)
+        db.commit()
+        if not dropped:
+            continue
+        occupied = db.query(Session.id).filter(
+            Session.slot_id == entry_slot, Session.ended_at.is_(None),
+        ).first()
+        if not occupied:
+            events.append(offer(db, entry_slot, now))
+    return events
+
+
+def next_expiry(db: DbSession) -> datetime | None:
+    return (
+        db.query(QueueEntry.hold_until)
+        .filter(QueueEntry.hold_until.isnot(None))
+        .order_by(QueueEntry.hold_until)
+        .limit(1)
+        .scalar()
+    )
+
+
+def _tick() -> tuple[list[dict], datetime | None]:
+    db = SessionLocal()
+    try:
+        return expire_holds(db), next_expiry(db)
+    finally:
+        db.close()
+
+
+def _wake() -> None:
+    """Nudge the task (safe to call from worker threads)."""
+    if _loop and _wakeup and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+async def _run_forever() -> None:
+    from backend.websocket import broadcast
+
+    while True:
+        delay = IDLE_POLL_SEC
+        try:
+            events, next_at = await asyncio.to_thread(_tick)
+            for event in events:
+                await broadcast("slot_reserved" if event["next_in_queue"] else "slot_released", event)
+            if next_at is not None:
+                delay = min(delay, max(0.0, (next_at - _now()).total_seconds()))
+        except Exception as e:
+            logger.error("Queue handoff error: %s", e)
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def start_handoff() -> None:
+    """Start expiring queue holds (called from app lifespan)."""
+    global _task, _loop, _wakeup
+    if _task is not None:
+        return
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    _task = asyncio.create_task(_run_forever())
+
+
+async def stop_handoff() -> None:
+    global _task, _loop, _wakeup
+    if _task:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+    _task = _loop = _wakeup = None
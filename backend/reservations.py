@@ -0,0 +1,131 @@
+"""Per-slot reservation timeline, consulted when a slot is occupied.
+
+For each slot: its active bookings that haven't ended, sorted by start.
+Bookings on one slot never overlap (bookings.py rejects it), so a bisect
+on the start times finds the booking covering any moment. A slot's
+timeline is loaded with one indexed query the first time it is asked
+for and kept for TTL_SEC. Entries are dropped once a transaction that
+inserted or changed a Booking commits (database.invalidate_on_commit).
+TTL_SEC bounds staleness for bookings made by another backend process,
+or read by a lookup racing the commit; booking_scheduler preempts at the
+booking's start regardless.
+
+Walk-up rule (walk_up): someone else's booking in progress keeps the
+slot for its owner; one starting within MIN_WALK_UP does too, as a
+session that short isn't worth starting. A later booking lets the
+session start, but only until the booking's start — booking_scheduler
+ends it then.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+from sqlalchemy.orm import Session as DbSession
+
+from backend.database import invalidate_on_commit
+from backend.models import Booking, User
+
+TTL_SEC = 30
+MIN_WALK_UP = timedelta(minutes=15)
+
+
+class Reservation(NamedTuple):
+    booking_id: int
+    user_id: int
+    user_name: str
+    start: datetime  # naive UTC
+    end: datetime
+
+
+class _Timeline(NamedTuple):
+    starts: list[datetime]
+    reservations: list[Reservation]
+    expires: float
+
+
+_cache: dict[str, _Timeline] = {}
+_lock = threading.Lock()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)  # naive UTC, like the DB columns
+
+
+def _load(db: DbSession, slot_id: str, now: datetime) -> _Timeline:
+    rows = (
+        db.query(Booking.id, Booking.user_id, User.name, Booking.starts_at, Booking.ends_at)
+        .join(User, User.id == Booking.user_id)
+        .filter(
+            Booking.slot_id == slot_id,
+            Booking.status == "active",
+            Booking.starts_at.isnot(None),
+            Booking.ends_at > now,
+        )
+        .order_by(Booking.starts_at)
+        .all()
+    )
+    reservations = [Reservation(*row) for row in rows]
+    timeline = _Timeline([r.start for r in reservations], reservations, time.monotonic() + TTL_SEC)
+    with _lock:
+        _cache[slot_id] = timeline
+    return timeline
+
+
+def _timeline(db: DbSession, slot_id: str, now: datetime) -> _Timeline:
+    with _lock:
+        timeline = _cache.get(slot_id)
+    if timeline is None or timeline.expires < time.monotonic():
+        timeline = _load(db, slot_id, now)
+    return timeline
+
+
+def upcoming(db: DbSession, slot_id: str, now: datetime | None = None) -> list[Reservation]:
+    """The slot's bookings in progress or ahead, by start."""
+    now = now or _now()
+    timeline = _timeline(db, slot_id, now)
+    first = max(0, bisect_right(timeline.starts, now) - 1)
+    return [r for r in timeline.reservations[first:] if r.end > now]
+
+
+def current(db: DbSession, slot_id: str, now: datetime | None = None) -> Reservation | None:
+    """The booking in progress on the slot, if any."""
+    now = now or _now()
+    ahead = upcoming(db, slot_id, now)
+    return ahead[0] if ahead and ahead[0].start <= now else None
+
+
+def walk_up(
+    db: DbSession, slot_id: str, user_id: int, now: datetime | None = None,
+) -> tuple[Reservation | None, datetime | None]:
+    """Can `user_id` start a session on the slot now?
+
+    Returns (the booking keeping them off it, or None; when their session
+    must end by, or None for no limit). Their own bookings never count.
+    """
+    now = now or _now()
+    for reservation in upcoming(db, slot_id, now):
+        if reservation.user_id == user_id:
+            continue
+        if reservation.start <= now + MIN_WALK_UP:
+            return reservation, None
+        return None, reservation.start
+    return None, None
+
+
+def invalidate(*slot_ids: str) -> None:
+    with _lock:
+        for slot_id in slot_ids:
+            _cache.pop(slot_id, None)
+
+
+def clear() -> None:
+    with _lock:
+        _cache.clear()
+
+
+invalidate_on_commit(Booking, lambda booking: (booking.slot_id,), invalidate)
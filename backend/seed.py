@@ -1,5 +1,6 @@
 """Seed script: creates admin user + 10 slots + 3 templates from BLUEPRINT."""
 
+from backend import migrations
 from backend.database import engine, SessionLocal, Base
 from backend.models import User, Slot, VmStatus, Template
 from backend.auth import hash_password
@@ -34,6 +35,7 @@ VMS = [
 
 def seed():
     Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
     db = SessionLocal()
 
     # Admin user (password: admin123, no TOTP for dev)
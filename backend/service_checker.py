@@ -0,0 +1,201 @@
+"""Service session checker — is each slot still logged in to its service?
+
+For every active slot with a URL the checker periodically requests the
+service page (with the slot's session cookie, if the admin stored one) and
+classifies the answer:
+
+- ok    — page served without bouncing to a login page
+- warn  — 401/403 or redirected to a login / sign-in page (cookies expired)
+- error — network failure, timeout or 5xx
+
+Concurrency is bounded by a semaphore, and requests to the same host are
+spaced out so several slots of one provider (ppx-1..3) never hit it at once.
+Results land in the service_checks table, which the health API reads.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+import httpx
+from sqlalchemy.orm import Session as DbSession
+
+from backend import health_history
+from backend.config import settings
+from backend.database import SessionLocal
+from backend.models import ServiceCheck, Slot
+
+logger = logging.getLogger(__name__)
+
+# Path fragments that mean "the service sent us to its login page"
+LOGIN_MARKERS = ("login", "signin", "sign-in", "sign_in", "auth", "accounts.google.com")
+
+_task: asyncio.Task | None = None
+
+
+class HostRateLimiter:
+    """Enforce a minimum interval between requests to the same host."""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._next_at: dict[str, float] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    async def wait(self, host: str) -> None:
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            loop = asyncio.get_running_loop()
+            delay = self._next_at.get(host, 0.0) - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_at[host] = loop.time() + self.min_interval
+
+
+def _looks_like_login(url: httpx.URL) -> bool:
+    target = f"{url.host}{url.path}".lower()
+    return any(marker in target for marker in LOGIN_MARKERS)
+
+
+async def check_slot(
+    client: httpx.AsyncClient,
+    slot_id: str,
+    url: str,
+    cookie: str | None = None,
+) -> dict:
+    """Probe one slot's service URL. Returns a result dict for _save_results."""
+    headers = {"Cookie": cookie} if cookie else {}
+    started = time.perf_counter()
+    try:
+        resp = await client.get(url, headers=headers)
+    except httpx.HTTPError as exc:
+        return {
+            "slot_id": slot_id,
+            "status": "error",
+            "latency_ms": int((time.perf_counter() - started) * 1000),
+            "http_status": None,
+            "reason": f"{type(exc).__name__}: {exc}" if str(exc) else type(exc).__name__,
+        }
+    latency_ms = int((time.perf_counter() - started) * 1000)
+
+    status = "ok"
+    reason = None
+    if resp.status_code >= 500:
+        status, reason = "error", f"HTTP {resp.status_code}"
+    elif resp.status_code in (401, 403):
+        status, reason = "warn", f"HTTP {resp.status_code} — сессия не авторизована"
+    elif resp.history and _looks_like_login(resp.url) and not _looks_like_login(httpx.URL(url)):
+        status, reason = "warn", f"Редирект на страницу входа: {resp.url.host}{resp.url.path}"
+    elif resp.status_code >= 400:
+        status, reason = "error", f"HTTP {resp.status_code}"
+
+    return {
+        "slot_id": slot_id,
+        "status": status,
+        "latency_ms": latency_ms,
+        "http_status": resp.status_code,
+        "reason": reason,
+    }
+
+
+def _load_targets(db: DbSession) -> list[tuple[str, str, str | None]]:
+    slots = (
+        db.query(Slot)
+        .filter(Slot.is_active == True, Slot.url.isnot(None), Slot.url != "")
+        .all()
+    )
+    return [(s.id, s.url, s.session_cookie) for s in slots]
+
+
+def _save_results(db: DbSession, results: list[dict]) -> None:
+    now = datetime.now(timezone.utc)
+    for r in results:
+        check = db.query(ServiceCheck).filter(ServiceCheck.slot_id == r["slot_id"]).first()
+        if not check:
+            check = ServiceCheck(slot_id=r["slot_id"])
+            db.add(check)
+        check.status = r["status"]
+        check.latency_ms = r["latency_ms"]
+        check.http_status = r["http_status"]
+        check.checked_at = now
+        if r["status"] != "ok":
+            check.last_failure = r["reason"]
+            check.last_failure_at = now
+    db.commit()
+
+
+async def check_services(
+    db: DbSession,
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> list[dict]:
+    """Check every active slot once and persist the results.
+
+    DB work runs in a worker thread so the event loop keeps serving
+    WebSockets while the checker is busy.
+    """
+    targets = await asyncio.to_thread(_load_targets, db)
+    if not targets:
+        return []
+
+    semaphore = asyncio.Semaphore(settings.service_check_concurrency)
+    limiter = HostRateLimiter(settings.service_check_host_interval_sec)
+
+    async with httpx.AsyncClient(
+        follow_redirects=True,
+        timeout=settings.service_check_timeout_sec,
+        transport=transport,
+    ) as client:
+
+        async def _one(slot_id: str, url: str, cookie: str | None) -> dict:
+            async with semaphore:
+                await limiter.wait(urlparse(url).hostname or url)
+                return await check_slot(client, slot_id, url, cookie)
+
+        results = await asyncio.gather(*(_one(*t) for t in targets))
+
+    await asyncio.to_thread(_save_results, db, results)
+    for r in results:
+        health_history.record(f"service:{r['slot_id']}:latency_ms", r["latency_ms"])
+    bad = [r for r in results if r["status"] != "ok"]
+    if bad:
+        logger.warning(
+            "Service check: %d/%d slots not ok (%s)",
+            len(bad), len(results), ", ".join(r["slot_id"] for r in bad),
+        )
+    return results
+
+
+async def _run_forever() -> None:
+    while True:
+        db = SessionLocal()
+        try:
+            await check_services(db)
+        except Exception as e:
+            logger.error("Service check round failed: %s", e)
+        finally:
+            db.close()
+        await asyncio.sleep(settings.service_check_interval_sec)
+
+
+async def start_checker() -> None:
+    """Start the periodic checker task (called from app lifespan)."""
+    global _task
+    if _task is None and settings.service_check_interval_sec > 0:
+        _task = asyncio.create_task(_run_forever())
+        logger.info(
+            "Service checker started (every %ds)", settings.service_check_interval_sec,
+        )
+
+
+async def stop_checker() -> None:
+    global _task
+    if _task:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
@@ -1,13 +1,22 @@
-"""Sessions API: session summary and history."""
+"""Sessions API: session summary, history, dump browsing and tab search."""
 
-from datetime import timezone
+import hashlib
+import hmac
+import mimetypes
+import os
+import re
+import time
+from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy.orm import Session as DbSession
+from sqlalchemy.orm import Session as DbSession, selectinload
 
+from backend import dump_search, dump_store, thumbnails
 from backend.database import get_db
 from backend.auth import get_current_user
+from backend.config import settings
 from backend.models import Session, User
 
 router = APIRouter(prefix="/sessions", tags=["sessions"])
@@ -26,6 +35,127 @@ class SessionSummary(BaseModel):
     tabs_count: int
     files_count: int
     telegram_status: str  # "sent" | "pending" | "error" | "no_telegram"
+    thumbnail_url: str | None = None
+
+
+class SearchMatch(BaseModel):
+    url: str
+    title: str  # snippet, matched words wrapped in dump_search.HIGHLIGHT
+
+
+class SessionSearchHit(BaseModel):
+    session_id: int
+    user_id: int
+    slot_id: str
+    service_name: str
+    started_at: str
+    ended_at: str | None
+    score: float
+    matches: list[SearchMatch]
+
+
+class DumpMember(BaseModel):
+    name: str
+    size: int
+    sha256: str
+    content_type: str
+
+
+def _get_session(db: DbSession, session_id: int, user: User) -> Session:
+    session = db.query(Session).filter(Session.id == session_id).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Сессия не найдена")
+    if session.user_id != user.id and not user.is_admin:
+        raise HTTPException(status_code=403, detail="Нет доступа к этой сессии")
+    return session
+
+
+def _get_manifest(session: Session) -> dict:
+    manifest = dump_store.load_manifest(session.id) if dump_store.is_manifest(session.dump_path) else None
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="Дамп сессии недоступен")
+    return manifest
+
+
+def thumbnail_url(session: Session) -> str | None:
+    """URL of the session's screenshot thumbnail, if its dump has a screenshot."""
+    if session.dump and session.dump.has_screenshot and session.dump_path:
+        return f"/api/sessions/{session.id}/thumbnail"
+    return None
+
+
+def _content_type(name: str) -> str:
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def _parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """A single "bytes=" range as (start, end) inclusive; None means the whole body.
+
+    Multi-range and malformed headers are ignored (RFC 9110 allows serving
+    the full representation instead).
+    """
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:  # suffix range: the last N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=416, detail="Диапазон вне файла", headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 requires for it)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in {t.strip().removeprefix("W/") for t in header.split(",")}
+
+
+@router.get("/search", response_model=list[SessionSearchHit])
+def search_sessions(
+    q: str = Query(min_length=2, max_length=200),
+    limit: int = Query(default=20, ge=1, le=50),
+    db: DbSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Sessions whose saved tabs match `q` (URL or title), best first.
+
+    Users search their own sessions, admins everyone's.
+    """
+    hits = dump_search.search(db, q, user_id=None if user.is_admin else user.id, limit=limit)
+    sessions = {
+        s.id: s
+        for s in db.query(Session)
+        .options(selectinload(Session.slot))
+        .filter(Session.id.in_([h["session_id"] for h in hits]))
+    }
+    return [
+        SessionSearchHit(
+            session_id=session.id,
+            user_id=session.user_id,
+            slot_id=session.slot_id,
+            service_name=session.slot.service_name if session.slot else session.slot_id,
+            started_at=session.started_at.isoformat() if session.started_at else "",
+            ended_at=session.ended_at.isoformat() if session.ended_at else None,
+            score=hit["score"],
+            matches=hit["matches"],
+        )
+        for hit in hits
+        if (session := sessions.get(hit["session_id"]))
+    ]
 
 
 @router.get("/{session_id}/summary", response_model=SessionSummary)
@@ -34,11 +164,7 @@ def get_session_summary(
     db: DbSession = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
-    session = db.query(Session).filter(Session.id == session_id).first()
-    if not session:
-        raise HTTPException(status_code=404, detail="Сессия не найдена")
-    if session.user_id != user.id and not user.is_admin:
-        raise HTTPException(status_code=403, detail="Нет доступа к этой сессии")
+    session = _get_session(db, session_id, user)
 
     # Calculate duration
     duration_min = 0
@@ -47,22 +173,9 @@ def get_session_summary(
         ended = session.ended_at.replace(tzinfo=timezone.utc)
         duration_min = int((ended - started).total_seconds() / 60)
 
-    # Dump info (tabs/files counts will be populated by dump script in S2-4)
-    tabs_count = 0
-    files_count = 0
-    if session.dump_path:
-        # Parse dump metadata if available
-        try:
-            import json
-            import os
-            meta_path = session.dump_path.replace(".tar.gz", "_meta.json")
-            if os.path.exists(meta_path):
-                with open(meta_path) as f:
-                    meta = json.load(f)
-                    tabs_count = meta.get("tabs_count", 0)
-                    files_count = meta.get("files_count", 0)
-        except Exception:
-            pass
+    # Dump info, parsed at ingest (session_dumps) — no file access here
+    tabs_count = session.dump.tabs_count if session.dump else 0
+    files_count = session.dump.files_count if session.dump else 0
 
     # Telegram status
     telegram_status = "no_telegram"
@@ -82,4 +195,173 @@ def get_session_summary(
         tabs_count=tabs_count,
         files_count=files_count,
         telegram_status=telegram_status,
+        thumbnail_url=thumbnail_url(session),
+    )
+
+
+# ── Dump browsing (chunk store, one member at a time) ──
+
+@router.get("/{session_id}/dump/files", response_model=list[DumpMember])
+def list_dump_files(
+    session_id: int,
+    db: DbSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Files in a session's dump, from its manifest (nothing is unpacked)."""
+    manifest = _get_manifest(_get_session(db, session_id, user))
+    return [
+        DumpMember(name=m["name"], size=m["size"], sha256=m["sha256"], content_type=_content_type(m["name"]))
+        for m in manifest["members"]
+    ]
+
+
+@router.get("/{session_id}/dump/files/{name:path}")
+def get_dump_file(
+    session_id: int,
+    name: str,
+    request: Request,
+    db: DbSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Stream one dump file, with Range support.
+
+    Bytes are read chunk by chunk from the chunk store, so memory use is
+    bounded by the largest chunk whatever the file or range size: 64 KiB
+    (MAX_CHUNK) for content-defined chunks, but up to 256 KiB for SQLite
+    files, which are cut every SQLITE_PAGES_PER_CHUNK pages of up to 64 KiB.
+    """
+    manifest = _get_manifest(_get_session(db, session_id, user))
+    member = dump_store.find_member(manifest, name)
+    if member is None:
+        raise HTTPException(status_code=404, detail="Файл не найден в дампе")
+
+    size = member["size"]
+    etag = f'"{member["sha256"]}"'
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Cache-Control": "private, max-age=86400",  # content-addressed: never changes
+    }
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range == etag:
+        byte_range = _parse_range(request.headers.get("range"), size)
+
+    media_type = _content_type(name)
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(dump_store.iter_member(member), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Length"] = str(end - start + 1)
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(
+        dump_store.iter_member(member, start, end + 1),
+        status_code=206,
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+def _dump_response(db: DbSession, session: Session, request: Request) -> Response:
+    headers = {"Cache-Control": "private, max-age=86400"}
+
+    if dump_store.is_manifest(session.dump_path):
+        manifest = _get_manifest(session)
+        etag = f'"{dump_store.archive_etag(manifest)}"'
+        headers["ETag"] = etag
+        if _not_modified(request, etag):
+            return Response(status_code=304, headers=headers)
+        path = dump_store.materialize(db, session.id)
+    elif session.dump_path and os.path.isfile(session.dump_path):
+        path = session.dump_path  # pre-chunk-store archive; FileResponse derives the ETag
+    else:
+        raise HTTPException(status_code=404, detail="Дамп сессии недоступен")
+
+    response = FileResponse(
+        path,
+        media_type="application/gzip",
+        filename=f"session_{session.id}_dump.tar.gz",
+        headers=headers,
+        stat_result=os.stat(path),
+    )
+    if "ETag" not in headers and _not_modified(request, response.headers["etag"]):
+        return Response(status_code=304, headers={**headers, "ETag": response.headers["etag"]})
+    return response
+
+
+@router.get("/{session_id}/dump")
+def download_dump(
+    session_id: int,
+    request: Request,
+    db: DbSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Download a session's dump archive.
+
+    Served from disk by FileResponse in fixed-size chunks (zero-copy via
+    the ASGI pathsend extension where the server supports it), so large
+    dumps never pass through Python memory whole. FileResponse handles
+    Range and If-Range; If-None-Match is answered here before the archive
+    is touched. Chunk-store dumps are rebuilt into the cache on first
+    download (deterministically, so the ETag is known up front).
+    """
+    return _dump_response(db, _get_session(db, session_id, user), request)
+
+
+# ── Signed dump links (Telegram delivery of archives over the upload limit) ──
+
+def _link_signature(session_id: int, expires: int) -> str:
+    return hmac.new(
+        settings.jwt_secret.encode(), f"dump:{session_id}:{expires}".encode(), hashlib.sha256,
+    ).hexdigest()
+
+
+def signed_dump_url(session_id: int, expires_at: datetime) -> str:
+    """Absolute download link for a dump, valid without login until `expires_at`."""
+    expires = int(expires_at.replace(tzinfo=timezone.utc).timestamp())
+    return (
+        f"{settings.public_url.rstrip('/')}/api/sessions/{session_id}/dump/link"
+        f"?expires={expires}&sig={_link_signature(session_id, expires)}"
+    )
+
+
+@router.get("/{session_id}/dump/link")
+def download_dump_by_link(
+    session_id: int,
+    request: Request,
+    expires: int = Query(...),
+    sig: str = Query(...),
+    db: DbSession = Depends(get_db),
+):
+    """Download a dump through a link from signed_dump_url() — the link is the credential."""
+    if not hmac.compare_digest(sig, _link_signature(session_id, expires)):
+        raise HTTPException(status_code=403, detail="Недействительная ссылка")
+    if expires < time.time():
+        raise HTTPException(status_code=410, detail="Срок действия ссылки истёк")
+    session = db.query(Session).filter(Session.id == session_id).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Сессия не найдена")
+    return _dump_response(db, session, request)
+
+
+@router.get("/{session_id}/thumbnail")
+def get_thumbnail(
+    session_id: int,
+    db: DbSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """WebP thumbnail of the session's screenshot, rendered on first request."""
+    session = _get_session(db, session_id, user)
+    path = thumbnails.ensure_thumbnail(db, session.id) if dump_store.is_manifest(session.dump_path) else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Скриншот недоступен")
+    return FileResponse(
+        path,
+        media_type="image/webp",
+        # A session's screenshot never changes
+        headers={"Cache-Control": "private, max-age=31536000, immutable"},
     )
@@ -3,16 +3,19 @@
 import base64
 import logging
 from datetime import datetime, timezone
+from typing import NamedTuple
 
 import httpx
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
 from sqlalchemy.orm import Session as DbSession
 
+from backend import dump_jobs, queue_handoff, reservations
 from backend.config import settings
 from backend.database import get_db
+from backend.dump_jobs import enqueue_dump
 from backend.auth import get_current_user
-from backend.models import Slot, Session, User, QueueEntry
+from backend.models import Slot, Session, User, QueueEntry, ServiceCheck
 from backend.websocket import broadcast_sync
 
 logger = logging.getLogger(__name__)
@@ -94,6 +97,10 @@ class SlotOut(BaseModel):
     occupant_name: str | None = None
     session_minutes: int | None = None
     queue_size: int = 0
+    reserved_for: str | None = None  # held for the head of the queue, or booked…
+    reserved_until: str | None = None  # …until then
+    free_until: str | None = None  # a walk-up session now would end here (next booking)
+    service_status: str = "ok"  # last service check: ok / warn / error
 
 
 class OccupyResponse(BaseModel):
@@ -101,6 +108,7 @@ class OccupyResponse(BaseModel):
     slot_id: str
     started_at: str
     guacamole_url: str
+    ends_by: str | None = None  # a booking starts then; the session is ended for it
 
 
 class SlotCredentials(BaseModel):
@@ -133,8 +141,9 @@ def get_guacamole_token(
 
 
 @router.get("", response_model=list[SlotOut])
-def list_slots(db: DbSession = Depends(get_db), _user: User = Depends(get_current_user)):
+def list_slots(db: DbSession = Depends(get_db), user: User = Depends(get_current_user)):
     slots = db.query(Slot).filter(Slot.is_active == True).all()
+    checks = {c.slot_id: c.status for c in db.query(ServiceCheck).all()}
     result = []
     for slot in slots:
         # Check for active session (no ended_at)
@@ -150,6 +159,8 @@ def list_slots(db: DbSession = Depends(get_db), _user: User = Depends(get_curren
             elapsed = datetime.now(timezone.utc) - active_session.started_at.replace(tzinfo=timezone.utc)
             session_minutes = int(elapsed.total_seconds() / 60)
         q_size = db.query(QueueEntry).filter(QueueEntry.slot_id == slot.id).count()
+        hold = None if active_session else queue_handoff.active_hold(db, slot.id)
+        booked, free_until = reservations.walk_up(db, slot.id, user.id)
         result.append(SlotOut(
             id=slot.id,
             service_name=slot.service_name,
@@ -157,14 +168,56 @@ def list_slots(db: DbSession = Depends(get_db), _user: User = Depends(get_curren
             category=slot.category,
             category_accent=slot.category_accent,
             monthly_cost=slot.monthly_cost,
-            available=active_session is None,
+            available=active_session is None and booked is None and (hold is None or hold.user_id == user.id),
             occupant_name=occupant_name,
             session_minutes=session_minutes,
             queue_size=q_size,
+            reserved_for=hold.user.name if hold else booked.user_name if booked else None,
+            reserved_until=hold.hold_until.isoformat() if hold else booked.end.isoformat() if booked else None,
+            free_until=free_until.isoformat() if free_until and not active_session else None,
+            service_status=checks.get(slot.id, "ok"),
         ))
     return result
 
 
+class Blocked(NamedTuple):
+    status: str  # "occupied", "staging", "booked" or "reserved"
+    detail: str
+    occupant: str | None = None
+
+
+def occupy_check(db: DbSession, slot_id: str, user: User) -> tuple[Blocked | None, datetime | None]:
+    """Can `user` start a session on the slot now?
+
+    Returns (why not, or None; when their session must end by, or None for
+    no limit). If nothing blocks them, their queue entry for the slot is
+    removed (queue_handoff.claim) — the caller commits with the session.
+    """
+    active = (
+        db.query(Session)
+        .filter(Session.slot_id == slot_id, Session.ended_at == None)
+        .first()
+    )
+    if active:
+        name = active.user.name
+        return Blocked("occupied", f"Слот уже занят пользователем {name}", name), None
+    if dump_jobs.staging(db, slot_id):
+        return Blocked(
+            "staging", "Слот освобождается: сохраняем данные предыдущей сессии. Попробуйте через минуту",
+        ), None
+    booked, ends_by = reservations.walk_up(db, slot_id, user.id)
+    if booked:
+        return Blocked(
+            "booked", f"Слот забронирован: {booked.user_name}, {booked.start:%H:%M}–{booked.end:%H:%M} UTC",
+        ), None
+    hold = queue_handoff.claim(db, slot_id, user.id)
+    if hold:
+        return Blocked(
+            "reserved", f"Слот зарезервирован для {hold.user.name} до {hold.hold_until:%H:%M} UTC",
+        ), None
+    return None, ends_by
+
+
 @router.post("/{slot_id}/occupy", response_model=OccupyResponse)
 def occupy_slot(
     slot_id: str,
@@ -174,17 +227,10 @@ def occupy_slot(
     slot = db.query(Slot).filter(Slot.id == slot_id).first()
     if not slot:
         raise HTTPException(status_code=404, detail="Слот не найден")
-    active = (
-        db.query(Session)
-        .filter(Session.slot_id == slot_id, Session.ended_at == None)
-        .first()
-    )
-    if active:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail=f"Слот уже занят пользователем {active.user.name}",
-        )
-    session = Session(user_id=user.id, slot_id=slot_id)
+    blocked, ends_by = occupy_check(db, slot_id, user)
+    if blocked:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=blocked.detail)
+    session = Session(user_id=user.id, slot_id=slot_id, ends_by=ends_by)
     db.add(session)
     db.commit()
     db.refresh(session)
@@ -203,6 +249,7 @@ def occupy_slot(
         slot_id=slot_id,
         started_at=session.started_at.isoformat(),
         guacamole_url=guac_url,
+        ends_by=ends_by.isoformat() if ends_by else None,
     )
 
 
@@ -225,24 +272,12 @@ def release_slot(
         raise HTTPException(status_code=404, detail="Нет активной сессии для этого слота")
     active.ended_at = datetime.now(timezone.utc)
     active.end_reason = "manual"
-    # Notify first in queue (remove from queue — Telegram notification in S2-5)
-    first_in_queue = (
-        db.query(QueueEntry)
-        .filter(QueueEntry.slot_id == slot_id)
-        .order_by(QueueEntry.position)
-        .first()
-    )
-    next_user_name = None
-    if first_in_queue:
-        next_user_name = first_in_queue.user.name
-        db.delete(first_in_queue)
-    db.commit()
+    enqueue_dump(db, active)
+    # Hold the slot for the first in queue (commits)
+    handoff = queue_handoff.offer(db, slot_id)
     # Broadcast to WebSocket clients
-    broadcast_sync("slot_released", {
-        "slot_id": slot_id,
-        "next_in_queue": next_user_name,
-    })
-    return {"ok": True, "session_id": active.id, "next_in_queue": next_user_name}
+    broadcast_sync("slot_released", handoff)
+    return {"ok": True, "session_id": active.id, **handoff}
 
 
 @router.get("/{slot_id}/credentials", response_model=SlotCredentials)
@@ -301,24 +336,11 @@ def force_release_slot(
 
     active.ended_at = datetime.now(timezone.utc)
     active.end_reason = "admin_force"
+    enqueue_dump(db, active)
 
-    # Clean queue
-    first_in_queue = (
-        db.query(QueueEntry)
-        .filter(QueueEntry.slot_id == slot_id)
-        .order_by(QueueEntry.position)
-        .first()
-    )
-    next_user_name = None
-    if first_in_queue:
-        next_user_name = first_in_queue.user.name
-        db.delete(first_in_queue)
+    # Hold the slot for the first in queue (commits)
+    handoff = queue_handoff.offer(db, slot_id)
 
-    db.commit()
-
-    broadcast_sync("slot_released", {
-        "slot_id": slot_id,
-        "next_in_queue": next_user_name,
-    })
+    broadcast_sync("slot_released", handoff)
 
-    return {"ok": True, "session_id": active.id, "next_in_queue": next_user_name}
+    return {"ok": True, "session_id": active.id, **handoff}
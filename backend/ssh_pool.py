@@ -0,0 +1,259 @@
+"""Persistent SSH connections per VM host.
+
+Opening a paramiko.SSHClient costs a TCP connect, key exchange and auth.
+The pool keeps one authenticated transport per (host, port, user) alive and
+multiplexes exec and SFTP channels over it, so an end-of-day burst of dumps
+against the same VMs pays for one handshake per host instead of one per job.
+
+- Connections idle for longer than IDLE_CHECK_SEC are health-checked (keepalive
+  packet) before reuse; dead ones are replaced.
+- Connections idle for longer than MAX_IDLE_SEC are closed — never one with
+  a channel open: a long dump stream only refreshes last_used when it ends.
+- Any transport-level error evicts the connection; exec() retries once on a
+  fresh one if the channel couldn't even be opened.
+- Concurrent channels per host are capped (sshd's MaxSessions defaults to 10).
+
+Blocking, like paramiko itself — call from worker threads (asyncio.to_thread).
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+IDLE_CHECK_SEC = 60
+MAX_IDLE_SEC = 600
+CONNECT_TIMEOUT_SEC = 10
+MAX_CHANNELS_PER_HOST = 8
+
+Key = tuple[str, int, str]
+
+
+class _Conn:
+    def __init__(self, client):
+        self.client = client
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.channels = threading.BoundedSemaphore(MAX_CHANNELS_PER_HOST)
+        self.in_use = 0  # callers between _acquire and _release; guarded by the pool lock
+
+    def is_alive(self) -> bool:
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+
+def _default_factory(host: str, port: int, user: str, password: str | None, key_path: str | None):
+    import paramiko
+
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    kwargs: dict = {"username": user, "port": port, "timeout": CONNECT_TIMEOUT_SEC}
+    if password:
+        kwargs["password"] = password
+    if key_path:
+        kwargs["key_filename"] = key_path
+    client.connect(host, **kwargs)
+    transport = client.get_transport()
+    if transport is not None:
+        transport.set_keepalive(30)
+    return client
+
+
+class SSHPool:
+    """Thread-safe pool of authenticated SSH connections, one per host/user."""
+
+    def __init__(self, client_factory: Callable | None = None):
+        self._factory = client_factory or _default_factory
+        self._conns: dict[Key, _Conn] = {}
+        self._lock = threading.Lock()
+        self._host_locks: dict[Key, threading.Lock] = {}
+        self.handshakes = 0  # connections opened, for logging/tests
+
+    # ── Connection management ──
+
+    def _acquire(
+        self, host: str, user: str, port: int, password: str | None, key_path: str | None,
+    ) -> tuple[Key, _Conn]:
+        """The host's connection, marked in use until _release()."""
+        key = (host, port, user)
+        self.reap_idle()
+        with self._lock:
+            host_lock = self._host_locks.setdefault(key, threading.Lock())
+
+        # One handshake at a time per host: concurrent callers wait for it
+        # and then share the connection instead of each opening their own.
+        with host_lock:
+            conn = self._conns.get(key)
+            if conn and not self._healthy(conn):
+                self._close(key, conn)
+                conn = None
+            if conn is None:
+                client = self._factory(host, port, user, password, key_path)
+                conn = _Conn(client)
+                self.handshakes += 1
+                with self._lock:
+                    self._conns[key] = conn
+                logger.debug("SSH connected to %s@%s:%d", user, host, port)
+            with self._lock:
+                conn.in_use += 1
+            conn.last_used = time.monotonic()
+            return key, conn
+
+    def _release(self, conn: _Conn) -> None:
+        with self._lock:
+            conn.in_use -= 1
+        conn.last_used = time.monotonic()
+
+    @contextmanager
+    def _channel_slot(
+        self, host: str, user: str, port: int, password: str | None, key_path: str | None,
+    ) -> Iterator[tuple[Key, _Conn]]:
+        """A connection with one of its MAX_CHANNELS_PER_HOST channels reserved."""
+        key, conn = self._acquire(host, user, port, password, key_path)
+        try:
+            with conn.channels:
+                yield key, conn
+        finally:
+            self._release(conn)
+
+    def _healthy(self, conn: _Conn) -> bool:
+        if not conn.is_alive():
+            return False
+        if time.monotonic() - conn.last_used < IDLE_CHECK_SEC:
+            return True
+        try:
+            conn.client.get_transport().send_ignore()
+            return True
+        except Exception:
+            return False
+
+    def _close(self, key: Key, conn: _Conn) -> None:
+        with self._lock:
+            if self._conns.get(key) is conn:
+                del self._conns[key]
+        try:
+            conn.client.close()
+        except Exception:
+            pass
+
+    def evict(self, host: str, user: str, port: int = 22) -> None:
+        key = (host, port, user)
+        with self._lock:
+            conn = self._conns.get(key)
+        if conn:
+            self._close(key, conn)
+
+    def reap_idle(self) -> int:
+        """Close connections unused for MAX_IDLE_SEC (none in use). Returns how many."""
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                (k, c) for k, c in self._conns.items()
+                if c.in_use == 0 and now - c.last_used > MAX_IDLE_SEC
+            ]
+        for key, conn in idle:
+            self._close(key, conn)
+        return len(idle)
+
+    def close_all(self) -> None:
+        with self._lock:
+            items = list(self._conns.items())
+        for key, conn in items:
+            self._close(key, conn)
+
+    # ── Channels ──
+
+    def exec(
+        self,
+        host: str,
+        command: str,
+        user: str,
+        password: str | None = None,
+        key_path: str | None = None,
+        port: int = 22,
+        timeout: float | None = None,
+    ) -> tuple[int, bytes, bytes]:
+        """Run a command; returns (exit_status, stdout, stderr).
+
+        If the pooled connection can't open a channel it is replaced and the
+        command retried once. Failures after the command started are not
+        retried (it may not be idempotent) — the connection is evicted and
+        the error raised.
+        """
+        for attempt in (1, 2):
+            with self._channel_slot(host, user, port, password, key_path) as (key, conn):
+                try:
+                    _, stdout, stderr = conn.client.exec_command(command, timeout=timeout)
+                except Exception:
+                    self._close(key, conn)
+                    if attempt == 2:
+                        raise
+                    logger.info("SSH channel to %s failed, reconnecting", host)
+                    continue
+                try:
+                    out = stdout.read()
+                    err = stderr.read()
+                    status = stdout.channel.recv_exit_status()
+                except Exception:
+                    self._close(key, conn)
+                    raise
+            return status, out, err
+        raise AssertionError("unreachable")
+
+    @contextmanager
+    def open_channel(
+        self,
+        host: str,
+        command: str,
+        user: str,
+        password: str | None = None,
+        key_path: str | None = None,
+        port: int = 22,
+        timeout: float | None = None,
+    ) -> Iterator:
+        """Start a command and yield its channel, for streaming stdout with recv()."""
+        with self._channel_slot(host, user, port, password, key_path) as (key, conn):
+            try:
+                channel = conn.client.get_transport().open_session()
+                if timeout is not None:
+                    channel.settimeout(timeout)
+                channel.exec_command(command)
+            except Exception:
+                self._close(key, conn)
+                raise
+            try:
+                yield channel
+            except Exception:
+                self._close(key, conn)
+                raise
+            finally:
+                channel.close()
+
+    @contextmanager
+    def sftp(
+        self,
+        host: str,
+        user: str,
+        password: str | None = None,
+        key_path: str | None = None,
+        port: int = 22,
+    ) -> Iterator:
+        """Yield an SFTP client on a channel of the pooled connection."""
+        with self._channel_slot(host, user, port, password, key_path) as (key, conn):
+            try:
+                sftp = conn.client.open_sftp()
+            except Exception:
+                self._close(key, conn)
+                raise
+            try:
+                yield sftp
+            finally:
+                sftp.close()
+
+
+pool = SSHPool()
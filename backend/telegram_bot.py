@@ -11,7 +11,12 @@ Admin commands:
   /reboot {vm_id} — reboot a VM
   /stats — weekly utilization stats
 
-Notifications:
+Updates arrive by long polling, or — with telegram_webhook_url set — at
+POST /api/telegram/webhook (telegram_webhook.py). Either way only one
+backend process, the lease holder, polls or registers the webhook and
+sends notifications.
+
+Notifications (queued in telegram_outbox.py, sent within rate limits):
   - Session dump (file + summary)
   - "Slot available" (queue notification)
   - "Booking in 5 minutes" reminder
@@ -19,14 +24,27 @@ Notifications:
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import logging
 import os
-from datetime import datetime, timezone
+import shlex
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 
 logger = logging.getLogger(__name__)
 
 # Lazy import — only import telegram when bot is actually started
 _bot_app = None
+_db_pool: ThreadPoolExecutor | None = None  # handlers' DB work, see _db()
+_leader_task: asyncio.Task | None = None
+_is_leader = False
+
+DB_WORKERS = 2
+WEBHOOK_PATH = "/api/telegram/webhook"
+LEADER_LEASE = "telegram_bot"
+LEADER_TTL = timedelta(seconds=60)
+LEADER_RENEW_SEC = 20
 
 
 def get_token() -> str:
@@ -42,19 +60,44 @@ def get_token() -> str:
     return token
 
 
+def webhook_mode() -> bool:
+    from backend.config import settings
+    return bool(settings.telegram_webhook_url)
+
+
+def webhook_secret() -> str:
+    """Secret Telegram sends with each webhook call (X-Telegram-Bot-Api-Secret-Token).
+
+    Derived from the token unless configured, so every worker agrees on it.
+    """
+    from backend.config import settings
+    if settings.telegram_webhook_secret:
+        return settings.telegram_webhook_secret
+    return hashlib.sha256(f"webhook:{get_token()}".encode()).hexdigest()
+
+
+def webhook_url() -> str:
+    from backend.config import settings
+    return settings.telegram_webhook_url.rstrip("/") + WEBHOOK_PATH
+
+
 async def start_bot() -> None:
-    """Initialize and start the Telegram bot (polling mode for dev)."""
-    from telegram import Update, BotCommand
-    from telegram.ext import (
-        ApplicationBuilder,
-        CommandHandler,
-        ContextTypes,
-    )
+    """Initialize and start the Telegram bot.
 
-    global _bot_app
+    Every worker builds the Application, so any of them can process a
+    webhook update it receives. Only the leader (leases.py) talks to
+    Telegram on the bot's behalf: registers the webhook — or polls, if no
+    webhook URL is configured — and drains the outbox.
+    """
+    from telegram.ext import ApplicationBuilder, CommandHandler
+
+    global _bot_app, _leader_task
 
     token = get_token()
-    _bot_app = ApplicationBuilder().token(token).build()
+    builder = ApplicationBuilder().token(token)
+    if webhook_mode():
+        builder = builder.updater(None)  # updates arrive at /api/telegram/webhook
+    _bot_app = builder.build()
 
     # Register handlers
     _bot_app.add_handler(CommandHandler("start", _cmd_start))
@@ -65,34 +108,175 @@ async def start_bot() -> None:
     _bot_app.add_handler(CommandHandler("reboot", _cmd_reboot))
     _bot_app.add_handler(CommandHandler("stats", _cmd_stats))
 
-    # Set commands menu
-    await _bot_app.bot.set_my_commands([
-        BotCommand("start", "Привязать аккаунт"),
-        BotCommand("status", "Мой статус"),
-        BotCommand("help", "Список команд"),
-        BotCommand("health", "Здоровье системы (admin)"),
-        BotCommand("stats", "Статистика (admin)"),
-    ])
-
-    logger.info("Telegram bot started (polling mode)")
+    from backend import chat_identity
+    linked = await _db(chat_identity.warm)
     await _bot_app.initialize()
     await _bot_app.start()
-    await _bot_app.updater.start_polling()
+    logger.info(
+        "Telegram bot started (%s mode, %d linked chats cached)",
+        "webhook" if webhook_mode() else "polling", linked,
+    )
+    _leader_task = asyncio.create_task(_lead_forever())
 
 
 async def stop_bot() -> None:
     """Stop the Telegram bot gracefully."""
-    global _bot_app
+    global _bot_app, _db_pool, _leader_task
+    if _leader_task:
+        _leader_task.cancel()
+        try:
+            await _leader_task
+        except asyncio.CancelledError:
+            pass
+        _leader_task = None
+    if _is_leader:
+        await _step_down()
+        from backend import leases
+        await _db(leases.release, LEADER_LEASE)
     if _bot_app:
-        await _bot_app.updater.stop()
         await _bot_app.stop()
         await _bot_app.shutdown()
         _bot_app = None
+    if _db_pool:
+        _db_pool.shutdown(wait=False)
+        _db_pool = None
+
+
+async def dispatch_update(data: dict) -> bool:
+    """Hand a webhook update to the Application. False if the bot isn't running."""
+    from telegram import Update
+
+    if not _bot_app:
+        return False
+    await _bot_app.update_queue.put(Update.de_json(data, _bot_app.bot))
+    return True
+
+
+# ── Leadership ─────────────────────────────────────────────
+# One process per deployment owns the bot's connection to Telegram. The
+# lease is renewed every LEADER_RENEW_SEC; if the leader dies, another
+# worker takes over within LEADER_TTL.
+
+
+async def _lead_forever() -> None:
+    from backend import leases
+
+    while True:
+        try:
+            leader = await _db(leases.acquire, LEADER_LEASE, LEADER_TTL)
+            if leader and not _is_leader:
+                await _become_leader()
+            elif not leader and _is_leader:
+                logger.warning("Telegram bot leadership lost")
+                await _step_down()
+        except Exception as e:
+            logger.error("Telegram bot leadership check failed: %s", e)
+        await asyncio.sleep(LEADER_RENEW_SEC)
+
+
+async def _become_leader() -> None:
+    """Take over the bot's connection; leader only once every step succeeded.
+
+    A failed step undoes the ones before it and gives the lease up, so the
+    next round here or another worker tries again from scratch.
+    """
+    from telegram import BotCommand
+    from backend import leases
+    from backend.telegram_outbox import start_sender
+
+    global _is_leader
+    try:
+        # Set commands menu
+        await _bot_app.bot.set_my_commands([
+            BotCommand("start", "Привязать аккаунт"),
+            BotCommand("status", "Мой статус"),
+            BotCommand("help", "Список команд"),
+            BotCommand("health", "Здоровье системы (admin)"),
+            BotCommand("stats", "Статистика (admin)"),
+        ])
+        if webhook_mode():
+            await _bot_app.bot.set_webhook(
+                url=webhook_url(),
+                secret_token=webhook_secret(),
+                allowed_updates=["message"],
+            )
+        else:
+            # Polling would also delete a webhook left from webhook mode
+            await _bot_app.updater.start_polling()
+        await start_sender(_bot_app.bot)
+    except Exception:
+        await _step_down()
+        await _db(leases.release, LEADER_LEASE)
+        raise
+    _is_leader = True
+    logger.info("Telegram bot leader: %s", "webhook registered" if webhook_mode() else "polling")
+
+
+async def _step_down() -> None:
+    from backend.telegram_outbox import stop_sender
+
+    global _is_leader
+    _is_leader = False
+    await stop_sender()
+    # The webhook stays registered: it points at the app, not at this process
+    if _bot_app and _bot_app.updater and _bot_app.updater.running:
+        await _bot_app.updater.stop()
+
+
+# ── Database access ────────────────────────────────────────
+# The bot runs on the FastAPI event loop, so handlers never touch the
+# database themselves: each does its queries in a sync function run on a
+# small dedicated executor (its own session, closed afterwards) and only
+# awaits the result. A slow query then delays that one reply, not the
+# WebSocket broadcasts and requests sharing the loop.
+
+
+async def _db(fn, *args):
+    """Run fn(db, *args) off the event loop with a fresh session."""
+    global _db_pool
+    if _db_pool is None:
+        _db_pool = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="bot-db")
+
+    def run():
+        from backend.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            return fn(db, *args)
+        finally:
+            db.close()
+
+    return await asyncio.get_running_loop().run_in_executor(_db_pool, run)
+
+
+async def _identity(chat_id: str):
+    """The sender's user — from chat_identity's cache, so usually no query."""
+    from backend import chat_identity
+
+    hit = chat_identity.cached(chat_id)
+    if hit is chat_identity.MISS:
+        hit = await _db(chat_identity.load, chat_id)
+    return hit
 
 
 # ── User Commands ──────────────────────────────────────────
 
 
+def _link_account(db, username: str, chat_id: str) -> str | None:
+    """Link chat_id to the user. Returns their name, None if not found.
+
+    The commit drops the chat's cached identity (see chat_identity.py).
+    """
+    from backend.models import User
+
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        return None
+    user.telegram_id = chat_id
+    db.commit()
+    return user.name
+
+
 async def _cmd_start(update, context) -> None:
     """Link Telegram to VDI account. User sends /start <username>."""
     chat_id = str(update.effective_chat.id)
@@ -107,71 +291,56 @@ async def _cmd_start(update, context) -> None:
         return
 
     username = args[0]
+    name = await _db(_link_account, username, chat_id)
+    if name is None:
+        await update.message.reply_text(
+            f"❌ Пользователь '{username}' не найден в системе."
+        )
+        return
 
-    # Link chat_id to user in DB
-    from backend.database import SessionLocal
-    from backend.models import User
+    await update.message.reply_text(
+        f"✅ Аккаунт привязан!\n"
+        f"Имя: {name}\n"
+        f"Chat ID: {chat_id}\n\n"
+        f"Теперь вы будете получать дампы сессий и уведомления."
+    )
 
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter(User.username == username).first()
-        if not user:
-            await update.message.reply_text(
-                f"❌ Пользователь '{username}' не найден в системе."
-            )
-            return
 
-        user.telegram_id = chat_id
-        db.commit()
-        await update.message.reply_text(
-            f"✅ Аккаунт привязан!\n"
-            f"Имя: {user.name}\n"
-            f"Chat ID: {chat_id}\n\n"
-            f"Теперь вы будете получать дампы сессий и уведомления."
+def _status_text(db, user_id: int) -> str:
+    from backend.models import Session
+
+    active = (
+        db.query(Session)
+        .filter(Session.user_id == user_id, Session.ended_at == None)
+        .first()
+    )
+    if not active:
+        return (
+            f"😴 Нет активных сессий.\n"
+            f"Откройте дашборд чтобы занять слот."
         )
-    finally:
-        db.close()
+
+    elapsed = datetime.now(timezone.utc) - active.started_at.replace(
+        tzinfo=timezone.utc
+    )
+    minutes = int(elapsed.total_seconds() / 60)
+    return (
+        f"🟢 Активная сессия\n"
+        f"Слот: {active.slot_id}\n"
+        f"Время: {minutes} мин\n"
+    )
 
 
 async def _cmd_status(update, context) -> None:
     """Show current session status."""
     chat_id = str(update.effective_chat.id)
-
-    from backend.database import SessionLocal
-    from backend.models import User, Session
-
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter(User.telegram_id == chat_id).first()
-        if not user:
-            await update.message.reply_text(
-                "❓ Аккаунт не привязан. Отправь /start <логин>"
-            )
-            return
-
-        active = (
-            db.query(Session)
-            .filter(Session.user_id == user.id, Session.ended_at == None)
-            .first()
+    identity = await _identity(chat_id)
+    if not identity:
+        await update.message.reply_text(
+            "❓ Аккаунт не привязан. Отправь /start <логин>"
         )
-
-        if active:
-            elapsed = datetime.now(timezone.utc) - active.started_at.replace(
-                tzinfo=timezone.utc
-            )
-            minutes = int(elapsed.total_seconds() / 60)
-            await update.message.reply_text(
-                f"🟢 Активная сессия\n"
-                f"Слот: {active.slot_id}\n"
-                f"Время: {minutes} мин\n"
-            )
-        else:
-            await update.message.reply_text(
-                f"😴 Нет активных сессий.\n"
-                f"Откройте дашборд чтобы занять слот."
-            )
-    finally:
-        db.close()
+        return
+    await update.message.reply_text(await _db(_status_text, identity.user_id))
 
 
 async def _cmd_help(update, context) -> None:
@@ -185,22 +354,15 @@ async def _cmd_help(update, context) -> None:
 
     # Check if admin
     chat_id = str(update.effective_chat.id)
-    from backend.database import SessionLocal
-    from backend.models import User
-
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter(User.telegram_id == chat_id).first()
-        if user and user.is_admin:
-            text += (
-                "\n🔑 Админ-команды:\n"
-                "/health — здоровье VM и сервисов\n"
-                "/kick <user> — отключить пользователя\n"
-                "/reboot <vm_id> — перезагрузить VM\n"
-                "/stats — статистика за неделю\n"
-            )
-    finally:
-        db.close()
+    identity = await _identity(chat_id)
+    if identity and identity.is_admin:
+        text += (
+            "\n🔑 Админ-команды:\n"
+            "/health — здоровье VM и сервисов\n"
+            "/kick <user> — отключить пользователя\n"
+            "/reboot <vm_id> — перезагрузить VM\n"
+            "/stats — статистика за неделю\n"
+        )
 
     await update.message.reply_text(text)
 
@@ -209,52 +371,75 @@ async def _cmd_help(update, context) -> None:
 
 
 async def _require_admin(update) -> bool:
-    """Check if sender is admin. Returns True if admin."""
+    """Check if sender is admin. Returns True if admin.
+
+    A cached non-admin is turned away without a query, but a cached admin
+    is re-read from the database: a revoked admin loses access at once,
+    even if another process made the change.
+    """
+    from backend import chat_identity
+
     chat_id = str(update.effective_chat.id)
+    identity = chat_identity.cached(chat_id)
+    if identity is chat_identity.MISS or (identity and identity.is_admin):
+        identity = await _db(chat_identity.load, chat_id)
+    if not identity or not identity.is_admin:
+        await update.message.reply_text("⛔ Только для администраторов.")
+        return False
+    return True
 
-    from backend.database import SessionLocal
-    from backend.models import User
 
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter(User.telegram_id == chat_id).first()
-        if not user or not user.is_admin:
-            await update.message.reply_text("⛔ Только для администраторов.")
-            return False
-        return True
-    finally:
-        db.close()
+def _health_text(db) -> str:
+    from backend.models import VmStatus, Slot
+
+    vms = db.query(VmStatus).all()
+    slots = db.query(Slot).filter(Slot.is_active == True).all()
+
+    lines = ["🏥 Здоровье системы\n"]
+
+    if vms:
+        lines.append("📟 Виртуальные машины:")
+        for vm in vms:
+            status = "🟢" if vm.is_healthy else "🔴"
+            user_info = f" ({vm.active_user})" if vm.active_user else ""
+            lines.append(f"  {status} {vm.vm_id}{user_info}")
+    else:
+        lines.append("📟 VM: нет данных")
+
+    lines.append(f"\n💾 Слотов активно: {len(slots)}")
+    return "\n".join(lines)
 
 
 async def _cmd_health(update, context) -> None:
     """VM and service health summary (admin only)."""
     if not await _require_admin(update):
         return
+    await update.message.reply_text(await _db(_health_text))
 
-    from backend.database import SessionLocal
-    from backend.models import VmStatus, Slot
 
-    db = SessionLocal()
-    try:
-        vms = db.query(VmStatus).all()
-        slots = db.query(Slot).filter(Slot.is_active == True).all()
-
-        lines = ["🏥 Здоровье системы\n"]
+def _kick_user(db, username: str) -> str:
+    """End the user's active session. Returns the reply."""
+    from backend.models import User, Session
+    from backend.dump_jobs import enqueue_dump
 
-        if vms:
-            lines.append("📟 Виртуальные машины:")
-            for vm in vms:
-                status = "🟢" if vm.is_healthy else "🔴"
-                user_info = f" ({vm.active_user})" if vm.active_user else ""
-                lines.append(f"  {status} {vm.vm_id}{user_info}")
-        else:
-            lines.append("📟 VM: нет данных")
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        return f"❌ Пользователь '{username}' не найден."
 
-        lines.append(f"\n💾 Слотов активно: {len(slots)}")
+    active = (
+        db.query(Session)
+        .filter(Session.user_id == user.id, Session.ended_at == None)
+        .first()
+    )
+    if not active:
+        return f"ℹ️ У {username} нет активных сессий."
 
-        await update.message.reply_text("\n".join(lines))
-    finally:
-        db.close()
+    active.ended_at = datetime.now(timezone.utc)
+    active.end_reason = "kicked"
+    enqueue_dump(db, active)
+    from backend.queue_handoff import offer
+    offer(db, active.slot_id)  # commits
+    return f"✅ Пользователь {username} отключён от слота {active.slot_id}."
 
 
 async def _cmd_kick(update, context) -> None:
@@ -267,38 +452,7 @@ async def _cmd_kick(update, context) -> None:
         await update.message.reply_text("Использование: /kick <username>")
         return
 
-    username = args[0]
-
-    from backend.database import SessionLocal
-    from backend.models import User, Session
-
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter(User.username == username).first()
-        if not user:
-            await update.message.reply_text(f"❌ Пользователь '{username}' не найден.")
-            return
-
-        active = (
-            db.query(Session)
-            .filter(Session.user_id == user.id, Session.ended_at == None)
-            .first()
-        )
-        if not active:
-            await update.message.reply_text(
-                f"ℹ️ У {username} нет активных сессий."
-            )
-            return
-
-        active.ended_at = datetime.now(timezone.utc)
-        active.end_reason = "kicked"
-        db.commit()
-
-        await update.message.reply_text(
-            f"✅ Пользователь {username} отключён от слота {active.slot_id}."
-        )
-    finally:
-        db.close()
+    await update.message.reply_text(await _db(_kick_user, args[0]))
 
 
 async def _cmd_reboot(update, context) -> None:
@@ -320,74 +474,76 @@ async def _cmd_reboot(update, context) -> None:
         return
 
     try:
-        import paramiko
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(
+        from backend.ssh_pool import pool
+
+        # Pooled connection, run off the event loop (paramiko is blocking)
+        exit_status, _, err = await asyncio.to_thread(
+            pool.exec,
             settings.timeweb_host,
-            username=settings.timeweb_ssh_user,
+            f"docker restart {shlex.quote(vm_id)}",
+            user=settings.timeweb_ssh_user,
             password=settings.timeweb_ssh_password,
         )
-        ssh.exec_command(f"docker restart {vm_id}")
-        ssh.close()
+        if exit_status != 0:
+            await update.message.reply_text(f"❌ Ошибка: {err.decode(errors='replace').strip()}")
+            return
         await update.message.reply_text(f"✅ {vm_id} перезагружается.")
     except Exception as e:
         await update.message.reply_text(f"❌ Ошибка: {e}")
 
 
+def _stats_text(db) -> str:
+    from backend.models import Session, Slot
+
+    week_ago = datetime.now(timezone.utc) - timedelta(days=7)
+    sessions = (
+        db.query(Session)
+        .filter(Session.started_at >= week_ago)
+        .all()
+    )
+    slots = db.query(Slot).filter(Slot.is_active == True).all()
+
+    total_minutes = 0
+    for s in sessions:
+        if s.ended_at:
+            started = s.started_at.replace(tzinfo=timezone.utc)
+            ended = s.ended_at.replace(tzinfo=timezone.utc)
+            total_minutes += int((ended - started).total_seconds() / 60)
+
+    total_hours = total_minutes / 60
+    avg_per_day = total_hours / 7
+
+    lines = [
+        "📊 Статистика за неделю\n",
+        f"Всего сессий: {len(sessions)}",
+        f"Общее время: {total_hours:.1f} ч",
+        f"Среднее/день: {avg_per_day:.1f} ч",
+        f"Активных слотов: {len(slots)}",
+    ]
+
+    # Per-slot breakdown
+    slot_usage: dict[str, int] = {}
+    for s in sessions:
+        slot_usage[s.slot_id] = slot_usage.get(s.slot_id, 0) + 1
+
+    if slot_usage:
+        lines.append("\n📈 По слотам:")
+        for sid, count in sorted(slot_usage.items(), key=lambda x: -x[1]):
+            lines.append(f"  {sid}: {count} сессий")
+
+    return "\n".join(lines)
+
+
 async def _cmd_stats(update, context) -> None:
     """Weekly utilization stats (admin only)."""
     if not await _require_admin(update):
         return
-
-    from backend.database import SessionLocal
-    from backend.models import Session, Slot
-    from datetime import timedelta
-
-    db = SessionLocal()
-    try:
-        week_ago = datetime.now(timezone.utc) - timedelta(days=7)
-        sessions = (
-            db.query(Session)
-            .filter(Session.started_at >= week_ago)
-            .all()
-        )
-        slots = db.query(Slot).filter(Slot.is_active == True).all()
-
-        total_minutes = 0
-        for s in sessions:
-            if s.ended_at:
-                started = s.started_at.replace(tzinfo=timezone.utc)
-                ended = s.ended_at.replace(tzinfo=timezone.utc)
-                total_minutes += int((ended - started).total_seconds() / 60)
-
-        total_hours = total_minutes / 60
-        avg_per_day = total_hours / 7
-
-        lines = [
-            "📊 Статистика за неделю\n",
-            f"Всего сессий: {len(sessions)}",
-            f"Общее время: {total_hours:.1f} ч",
-            f"Среднее/день: {avg_per_day:.1f} ч",
-            f"Активных слотов: {len(slots)}",
-        ]
-
-        # Per-slot breakdown
-        slot_usage: dict[str, int] = {}
-        for s in sessions:
-            slot_usage[s.slot_id] = slot_usage.get(s.slot_id, 0) + 1
-
-        if slot_usage:
-            lines.append("\n📈 По слотам:")
-            for sid, count in sorted(slot_usage.items(), key=lambda x: -x[1]):
-                lines.append(f"  {sid}: {count} сессий")
-
-        await update.message.reply_text("\n".join(lines))
-    finally:
-        db.close()
+    await update.message.reply_text(await _db(_stats_text))
 
 
 # ── Notification Functions ─────────────────────────────────
+# Queued in the outbox (telegram_outbox.py) and sent by its rate-limited
+# sender, so they work — eventually — even while the bot is down.
 
 
 async def send_session_dump(
@@ -399,11 +555,7 @@ async def send_session_dump(
     files_count: int = 0,
     dump_path: str | None = None,
 ) -> bool:
-    """Send session dump notification to user."""
-    if not _bot_app:
-        logger.warning("Bot not started — cannot send dump notification")
-        return False
-
+    """Queue the session dump (summary as the archive's caption) for the user."""
     text = (
         f"🔚 Сессия завершена\n"
         f"Слот: {slot_id}\n"
@@ -414,74 +566,72 @@ async def send_session_dump(
     if files_count:
         text += f"📁 Файлов: {files_count}\n"
 
-    try:
-        await _bot_app.bot.send_message(chat_id=chat_id, text=text)
-
-        # Send dump file if available
-        if dump_path and os.path.exists(dump_path):
-            with open(dump_path, "rb") as f:
-                await _bot_app.bot.send_document(
-                    chat_id=chat_id,
-                    document=f,
-                    filename=os.path.basename(dump_path),
-                    caption="📦 Артефакты сессии",
-                )
-        return True
-    except Exception as e:
-        logger.error("Failed to send dump to %s: %s", chat_id, e)
-        return False
+    from backend.telegram_outbox import enqueue_async
 
+    await enqueue_async(chat_id, text, document_path=dump_path, session_id=session_id)
+    return True
 
-async def notify_slot_available(chat_id: str, slot_id: str) -> bool:
-    """Notify user that their queued slot is now available."""
-    if not _bot_app:
-        return False
 
-    try:
-        await _bot_app.bot.send_message(
-            chat_id=chat_id,
-            text=(
-                f"🟢 Слот освободился!\n"
-                f"Слот: {slot_id}\n"
-                f"Перейдите в дашборд чтобы занять."
-            ),
-        )
-        return True
-    except Exception as e:
-        logger.error("Failed to notify slot available to %s: %s", chat_id, e)
-        return False
+def slot_available_text(slot_id: str, hold_until: datetime | None = None) -> str:
+    text = f"🟢 Слот освободился!\nСлот: {slot_id}\n"
+    if hold_until:
+        text += f"Слот держится за вами до {hold_until:%H:%M} UTC — займите его в дашборде."
+    else:
+        text += "Перейдите в дашборд чтобы занять."
+    return text
+
+
+async def notify_slot_available(chat_id: str, slot_id: str, hold_until: datetime | None = None) -> bool:
+    """Notify user that their queued slot is now available (held until `hold_until`)."""
+    from backend.telegram_outbox import enqueue_async
+
+    await enqueue_async(chat_id, slot_available_text(slot_id, hold_until))
+    return True
 
 
 async def notify_booking_reminder(
     chat_id: str, slot_id: str, start_time: str
 ) -> bool:
     """Remind user about upcoming booking (5 min before)."""
-    if not _bot_app:
-        return False
+    from backend.telegram_outbox import enqueue_async
 
-    try:
-        await _bot_app.bot.send_message(
-            chat_id=chat_id,
-            text=(
-                f"⏰ Напоминание о бронировании\n"
-                f"Слот: {slot_id}\n"
-                f"Время: {start_time}\n"
-                f"Бронь через 5 минут!"
-            ),
-        )
-        return True
-    except Exception as e:
-        logger.error("Failed to send booking reminder to %s: %s", chat_id, e)
-        return False
+    await enqueue_async(
+        chat_id,
+        f"⏰ Напоминание о бронировании\n"
+        f"Слот: {slot_id}\n"
+        f"Время: {start_time}\n"
+        f"Бронь через 5 минут!",
+    )
+    return True
 
 
-async def send_admin_alert(message: str) -> None:
-    """Send alert to all admin users."""
-    if not _bot_app:
-        return
+def booking_started_text(slot_id: str, ends_at: datetime, no_show_min: int) -> str:
+    return (
+        f"🟢 Бронь началась\n"
+        f"Слот: {slot_id}\n"
+        f"Слот ваш до {ends_at:%H:%M} UTC. Если не займёте его за {no_show_min} мин — бронь снимется."
+    )
+
+
+def preempt_warning_text(slot_id: str, at: datetime) -> str:
+    return (
+        f"⏳ Слот {slot_id} забронирован с {at:%H:%M} UTC.\n"
+        f"Ваша сессия будет завершена в это время — сохраните работу."
+    )
+
+
+def preempted_text(slot_id: str, booker_name: str) -> str:
+    return f"⏹ Сессия на слоте {slot_id} завершена: началась бронь ({booker_name})."
 
+
+def no_show_text(slot_id: str) -> str:
+    return f"❌ Бронь снята\nСлот: {slot_id}\nВы не заняли слот вовремя."
+
+
+def _queue_admin_alert(message: str) -> None:
     from backend.database import SessionLocal
     from backend.models import User
+    from backend.telegram_outbox import enqueue
 
     db = SessionLocal()
     try:
@@ -491,12 +641,11 @@ async def send_admin_alert(message: str) -> None:
             .all()
         )
         for admin in admins:
-            try:
-                await _bot_app.bot.send_message(
-                    chat_id=admin.telegram_id,
-                    text=f"🚨 Алерт\n{message}",
-                )
-            except Exception as e:
-                logger.error("Failed to alert admin %s: %s", admin.username, e)
+            enqueue(db, admin.telegram_id, f"🚨 Алерт\n{message}")
     finally:
         db.close()
+
+
+async def send_admin_alert(message: str) -> None:
+    """Queue an alert for all admin users."""
+    await asyncio.to_thread(_queue_admin_alert, message)
@@ -0,0 +1,623 @@
+"""Telegram outbox — persisted outgoing messages, sent within rate limits.
+
+Notifications (session dumps, "slot available", booking reminders, admin
+alerts) are written to telegram_outbox and return immediately; nothing is
+lost if the bot is down or Telegram is slow. A sender task started with
+the bot drains the table:
+
+- Token buckets, one global (GLOBAL_RATE msg/s, under Telegram's ~30/s)
+  and one per chat (PER_CHAT_RATE msg/s), decide what may go out now.
+- A 429 (RetryAfter) pauses the chat for the time Telegram asks for;
+  other transient errors retry with exponential backoff, up to
+  MAX_ATTEMPTS. A blocked bot or an unknown chat fails the message at once.
+- When a chat falls behind — DIGEST_MIN or more text messages waiting —
+  they go out as one digest message instead of one per second.
+
+Messages for a session dump carry session_id. The dump's archive is
+rebuilt at send time if the cached copy has expired meanwhile, and once
+Telegram has the message in the owner's chat the dump is marked delivered.
+The file_id Telegram returns for an upload is kept (telegram_files), so
+sending the same dump again — a retry, an admin forward — uploads nothing.
+Archives over the Bot API's upload limit go as a signed download link when
+public_url is set, otherwise as volumes (plain byte splits of the .tar.gz,
+joined back with cat). Bytes uploaded and time spent are recorded on each
+message.
+
+Documents go out as background tasks, at most MAX_UPLOADS at once, so a
+large upload never holds up text messages to other chats. A chat with an
+upload in flight is left alone until it finishes, keeping its order.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session as DbSession
+
+from backend.config import settings
+from backend.database import SessionLocal
+from backend.models import OutboxMessage, TelegramFile
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_RATE = 25.0  # msg/s; Telegram allows about 30
+GLOBAL_BURST = 25
+PER_CHAT_RATE = 1.0
+PER_CHAT_BURST = 1
+DIGEST_MIN = 3  # waiting text messages in one chat that get coalesced
+MAX_MESSAGE_LEN = 4096
+MAX_ATTEMPTS = 8
+RETRY_BASE_SEC = 5
+RETRY_MAX_SEC = 600
+BATCH = 200  # due rows looked at per round
+IDLE_POLL_SEC = 30
+KEEP_SENT = timedelta(days=7)
+UPLOAD_LIMIT = 50 * 1024 * 1024  # Bot API send_document
+VOLUME_SIZE = 48 * 1024 * 1024  # leaves room for the multipart envelope
+LINK_TTL = timedelta(days=3)
+MAX_UPLOADS = 2  # document batches in flight at once
+
+_task: asyncio.Task | None = None
+_loop: asyncio.AbstractEventLoop | None = None
+_wakeup: asyncio.Event | None = None
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)  # naive UTC, like the DB columns
+
+
+@dataclass
+class TokenBucket:
+    rate: float  # tokens per second
+    capacity: float
+    tokens: float = field(init=False)
+    updated: float = field(init=False)
+    paused_until: float = 0.0  # RetryAfter
+
+    def __post_init__(self) -> None:
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available (0: now)."""
+        self._refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, seconds: float, now: float) -> None:
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0
+
+
+# ── Enqueue ──
+
+
+def enqueue(
+    db: DbSession,
+    chat_id: str,
+    text: str,
+    document_path: str | None = None,
+    session_id: int | None = None,
+) -> OutboxMessage:
+    """Queue a message (a document with `text` as caption if a path is given). Commits."""
+    msg = OutboxMessage(
+        chat_id=str(chat_id), text=text, document_path=document_path,
+        session_id=session_id, next_attempt_at=_now(),
+    )
+    db.add(msg)
+    db.commit()
+    _wake()
+    return msg
+
+
+def _enqueue(chat_id: str, text: str, **kw) -> None:
+    db = SessionLocal()
+    try:
+        enqueue(db, chat_id, text, **kw)
+    finally:
+        db.close()
+
+
+async def enqueue_async(chat_id: str, text: str, **kw) -> None:
+    await asyncio.to_thread(_enqueue, chat_id, text, **kw)
+
+
+def _wake() -> None:
+    """Nudge the sender (safe to call from worker threads)."""
+    if _loop and _wakeup and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+# ── Planning ──
+
+
+@dataclass
+class Batch:
+    """What goes out in one Bot API call: a message, a digest, or a document."""
+    chat_id: str
+    ids: list[int]
+    text: str
+    document_path: str | None = None
+    session_id: int | None = None
+
+
+def due_messages(db: DbSession, now: datetime | None = None, limit: int = BATCH) -> list[OutboxMessage]:
+    now = now or _now()
+    return (
+        db.query(OutboxMessage)
+        .filter(OutboxMessage.status == "pending", OutboxMessage.next_attempt_at <= now)
+        .order_by(OutboxMessage.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def seconds_until_due(db: DbSession) -> float:
+    """Until the next pending message is due (retries wait), capped at IDLE_POLL_SEC."""
+    earliest = (
+        db.query(OutboxMessage.next_attempt_at)
+        .filter(OutboxMessage.status == "pending")
+        .order_by(OutboxMessage.next_attempt_at)
+        .limit(1)
+        .scalar()
+    )
+    if earliest is None:
+        return IDLE_POLL_SEC
+    return min(IDLE_POLL_SEC, max(0.0, (earliest - _now()).total_seconds()))
+
+
+def _digest(messages: list[OutboxMessage]) -> Batch:
+    """Coalesce a chat's waiting text messages, oldest first, up to the length limit."""
+    header = f"📬 Пропущенные уведомления ({len(messages)})"
+    parts, ids, length = [], [], len(header)
+    for msg in messages:
+        if ids and length + len(msg.text) + 2 > MAX_MESSAGE_LEN:
+            break
+        parts.append(msg.text)
+        ids.append(msg.id)
+        length += len(msg.text) + 2
+    if len(ids) < len(messages):
+        header = f"📬 Пропущенные уведомления ({len(ids)} из {len(messages)})"
+    return Batch(messages[0].chat_id, ids, "\n\n".join([header, *parts])[:MAX_MESSAGE_LEN])
+
+
+def plan(messages: list[OutboxMessage]) -> list[Batch]:
+    """One batch per chat: its oldest message, or a digest if it has fallen behind."""
+    by_chat: dict[str, list[OutboxMessage]] = {}
+    for msg in messages:
+        by_chat.setdefault(msg.chat_id, []).append(msg)
+    batches = []
+    for chat_messages in by_chat.values():
+        first = chat_messages[0]
+        if first.document_path or first.session_id:
+            batches.append(Batch(first.chat_id, [first.id], first.text, first.document_path, first.session_id))
+            continue
+        texts = []
+        for msg in chat_messages:
+            if msg.document_path or msg.session_id:
+                break  # keep order: the digest stops at the next document
+            texts.append(msg)
+        if len(texts) >= DIGEST_MIN:
+            batches.append(_digest(texts))
+        else:
+            batches.append(Batch(first.chat_id, [first.id], first.text))
+    return batches
+
+
+# ── Sending ──
+
+
+@dataclass
+class Attachment:
+    """One file to send: a byte range of `path` to upload, or a known file_id."""
+    filename: str
+    part: int = 0  # 0: the whole archive; 1..parts: volumes
+    parts: int = 1
+    path: str | None = None
+    offset: int = 0
+    size: int = 0
+    file_id: str | None = None
+
+
+@dataclass
+class Document:
+    """What a document message carries: attachments, or a download link instead."""
+    attachments: list[Attachment] = field(default_factory=list)
+    session_id: int | None = None
+    etag: str | None = None  # archive_etag() of a chunk-store dump; None: file_ids not kept
+    link: str | None = None
+    size: int = 0
+
+
+def _expected_parts(parts: int) -> set[int]:
+    return {0} if parts == 1 else set(range(1, parts + 1))
+
+
+def split(path: str, filename: str, cached: dict[int, TelegramFile] | None = None) -> list[Attachment]:
+    """The file as one attachment, or as volumes if it is over UPLOAD_LIMIT."""
+    size = os.path.getsize(path)
+    if size <= UPLOAD_LIMIT:
+        parts = [Attachment(filename, 0, 1, path, 0, size)]
+    else:
+        count = math.ceil(size / VOLUME_SIZE)
+        parts = [
+            Attachment(f"{filename}.{n:03d}", n, count, path, (n - 1) * VOLUME_SIZE,
+                       min(VOLUME_SIZE, size - (n - 1) * VOLUME_SIZE))
+            for n in range(1, count + 1)
+        ]
+    for att in parts:
+        known = (cached or {}).get(att.part)
+        if known and known.parts == att.parts and known.size == att.size:
+            att.file_id = known.file_id
+    return parts
+
+
+def resolve_document(db: DbSession, batch: Batch) -> Document | None:
+    """What to attach, rebuilding an expired dump archive only if Telegram lacks it."""
+    if batch.document_path and os.path.exists(batch.document_path):
+        return Document(split(batch.document_path, os.path.basename(batch.document_path)))
+    if batch.session_id is None:
+        return None
+    from backend import dump_store
+    from backend.models import Session
+
+    session = db.query(Session).filter(Session.id == batch.session_id).first()
+    manifest = dump_store.load_manifest(session.id) if session and dump_store.is_manifest(session.dump_path) else None
+    if manifest is None:
+        return None
+    doc = Document(session_id=session.id, etag=dump_store.archive_etag(manifest))
+    filename = f"session_{session.id}_dump.tar.gz"
+    cached = {
+        f.part: f for f in db.query(TelegramFile).filter(
+            TelegramFile.session_id == session.id, TelegramFile.etag == doc.etag,
+        )
+    }
+    if cached and set(cached) == _expected_parts(next(iter(cached.values())).parts):
+        # Sent before: Telegram has every part, nothing to rebuild or upload
+        doc.attachments = [
+            Attachment(filename if f.parts == 1 else f"{filename}.{f.part:03d}", f.part, f.parts,
+                       size=f.size, file_id=f.file_id)
+            for f in sorted(cached.values(), key=lambda f: f.part)
+        ]
+        doc.size = sum(f.size for f in cached.values())
+        return doc
+
+    path = dump_store.materialize(db, session.id)
+    doc.size = path.stat().st_size
+    if doc.size > UPLOAD_LIMIT and settings.public_url:
+        from backend.sessions import signed_dump_url
+        doc.link = signed_dump_url(session.id, _now() + LINK_TTL)
+    else:
+        doc.attachments = split(str(path), filename, cached)
+    return doc
+
+
+def remember_file(db: DbSession, document: Document, att: Attachment, file_id: str) -> None:
+    """Keep the file_id of an uploaded dump part. Commits."""
+    if document.etag is None:
+        return
+    # Parts of an older archive, or of another split, are no use any more
+    db.query(TelegramFile).filter(
+        TelegramFile.session_id == document.session_id,
+        (TelegramFile.etag != document.etag) | (TelegramFile.parts != att.parts),
+    ).delete(synchronize_session=False)
+    values = {"parts": att.parts, "etag": document.etag, "file_id": file_id, "size": att.size, "created_at": _now()}
+    db.execute(
+        sqlite_insert(TelegramFile)
+        .values(session_id=document.session_id, part=att.part, **values)
+        .on_conflict_do_update(index_elements=["session_id", "part"], set_=values)
+    )
+    db.commit()
+
+
+class _Volume(io.RawIOBase):
+    """Read-only view of bytes [offset, offset + size) of a file: one volume.
+
+    Handed to send_document as is, so the only copy of the volume in memory
+    is the one the Bot API request is built from.
+    """
+
+    def __init__(self, path: str, offset: int, size: int):
+        self._file = open(path, "rb")
+        self._file.seek(offset)
+        self._left = size
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = self._file.readinto(memoryview(b)[:self._left])
+        self._left -= n
+        return n
+
+    def readall(self) -> bytes:
+        data = self._file.read(self._left)
+        self._left -= len(data)
+        return data
+
+    def close(self) -> None:
+        self._file.close()
+        super().close()
+
+
+def _link_text(batch: Batch, document: Document) -> str:
+    until = (_now() + LINK_TTL).strftime("%d.%m %H:%M UTC")
+    return (
+        f"{batch.text}\n📦 Архив {document.size / 1024 / 1024:.0f} МБ — больше лимита Telegram.\n"
+        f"Скачать до {until}: {document.link}"
+    )
+
+
+async def send_batch(bot, batch: Batch, document: Document | None = None, on_upload=None) -> tuple[int, float]:
+    """The batch's Bot API calls. Returns (bytes uploaded, seconds spent).
+
+    Raises telegram errors as they come. `on_upload(attachment, file_id)`
+    is awaited after each upload, so volumes that went out before a
+    failure are sent by file_id on the retry.
+    """
+    started = time.perf_counter()
+    if document is None or document.link:
+        text = batch.text if document is None else _link_text(batch, document)
+        await bot.send_message(chat_id=batch.chat_id, text=text)
+        return 0, time.perf_counter() - started
+
+    uploaded = 0
+    for att in document.attachments:
+        caption = batch.text if att.part <= 1 else ""
+        if att.parts > 1:
+            caption += f"\n📦 Часть {att.part} из {att.parts} (склеить: cat {att.filename[:-4]}.* > {att.filename[:-4]})"
+        caption = caption.strip()[:1024]
+        if att.file_id:
+            await bot.send_document(chat_id=batch.chat_id, document=att.file_id, caption=caption)
+            continue
+        with _Volume(att.path, att.offset, att.size) as volume:
+            message = await bot.send_document(
+                chat_id=batch.chat_id, document=volume, filename=att.filename, caption=caption,
+            )
+        uploaded += att.size
+        file_id = getattr(getattr(message, "document", None), "file_id", None)
+        if file_id and on_upload:
+            await on_upload(att, file_id)
+    return uploaded, time.perf_counter() - started
+
+
+def _owner_chat(db: DbSession, session_id: int) -> str | None:
+    from backend.models import Session, User
+
+    return (
+        db.query(User.telegram_id)
+        .join(Session, Session.user_id == User.id)
+        .filter(Session.id == session_id)
+        .scalar()
+    )
+
+
+def record_sent(db: DbSession, batch: Batch, upload_bytes: int | None = None,
+                upload_sec: float | None = None) -> None:
+    now = _now()
+    db.query(OutboxMessage).filter(OutboxMessage.id.in_(batch.ids)).update(
+        {
+            "status": "sent", "sent_at": now, "attempts": OutboxMessage.attempts + 1, "last_error": None,
+            "upload_bytes": upload_bytes,
+            "upload_ms": None if upload_sec is None else round(upload_sec * 1000),
+        },
+        synchronize_session=False,
+    )
+    # A forward to someone else (an admin) doesn't deliver the user's dump
+    if batch.session_id is not None and _owner_chat(db, batch.session_id) == batch.chat_id:
+        from backend.dump_jobs import mark_session_delivered
+        mark_session_delivered(db, batch.session_id, commit=False)
+    db.commit()
+
+
+def backoff_delay(attempts: int) -> timedelta:
+    """Delay before retry number `attempts` (1-based): base · 2^(n-1), capped."""
+    return timedelta(seconds=min(RETRY_BASE_SEC * (2 ** max(0, attempts - 1)), RETRY_MAX_SEC))
+
+
+def record_failure(db: DbSession, batch: Batch, error: str, retry_after: float | None = None,
+                   permanent: bool = False) -> None:
+    now = _now()
+    for msg in db.query(OutboxMessage).filter(OutboxMessage.id.in_(batch.ids)):
+        msg.last_error = error[:500]
+        if retry_after is not None:
+            # Telegram's flood control — not the message's fault
+            msg.next_attempt_at = now + timedelta(seconds=retry_after)
+            continue
+        msg.attempts += 1
+        if permanent or msg.attempts >= MAX_ATTEMPTS:
+            msg.status = "failed"
+            logger.error("Telegram message %d to %s failed: %s", msg.id, msg.chat_id, error)
+        else:
+            msg.next_attempt_at = now + backoff_delay(msg.attempts)
+    db.commit()
+
+
+def purge(db: DbSession, now: datetime | None = None) -> int:
+    """Delete sent and failed messages older than KEEP_SENT."""
+    cutoff = (now or _now()) - KEEP_SENT
+    count = (
+        db.query(OutboxMessage)
+        .filter(OutboxMessage.status.in_(("sent", "failed")), OutboxMessage.created_at < cutoff)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return count
+
+
+def _retry_after_seconds(error) -> float:
+    value = error.retry_after
+    return value.total_seconds() if isinstance(value, timedelta) else float(value)
+
+
+class Sender:
+    """Drains the outbox through the token buckets."""
+
+    def __init__(self, bot, session_factory=SessionLocal):
+        self.bot = bot
+        self.session_factory = session_factory
+        self.global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+        self.chats: dict[str, TokenBucket] = {}
+        self.uploads: dict[str, asyncio.Task] = {}  # chat_id → its document being sent
+
+    def _chat(self, chat_id: str) -> TokenBucket:
+        if chat_id not in self.chats:
+            self.chats[chat_id] = TokenBucket(PER_CHAT_RATE, PER_CHAT_BURST)
+        return self.chats[chat_id]
+
+    def _with_db(self, fn, *args, **kw):
+        db = self.session_factory()
+        try:
+            return fn(db, *args, **kw)
+        finally:
+            db.close()
+
+    async def drain_once(self) -> float:
+        """Send what the buckets allow now. Returns seconds until worth trying again.
+
+        Text goes out before this returns; documents are started as
+        background tasks (see join()).
+        """
+        due = await asyncio.to_thread(self._with_db, lambda db: [
+            _detach(db, m) for m in due_messages(db)
+        ])
+        messages = [m for m in due if m.chat_id not in self.uploads]
+        if not messages:
+            if due:
+                return IDLE_POLL_SEC  # only chats with an upload in flight; it wakes us when done
+            return await asyncio.to_thread(self._with_db, seconds_until_due)
+        next_try = IDLE_POLL_SEC
+        for batch in plan(messages):
+            document = batch.document_path or batch.session_id is not None
+            if document and len(self.uploads) >= MAX_UPLOADS:
+                continue  # retried when an upload finishes
+            chat = self._chat(batch.chat_id)
+            now = time.monotonic()
+            wait = max(chat.wait_time(now), self.global_bucket.wait_time(now))
+            if wait > 0:
+                next_try = min(next_try, wait)
+                continue
+            chat.take(now)
+            self.global_bucket.take(now)
+            if document:
+                self.uploads[batch.chat_id] = asyncio.create_task(self._upload(batch, chat))
+            else:
+                await self._send(batch, chat)
+        # Whatever was skipped is due again once a bucket refills
+        return min(next_try, 1 / PER_CHAT_RATE)
+
+    async def _upload(self, batch: Batch, chat: TokenBucket) -> None:
+        try:
+            await self._send(batch, chat)
+        finally:
+            self.uploads.pop(batch.chat_id, None)
+            _wake()  # the chat's next messages, or a document waiting for a free lane
+
+    async def join(self) -> None:
+        """Wait for the documents in flight."""
+        while self.uploads:
+            await asyncio.gather(*self.uploads.values(), return_exceptions=True)
+
+    async def close(self) -> None:
+        """Cancel the documents in flight (they stay pending and go out later)."""
+        for task in self.uploads.values():
+            task.cancel()
+        await self.join()
+
+    async def _send(self, batch: Batch, chat: TokenBucket) -> None:
+        from telegram.error import BadRequest, Forbidden, RetryAfter
+
+        document = None
+
+        async def on_upload(att: Attachment, file_id: str) -> None:
+            await asyncio.to_thread(self._with_db, remember_file, document, att, file_id)
+
+        try:
+            if batch.document_path or batch.session_id is not None:
+                document = await asyncio.to_thread(self._with_db, resolve_document, batch)
+            uploaded, seconds = await send_batch(self.bot, batch, document, on_upload)
+        except RetryAfter as e:
+            seconds = _retry_after_seconds(e)
+            chat.pause(seconds, time.monotonic())
+            logger.warning("Telegram flood control for %s: retry in %.0f s", batch.chat_id, seconds)
+            await asyncio.to_thread(self._with_db, record_failure, batch, str(e), retry_after=seconds)
+        except (Forbidden, BadRequest) as e:
+            await asyncio.to_thread(self._with_db, record_failure, batch, str(e), permanent=True)
+        except Exception as e:
+            await asyncio.to_thread(self._with_db, record_failure, batch, str(e))
+        else:
+            if document and len(document.attachments) > 1:
+                # Volumes are several messages: the chat owes the extra tokens
+                for _ in document.attachments[1:]:
+                    chat.take(time.monotonic())
+            if uploaded:
+                logger.info(
+                    "Uploaded %d bytes to Telegram chat %s in %.1f s", uploaded, batch.chat_id, seconds,
+                )
+            stats = (uploaded, seconds) if document else ()
+            await asyncio.to_thread(self._with_db, record_sent, batch, *stats)
+
+
+def _detach(db: DbSession, msg: OutboxMessage) -> OutboxMessage:
+    db.expunge(msg)
+    return msg
+
+
+async def _run_forever(sender: Sender) -> None:
+    last_purge = 0.0
+    try:
+        while True:
+            delay = IDLE_POLL_SEC
+            _wakeup.clear()  # before draining: a wake meanwhile (an upload done) isn't lost
+            try:
+                if time.monotonic() - last_purge > 3600:
+                    await asyncio.to_thread(sender._with_db, purge)
+                    last_purge = time.monotonic()
+                delay = await sender.drain_once()
+            except Exception as e:
+                logger.error("Telegram outbox error: %s", e)
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        await sender.close()
+
+
+async def start_sender(bot) -> None:
+    """Start draining the outbox through `bot` (called from start_bot)."""
+    global _task, _loop, _wakeup
+    if _task is not None:
+        return
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    _task = asyncio.create_task(_run_forever(Sender(bot)))
+
+
+async def stop_sender() -> None:
+    global _task, _loop, _wakeup
+    if _task:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+    _task = _loop = _wakeup = None
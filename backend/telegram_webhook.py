@@ -0,0 +1,36 @@
+"""Telegram webhook endpoint — updates pushed by Telegram (webhook mode).
+
+Enabled by telegram_webhook_url. The bot's leader registers
+<telegram_webhook_url>/api/telegram/webhook with a secret token; Telegram
+sends that token back in X-Telegram-Bot-Api-Secret-Token on every call,
+so anything without it is rejected. The update goes onto the
+Application's queue and the request returns at once — command handlers
+run after Telegram has its 200.
+"""
+
+import hmac
+
+from fastapi import APIRouter, Header, HTTPException, Request
+
+from backend import telegram_bot
+
+router = APIRouter(prefix="/telegram", tags=["telegram"])
+
+
+@router.post("/webhook")
+async def telegram_webhook(
+    request: Request,
+    x_telegram_bot_api_secret_token: str | None = Header(default=None),
+):
+    if not telegram_bot.webhook_mode():
+        raise HTTPException(status_code=404, detail="Webhook mode is off")
+    if not hmac.compare_digest(x_telegram_bot_api_secret_token or "", telegram_bot.webhook_secret()):
+        raise HTTPException(status_code=403, detail="Bad secret token")
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    if not await telegram_bot.dispatch_update(data):
+        # Not started yet (or shutting down) — Telegram retries later
+        raise HTTPException(status_code=503, detail="Bot not running")
+    return {"ok": True}
@@ -1,12 +1,15 @@
-"""Templates API: CRUD + launch."""
+"""Templates API: CRUD + launch + booking all of a template's slots."""
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
 from sqlalchemy.orm import Session as DbSession
 
+from backend import booking_scheduler
+from backend.bookings import BookingConflict, conflict_report, find_conflicts, validate_window
 from backend.database import get_db
 from backend.auth import get_current_user
-from backend.models import Template, Session, Slot, User
+from backend.models import Booking, Template, Session, Slot, User
+from backend.slots import occupy_check
 
 router = APIRouter(prefix="/templates", tags=["templates"])
 
@@ -35,6 +38,17 @@ class LaunchResult(BaseModel):
     sessions: list[dict]
 
 
+class TemplateBookingCreate(BaseModel):
+    date: str  # "2026-02-14"
+    start_time: str  # "10:00"
+    duration_min: int = 60
+
+
+class TemplateBookingResult(BaseModel):
+    template_id: int
+    booking_ids: list[int]
+
+
 # ── Endpoints ──
 
 @router.get("", response_model=list[TemplateOut])
@@ -147,13 +161,16 @@ def launch_template(
         slot = db.query(Slot).filter(Slot.id == slot_id).first()
         if not slot:
             continue
-        # Check if already occupied
-        active = db.query(Session).filter(Session.slot_id == slot_id, Session.ended_at == None).first()
-        if active:
-            sessions_created.append({"slot_id": slot_id, "status": "occupied", "occupant": active.user.name})
+        # Same rules as occupying the slot by hand
+        blocked, ends_by = occupy_check(db, slot_id, user)
+        if blocked:
+            result = {"slot_id": slot_id, "status": blocked.status, "detail": blocked.detail}
+            if blocked.occupant:
+                result["occupant"] = blocked.occupant
+            sessions_created.append(result)
             continue
 
-        session = Session(user_id=user.id, slot_id=slot_id)
+        session = Session(user_id=user.id, slot_id=slot_id, ends_by=ends_by)
         db.add(session)
         db.flush()
         sessions_created.append({
@@ -166,3 +183,48 @@ def launch_template(
     db.commit()
 
     return LaunchResult(template_id=template_id, sessions=sessions_created)
+
+
+@router.post("/{template_id}/book", response_model=TemplateBookingResult, status_code=201)
+def book_template(
+    template_id: int,
+    body: TemplateBookingCreate,
+    db: DbSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Book every slot of a template for the same time — all or nothing.
+
+    On a conflict nothing is booked; the 409 lists every clashing booking
+    across the template's slots (with who booked it, for admins).
+    """
+    tpl = db.query(Template).filter(Template.id == template_id).first()
+    if not tpl:
+        raise HTTPException(status_code=404, detail="Шаблон не найден")
+    slot_ids = [s.id for s in db.query(Slot).filter(Slot.id.in_(tpl.slot_ids or [])).all()]
+    if not slot_ids:
+        raise HTTPException(status_code=400, detail="В шаблоне нет слотов")
+
+    start, end = validate_window(body.date, body.start_time, body.duration_min)
+    conflicts = find_conflicts(db, slot_ids, start, end)
+    if conflicts:
+        report: list[BookingConflict] = conflict_report(conflicts, user)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "message": f"Конфликт бронирования в слотах: {', '.join(sorted({c.slot_id for c in report}))}",
+                "conflicts": [c.model_dump() for c in report],
+            },
+        )
+
+    bookings = [
+        Booking(
+            user_id=user.id, slot_id=slot_id, date=body.date, start_time=body.start_time,
+            duration_min=body.duration_min, starts_at=start, ends_at=end,
+        )
+        for slot_id in slot_ids
+    ]
+    db.add_all(bookings)
+    db.commit()
+    for booking in bookings:
+        booking_scheduler.schedule(booking)
+    return TemplateBookingResult(template_id=template_id, booking_ids=[b.id for b in bookings])
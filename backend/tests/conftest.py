@@ -1,14 +1,21 @@
 """Shared test fixtures for backend tests."""
 
+import io
+import os
+import sqlite3
+import tarfile
+from datetime import datetime, timedelta
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from backend import availability, dump, dump_store, reservations
 from backend.database import Base, get_db
 from backend.main import app
 from backend.auth import hash_password
-from backend.models import User, Slot
+from backend.models import Session, User, Slot
 
 
 # In-memory SQLite for tests
@@ -34,6 +41,8 @@ def setup_db():
     Base.metadata.create_all(bind=engine)
     yield
     Base.metadata.drop_all(bind=engine)
+    reservations.clear()  # cached per slot id, which the next test reuses
+    availability.clear()
 
 
 @pytest.fixture
@@ -106,3 +115,73 @@ def get_auth_header(client, username: str, password: str) -> dict:
     })
     token = resp.json()["token"]
     return {"Authorization": f"Bearer {token}"}
+
+
+# ── Sessions and dumps ──
+
+def ended_session(db, user, slot, **kw) -> Session:
+    """A 30-minute session of `user` on `slot` that has just ended."""
+    now = datetime.utcnow()
+    session = Session(
+        user_id=user.id, slot_id=slot.id,
+        started_at=now - timedelta(minutes=30), ended_at=now, **kw,
+    )
+    db.add(session)
+    db.commit()
+    return session
+
+
+def chrome_history(path, visits: int) -> bytes:
+    """Chrome-like History DB; later sessions = same profile, more visits."""
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE IF NOT EXISTS urls (id INTEGER PRIMARY KEY, url TEXT, title TEXT, last_visit_time INTEGER)")
+    db.execute("CREATE INDEX IF NOT EXISTS urls_url ON urls (url)")
+    have = db.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+    for i in range(have, visits):
+        db.execute(
+            "INSERT INTO urls (url, title, last_visit_time) VALUES (?, ?, ?)",
+            (f"https://perplexity.ai/search/{i}-{os.urandom(6).hex()}", f"Research note {i} " * 4, i),
+        )
+    db.commit()
+    db.close()
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def make_archive(path, session_id: int, files: dict[str, bytes]) -> str:
+    """A dump archive (.tar.gz) of `files`, laid out as collect_dump.sh does."""
+    with tarfile.open(path, "w:gz") as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(f"session_{session_id}_dump/{name}")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return str(path)
+
+
+def dump_archives(tmp_path, count: int) -> list[tuple[int, str, dict]]:
+    """A slot's dumps over a working week: growing History, fresh screenshots."""
+    out = []
+    history = tmp_path / "History"
+    for sid in range(1, count + 1):
+        files = {
+            "History": chrome_history(history, 1500 + sid * 40),
+            "screenshot.png": os.urandom(40_000),
+            "tabs.txt": f"https://perplexity.ai/search/{sid}|Tab\n".encode() * 30,
+            "metadata.json": b'{"tabs_count": 30, "files_count": 0}',
+        }
+        out.append((sid, make_archive(tmp_path / f"s{sid}.tar.gz", sid, files), files))
+    return out
+
+
+@pytest.fixture
+def stored_dump(db, tmp_path, monkeypatch, regular_user, sample_slot):
+    """A session of a user with Telegram linked, with a ~200 KB chunk-store dump."""
+    monkeypatch.setattr(dump, "DUMP_STORAGE", tmp_path / "dumps")
+    regular_user[0].telegram_id = "owner"
+    session = Session(user_id=regular_user[0].id, slot_id=sample_slot.id, ended_at=datetime.utcnow())
+    db.add(session)
+    db.commit()
+    files = {"screenshot.png": os.urandom(200_000), "tabs.txt": b"https://perplexity.ai/|Perplexity\n"}
+    manifest = dump_store.ingest_archive(db, session.id, make_archive(tmp_path / "d.tar.gz", session.id, files))
+    dump.save_dump_path(db, session.id, str(manifest))
+    return session
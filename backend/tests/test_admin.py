@@ -1,6 +1,7 @@
-"""Tests for admin endpoints: users, stats, slots CRUD."""
+"""Tests for admin endpoints: users, stats, slots CRUD, dump forwarding."""
 
 import pytest
+from backend.models import OutboxMessage
 from backend.tests.conftest import get_auth_header
 
 
@@ -98,3 +99,18 @@ class TestAdminSlotsCRUD:
             "service_name": "Test",
         })
         assert resp.status_code == 404
+
+
+class TestDumpForward:
+    def test_forward_queues_to_admin_chat(self, client, db, admin_user, stored_dump):
+        admin, password = admin_user
+        headers = get_auth_header(client, "admin", password)
+        url = f"/api/admin/sessions/{stored_dump.id}/dump/forward"
+        assert client.post(url, headers=headers, json={}).status_code == 400  # no Telegram linked
+
+        resp = client.post(url, headers=headers, json={"chat_id": "555"})
+        assert resp.status_code == 202
+        msg = db.get(OutboxMessage, resp.json()["message_id"])
+        assert (msg.chat_id, msg.session_id) == ("555", stored_dump.id)
+        missing = client.post("/api/admin/sessions/999/dump/forward", headers=headers, json={"chat_id": "555"})
+        assert missing.status_code == 404
@@ -0,0 +1,274 @@
+"""Tests for the booking scheduler: heap, reminders, handover, expiry, ownership."""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import booking_scheduler, leases
+from backend.bookings import booking_window
+from backend.models import Booking, OutboxMessage, QueueEntry, Session, Slot, Template
+from backend.tests.conftest import TestSession, get_auth_header
+
+NOW = datetime(2099, 12, 31, 9, 0)
+
+
+@pytest.fixture(autouse=True)
+def scheduler_db(monkeypatch):
+    monkeypatch.setattr(booking_scheduler, "SessionLocal", TestSession)
+    monkeypatch.setattr("backend.telegram_outbox.SessionLocal", TestSession)
+    booking_scheduler.timers.clear()
+    yield
+    booking_scheduler.timers.clear()
+
+
+def _booking(db, user, start_time, duration_min=60, date="2099-12-31", **kw):
+    booking = Booking(user_id=user.id, slot_id="ppx-1", date=date, start_time=start_time,
+                      duration_min=duration_min, **kw)
+    booking.starts_at, booking.ends_at = booking_window(booking)
+    db.add(booking)
+    db.commit()
+    return booking
+
+
+class TestTimers:
+    def test_due_in_time_order_and_cancel(self):
+        timers = booking_scheduler.BookingTimers()
+        timers.schedule(1, NOW + timedelta(minutes=10), NOW + timedelta(minutes=70))
+        timers.schedule(2, NOW + timedelta(minutes=6), NOW + timedelta(minutes=20))
+        timers.schedule(3, NOW + timedelta(minutes=7), NOW + timedelta(minutes=30))
+        timers.unschedule(3)
+
+        assert timers.next_at() == NOW + timedelta(minutes=1)
+        assert not any(timers.pop_due(NOW).values())
+        assert timers.pop_due(NOW + timedelta(minutes=5)) == {"remind": [2, 1], "start": [], "no_show": [], "expire": []}
+        # 2 ends before its no-show check is due
+        assert timers.pop_due(NOW + timedelta(hours=2)) == {"remind": [], "start": [2, 1], "no_show": [1], "expire": [2, 1]}
+        assert timers.next_at() is None
+
+
+class TestFire:
+    def test_reminder_then_expiry(self, db, regular_user, sample_slot):
+        user = regular_user[0]
+        user.telegram_id = "42"
+        soon = _booking(db, user, "09:04")
+        later = _booking(db, user, "11:00")
+        _booking(db, user, "09:02", status="cancelled")
+        assert booking_scheduler.load(db, NOW) == 2
+
+        assert asyncio.run(booking_scheduler.run_due(NOW)) == 1
+        msg, = db.query(OutboxMessage).all()
+        assert msg.chat_id == "42" and "09:04" in msg.text
+        db.expire_all()
+        assert db.get(Booking, soon.id).reminded_at is not None
+
+        # A takeover reloads the heap; nobody is reminded twice
+        booking_scheduler.load(db, NOW)
+        assert asyncio.run(booking_scheduler.run_due(NOW + timedelta(minutes=3))) == 0
+
+        asyncio.run(booking_scheduler.run_due(NOW + timedelta(hours=3)))
+        db.expire_all()
+        assert db.get(Booking, soon.id).status == "expired"
+        assert db.get(Booking, later.id).status == "expired"
+        assert db.query(OutboxMessage).count() == 2  # 11:00 reminded on the way
+
+    def test_past_bookings_expire_without_reminder(self, db, regular_user, sample_slot):
+        past = _booking(db, regular_user[0], "10:00", date="2099-12-30")
+        booking_scheduler.load(db, NOW)
+        asyncio.run(booking_scheduler.run_due(NOW))
+        db.expire_all()
+        assert db.get(Booking, past.id).status == "expired"
+        assert db.query(OutboxMessage).count() == 0
+
+    def test_failed_round_retried(self, db, regular_user, sample_slot, monkeypatch):
+        user = regular_user[0]
+        user.telegram_id = "42"
+        booking = _booking(db, user, "09:04")
+        booking_scheduler.load(db, NOW)
+        fire = booking_scheduler.fire
+
+        def locked(*a):
+            raise RuntimeError("database is locked")
+        monkeypatch.setattr(booking_scheduler, "fire", locked)
+        with pytest.raises(RuntimeError):
+            asyncio.run(booking_scheduler.run_due(NOW))
+        assert booking_scheduler.timers.next_at() == NOW + booking_scheduler.RETRY_AFTER  # back, not lost
+
+        monkeypatch.setattr(booking_scheduler, "fire", fire)
+        assert asyncio.run(booking_scheduler.run_due(NOW + timedelta(seconds=1))) == 0
+        assert asyncio.run(booking_scheduler.run_due(NOW + booking_scheduler.RETRY_AFTER)) == 1
+        db.expire_all()
+        assert db.get(Booking, booking.id).reminded_at is not None
+
+    def test_catch_up_and_cancelled_elsewhere(self, db, regular_user, sample_slot):
+        booking_scheduler.load(db, NOW)
+        made_elsewhere = _booking(db, regular_user[0], "09:30")
+        assert booking_scheduler.catch_up(db, NOW) == 1
+        assert booking_scheduler.catch_up(db, NOW) == 0
+
+        made_elsewhere.status = "cancelled"
+        db.commit()
+        asyncio.run(booking_scheduler.run_due(NOW + timedelta(hours=1)))
+        db.expire_all()
+        assert db.get(Booking, made_elsewhere.id).status == "cancelled"
+
+    def test_catch_up_despite_later_id_scheduled_here(self, db, regular_user, sample_slot):
+        booking_scheduler.load(db, NOW)
+        made_elsewhere = _booking(db, regular_user[0], "09:30")
+        made_here = _booking(db, regular_user[0], "11:00")
+        booking_scheduler.schedule(made_here)  # a higher id, scheduled before the poll
+        assert made_here.id > made_elsewhere.id
+        assert booking_scheduler.catch_up(db, NOW) == 1
+        assert made_elsewhere.id in booking_scheduler.timers
+
+    def test_catch_up_waits_for_the_horizon(self, db, regular_user, sample_slot):
+        booking_scheduler.load(db, NOW)
+        _booking(db, regular_user[0], "09:00", date="2100-01-05")
+        assert booking_scheduler.catch_up(db, NOW) == 0
+        later = NOW + timedelta(days=5) - booking_scheduler.CATCH_UP_AHEAD
+        assert booking_scheduler.catch_up(db, later) == 1
+
+
+class TestApiHooks:
+    def test_create_and_cancel_update_heap(self, client, regular_user, sample_slot):
+        headers = get_auth_header(client, "testuser", regular_user[1])
+        resp = client.post("/api/bookings", headers=headers, json={
+            "slot_id": "ppx-1", "date": "2099-12-31", "start_time": "10:00", "duration_min": 30,
+        })
+        assert booking_scheduler.timers.next_at() == datetime(2099, 12, 31, 9, 55)
+        client.delete(f"/api/bookings/{resp.json()['id']}", headers=headers)
+        assert booking_scheduler.timers.next_at() is None
+
+    def test_booking_timezone(self, db, regular_user, monkeypatch):
+        from backend.bookings import booking_window
+        monkeypatch.setattr("backend.config.settings.booking_timezone", "Europe/Moscow")
+        booking = Booking(date="2099-12-31", start_time="10:00", duration_min=90)
+        assert booking_window(booking) == (datetime(2099, 12, 31, 7, 0), datetime(2099, 12, 31, 8, 30))
+
+
+def test_only_lease_holder_runs(db, regular_user, sample_slot):
+    past = _booking(db, regular_user[0], "10:00", date="2020-01-01")
+
+    async def run_briefly():
+        await booking_scheduler.start_scheduler()
+        await asyncio.sleep(0.3)
+        await booking_scheduler.stop_scheduler()
+
+    leases.acquire(db, booking_scheduler.LEASE, booking_scheduler.LEASE_TTL, holder="other worker")
+    asyncio.run(run_briefly())
+    db.expire_all()
+    assert db.get(Booking, past.id).status == "active"
+
+    leases.release(db, booking_scheduler.LEASE, holder="other worker")
+    asyncio.run(run_briefly())
+    db.expire_all()
+    assert db.get(Booking, past.id).status == "expired"
+    assert leases.holder_of(db, booking_scheduler.LEASE) is None  # released on stop
+
+
+def _window(db, user, start, minutes=60, slot_id="ppx-1"):
+    """A booking of the slot from `start` (naive UTC), with its interval columns set."""
+    booking = Booking(user_id=user.id, slot_id=slot_id, date=f"{start:%Y-%m-%d}", start_time=f"{start:%H:%M}",
+                      duration_min=minutes, starts_at=start, ends_at=start + timedelta(minutes=minutes))
+    db.add(booking)
+    db.commit()
+    return booking
+
+
+class TestWalkUp:
+    def test_occupy_blocked_or_limited_by_booking(self, client, db, admin_user, regular_user, sample_slot):
+        now = datetime.utcnow().replace(microsecond=0)
+        booking = _window(db, admin_user[0], now + timedelta(minutes=10))
+        user_headers = get_auth_header(client, "testuser", regular_user[1])
+        admin_headers = get_auth_header(client, "admin", admin_user[1])
+
+        resp = client.post("/api/slots/ppx-1/occupy", headers=user_headers)
+        assert resp.status_code == 409 and "забронирован" in resp.json()["detail"]
+        slot, = client.get("/api/slots", headers=user_headers).json()
+        assert (slot["available"], slot["reserved_for"]) == (False, "Admin")
+        assert client.post("/api/slots/ppx-1/queue", headers=user_headers).status_code == 200
+
+        resp = client.post("/api/slots/ppx-1/occupy", headers=admin_headers)  # the booker
+        assert resp.status_code == 200 and resp.json()["ends_by"] is None
+        client.post("/api/slots/ppx-1/release", headers=admin_headers)
+
+        booking.starts_at = now + timedelta(hours=2)
+        booking.ends_at = now + timedelta(hours=3)
+        db.commit()
+        resp = client.post("/api/slots/ppx-1/occupy", headers=user_headers)
+        assert resp.status_code == 200
+        assert resp.json()["ends_by"] == booking.starts_at.isoformat()
+
+    def test_template_launch_follows_occupy_rules(self, client, db, admin_user, regular_user, sample_slot):
+        db.add(Slot(id="nb-1", service_name="NotebookLM", category="AI Research", is_active=True))
+        tpl = Template(name="Research", slot_ids=["ppx-1", "nb-1"])
+        db.add(tpl)
+        db.commit()
+        now = datetime.utcnow().replace(microsecond=0)
+        _window(db, admin_user[0], now + timedelta(minutes=10))
+        later = _window(db, admin_user[0], now + timedelta(hours=2), slot_id="nb-1")
+
+        headers = get_auth_header(client, "testuser", regular_user[1])
+        resp = client.post(f"/api/templates/{tpl.id}/launch", headers=headers)
+        assert resp.status_code == 200
+        booked, launched = resp.json()["sessions"]
+        assert booked["status"] == "booked" and "забронирован" in booked["detail"]
+        assert launched["status"] == "ok"
+        session = db.get(Session, launched["session_id"])
+        assert session.slot_id == "nb-1" and session.ends_by == later.starts_at
+        assert db.query(Session).count() == 1
+
+
+class TestHandover:
+    def test_walk_up_warned_then_preempted(self, db, admin_user, regular_user, sample_slot):
+        booker, walker = admin_user[0], regular_user[0]
+        booker.telegram_id, walker.telegram_id = "1", "2"
+        booking = _window(db, booker, NOW)
+        session = Session(user_id=walker.id, slot_id="ppx-1", started_at=NOW - timedelta(hours=1))
+        db.add(session)
+        db.commit()
+
+        booking_scheduler.fire(db, {"remind": [booking.id]}, NOW - timedelta(minutes=5))
+        assert [m.chat_id for m in db.query(OutboxMessage)] == ["2"]  # the reminder itself goes via run_due
+
+        _, events = booking_scheduler.fire(db, {"start": [booking.id]}, NOW)
+        db.expire_all()
+        ended = db.get(Session, session.id)
+        assert (ended.ended_at, ended.end_reason) == (NOW, "preempted")
+        assert events == [("slot_reserved", {
+            "slot_id": "ppx-1", "next_in_queue": "Admin", "hold_until": booking.ends_at.isoformat(),
+        })]
+        texts = {m.chat_id: m.text for m in db.query(OutboxMessage).order_by(OutboxMessage.id)}
+        assert "завершена" in texts["2"] and "Бронь началась" in texts["1"]
+
+    def test_no_show_frees_slot_for_queue(self, db, admin_user, regular_user, sample_slot):
+        booker, waiting = admin_user[0], regular_user[0]
+        booker.telegram_id = "1"
+        booking = _window(db, booker, NOW)
+        shown = _window(db, booker, NOW + timedelta(hours=2))
+        db.add(QueueEntry(user_id=waiting.id, slot_id="ppx-1", position=1))
+        db.commit()
+
+        late = NOW + booking_scheduler.NO_SHOW_AFTER
+        _, events = booking_scheduler.fire(db, {"no_show": [booking.id]}, late)
+        db.expire_all()
+        assert db.get(Booking, booking.id).status == "expired"
+        assert events[0][0] == "slot_reserved" and events[0][1]["next_in_queue"] == "Test User"
+        assert db.query(QueueEntry).one().hold_until is not None
+        assert "Бронь снята" in db.query(OutboxMessage).one().text
+
+        db.add(Session(user_id=booker.id, slot_id="ppx-1", started_at=shown.starts_at))
+        db.commit()
+        booking_scheduler.fire(db, {"no_show": [shown.id]}, shown.starts_at + booking_scheduler.NO_SHOW_AFTER)
+        db.expire_all()
+        assert db.get(Booking, shown.id).status == "active"
+
+    def test_no_show_checked_after_downtime(self, db, admin_user, sample_slot):
+        booking = _window(db, admin_user[0], NOW)
+        back = NOW + 2 * booking_scheduler.NO_SHOW_AFTER  # past the no-show deadline, before the end
+        booking_scheduler.load(db, back)
+        due = booking_scheduler.timers.pop_due(back)
+        assert (due["start"], due["no_show"]) == ([], [booking.id])  # too late to hand over
+        booking_scheduler.fire(db, due, back)
+        db.expire_all()
+        assert db.get(Booking, booking.id).status == "expired"
@@ -1,7 +1,14 @@
-"""Tests for bookings endpoints: create, list, cancel, conflict detection."""
+"""Tests for bookings endpoints: create, list, cancel, conflict detection, template booking, availability."""
+
+import base64
+from datetime import date, datetime, timedelta
 
 import pytest
-from backend.tests.conftest import get_auth_header
+from sqlalchemy import event, text
+
+from backend import availability
+from backend.models import Booking, Slot, Template
+from backend.tests.conftest import engine, get_auth_header
 
 
 class TestCreateBooking:
@@ -33,6 +40,17 @@ class TestCreateBooking:
         })
         assert resp.status_code == 400
 
+    def test_create_booking_earlier_today(self, client, regular_user, sample_slot):
+        headers = get_auth_header(client, "testuser", regular_user[1])
+        started = datetime.utcnow() - timedelta(hours=1)  # booking_timezone is UTC here
+        resp = client.post("/api/bookings", headers=headers, json={
+            "slot_id": "ppx-1",
+            "date": f"{started:%Y-%m-%d}",
+            "start_time": f"{started:%H:%M}",
+            "duration_min": 120,
+        })
+        assert resp.status_code == 400
+
     def test_create_booking_invalid_time(self, client, regular_user, sample_slot):
         user, password = regular_user
         headers = get_auth_header(client, "testuser", password)
@@ -188,3 +206,164 @@ class TestCancelBooking:
             "duration_min": 60,
         })
         assert resp.status_code == 201
+
+
+def _book(client, headers, slot_id="ppx-1", start_time="10:00", duration_min=60, date="2099-12-31"):
+    return client.post("/api/bookings", headers=headers, json={
+        "slot_id": slot_id, "date": date, "start_time": start_time, "duration_min": duration_min,
+    })
+
+
+class TestConflictIndex:
+    def test_conflict_message_has_real_end_time(self, client, regular_user, sample_slot):
+        headers = get_auth_header(client, "testuser", regular_user[1])
+        _book(client, headers, start_time="10:15", duration_min=90)
+        resp = _book(client, headers, start_time="11:00")
+        assert resp.status_code == 409
+        assert resp.json()["detail"] == "Конфликт с бронью 10:15–11:45"
+
+    def test_overlap_across_midnight(self, client, regular_user, sample_slot):
+        headers = get_auth_header(client, "testuser", regular_user[1])
+        assert _book(client, headers, start_time="23:30", duration_min=60, date="2099-12-30").status_code == 201
+        resp = _book(client, headers, start_time="00:00", date="2099-12-31")
+        assert resp.status_code == 409 and resp.json()["detail"].endswith("00:30 (+1)")
+        assert _book(client, headers, start_time="00:30", date="2099-12-31").status_code == 201
+
+    def test_rejects_bad_duration(self, client, regular_user, sample_slot):
+        headers = get_auth_header(client, "testuser", regular_user[1])
+        assert _book(client, headers, duration_min=0).status_code == 400
+        assert _book(client, headers, start_time="25:00").status_code == 400
+
+    def test_overlap_query_uses_index(self, db):
+        # The predicate find_conflicts() builds
+        start = datetime(2099, 12, 31, 10)
+        stmt = (
+            db.query(Booking).filter(
+                Booking.slot_id.in_(["ppx-1"]), Booking.status == "active",
+                Booking.starts_at > start - timedelta(days=1), Booking.starts_at < start + timedelta(hours=1),
+                Booking.ends_at > start,
+            ).statement.compile(compile_kwargs={"literal_binds": True})
+        )
+        plan = " ".join(row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {stmt}")))
+        assert "ix_bookings_slot_status_start" in plan and "starts_at>" in plan.replace(" ", "")
+
+
+class TestTemplateBooking:
+    @pytest.fixture
+    def template(self, db, sample_slot):
+        db.add(Slot(id="nb-1", service_name="NotebookLM", category="AI Research", is_active=True))
+        tpl = Template(name="Research", slot_ids=["ppx-1", "nb-1"])
+        db.add(tpl)
+        db.commit()
+        return tpl
+
+    def test_books_all_slots_or_reports_every_conflict(self, client, db, admin_user, regular_user, template):
+        user_headers = get_auth_header(client, "testuser", regular_user[1])
+        admin_headers = get_auth_header(client, "admin", admin_user[1])
+        url = f"/api/templates/{template.id}/book"
+        body = {"date": "2099-12-31", "start_time": "10:00", "duration_min": 60}
+
+        _book(client, admin_headers, "ppx-1", "09:30")
+        _book(client, admin_headers, "nb-1", "10:45", 30)
+        resp = client.post(url, headers=user_headers, json=body)
+        assert resp.status_code == 409
+        conflicts = resp.json()["detail"]["conflicts"]
+        assert [(c["slot_id"], c["start_time"], c["end_time"]) for c in conflicts] == [
+            ("nb-1", "10:45", "11:15"), ("ppx-1", "09:30", "10:30"),
+        ]
+        assert all(c["user_name"] is None for c in conflicts)  # not theirs to see
+        assert db.query(Booking).filter(Booking.user_id == regular_user[0].id).count() == 0
+
+        conflicts = client.post(url, headers=admin_headers, json=body).json()["detail"]["conflicts"]
+        assert {c["user_name"] for c in conflicts} == {"Admin"}
+
+        body["start_time"] = "12:00"
+        resp = client.post(url, headers=user_headers, json=body)
+        assert resp.status_code == 201 and len(resp.json()["booking_ids"]) == 2
+
+
+@pytest.fixture
+def statements():
+    """SQL statements executed while the fixture is active."""
+    seen = []
+
+    def record(conn, cursor, statement, *_):
+        seen.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    yield seen
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def _busy_cells(bitmap: str) -> list[int]:
+    data = base64.b64decode(bitmap)
+    return [i for i in range(len(data) * 8) if data[i // 8] >> (i % 8) & 1]
+
+
+class TestAvailability:
+    def test_bookings_and_sessions_in_one_grid(self, client, db, regular_user, sample_slot):
+        headers = get_auth_header(client, "testuser", regular_user[1])
+        db.add(Slot(id="nb-1", service_name="NotebookLM", category="AI Research", is_active=True))
+        db.commit()
+        day = date.today() + timedelta(days=30)
+        _book(client, headers, "ppx-1", "10:00", 60, date=f"{day}")
+        _book(client, headers, "ppx-1", "23:50", 30, date=f"{day}")  # into the next day
+
+        resp = client.get(f"/api/bookings/availability?from={day}&to={day + timedelta(days=1)}", headers=headers)
+        assert resp.status_code == 200
+        grid = resp.json()
+        assert (grid["cell_min"], grid["cells"], grid["start"]) == (15, 192, f"{day}T00:00:00")
+        assert _busy_cells(grid["slots"]["ppx-1"]) == [40, 41, 42, 43, 95, 96, 97]
+        assert _busy_cells(grid["slots"]["nb-1"]) == []
+
+        # A running session makes its slot busy now — on today's grid
+        client.post("/api/slots/nb-1/occupy", headers=headers)
+        today = datetime.utcnow()
+        resp = client.get(f"/api/bookings/availability?from={today:%Y-%m-%d}&slots=nb-1", headers=headers)
+        assert list(resp.json()["slots"]) == ["nb-1"]
+        assert (today.hour * 60 + today.minute) // 15 in _busy_cells(resp.json()["slots"]["nb-1"])
+
+    def test_cached_per_day_and_invalidated(self, client, db, regular_user, sample_slot, statements):
+        headers = get_auth_header(client, "testuser", regular_user[1])
+        day = date.today() + timedelta(days=30)
+        url = f"/api/bookings/availability?from={day}&slots=ppx-1"
+        client.get(url, headers=headers)
+        statements.clear()
+        client.get(url, headers=headers)
+        assert not any("FROM bookings" in s for s in statements)
+
+        booking = _book(client, headers, "ppx-1", "10:00", date=f"{day}").json()
+        assert _busy_cells(client.get(url, headers=headers).json()["slots"]["ppx-1"]) == [40, 41, 42, 43]
+        client.delete(f"/api/bookings/{booking['id']}", headers=headers)
+        assert _busy_cells(client.get(url, headers=headers).json()["slots"]["ppx-1"]) == []
+
+    def test_cell_marked_from_its_first_second(self):
+        origin = datetime(2099, 12, 31)
+        mark = lambda start, end: availability._mark(0, origin, 96, origin + start, origin + end)
+        assert mark(timedelta(hours=10), timedelta(hours=10, seconds=30)) == 1 << 40
+        assert mark(timedelta(hours=9, minutes=50), timedelta(hours=10)) == 1 << 39
+        assert mark(timedelta(hours=9, minutes=59), timedelta(hours=10, seconds=1)) == 0b11 << 39
+
+    def test_rejects_bad_range(self, client, regular_user):
+        headers = get_auth_header(client, "testuser", regular_user[1])
+        assert client.get("/api/bookings/availability?from=2099-12-31&to=2099-12-01", headers=headers).status_code == 400
+        assert client.get("/api/bookings/availability?from=soon", headers=headers).status_code == 400
+        for far in ("9999-12-31", "0001-01-01", f"{date.today() + timedelta(days=3 * 366)}"):
+            assert client.get(f"/api/bookings/availability?from={far}", headers=headers).status_code == 400
+
+    def test_expired_days_pruned(self, client, regular_user, sample_slot, monkeypatch):
+        headers = get_auth_header(client, "testuser", regular_user[1])
+        monkeypatch.setattr(availability, "CACHE_TTL_SEC", -1)  # expired as soon as cached
+        client.get(f"/api/bookings/availability?from={date.today()}", headers=headers)
+        assert len(availability._cache) == 1
+        client.get(f"/api/bookings/availability?from={date.today() + timedelta(days=1)}", headers=headers)
+        assert list(availability._cache) == [("ppx-1", date.today() + timedelta(days=1))]
+
+    def test_rolled_back_booking_keeps_cache(self, db, regular_user, sample_slot):
+        day = date.today() + timedelta(days=1)
+        availability.grid(db, ["ppx-1"], day, day)
+        start = datetime.combine(day, datetime.min.time())
+        db.add(Booking(user_id=regular_user[0].id, slot_id="ppx-1", date=f"{day}", start_time="00:00",
+                       starts_at=start, ends_at=start + timedelta(hours=1)))
+        db.flush()
+        db.rollback()
+        assert ("ppx-1", day) in availability._cache
@@ -0,0 +1,197 @@
+"""Tests for streamed dump collection: checksum verification and resume.
+
+The real scripts/collect_dump.sh runs locally through a fake SSH pool, so
+the archive bytes, checksum and offsets are exactly what a VM would send.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import tarfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+from backend import dump, dump_store
+
+SCRIPT = Path(__file__).resolve().parents[2] / "scripts" / "collect_dump.sh"
+SESSION_ID = 987001
+
+pytestmark = pytest.mark.skipif(
+    not (shutil.which("sqlite3") and shutil.which("bash")),
+    reason="needs bash + sqlite3 to run collect_dump.sh",
+)
+
+
+class LocalChannel:
+    """Channel-like wrapper over a local subprocess; can drop after N bytes."""
+
+    def __init__(self, proc, cut_after: int | None):
+        self.proc = proc
+        self.cut_after = cut_after
+        self.sent = 0
+
+    def recv(self, n):
+        if self.cut_after is not None and self.sent >= self.cut_after:
+            raise TimeoutError("connection dropped")
+        if self.cut_after is not None:
+            n = min(n, self.cut_after - self.sent)
+        data = self.proc.stdout.read1(n)
+        self.sent += len(data)
+        return data
+
+    def recv_exit_status(self):
+        return self.proc.wait()
+
+
+class LocalPool:
+    def __init__(self, home: Path):
+        self.env = {**os.environ, "HOME": str(home)}
+        self.cut_after: int | None = None
+        self.commands: list[str] = []
+
+    def exec(self, host, command, user, key_path=None, **kw):
+        self.commands.append(command)
+        proc = subprocess.run(command, shell=True, capture_output=True, env=self.env)
+        return proc.returncode, proc.stdout, proc.stderr
+
+    @contextmanager
+    def open_channel(self, host, command, user, key_path=None, timeout=None, **kw):
+        self.commands.append(command)
+        proc = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, env=self.env)
+        try:
+            yield LocalChannel(proc, self.cut_after)
+        finally:
+            proc.kill()
+            proc.wait()
+
+
+@pytest.fixture
+def vm_home(tmp_path):
+    home = tmp_path / "home"
+    profile = home / ".config" / "google-chrome" / "Default"
+    profile.mkdir(parents=True)
+    (home / "Downloads").mkdir()
+    db = sqlite3.connect(profile / "History")
+    db.execute("CREATE TABLE urls (id INTEGER PRIMARY KEY, url TEXT, title TEXT, last_visit_time INTEGER)")
+    db.execute("CREATE TABLE downloads (id INTEGER PRIMARY KEY, target_path TEXT, start_time INTEGER)")
+    now = int((time.time() + 11644473600) * 1_000_000)
+    for i in range(40):
+        db.execute(
+            "INSERT INTO urls (url, title, last_visit_time) VALUES (?, ?, ?)",
+            (f"https://example.com/page/{i}", os.urandom(200).hex(), now - i * 1_000_000),
+        )
+    db.commit()
+    db.close()
+    return home
+
+
+@pytest.fixture
+def local_pool(vm_home, tmp_path, monkeypatch):
+    pool = LocalPool(vm_home)
+    monkeypatch.setattr(dump, "pool", pool)
+    monkeypatch.setattr(dump, "COLLECT_SCRIPT", f"bash {SCRIPT}")
+    monkeypatch.setattr(dump, "DUMP_STORAGE", tmp_path / "dumps")
+    monkeypatch.setattr(dump, "STREAM_CHUNK", 1024)
+    yield pool
+    subprocess.run(["bash", str(SCRIPT), "cleanup", str(SESSION_ID)])
+
+
+class TestStreamedCollection:
+    def test_streams_and_verifies(self, local_pool):
+        result = dump.collect_dump(SESSION_ID, "vm")
+        assert "error" not in result, result
+        archive = Path(result["archive_path"])
+        assert archive.stat().st_size == result["archive_size"]
+        assert result["bytes_transferred"] == result["archive_size"]
+        assert result["tabs_count"] == 40
+        assert not archive.with_name(archive.name + ".part").exists()
+        assert json.loads(Path(result["meta_path"]).read_text())["archive_sha256"] == result["archive_sha256"]
+        # staging removed on the VM once verified
+        assert any(" cleanup " in c for c in local_pool.commands)
+
+    def test_interrupted_transfer_resumes(self, local_pool):
+        local_pool.cut_after = 3000
+        first = dump.collect_dump(SESSION_ID, "vm")
+        assert "error" in first
+        part = dump.DUMP_STORAGE / f"session_{SESSION_ID}_dump.part"
+        assert part.stat().st_size == 3000
+
+        local_pool.cut_after = None
+        result = dump.collect_dump(SESSION_ID, "vm")
+        assert "error" not in result, result
+        assert result["resumed_from"] == 3000
+        assert result["bytes_transferred"] == result["archive_size"] - 3000
+        # prepare ran only once: the resumed stream continued the same archive
+        assert sum(" prepare " in c for c in local_pool.commands) == 1
+
+    def test_staging_vetoed_or_reported(self, local_pool):
+        result = dump.collect_dump(SESSION_ID, "vm", may_stage=lambda: False)
+        assert result.get("superseded") is True
+        assert local_pool.commands == []  # nothing captured from the VM
+
+        local_pool.cut_after = 2000
+        staged = []
+        dump.collect_dump(SESSION_ID, "vm", on_staged=lambda: staged.append(1))
+        assert staged == [1]  # before the stream, which failed
+
+    def test_checksum_mismatch_discards_partial(self, local_pool):
+        local_pool.cut_after = 2000
+        dump.collect_dump(SESSION_ID, "vm")
+        part = dump.DUMP_STORAGE / f"session_{SESSION_ID}_dump.part"
+        with open(part, "r+b") as f:  # corrupt what we already have
+            f.write(b"garbage")
+
+        local_pool.cut_after = None
+        result = dump.collect_dump(SESSION_ID, "vm")
+        assert "checksum mismatch" in result["error"]
+        assert not part.exists()
+
+
+class TestDumpFormats:
+    def _members(self, path) -> dict[str, bytes]:
+        with dump_store.open_archive(path) as tar:
+            return {m.name.split("/", 1)[1]: tar.extractfile(m).read() for m in tar if m.isfile()}
+
+    @pytest.mark.skipif(not shutil.which("zstd"), reason="needs zstd")
+    def test_v2_extracts_session_rows_with_zstd(self, local_pool):
+        since = int(time.time()) - 10
+        result = dump.collect_dump(SESSION_ID, "vm", since=since)
+        assert "error" not in result, result
+        assert result["format_version"] == 2
+        assert result["archive_path"].endswith(".tar.zst")
+        members = self._members(result["archive_path"])
+        assert "History" not in members
+        history = json.loads(members["history.json"])
+        assert len(history["urls"]) == result["tabs_count"] <= 11
+        assert history["downloads"] == []
+
+    def test_history_window_ends_at_session_end(self, local_pool, vm_home):
+        until = int(time.time()) - 10  # the next user's visits come after this
+        since = until - 20
+        result = dump.collect_dump(SESSION_ID, "vm", since=since, until=until)
+        assert "error" not in result, result
+        assert result["window_end"] == until
+
+        db = sqlite3.connect(vm_home / ".config" / "google-chrome" / "Default" / "History")
+        bound = lambda t: (t + 11644473600) * 1_000_000
+        (expected,), = db.execute(
+            "SELECT COUNT(*) FROM urls WHERE last_visit_time > ? AND last_visit_time < ?",
+            (bound(since), bound(until + 1)),
+        )
+        db.close()
+        assert 0 < result["tabs_count"] == expected < 40
+        assert f"prepare {SESSION_ID} Default {since} {until}" in local_pool.commands[0]
+
+    def test_v1_ships_full_history_gzip(self, local_pool):
+        local_pool.env["DUMP_FORMAT"] = "1"
+        result = dump.collect_dump(SESSION_ID, "vm")
+        assert "error" not in result, result
+        assert result["format_version"] == 1
+        assert result["archive_path"].endswith(".tar.gz")
+        assert tarfile.is_tarfile(result["archive_path"])
+        assert self._members(result["archive_path"])["History"].startswith(b"SQLite format 3")
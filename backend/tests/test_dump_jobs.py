@@ -0,0 +1,314 @@
+"""Tests for the dump job queue: enqueue on release, claim, retries."""
+
+import io
+import tarfile
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from backend import dump, dump_jobs, dump_search, dump_store, thumbnails
+from backend.config import settings
+from backend.models import DumpJob, Session, SessionDump
+from backend.tests.conftest import TestSession, get_auth_header, make_archive
+
+
+@pytest.fixture
+def dump_host(monkeypatch):
+    monkeypatch.setattr(settings, "dump_ssh_host", "vm.test")
+    monkeypatch.setattr(settings, "dump_max_attempts", 3)
+    monkeypatch.setattr(settings, "dump_retry_base_sec", 30)
+
+
+def _ended_session(db, user, slot) -> Session:
+    session = Session(user_id=user.id, slot_id=slot.id, ended_at=datetime.utcnow())
+    db.add(session)
+    db.commit()
+    return session
+
+
+class TestEnqueue:
+    def test_release_enqueues_dump(self, client, db, dump_host, regular_user, sample_slot):
+        user, password = regular_user
+        headers = get_auth_header(client, "testuser", password)
+        client.post("/api/slots/ppx-1/occupy", headers=headers)
+        resp = client.post("/api/slots/ppx-1/release", headers=headers)
+        assert resp.status_code == 200
+
+        job = db.query(DumpJob).one()
+        assert job.session_id == resp.json()["session_id"]
+        assert job.status == "queued"
+        assert job.vm_host == "vm.test"
+
+    def test_force_release_enqueues_dump(self, client, db, dump_host, admin_user, regular_user, sample_slot):
+        user, user_pass = regular_user
+        client.post("/api/slots/ppx-1/occupy", headers=get_auth_header(client, "testuser", user_pass))
+        admin, admin_pass = admin_user
+        resp = client.post(
+            "/api/slots/ppx-1/force-release", headers=get_auth_header(client, "admin", admin_pass),
+        )
+        assert resp.status_code == 200
+        assert db.query(DumpJob).count() == 1
+
+    def test_occupy_waits_for_staging(self, client, db, dump_host, regular_user, admin_user, sample_slot):
+        client.post("/api/slots/ppx-1/occupy", headers=get_auth_header(client, "testuser", regular_user[1]))
+        client.post("/api/slots/ppx-1/release", headers=get_auth_header(client, "testuser", regular_user[1]))
+        admin_headers = get_auth_header(client, "admin", admin_user[1])
+
+        resp = client.post("/api/slots/ppx-1/occupy", headers=admin_headers)
+        assert resp.status_code == 409 and "сохраняем данные" in resp.json()["detail"]
+        job = db.query(DumpJob).one()
+        job.staged_at = datetime.utcnow()
+        db.commit()
+        assert client.post("/api/slots/ppx-1/occupy", headers=admin_headers).status_code == 200
+
+    def test_slot_let_go_after_stage_wait(self, db, dump_host, regular_user, sample_slot):
+        session = _ended_session(db, regular_user[0], sample_slot)
+        job = dump_jobs.enqueue_dump(db, session)
+        db.commit()
+        assert dump_jobs.staging(db, "ppx-1") == job
+        later = datetime.utcnow() + dump_jobs.STAGE_WAIT
+        assert dump_jobs.staging(db, "ppx-1", now=later) is None
+
+    def test_dispatcher_woken_after_commit(self, db, dump_host, regular_user, sample_slot, monkeypatch):
+        woken = []
+        monkeypatch.setattr(dump_jobs, "_wake", lambda: woken.append(True))
+        session = _ended_session(db, regular_user[0], sample_slot)
+
+        dump_jobs.enqueue_dump(db, session)
+        db.rollback()
+        assert woken == []
+
+        dump_jobs.enqueue_dump(db, session)
+        db.flush()
+        assert woken == []
+        db.commit()
+        assert woken == [True]
+
+    def test_no_host_no_job(self, client, db, regular_user, sample_slot, monkeypatch):
+        monkeypatch.setattr(settings, "dump_ssh_host", "")
+        monkeypatch.setattr(settings, "timeweb_host", "")
+        user, password = regular_user
+        headers = get_auth_header(client, "testuser", password)
+        client.post("/api/slots/ppx-1/occupy", headers=headers)
+        assert client.post("/api/slots/ppx-1/release", headers=headers).status_code == 200
+        assert db.query(DumpJob).count() == 0
+
+
+class TestRunJob:
+    def test_claim_is_exclusive(self, db, dump_host, regular_user, sample_slot):
+        session = _ended_session(db, regular_user[0], sample_slot)
+        dump_jobs.enqueue_dump(db, session)
+        db.commit()
+
+        assert len(dump_jobs.claim_due_jobs(db, 5)) == 1
+        assert dump_jobs.claim_due_jobs(db, 5) == []
+        job = db.query(DumpJob).one()
+        assert job.status == "running"
+        assert job.attempts == 1
+
+    def test_success_ingests_dump(self, db, dump_host, regular_user, sample_slot, monkeypatch, tmp_path):
+        session = _ended_session(db, regular_user[0], sample_slot)
+        dump_jobs.enqueue_dump(db, session)
+        db.commit()
+        (job_id,) = dump_jobs.claim_due_jobs(db, 1)
+        monkeypatch.setattr(dump, "DUMP_STORAGE", tmp_path / "dumps")
+        archive = tmp_path / "x.tar.gz"
+        with tarfile.open(archive, "w:gz") as tar:
+            tabs = b"https://docs.python.org/3/library/asyncio.html|asyncio docs\n"
+            info = tarfile.TarInfo("session_1_dump/tabs.txt")
+            info.size = len(tabs)
+            tar.addfile(info, io.BytesIO(tabs))
+        calls = []
+        monkeypatch.setattr(
+            dump, "collect_dump",
+            lambda *a, **kw: calls.append(kw) or {"archive_path": str(archive), "tabs_count": 3},
+        )
+
+        assert dump_jobs.run_job(job_id, session_factory=TestSession) is True
+        ended = session.ended_at.replace(tzinfo=timezone.utc).timestamp()
+        assert calls[0]["since"] <= calls[0]["until"] == int(ended)  # the session's window
+        db.expire_all()
+        assert db.query(DumpJob).one().status == "done"
+        dump_path = db.query(Session).one().dump_path
+        assert dump_store.is_manifest(dump_path)
+        assert db.query(SessionDump).one().tabs_count == 3
+        assert not archive.exists()  # the chunk store holds it now
+        assert [h["session_id"] for h in dump_search.search(db, "asyncio")] == [session.id]
+
+    def test_success_committed_without_session_row(self, db, dump_host, regular_user, sample_slot, monkeypatch, tmp_path):
+        session = _ended_session(db, regular_user[0], sample_slot)
+        dump_jobs.enqueue_dump(db, session)
+        db.commit()
+        (job_id,) = dump_jobs.claim_due_jobs(db, 1)
+        monkeypatch.setattr(dump, "DUMP_STORAGE", tmp_path / "dumps")
+        archive = tmp_path / "x.tar.gz"
+        with tarfile.open(archive, "w:gz") as tar:
+            info = tarfile.TarInfo("session_1_dump/tabs.txt")
+            tar.addfile(info, io.BytesIO(b""))
+        monkeypatch.setattr(dump, "collect_dump", lambda *a, **kw: {"archive_path": str(archive)})
+        monkeypatch.setattr(dump, "save_dump_path", lambda *a: None)  # the session row is gone
+
+        assert dump_jobs.run_job(job_id, session_factory=TestSession) is True
+        db.expire_all()
+        job = db.query(DumpJob).one()
+        assert job.status == "done" and job.finished_at is not None
+
+    def test_thumbnail_failure_does_not_fail_job(self, db, dump_host, regular_user, sample_slot, monkeypatch, tmp_path):
+        session = _ended_session(db, regular_user[0], sample_slot)
+        dump_jobs.enqueue_dump(db, session)
+        db.commit()
+        (job_id,) = dump_jobs.claim_due_jobs(db, 1)
+        monkeypatch.setattr(dump, "DUMP_STORAGE", tmp_path / "dumps")
+        archive = make_archive(tmp_path / "x.tar.gz", session.id, {thumbnails.SCREENSHOT: b"\x89PNG"})
+        monkeypatch.setattr(dump, "collect_dump", lambda *a, **kw: {"archive_path": archive})
+
+        def broken(*_):
+            raise OSError("disk full")
+        monkeypatch.setattr(thumbnails, "ensure_thumbnail", broken)
+
+        assert dump_jobs.run_job(job_id, session_factory=TestSession) is True
+        db.expire_all()
+        assert db.query(DumpJob).one().status == "done"
+        assert db.query(SessionDump).one().has_screenshot
+
+    def test_failure_retries_with_backoff_then_fails(self, db, dump_host, regular_user, sample_slot, monkeypatch):
+        session = _ended_session(db, regular_user[0], sample_slot)
+        dump_jobs.enqueue_dump(db, session)
+        db.commit()
+        monkeypatch.setattr(dump, "collect_dump", lambda *a, **kw: {"error": "connection refused"})
+
+        delays = []
+        for attempt in range(1, 4):
+            job = db.query(DumpJob).one()
+            job.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)  # due now
+            db.commit()
+            (job_id,) = dump_jobs.claim_due_jobs(db, 1)
+            assert dump_jobs.run_job(job_id, session_factory=TestSession) is False
+            db.expire_all()
+            job = db.query(DumpJob).one()
+            if attempt < 3:
+                assert job.status == "queued"
+                delays.append((job.next_attempt_at - datetime.utcnow()).total_seconds())
+        assert job.status == "failed"
+        assert job.last_error == "connection refused"
+        # 30 s, then 60 s
+        assert 25 < delays[0] <= 30 and 55 < delays[1] <= 60
+
+    def test_slot_reused_before_staging_aborts(self, db, dump_host, regular_user, admin_user, sample_slot, monkeypatch):
+        session = _ended_session(db, regular_user[0], sample_slot)
+        dump_jobs.enqueue_dump(db, session)
+        db.commit()
+
+        def collect(*a, may_stage, on_staged, **kw):
+            if not may_stage():
+                return {"error": "slot reused before the dump was staged", "superseded": True}
+            on_staged()
+            return {"error": "connection reset"}
+        monkeypatch.setattr(dump, "collect_dump", collect)
+
+        (job_id,) = dump_jobs.claim_due_jobs(db, 1)
+        assert dump_jobs.run_job(job_id, session_factory=TestSession) is False
+        db.expire_all()
+        job = db.get(DumpJob, job_id)
+        assert job.status == "queued" and job.staged_at is not None  # streaming may retry
+
+        job.staged_at = None  # say the VM lost the staging dir
+        job.next_attempt_at = datetime.utcnow()
+        _ended_session(db, admin_user[0], sample_slot)  # the next user has been on the slot
+        (job_id,) = dump_jobs.claim_due_jobs(db, 1)
+        assert dump_jobs.run_job(job_id, session_factory=TestSession) is False
+        db.expire_all()
+        assert db.get(DumpJob, job_id).status == "failed"  # no retry
+
+    def test_stale_running_jobs_requeued(self, db, dump_host, regular_user, sample_slot):
+        session = _ended_session(db, regular_user[0], sample_slot)
+        db.add(DumpJob(
+            session_id=session.id, vm_host="vm.test", status="running",
+            started_at=datetime.utcnow() - timedelta(hours=1),
+        ))
+        db.add(DumpJob(
+            session_id=session.id, vm_host="vm.test", status="running",
+            started_at=datetime.utcnow(),
+        ))
+        db.commit()
+        assert dump_jobs.requeue_stale(db) == 1
+
+
+def _queued(db, session, host, **kw) -> DumpJob:
+    job = DumpJob(session_id=session.id, vm_host=host, status="queued",
+                  next_attempt_at=datetime.utcnow() - timedelta(seconds=1), **kw)
+    db.add(job)
+    db.commit()
+    return job
+
+
+class TestScheduling:
+    def test_per_host_and_global_caps(self, db, regular_user, sample_slot):
+        session = _ended_session(db, regular_user[0], sample_slot)
+        for host in ["vm1"] * 5 + ["vm2"] * 2 + ["vm3"]:
+            _queued(db, session, host)
+        db.add(DumpJob(session_id=session.id, vm_host="vm2", status="running", started_at=datetime.utcnow()))
+        db.commit()
+
+        claimed = dump_jobs.claim_due_jobs(db, 10, per_host=2)
+        hosts = [db.get(DumpJob, i).vm_host for i in claimed]
+        assert sorted(hosts) == ["vm1", "vm1", "vm2", "vm3"]
+        # vm1 is full now; nothing else may start there
+        assert dump_jobs.claim_due_jobs(db, 10, per_host=2) == []
+        db.query(DumpJob).filter(DumpJob.status == "running").update({"status": "done"})
+        db.commit()
+        assert len(dump_jobs.claim_due_jobs(db, 1, per_host=2)) == 1  # global limit
+
+    def test_telegram_users_then_small_jobs_first(self, db, regular_user, sample_slot):
+        session = _ended_session(db, regular_user[0], sample_slot)
+        unknown = _queued(db, session, "vm1", priority=0)
+        big = _queued(db, session, "vm2", priority=0, size_hint=50_000_000)
+        small = _queued(db, session, "vm3", priority=0, size_hint=200_000)
+        no_telegram = _queued(db, session, "vm4", priority=1, size_hint=1_000)
+
+        assert dump_jobs.claim_due_jobs(db, 10) == [small.id, big.id, unknown.id, no_telegram.id]
+
+    def test_enqueue_sets_priority_and_size_hint(self, db, dump_host, regular_user, sample_slot):
+        user = regular_user[0]
+        session = _ended_session(db, user, sample_slot)
+        for size in (1_000, 3_000):
+            db.add(DumpJob(session_id=session.id, vm_host="vm.test", chrome_profile="Default",
+                           status="done", archive_size=size, finished_at=datetime.utcnow()))
+        db.commit()
+
+        assert dump_jobs.enqueue_dump(db, session).priority == 1
+        user.telegram_id = "42"
+        db.commit()
+        job = dump_jobs.enqueue_dump(db, session)
+        assert (job.priority, job.size_hint) == (0, 2_000)
+
+    def test_queue_stats(self, client, db, admin_user, regular_user, sample_slot):
+        session = _ended_session(db, regular_user[0], sample_slot)
+        now = datetime.utcnow()
+        for delay in range(1, 11):  # delivered after 10 … 100 s
+            db.add(DumpJob(session_id=session.id, vm_host="vm1", status="done",
+                           created_at=now - timedelta(minutes=5), delivered_at=now - timedelta(minutes=5) + timedelta(seconds=delay * 10)))
+        db.add(DumpJob(session_id=session.id, vm_host="vm1", status="done",
+                       created_at=now - timedelta(days=3), delivered_at=now - timedelta(days=2)))  # outside window
+        _queued(db, session, "vm1")
+        _queued(db, session, "vm2")
+        db.add(DumpJob(session_id=session.id, vm_host="vm2", status="running"))
+        db.commit()
+
+        resp = client.get("/api/admin/dumps/queue", headers=get_auth_header(client, "admin", admin_user[1]))
+        assert resp.status_code == 200
+        body = resp.json()
+        assert (body["queued"], body["running"], body["delivered"]) == (2, 1, 10)
+        assert body["hosts"] == [
+            {"host": "vm1", "queued": 1, "running": 0},
+            {"host": "vm2", "queued": 1, "running": 1},
+        ]
+        assert (body["delivery_p50_sec"], body["delivery_p90_sec"], body["delivery_p99_sec"]) == (50, 90, 100)
+
+    def test_delivery_recorded(self, db, regular_user, sample_slot):
+        session = _ended_session(db, regular_user[0], sample_slot)
+        job = _queued(db, session, "vm1")
+        dump_jobs.mark_delivered(db, job.id, sent=True)
+        db.expire_all()
+        assert db.get(DumpJob, job.id).delivered_at is not None
+        assert db.get(Session, session.id).dump_sent is True
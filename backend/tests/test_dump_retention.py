@@ -0,0 +1,106 @@
+"""Tests for the indexed dump retention sweeper and storage totals."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import dump, dump_retention, dump_store
+from backend.models import DumpChunk, DumpFile, Session
+from backend.tests.conftest import dump_archives, get_auth_header
+
+
+@pytest.fixture(autouse=True)
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(dump, "DUMP_STORAGE", tmp_path / "dumps")
+    return tmp_path / "dumps"
+
+
+def _disk_bytes(storage) -> int:
+    return sum(f.stat().st_size for f in storage.rglob("*") if f.is_file())
+
+
+def _ingest(db, tmp_path, user, slot, count):
+    out = []
+    for sid, path, _ in dump_archives(tmp_path, count):
+        db.add(Session(id=sid, user_id=user.id, slot_id=slot.id, ended_at=datetime.utcnow()))
+        db.commit()
+        dump.save_dump_path(db, sid, str(dump_store.ingest_archive(db, sid, path)))
+        out.append(sid)
+    return out
+
+
+def _expire(db, session_id):
+    db.query(DumpFile).filter(DumpFile.session_id == session_id).update(
+        {"expires_at": datetime.utcnow() - timedelta(minutes=1)},
+    )
+    db.commit()
+
+
+class TestSweep:
+    def test_expired_dump_released(self, db, tmp_path, storage, regular_user, sample_slot):
+        s1, s2 = _ingest(db, tmp_path, regular_user[0], sample_slot, 2)
+        dump_store.materialize(db, s1)
+        _expire(db, s1)
+
+        result = dump_retention.sweep(db)
+        assert result["expired"] == 2  # manifest + cached archive
+        assert result["chunks_freed"] > 0
+        db.expire_all()
+        assert db.get(Session, s1).dump_path is None
+        assert db.get(Session, s2).dump_path is not None
+        assert db.query(DumpFile).count() == 1
+        assert db.query(DumpChunk).filter(DumpChunk.refs <= 0).count() == 0
+
+    def test_totals_track_disk(self, db, tmp_path, storage, regular_user, sample_slot):
+        s1, _ = _ingest(db, tmp_path, regular_user[0], sample_slot, 2)
+        dump_store.materialize(db, s1)
+        totals = dump_store.totals(db)
+        assert totals["manifest"]["files"] == 2 and totals["cache"]["files"] == 1
+        assert sum(t["bytes"] for t in totals.values()) == _disk_bytes(storage)
+
+        _expire(db, s1)
+        dump_retention.sweep(db)
+        assert sum(t["bytes"] for t in dump_store.totals(db).values()) == _disk_bytes(storage)
+
+    def test_deletes_in_bounded_batches(self, db, tmp_path, storage, monkeypatch):
+        monkeypatch.setattr(dump_retention, "SWEEP_BATCH", 2)
+        past = datetime.utcnow() - timedelta(days=1)
+        for i in range(5):
+            path = storage / "cache" / f"old_{i}.tar.gz"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b"x" * 10)
+            dump_store.index_file(db, path, "cache", 10, expires_at=past)
+        db.commit()
+
+        assert dump_retention.sweep_batch(db, limit=2) == 2
+        assert db.query(DumpFile).count() == 3
+        dump_retention.sweep(db)
+        assert db.query(DumpFile).count() == 0
+        assert not any((storage / "cache").iterdir())
+        assert dump_store.totals(db)["cache"] == {"files": 0, "bytes": 0}
+
+    def test_legacy_archive_indexed_and_expired(self, db, tmp_path, regular_user, sample_slot):
+        archive = tmp_path / "session_9_dump.tar.gz"
+        archive.write_bytes(b"legacy")
+        db.add(Session(
+            id=9, user_id=regular_user[0].id, slot_id=sample_slot.id,
+            ended_at=datetime.utcnow() - timedelta(days=dump.DUMP_RETENTION_DAYS + 1),
+            dump_path=str(archive),
+        ))
+        db.commit()
+
+        assert dump_retention.sweep(db)["expired"] == 1
+        assert not archive.exists()
+        db.expire_all()
+        assert db.get(Session, 9).dump_path is None
+
+
+class TestStorageEndpoint:
+    def test_admin_storage_totals(self, client, db, tmp_path, admin_user, regular_user, sample_slot):
+        _ingest(db, tmp_path, regular_user[0], sample_slot, 1)
+        admin, password = admin_user
+        resp = client.get("/api/admin/dumps/storage", headers=get_auth_header(client, "admin", password))
+        assert resp.status_code == 200
+        body = resp.json()
+        assert {k["kind"] for k in body["kinds"]} == {"chunk", "manifest"}
+        assert body["bytes"] == sum(k["bytes"] for k in body["kinds"])
@@ -0,0 +1,96 @@
+"""Tests for full-text search over dump tabs."""
+
+import json
+import time
+
+import pytest
+
+from backend import dump, dump_search, dump_store
+from backend.tests.conftest import ended_session, get_auth_header, make_archive
+
+
+@pytest.fixture(autouse=True)
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(dump, "DUMP_STORAGE", tmp_path / "dumps")
+
+
+def _index(db, tmp_path, user, slot, files: dict[str, bytes]) -> int:
+    session = ended_session(db, user, slot)
+    dump_store.ingest_archive(db, session.id, make_archive(tmp_path / f"s{session.id}.tar.gz", session.id, files))
+    dump_search.index_session(db, session.id, user.id, dump_store.load_manifest(session.id))
+    db.commit()
+    return session.id
+
+
+def _history(*tabs) -> dict[str, bytes]:
+    urls = [{"url": u, "title": t, "last_visit_time": 1} for u, t in tabs]
+    return {"history.json": json.dumps({"urls": urls, "downloads": []}).encode()}
+
+
+class TestIndex:
+    def test_v2_history_and_v1_tabs(self, db, tmp_path, regular_user, sample_slot):
+        user = regular_user[0]
+        v2 = _index(db, tmp_path, user, sample_slot, _history(
+            ("https://arxiv.org/abs/2401.1", "Attention is all you need"),
+            ("https://arxiv.org/abs/2401.1", ""),  # revisit: deduplicated
+        ))
+        v1 = _index(db, tmp_path, user, sample_slot, {
+            "tabs.txt": "https://habr.com/ru/post/1|Оптимизация SQLite запросов\n".encode(),
+        })
+        assert [h["session_id"] for h in dump_search.search(db, "attention")] == [v2]
+        assert [h["session_id"] for h in dump_search.search(db, "оптимизац")] == [v1]  # prefix, Cyrillic
+        assert [h["session_id"] for h in dump_search.search(db, "habr")] == [v1]  # URL text
+        hit, = dump_search.search(db, "arxiv")
+        assert len(hit["matches"]) == 1
+
+    def test_reindex_replaces_rows(self, db, tmp_path, regular_user, sample_slot):
+        sid = _index(db, tmp_path, regular_user[0], sample_slot, _history(("https://a.example/", "Kubernetes")))
+        dump_store.ingest_archive(db, sid, make_archive(tmp_path / "again.tar.gz", sid, _history(("https://b.example/", "Terraform"))))
+        dump_search.index_session(db, sid, regular_user[0].id, dump_store.load_manifest(sid))
+        db.commit()
+        assert dump_search.search(db, "kubernetes") == []
+        assert len(dump_search.search(db, "terraform")) == 1
+
+    def test_query_syntax_is_text(self, db, tmp_path, regular_user, sample_slot):
+        _index(db, tmp_path, regular_user[0], sample_slot, _history(("https://x.example/", "NEAR OR AND")))
+        assert dump_search.match_query('"(* -') is None
+        assert len(dump_search.search(db, 'near" OR (and')) == 1
+
+    def test_ranked_and_fast(self, db, tmp_path, regular_user, sample_slot):
+        user = regular_user[0]
+        for i in range(200):
+            _index(db, tmp_path, user, sample_slot, _history(
+                *((f"https://site{i}.example/{j}", f"Filler page {j}") for j in range(50)),
+            ))
+        best = _index(db, tmp_path, user, sample_slot, _history(
+            ("https://pg.example/1", "postgres vacuum postgres tuning"),
+        ))
+        other = _index(db, tmp_path, user, sample_slot, _history(
+            ("https://pg.example/2", "notes " * 30 + "postgres"),
+        ))
+        started = time.perf_counter()
+        hits = dump_search.search(db, "postgres")
+        elapsed = time.perf_counter() - started
+        assert [h["session_id"] for h in hits] == [best, other]
+        assert hits[0]["score"] > hits[1]["score"]
+        assert "**postgres**" in hits[0]["matches"][0]["title"]
+        assert elapsed < 0.05
+
+
+class TestEndpoint:
+    def test_scoped_to_caller_admin_sees_all(self, client, db, tmp_path, admin_user, regular_user, sample_slot):
+        mine = _index(db, tmp_path, regular_user[0], sample_slot, _history(("https://a.example/", "Grafana dashboards")))
+        theirs = _index(db, tmp_path, admin_user[0], sample_slot, _history(("https://b.example/", "Grafana alerts")))
+
+        resp = client.get("/api/sessions/search?q=grafana", headers=get_auth_header(client, "testuser", "user123"))
+        assert resp.status_code == 200
+        hit, = resp.json()
+        assert hit["session_id"] == mine and hit["service_name"] == sample_slot.service_name
+        assert hit["matches"][0]["url"] == "https://a.example/"
+
+        resp = client.get("/api/sessions/search?q=grafana", headers=get_auth_header(client, "admin", "admin123"))
+        assert {h["session_id"] for h in resp.json()} == {mine, theirs}
+
+    def test_short_query_rejected(self, client, regular_user):
+        resp = client.get("/api/sessions/search?q=a", headers=get_auth_header(client, "testuser", "user123"))
+        assert resp.status_code == 422
@@ -0,0 +1,141 @@
+"""Tests for content-addressed dump storage: dedup, refcounts, rebuild."""
+
+import gzip
+import os
+import tarfile
+import threading
+
+import pytest
+
+from backend import dump, dump_store
+from backend.models import DumpChunk
+
+from backend.tests.conftest import TestSession, chrome_history, dump_archives
+
+
+@pytest.fixture(autouse=True)
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(dump, "DUMP_STORAGE", tmp_path / "dumps")
+    return tmp_path / "dumps"
+
+
+class TestChunking:
+    def test_cdc_survives_insertion(self):
+        data = os.urandom(200_000)
+        before = {data[a:b] for a, b in dump_store.chunk_boundaries(data)}
+        shifted = data[:50_000] + b"inserted" + data[50_000:]
+        after = {shifted[a:b] for a, b in dump_store.chunk_boundaries(shifted)}
+        assert len(before & after) >= len(before) - 2
+
+    def test_sqlite_cut_at_pages(self, tmp_path):
+        data = chrome_history(tmp_path / "h.db", 200)
+        step = 4096 * dump_store.SQLITE_PAGES_PER_CHUNK
+        assert all(a % step == 0 for a, _ in dump_store.chunk_boundaries(data))
+
+
+class TestStore:
+    def test_roundtrip_and_dedup(self, db, tmp_path, storage):
+        sessions = dump_archives(tmp_path, 10)
+        raw = sum(os.path.getsize(p) for _, p, _ in sessions)
+        for sid, path, _ in sessions:
+            dump_store.ingest_archive(db, sid, path, {"tabs_count": 30})
+
+        for sid, _, files in sessions:
+            manifest = dump_store.load_manifest(sid)
+            assert manifest["meta"] == {"tabs_count": 30}
+            for name, data in files.items():
+                member = dump_store.find_member(manifest, name)
+                pieces = list(dump_store.iter_member(member))
+                assert b"".join(pieces) == data
+                assert max(map(len, pieces), default=0) <= dump_store.MAX_CHUNK  # bounded reads
+        # byte range straddling chunk boundaries
+        member = dump_store.find_member(dump_store.load_manifest(3), "History")
+        assert b"".join(dump_store.iter_member(member, 10_000, 50_000)) == sessions[2][2]["History"][10_000:50_000]
+
+        stored = sum(f.stat().st_size for f in (storage / "chunks").rglob("*") if f.is_file())
+        assert stored == dump_store.usage(db)["stored_bytes"]
+        assert stored < raw * 0.75
+
+    def test_release_keeps_shared_chunks(self, db, tmp_path):
+        (s1, p1, f1), (s2, p2, f2) = dump_archives(tmp_path, 2)
+        dump_store.ingest_archive(db, s1, p1)
+        dump_store.ingest_archive(db, s2, p2)
+        total = db.query(DumpChunk).count()
+
+        assert dump_store.release(db, s1)
+        freed = dump_store.collect_garbage(db)
+        assert 0 < freed < total
+        member = dump_store.find_member(dump_store.load_manifest(s2), "History")
+        assert b"".join(dump_store.iter_member(member)) == f2["History"]
+
+        dump_store.release(db, s2)
+        dump_store.collect_garbage(db)
+        assert db.query(DumpChunk).count() == 0
+        assert dump_store.usage(db)["stored_bytes"] == 0
+
+    def test_reingest_does_not_leak_refs(self, db, tmp_path):
+        (sid, path, _), = dump_archives(tmp_path, 1)
+        dump_store.ingest_archive(db, sid, path)
+        dump_store.ingest_archive(db, sid, path)
+        assert {r for (r,) in db.query(DumpChunk.refs).all()} == {1}
+
+    def test_gc_spares_chunks_reingested_meanwhile(self, db, tmp_path, storage):
+        (sid, path, _), = dump_archives(tmp_path, 1)
+        dump_store.ingest_archive(db, sid, path)
+        dump_store.release(db, sid)
+        result = {}
+
+        def gc():
+            gc_db = TestSession()
+            try:
+                result["freed"] = dump_store.collect_garbage(gc_db)
+            finally:
+                gc_db.close()
+
+        with dump_store._chunk_lock():
+            thread = threading.Thread(target=gc)
+            thread.start()  # finds every chunk orphaned, then waits for the lock
+            thread.join(0.5)
+            dump_store._ingest_chunks(db, sid, path)
+        thread.join()
+
+        assert result["freed"] == 0
+        digests = [d for (d,) in db.query(DumpChunk.hash).all()]
+        assert digests and all(dump_store.chunk_path(d).exists() for d in digests)
+
+    def test_unindexed_file_deleted_on_commit(self, db, tmp_path):
+        (sid, path, _), = dump_archives(tmp_path, 1)
+        manifest = dump_store.ingest_archive(db, sid, path)
+
+        dump_store.unindex_file(db, manifest)
+        db.rollback()
+        assert manifest.exists()
+        assert dump_store.totals(db)["manifest"]["files"] == 1
+
+        dump_store.unindex_file(db, manifest)
+        assert manifest.exists()
+        db.commit()
+        assert not manifest.exists()
+        assert dump_store.totals(db)["manifest"]["files"] == 0
+
+    def test_materialize_rebuilds_archive(self, db, tmp_path):
+        (sid, path, files), = dump_archives(tmp_path, 1)
+        dump_store.ingest_archive(db, sid, path)
+        rebuilt = dump_store.materialize(db, sid)
+        with tarfile.open(rebuilt) as tar:
+            got = {m.name.split("/", 1)[1]: tar.extractfile(m).read() for m in tar if m.isfile()}
+        assert got == files
+
+    def test_ingests_zstd_archive(self, db, tmp_path):
+        zstandard = pytest.importorskip("zstandard")
+        (sid, path, files), = dump_archives(tmp_path, 1)
+        with open(path, "rb") as f:
+            tar_bytes = gzip.decompress(f.read())
+        zst = tmp_path / "v2.tar.zst"
+        zst.write_bytes(zstandard.ZstdCompressor(level=12).compress(tar_bytes))
+
+        dump_store.ingest_archive(db, sid, zst, {"format_version": 2})
+        manifest = dump_store.load_manifest(sid)
+        assert manifest["meta"]["format_version"] == 2
+        member = dump_store.find_member(manifest, "History")
+        assert b"".join(dump_store.iter_member(member)) == files["History"]
@@ -0,0 +1,98 @@
+"""Tests for health transitions, alert cooldown and the admin WebSocket."""
+
+import asyncio
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from backend import health, health_events
+from backend.health import HealthResponse, ServiceStatus, VmInfo, VpnPeer, VpnStatus
+from backend.tests.conftest import get_auth_header
+
+
+def _snapshot(vm_up=True, service="ok", peer_stale=False) -> HealthResponse:
+    return HealthResponse(
+        vms=[VmInfo(vm_id="VM-4", is_healthy=vm_up, active_user=None,
+                    active_slot=None, uptime=None, updated_at=None)],
+        services=[ServiceStatus(slot_id="ppx-1", service_name="Perplexity", status=service,
+                                detail=None if service == "ok" else "HTTP 401")],
+        vpn=VpnStatus(connected=True, ip=None, interface="wg0", peers=[
+            VpnPeer(public_key="abcd1234", endpoint=None, last_handshake_sec=10, stale=peer_stale),
+        ]),
+    )
+
+
+@pytest.fixture(autouse=True)
+def reset_state(monkeypatch):
+    health_events._previous = None
+    health_events._last_alert.clear()
+    alerts = []
+
+    async def fake_alert(message):
+        alerts.append(message)
+
+    monkeypatch.setattr("backend.telegram_bot.send_admin_alert", fake_alert)
+    yield alerts
+
+
+class TestDiff:
+    def test_first_snapshot_has_no_transitions(self):
+        assert health_events.diff_snapshots(None, _snapshot()) == []
+
+    def test_detects_vm_service_and_peer_changes(self):
+        transitions = health_events.diff_snapshots(
+            _snapshot(), _snapshot(vm_up=False, service="warn", peer_stale=True),
+        )
+        got = {(t["kind"], t["subject"], t["from"], t["to"]) for t in transitions}
+        assert got == {
+            ("vm", "VM-4", "up", "down"),
+            ("service", "ppx-1", "ok", "warn"),
+            ("vpn_peer", "abcd1234", "fresh", "stale"),
+        }
+        service = next(t for t in transitions if t["kind"] == "service")
+        assert service["detail"] == "HTTP 401"
+
+
+class TestAlerts:
+    def test_flapping_vm_alerts_once_per_cooldown(self, reset_state):
+        alerts = reset_state
+        for up in [True, False, True, False, True]:
+            asyncio.run(health_events.process_snapshot(_snapshot(vm_up=up)))
+        # down, up — then repeats are inside the cooldown window
+        assert len(alerts) == 2
+        assert "up → down" in alerts[0]
+
+
+class TestWireguard:
+    def test_parses_dump(self, monkeypatch):
+        import time
+        now = int(time.time())
+        dump = (
+            "privkey\tpubkey\t51820\toff\n"
+            f"peerAAAAAAAA\t(none)\t1.2.3.4:51820\t10.0.0.2/32\t{now - 30}\t1\t2\t25\n"
+            f"peerBBBBBBBB\t(none)\t(none)\t10.0.0.3/32\t0\t0\t0\toff\n"
+        )
+        outputs = {"wg": dump, "ip": "5: wg0    inet 10.0.0.1/24 scope global wg0\n"}
+        monkeypatch.setattr(health, "_run", lambda cmd: outputs[cmd[0]])
+
+        vpn = health._read_wireguard("wg0")
+        assert vpn.connected is True
+        assert vpn.ip == "10.0.0.1"
+        assert [p.stale for p in vpn.peers] == [False, True]
+        assert vpn.peers[1].endpoint is None
+
+
+class TestAdminWebSocket:
+    def test_admin_can_connect(self, client, admin_user):
+        admin, password = admin_user
+        token = get_auth_header(client, "admin", password)["Authorization"].split()[1]
+        with client.websocket_connect(f"/api/ws/admin?token={token}") as ws:
+            ws.send_text("ping")
+            assert ws.receive_text() == "pong"
+
+    def test_regular_user_rejected(self, client, regular_user):
+        user, password = regular_user
+        token = get_auth_header(client, "testuser", password)["Authorization"].split()[1]
+        with pytest.raises(WebSocketDisconnect):
+            with client.websocket_connect(f"/api/ws/admin?token={token}") as ws:
+                ws.receive_text()
@@ -0,0 +1,85 @@
+"""Tests for the health time-series store and history endpoint."""
+
+import time
+
+import pytest
+
+from backend import health_history
+from backend.health_history import RingBuffer, flush, query, record
+from backend.models import HealthSample
+from backend.tests.conftest import get_auth_header
+
+
+@pytest.fixture(autouse=True)
+def clean_buffers():
+    health_history._buffers.clear()
+    health_history._flushed_seq.clear()
+    yield
+    health_history._buffers.clear()
+    health_history._flushed_seq.clear()
+
+
+class TestRingBuffer:
+    def test_wraps_and_keeps_latest(self):
+        buf = RingBuffer(size=3)
+        for i in range(5):
+            buf.append(float(i), float(i * 10))
+        samples, seq = buf.since(0)
+        assert samples == [(2.0, 20.0), (3.0, 30.0), (4.0, 40.0)]
+        assert seq == 5
+        assert buf.since(4)[0] == [(4.0, 40.0)]
+
+
+class TestFlush:
+    def test_downsamples_into_tiers(self, db):
+        base = (int(time.time()) // 3600) * 3600
+        record("vm:VM-1:up", 1, base + 10)
+        record("vm:VM-1:up", 0, base + 70)
+        assert flush(db) == 2
+
+        raw = db.query(HealthSample).filter(HealthSample.step == 60).all()
+        assert len(raw) == 2
+        hourly = db.query(HealthSample).filter(HealthSample.step == 3600).one()
+        assert hourly.count == 2
+        assert hourly.sum == 1
+        assert (hourly.min, hourly.max) == (0, 1)
+
+    def test_second_flush_merges_only_new_samples(self, db):
+        base = (int(time.time()) // 3600) * 3600
+        record("service:ppx-1:latency_ms", 100, base + 5)
+        flush(db)
+        record("service:ppx-1:latency_ms", 300, base + 6)
+        assert flush(db) == 1
+
+        step, data = query(db, ["service:ppx-1:latency_ms"], since=base, step=60)
+        assert step == 60
+        assert data["service:ppx-1:latency_ms"] == [[base, 200.0, 100.0, 300.0]]
+
+    def test_retention_drops_old_raw_buckets(self, db):
+        now = time.time()
+        record("vm:VM-2:up", 1, now - 3 * 86400)
+        flush(db, now=now)
+        assert db.query(HealthSample).filter(HealthSample.step == 60).count() == 0
+        assert db.query(HealthSample).filter(HealthSample.step == 900).count() == 1
+
+
+class TestHistoryEndpoint:
+    def test_history_by_prefix(self, client, db, admin_user):
+        now = time.time()
+        record("vm:VM-1:up", 1, now - 1800)
+        record("service:ppx-1:status", 1, now - 1800)
+        flush(db)
+
+        admin, password = admin_user
+        headers = get_auth_header(client, "admin", password)
+        resp = client.get("/api/admin/health/history?prefix=vm:&hours=24", headers=headers)
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["step"] == 900
+        assert list(data["series"]) == ["vm:VM-1:up"]
+
+    def test_history_admin_only(self, client, regular_user):
+        user, password = regular_user
+        headers = get_auth_header(client, "testuser", password)
+        resp = client.get("/api/admin/health/history", headers=headers)
+        assert resp.status_code == 403
@@ -0,0 +1,111 @@
+"""Tests for schema upgrades of databases made by an earlier version."""
+
+import json
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session as DbSession
+
+from backend import bookings, dump, dump_store, migrations
+from backend.database import Base
+from backend.models import Booking, Session, SessionDump
+from backend.tests.conftest import engine
+
+
+@pytest.fixture
+def old_engine(tmp_path):
+    """A database as create_all made it before the listed columns existed."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for table in {table for table, _, _ in migrations.COLUMNS}:
+            dropped = [column for t, column, _ in migrations.COLUMNS if t == table]
+            for column in dropped:
+                for index in Base.metadata.tables[table].indexes:
+                    if column in index.columns:
+                        conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+                conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+        for name in migrations.INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    yield engine
+    engine.dispose()
+
+
+def _columns(engine, table):
+    return {c["name"] for c in inspect(engine).get_columns(table)}
+
+
+def test_adds_missing_columns_once(old_engine):
+    assert "session_cookie" not in _columns(old_engine, "slots")
+    added = migrations.upgrade(old_engine)
+    assert added == [f"{t}.{c}" for t, c, _ in migrations.COLUMNS] + migrations.INDEXES
+    assert "session_cookie" in _columns(old_engine, "slots")
+    assert migrations.upgrade(old_engine) == []
+
+
+def test_fresh_database_untouched(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    Base.metadata.create_all(bind=engine)
+    assert migrations.upgrade(engine) == []
+
+
+def test_backfills_dump_meta(db, regular_user, sample_slot, tmp_path, monkeypatch):
+    monkeypatch.setattr(dump, "DUMP_STORAGE", tmp_path / "dumps")
+    user, _ = regular_user
+    manifest_dump, legacy_dump, unreadable_dump, done = (
+        Session(user_id=user.id, slot_id=sample_slot.id) for _ in range(4)
+    )
+    db.add_all([manifest_dump, legacy_dump, unreadable_dump, done])
+    db.flush()
+
+    path = dump_store.manifest_path(manifest_dump.id)
+    path.parent.mkdir(parents=True)
+    path.write_text(json.dumps({
+        "meta": {"format_version": 2, "tabs_count": 7, "files_count": 2},
+        "members": [{"name": "screenshot.png", "size": 1, "sha256": "", "chunks": []}],
+    }))
+    manifest_dump.dump_path = str(path)
+    (tmp_path / "legacy_meta.json").write_text(json.dumps({"tabs_count": 3, "files_count": 1}))
+    legacy_dump.dump_path = str(tmp_path / "legacy.tar.gz")
+    unreadable_dump.dump_path = str(tmp_path / "gone.tar.gz")
+    done.dump_path = str(tmp_path / "done.tar.gz")
+    db.add(SessionDump(session_id=done.id, tabs_count=42))
+    db.commit()
+
+    assert migrations.upgrade(engine) == ["session_dumps (3 rows)"]
+    counts = {s.id: (s.dump.tabs_count, s.dump.files_count, s.dump.has_screenshot)
+              for s in (manifest_dump, legacy_dump, unreadable_dump, done)}
+    assert counts == {
+        manifest_dump.id: (7, 2, True),
+        legacy_dump.id: (3, 1, False),
+        unreadable_dump.id: (0, 0, False),
+        done.id: (42, 0, False),
+    }
+    assert manifest_dump.dump.format_version == 2
+    assert migrations.upgrade(engine) == []
+
+
+def test_existing_dump_jobs_get_default_priority(old_engine):
+    with old_engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO dump_jobs (session_id, vm_host, status, attempts) VALUES (1, 'vm', 'queued', 0)"
+        ))
+    migrations.upgrade(old_engine)
+    with old_engine.connect() as conn:
+        assert conn.execute(text("SELECT priority FROM dump_jobs")).scalar() == 1
+
+
+def test_backfills_booking_intervals(old_engine):
+    with old_engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO bookings (user_id, slot_id, date, start_time, duration_min, status) VALUES "
+            "(1, 'ppx-1', '2026-02-14', '10:00', 90, 'active'), (1, 'ppx-1', 'someday', '10:00', 60, 'active')"
+        ))
+    assert "bookings.starts_at (1 rows)" in migrations.upgrade(old_engine)
+    with DbSession(bind=old_engine) as db:
+        booked, unreadable = db.query(Booking).order_by(Booking.id)
+        start = bookings._to_utc(bookings._parse_local("2026-02-14", "10:00"))
+        assert (booked.starts_at, booked.ends_at) == (start, start + timedelta(minutes=90))
+        assert unreadable.starts_at is None
+    assert migrations.upgrade(old_engine) == []
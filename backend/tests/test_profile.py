@@ -2,8 +2,9 @@
 
 import pytest
 from datetime import datetime, timedelta, timezone
-from backend.tests.conftest import get_auth_header
-from backend.models import Session
+from sqlalchemy import event
+from backend.tests.conftest import engine, get_auth_header
+from backend.models import Session, SessionDump
 
 
 class TestGetProfile:
@@ -103,3 +104,31 @@ class TestSessionHistory:
         # Active sessions should NOT appear in history
         resp = client.get("/api/profile/sessions", headers=headers)
         assert resp.json() == []
+
+    def test_dump_counts_batched(self, client, regular_user, sample_slot, db):
+        user, password = regular_user
+        headers = get_auth_header(client, "testuser", password)
+        now = datetime.now(timezone.utc)
+        for i in range(10):
+            session = Session(
+                user_id=user.id, slot_id="ppx-1",
+                started_at=now - timedelta(hours=i + 1), ended_at=now - timedelta(hours=i),
+            )
+            db.add(session)
+            db.flush()
+            db.add(SessionDump(session_id=session.id, tabs_count=i, files_count=1))
+        db.commit()
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            resp = client.get("/api/profile/sessions", headers=headers)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+
+        data = resp.json()
+        assert [s["tabs_count"] for s in data] == list(range(10))
+        assert all(s["files_count"] == 1 for s in data)
+        # user lookup + sessions + slots + dumps, independent of the row count
+        assert len(statements) <= 4
@@ -1,7 +1,13 @@
-"""Tests for queue endpoints: join, leave, info."""
+"""Tests for queue endpoints: join, leave, info, and the handoff on release."""
+
+from datetime import datetime, timedelta
 
 import pytest
-from backend.tests.conftest import get_auth_header
+
+from backend import queue_handoff
+from backend.auth import hash_password
+from backend.models import OutboxMessage, QueueEntry, User
+from backend.tests.conftest import TestSession, get_auth_header
 
 
 class TestJoinQueue:
@@ -89,3 +95,73 @@ class TestQueueInfo:
 
         resp = client.get("/api/slots/ppx-1/queue", headers=user_headers)
         assert resp.json()["queue_size"] == 1
+
+
+@pytest.fixture
+def third_user(db):
+    user = User(name="Third", username="third", password_hash=hash_password("third123"), telegram_id="3")
+    db.add(user)
+    db.commit()
+    return user, "third123"
+
+
+@pytest.fixture
+def queued(client, db, admin_user, regular_user, third_user, sample_slot):
+    """Admin holds the slot; testuser, then third, wait in its queue."""
+    regular_user[0].telegram_id = "2"
+    db.commit()
+    headers = {
+        "admin": get_auth_header(client, "admin", admin_user[1]),
+        "testuser": get_auth_header(client, "testuser", regular_user[1]),
+        "third": get_auth_header(client, "third", third_user[1]),
+    }
+    client.post("/api/slots/ppx-1/occupy", headers=headers["admin"])
+    client.post("/api/slots/ppx-1/queue", headers=headers["testuser"])
+    client.post("/api/slots/ppx-1/queue", headers=headers["third"])
+    return headers
+
+
+def _lapse(db):
+    db.query(QueueEntry).filter(QueueEntry.hold_until.isnot(None)).update(
+        {"hold_until": datetime.utcnow() - timedelta(seconds=1)},
+    )
+    db.commit()
+
+
+class TestHandoff:
+    def test_release_holds_slot_for_head(self, client, db, queued):
+        resp = client.post("/api/slots/ppx-1/release", headers=queued["admin"])
+        assert resp.json()["next_in_queue"] == "Test User" and resp.json()["hold_until"]
+        ping, = db.query(OutboxMessage).filter(OutboxMessage.chat_id == "2").all()
+        assert "ppx-1" in ping.text
+
+        assert client.post("/api/slots/ppx-1/occupy", headers=queued["third"]).status_code == 409
+        slot, = client.get("/api/slots", headers=queued["third"]).json()
+        assert (slot["available"], slot["reserved_for"]) == (False, "Test User")
+        slot, = client.get("/api/slots", headers=queued["testuser"]).json()
+        assert slot["available"] is True
+
+        assert client.post("/api/slots/ppx-1/occupy", headers=queued["testuser"]).status_code == 200
+        assert [e.user.username for e in db.query(QueueEntry)] == ["third"]
+
+    def test_lapsed_hold_passes_to_next(self, client, db, queued, monkeypatch):
+        monkeypatch.setattr(queue_handoff, "SessionLocal", TestSession)
+        client.post("/api/slots/ppx-1/release", headers=queued["admin"])
+        _lapse(db)
+        events, next_at = queue_handoff._tick()
+        assert [e["next_in_queue"] for e in events] == ["Third"] and next_at is not None
+        db.expire_all()
+        assert db.query(QueueEntry).one().user.username == "third"
+        assert db.query(OutboxMessage).filter(OutboxMessage.chat_id == "3").count() == 1
+
+        # Nobody left after third's hold lapses: anyone may take the slot,
+        # even before the task has run
+        _lapse(db)
+        assert client.post("/api/slots/ppx-1/occupy", headers=queued["admin"]).status_code == 200
+        assert db.query(QueueEntry).count() == 0
+
+    def test_leaving_passes_hold_on(self, client, db, queued):
+        client.post("/api/slots/ppx-1/release", headers=queued["admin"])
+        client.delete("/api/slots/ppx-1/queue", headers=queued["testuser"])
+        db.expire_all()
+        assert queue_handoff.active_hold(db, "ppx-1").user.username == "third"
@@ -0,0 +1,107 @@
+"""Tests for the service session checker and its health API integration."""
+
+import asyncio
+
+import httpx
+import pytest
+
+from backend.config import settings
+from backend.models import Slot, ServiceCheck
+from backend.service_checker import HostRateLimiter, check_services
+from backend.tests.conftest import get_auth_header
+
+
+def _handler(request: httpx.Request) -> httpx.Response:
+    if request.url.host == "ok.example":
+        return httpx.Response(200, text="dashboard")
+    if request.url.host == "expired.example":
+        if request.url.path == "/login":
+            return httpx.Response(200, text="sign in")
+        return httpx.Response(302, headers={"Location": "https://expired.example/login"})
+    if request.url.host == "cookie.example":
+        if request.headers.get("Cookie") == "sid=valid":
+            return httpx.Response(200)
+        return httpx.Response(401)
+    return httpx.Response(503)
+
+
+@pytest.fixture
+def service_slots(db):
+    for slot_id, url, cookie in [
+        ("ok-1", "https://ok.example/app", None),
+        ("exp-1", "https://expired.example/app", None),
+        ("cookie-1", "https://cookie.example/app", "sid=valid"),
+        ("down-1", "https://down.example/", None),
+        ("nourl-1", None, None),
+    ]:
+        db.add(Slot(id=slot_id, service_name=slot_id, category="Test", url=url, session_cookie=cookie))
+    db.commit()
+
+
+class TestCheckServices:
+    def test_classifies_and_persists(self, db, service_slots, monkeypatch):
+        monkeypatch.setattr(settings, "service_check_host_interval_sec", 0)
+        results = asyncio.run(check_services(db, transport=httpx.MockTransport(_handler)))
+        by_slot = {r["slot_id"]: r for r in results}
+
+        assert set(by_slot) == {"ok-1", "exp-1", "cookie-1", "down-1"}
+        assert by_slot["ok-1"]["status"] == "ok"
+        assert by_slot["exp-1"]["status"] == "warn"
+        assert by_slot["cookie-1"]["status"] == "ok"
+        assert by_slot["down-1"]["status"] == "error"
+
+        db.expire_all()
+        stored = db.query(ServiceCheck).filter(ServiceCheck.slot_id == "exp-1").first()
+        assert stored.status == "warn"
+        assert "входа" in stored.last_failure
+        assert stored.latency_ms is not None
+
+    def test_concurrency_is_bounded(self, db, monkeypatch):
+        for i in range(6):
+            db.add(Slot(id=f"s-{i}", service_name="s", category="Test", url=f"https://h{i}.example/"))
+        db.commit()
+        monkeypatch.setattr(settings, "service_check_concurrency", 2)
+
+        in_flight = 0
+        peak = 0
+
+        class SlowTransport(httpx.AsyncBaseTransport):
+            async def handle_async_request(self, request):
+                nonlocal in_flight, peak
+                in_flight += 1
+                peak = max(peak, in_flight)
+                await asyncio.sleep(0.02)
+                in_flight -= 1
+                return httpx.Response(200)
+
+        asyncio.run(check_services(db, transport=SlowTransport()))
+        assert peak == 2
+
+    def test_host_rate_limit_spaces_requests(self):
+        async def run():
+            limiter = HostRateLimiter(0.05)
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            await limiter.wait("same.example")
+            await limiter.wait("same.example")
+            await limiter.wait("other.example")
+            return loop.time() - start
+
+        assert asyncio.run(run()) >= 0.05
+
+
+class TestHealthServices:
+    def test_health_reports_check_result(self, client, db, admin_user, sample_slot):
+        db.add(ServiceCheck(slot_id="ppx-1", status="warn", latency_ms=120, last_failure="HTTP 401"))
+        db.commit()
+        admin, password = admin_user
+        headers = get_auth_header(client, "admin", password)
+        resp = client.get("/api/admin/health", headers=headers)
+        assert resp.status_code == 200
+        service = resp.json()["services"][0]
+        assert service["status"] == "warn"
+        assert service["detail"] == "HTTP 401"
+        assert service["latency_ms"] == 120
+
+        slots = client.get("/api/slots", headers=headers).json()
+        assert slots[0]["service_status"] == "warn"
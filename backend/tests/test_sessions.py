@@ -0,0 +1,165 @@
+"""Tests for the sessions API: summary and dump browsing."""
+
+import io
+import os
+import tarfile
+
+import pytest
+
+from backend import dump, dump_store
+from backend.models import SessionDump
+from backend.tests.conftest import ended_session, get_auth_header, make_archive
+
+
+class TestSummary:
+    def test_counts_from_session_dumps(self, client, db, regular_user, sample_slot, monkeypatch):
+        user, password = regular_user
+        # The archive path no longer exists — the summary must not care
+        session = ended_session(db, user, sample_slot, dump_path="/nonexistent/session_1_dump.tar.gz")
+        db.add(SessionDump(session_id=session.id, tabs_count=7, files_count=2))
+        db.commit()
+        monkeypatch.setattr("builtins.open", None)  # any file access would blow up
+
+        resp = client.get(
+            f"/api/sessions/{session.id}/summary", headers=get_auth_header(client, "testuser", password),
+        )
+        assert resp.status_code == 200
+        data = resp.json()
+        assert (data["tabs_count"], data["files_count"]) == (7, 2)
+        assert data["duration_min"] == 30
+
+    def test_no_dump_yet(self, client, db, regular_user, sample_slot):
+        user, password = regular_user
+        session = ended_session(db, user, sample_slot)
+        resp = client.get(
+            f"/api/sessions/{session.id}/summary", headers=get_auth_header(client, "testuser", password),
+        )
+        assert (resp.json()["tabs_count"], resp.json()["files_count"]) == (0, 0)
+
+    def test_other_users_session_forbidden(self, client, db, admin_user, regular_user, sample_slot):
+        session = ended_session(db, admin_user[0], sample_slot)
+        user, password = regular_user
+        resp = client.get(
+            f"/api/sessions/{session.id}/summary", headers=get_auth_header(client, "testuser", password),
+        )
+        assert resp.status_code == 403
+
+
+@pytest.fixture
+def stored_dump(db, tmp_path, monkeypatch, regular_user, sample_slot):
+    """A finished session whose dump is in the chunk store."""
+    monkeypatch.setattr(dump, "DUMP_STORAGE", tmp_path / "dumps")
+    files = {
+        "tabs.txt": b"https://perplexity.ai/|Perplexity\n" * 20,
+        "screenshot.png": os.urandom(300_000),
+    }
+    session = ended_session(db, regular_user[0], sample_slot)
+    manifest = dump_store.ingest_archive(db, session.id, make_archive(tmp_path / "d.tar.gz", session.id, files))
+    dump.save_dump_path(db, session.id, str(manifest))
+    return session, files
+
+
+class TestDumpBrowsing:
+    def _get(self, client, path, password="user123", **headers):
+        headers.update(get_auth_header(client, "testuser", password))
+        return client.get(path, headers=headers)
+
+    def test_lists_members(self, client, stored_dump):
+        session, files = stored_dump
+        resp = self._get(client, f"/api/sessions/{session.id}/dump/files")
+        assert resp.status_code == 200
+        by_name = {m["name"]: m for m in resp.json()}
+        assert by_name["screenshot.png"]["size"] == 300_000
+        assert by_name["screenshot.png"]["content_type"] == "image/png"
+        assert by_name["tabs.txt"]["content_type"].startswith("text/plain")
+
+    def test_streams_whole_member(self, client, stored_dump):
+        session, files = stored_dump
+        resp = self._get(client, f"/api/sessions/{session.id}/dump/files/screenshot.png")
+        assert resp.status_code == 200
+        assert resp.content == files["screenshot.png"]
+        assert resp.headers["accept-ranges"] == "bytes"
+
+    def test_range_requests(self, client, stored_dump):
+        session, files = stored_dump
+        url = f"/api/sessions/{session.id}/dump/files/screenshot.png"
+        data = files["screenshot.png"]
+
+        resp = self._get(client, url, Range="bytes=100000-200099")
+        assert resp.status_code == 206
+        assert resp.content == data[100000:200100]
+        assert resp.headers["content-range"] == "bytes 100000-200099/300000"
+
+        resp = self._get(client, url, Range="bytes=-500")
+        assert resp.content == data[-500:]
+        resp = self._get(client, url, Range="bytes=299990-")
+        assert resp.content == data[299990:]
+
+        resp = self._get(client, url, Range="bytes=300000-")
+        assert resp.status_code == 416
+        assert resp.headers["content-range"] == "bytes */300000"
+
+    def test_conditional_requests(self, client, stored_dump):
+        session, _ = stored_dump
+        url = f"/api/sessions/{session.id}/dump/files/tabs.txt"
+        etag = self._get(client, url).headers["etag"]
+        assert self._get(client, url, **{"If-None-Match": etag}).status_code == 304
+        # Stale If-Range → full body instead of a range
+        resp = self._get(client, url, Range="bytes=0-9", **{"If-Range": '"other"'})
+        assert resp.status_code == 200
+
+    def test_missing_member_and_access(self, client, db, stored_dump, admin_user):
+        session, _ = stored_dump
+        assert self._get(client, f"/api/sessions/{session.id}/dump/files/History").status_code == 404
+        other = ended_session(db, admin_user[0], session.slot)
+        assert self._get(client, f"/api/sessions/{other.id}/dump/files").status_code == 403
+
+
+class TestDumpDownload:
+    def _get(self, client, path, **headers):
+        headers.update(get_auth_header(client, "testuser", "user123"))
+        return client.get(path, headers=headers)
+
+    def test_downloads_rebuilt_archive(self, client, stored_dump):
+        session, files = stored_dump
+        resp = self._get(client, f"/api/sessions/{session.id}/dump")
+        assert resp.status_code == 200
+        assert resp.headers["content-type"] == "application/gzip"
+        assert f"session_{session.id}_dump.tar.gz" in resp.headers["content-disposition"]
+        with tarfile.open(fileobj=io.BytesIO(resp.content)) as tar:
+            got = {m.name.split("/", 1)[1]: tar.extractfile(m).read() for m in tar}
+        assert got == files
+
+    def test_etag_is_stable_across_rebuilds(self, client, stored_dump):
+        session, _ = stored_dump
+        url = f"/api/sessions/{session.id}/dump"
+        first = self._get(client, url)
+        dump_store.cache_path(session.id).unlink()
+        second = self._get(client, url)
+        assert first.headers["etag"] == second.headers["etag"]
+        assert first.content == second.content
+
+        assert self._get(client, url, **{"If-None-Match": first.headers["etag"]}).status_code == 304
+
+    def test_range_download(self, client, stored_dump):
+        session, _ = stored_dump
+        url = f"/api/sessions/{session.id}/dump"
+        full = self._get(client, url).content
+        resp = self._get(client, url, Range="bytes=1000-1999", **{"If-Range": self._get(client, url).headers["etag"]})
+        assert resp.status_code == 206
+        assert resp.content == full[1000:2000]
+
+    def test_legacy_archive(self, client, db, tmp_path, regular_user, sample_slot):
+        archive = tmp_path / "session_legacy.tar.gz"
+        archive.write_bytes(b"\x1f\x8b legacy bytes")
+        session = ended_session(db, regular_user[0], sample_slot, dump_path=str(archive))
+        resp = self._get(client, f"/api/sessions/{session.id}/dump")
+        assert resp.status_code == 200
+        assert resp.content == archive.read_bytes()
+        assert self._get(
+            client, f"/api/sessions/{session.id}/dump", **{"If-None-Match": resp.headers["etag"]},
+        ).status_code == 304
+
+    def test_no_dump(self, client, db, regular_user, sample_slot):
+        session = ended_session(db, regular_user[0], sample_slot)
+        assert self._get(client, f"/api/sessions/{session.id}/dump").status_code == 404
@@ -0,0 +1,128 @@
+"""Tests for the persistent SSH connection pool (fake paramiko clients)."""
+
+import threading
+
+import pytest
+
+from backend import ssh_pool
+from backend.ssh_pool import SSHPool
+
+
+class FakeStream:
+    def __init__(self, data: bytes, status: int = 0):
+        self._data = data
+        self.channel = self
+        self._status = status
+
+    def read(self):
+        return self._data
+
+    def recv_exit_status(self):
+        return self._status
+
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+    def send_ignore(self):
+        if not self.active:
+            raise EOFError
+
+
+class FakeClient:
+    def __init__(self, host):
+        self.host = host
+        self.transport = FakeTransport()
+        self.closed = False
+        self.fail_next_exec = False
+
+    def get_transport(self):
+        return self.transport
+
+    def exec_command(self, command, timeout=None):
+        if self.fail_next_exec:
+            self.fail_next_exec = False
+            raise EOFError("channel closed")
+        return None, FakeStream(f"{self.host}:{command}".encode()), FakeStream(b"")
+
+    def open_sftp(self):
+        return FakeSftp()
+
+    def close(self):
+        self.closed = True
+        self.transport.active = False
+
+
+class FakeSftp:
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def pool():
+    clients = []
+
+    def factory(host, port, user, password, key_path):
+        client = FakeClient(host)
+        clients.append(client)
+        return client
+
+    p = SSHPool(client_factory=factory)
+    p.clients = clients
+    return p
+
+
+class TestSSHPool:
+    def test_reuses_connection_per_host(self, pool):
+        for _ in range(5):
+            status, out, _ = pool.exec("vm1", "uptime", user="vdi")
+            assert status == 0
+        with pool.sftp("vm1", user="vdi"):
+            pass
+        pool.exec("vm2", "uptime", user="vdi")
+        assert pool.handshakes == 2
+
+    def test_concurrent_callers_share_one_handshake(self, pool):
+        threads = [
+            threading.Thread(target=pool.exec, args=("vm1", "true"), kwargs={"user": "vdi"})
+            for _ in range(10)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert pool.handshakes == 1
+
+    def test_dead_transport_is_replaced(self, pool):
+        pool.exec("vm1", "true", user="vdi")
+        pool.clients[0].transport.active = False
+        pool.exec("vm1", "true", user="vdi")
+        assert pool.handshakes == 2
+        assert pool.clients[0].closed
+
+    def test_channel_error_evicts_and_retries(self, pool):
+        pool.exec("vm1", "true", user="vdi")
+        pool.clients[0].fail_next_exec = True
+        status, out, _ = pool.exec("vm1", "echo hi", user="vdi")
+        assert status == 0
+        assert pool.handshakes == 2
+        assert pool.clients[0].closed
+
+    def test_idle_connections_are_reaped(self, pool, monkeypatch):
+        pool.exec("vm1", "true", user="vdi")
+        monkeypatch.setattr(ssh_pool, "MAX_IDLE_SEC", -1)
+        assert pool.reap_idle() == 1
+        assert pool.clients[0].closed
+
+    def test_busy_connections_are_not_reaped(self, pool, monkeypatch):
+        monkeypatch.setattr(ssh_pool, "MAX_IDLE_SEC", -1)
+        with pool.sftp("vm1", user="vdi"):
+            pool.exec("vm2", "true", user="vdi")  # reaps on the way in — not vm1
+            assert not pool.clients[0].closed
+            assert pool.reap_idle() == 1  # vm2, done with
+        assert pool.reap_idle() == 1
+        assert pool.clients[0].closed
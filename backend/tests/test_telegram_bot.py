@@ -0,0 +1,206 @@
+"""Tests for Telegram bot commands: replies, and an event loop that stays free."""
+
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+
+from backend import chat_identity, telegram_bot
+from backend.models import DumpJob, Session, User
+from backend.tests.conftest import TestSession, engine, get_auth_header
+
+QUERY_DELAY = 0.05  # every SQL statement sleeps this long in these tests
+MAX_LOOP_LAG = 0.03
+
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text):
+        self.replies.append(text)
+
+
+class FakeUpdate:
+    def __init__(self, chat_id):
+        self.effective_chat = type("Chat", (), {"id": chat_id})()
+        self.message = FakeMessage()
+
+
+class FakeContext:
+    def __init__(self, *args):
+        self.args = list(args)
+
+
+@pytest.fixture(autouse=True)
+def bot_db(monkeypatch):
+    monkeypatch.setattr("backend.database.SessionLocal", TestSession)
+    chat_identity.clear()  # every test starts from a fresh database
+    yield
+    chat_identity.clear()
+
+
+@pytest.fixture
+def linked(db, admin_user, regular_user):
+    admin_user[0].telegram_id = "1"
+    regular_user[0].telegram_id = "2"
+    db.commit()
+
+
+@pytest.fixture
+def slow_db():
+    """Make every query slow, as under SQLite write contention."""
+    def delay(*_):
+        time.sleep(QUERY_DELAY)
+    event.listen(engine, "before_cursor_execute", delay)
+    yield
+    event.remove(engine, "before_cursor_execute", delay)
+
+
+async def _max_lag(coro) -> float:
+    """Run `coro` while measuring the worst event loop stall."""
+    lag = 0.0
+    done = False
+
+    async def monitor():
+        nonlocal lag
+        while not done:
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag = max(lag, time.perf_counter() - started - 0.005)
+
+    task = asyncio.create_task(monitor())
+    await asyncio.sleep(0)
+    try:
+        await coro
+    finally:
+        done = True
+        await task
+    return lag
+
+
+def _run(handler, chat_id, *args) -> list[str]:
+    update = FakeUpdate(chat_id)
+    asyncio.run(handler(update, FakeContext(*args)))
+    return update.message.replies
+
+
+class TestCommands:
+    def test_start_links_account(self, db, regular_user):
+        replies = _run(telegram_bot._cmd_start, 77, "testuser")
+        assert replies[0].startswith("✅")
+        db.expire_all()
+        assert regular_user[0].telegram_id == "77"
+        assert _run(telegram_bot._cmd_start, 77, "nobody")[0].startswith("❌")
+
+    def test_status_and_help(self, db, linked, regular_user, sample_slot):
+        assert "Нет активных сессий" in _run(telegram_bot._cmd_status, 2)[0]
+        db.add(Session(user_id=regular_user[0].id, slot_id=sample_slot.id, started_at=datetime.utcnow()))
+        db.commit()
+        assert "ppx-1" in _run(telegram_bot._cmd_status, 2)[0]
+        assert "Аккаунт не привязан" in _run(telegram_bot._cmd_status, 99)[0]
+
+        assert "Админ-команды" not in _run(telegram_bot._cmd_help, 2)[0]
+        assert "Админ-команды" in _run(telegram_bot._cmd_help, 1)[0]
+
+    def test_admin_commands(self, db, linked, regular_user, sample_slot, monkeypatch):
+        monkeypatch.setattr("backend.config.settings.dump_ssh_host", "vm.test")
+        assert _run(telegram_bot._cmd_stats, 2) == ["⛔ Только для администраторов."]
+        assert _run(telegram_bot._cmd_health, 1)[0].startswith("🏥")
+        assert "Всего сессий: 0" in _run(telegram_bot._cmd_stats, 1)[0]
+
+        db.add(Session(user_id=regular_user[0].id, slot_id=sample_slot.id, started_at=datetime.utcnow()))
+        db.commit()
+        assert _run(telegram_bot._cmd_kick, 1, "testuser")[0].startswith("✅")
+        db.expire_all()
+        assert db.query(Session).one().end_reason == "kicked"
+        assert db.query(DumpJob).count() == 1
+
+
+class TestEventLoop:
+    def test_commands_never_block_the_loop(self, db, linked, slow_db):
+        commands = [
+            (telegram_bot._cmd_status, 2),
+            (telegram_bot._cmd_help, 1),
+            (telegram_bot._cmd_health, 1),
+            (telegram_bot._cmd_stats, 1),
+            (telegram_bot._cmd_kick, 1, "testuser"),
+        ]
+
+        async def run_all():
+            for handler, chat_id, *args in commands:
+                update = FakeUpdate(chat_id)
+                started = time.perf_counter()
+                lag = await _max_lag(handler(update, FakeContext(*args)))
+                # The queries did take their time — just not on the loop
+                assert time.perf_counter() - started >= QUERY_DELAY
+                assert update.message.replies
+                assert lag < MAX_LOOP_LAG, f"{handler.__name__} stalled the loop for {lag * 1000:.0f} ms"
+
+        asyncio.run(run_all())
+
+
+@pytest.fixture
+def statements():
+    """SQL statements executed while the fixture is active."""
+    seen = []
+
+    def record(conn, cursor, statement, *_):
+        seen.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    yield seen
+    event.remove(engine, "before_cursor_execute", record)
+
+
+class TestIdentityCache:
+    def test_warm_cache_answers_without_queries(self, db, linked, statements):
+        assert chat_identity.warm(TestSession()) == 2
+        statements.clear()
+        assert "Админ-команды" in _run(telegram_bot._cmd_help, 1)[0]
+        assert _run(telegram_bot._cmd_health, 2) == ["⛔ Только для администраторов."]
+        assert statements == []
+
+    def test_unknown_chat_cached_until_linked(self, db, regular_user, statements):
+        assert "Аккаунт не привязан" in _run(telegram_bot._cmd_status, 55)[0]
+        statements.clear()
+        assert "Аккаунт не привязан" in _run(telegram_bot._cmd_status, 55)[0]
+        assert statements == []
+
+        _run(telegram_bot._cmd_start, 55, "testuser")
+        assert chat_identity.cached("55") is chat_identity.MISS
+        assert "Нет активных сессий" in _run(telegram_bot._cmd_status, 55)[0]
+        assert chat_identity.cached("55").user_id == regular_user[0].id
+
+    def test_profile_update_and_admin_change_invalidate(self, client, db, linked, regular_user):
+        chat_identity.warm(TestSession())
+        headers = get_auth_header(client, "testuser", regular_user[1])
+        assert client.put("/api/profile", json={"telegram_id": "3"}, headers=headers).status_code == 200
+        assert chat_identity.cached("2") is chat_identity.MISS  # old chat
+        assert chat_identity.cached("3") is chat_identity.MISS
+
+        chat_identity.warm(TestSession())
+        user = db.query(User).filter(User.username == "testuser").one()
+        user.is_admin = True
+        db.flush()
+        assert chat_identity.cached("3").is_admin is False  # not until the commit
+        db.commit()
+        assert _run(telegram_bot._cmd_health, 3)[0].startswith("🏥")
+
+    def test_revoked_admin_rechecked(self, db, linked, statements):
+        chat_identity.warm(TestSession())
+        with engine.begin() as conn:  # as another process would, without the ORM events
+            conn.exec_driver_sql("UPDATE users SET is_admin = 0 WHERE telegram_id = '1'")
+        assert chat_identity.cached("1").is_admin is True
+        statements.clear()
+        assert _run(telegram_bot._cmd_kick, 1, "testuser") == ["⛔ Только для администраторов."]
+        assert statements
+        assert chat_identity.cached("1").is_admin is False
+
+    def test_rollback_keeps_entries(self, db, linked):
+        chat_identity.warm(TestSession())
+        db.query(User).filter(User.telegram_id == "2").one().name = "Renamed"
+        db.flush()
+        db.rollback()
+        assert chat_identity.cached("2").name != "Renamed"
@@ -0,0 +1,273 @@
+"""Tests for the Telegram outbox: persistence, rate limits, retries, digests."""
+
+import asyncio
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+import pytest
+from telegram.error import Forbidden, NetworkError, RetryAfter
+
+from backend import dump, dump_store, telegram_bot, telegram_outbox
+from backend.models import DumpJob, OutboxMessage, Session, TelegramFile
+from backend.sessions import signed_dump_url
+from backend.tests.conftest import TestSession, make_archive
+
+
+class FakeBot:
+    def __init__(self, fail=None, fail_upload=None):
+        self.sent = []
+        self.uploads = 0
+        self.documents = []  # uploaded file objects
+        self.fail = fail  # exception raised by every call
+        self.fail_upload = fail_upload  # upload number (1-based) that fails
+
+    async def send_message(self, chat_id, text):
+        if self.fail:
+            raise self.fail
+        self.sent.append((chat_id, text))
+
+    async def send_document(self, chat_id, document, caption, filename=None):
+        if self.fail:
+            raise self.fail
+        if isinstance(document, str):  # a file_id
+            self.sent.append((chat_id, "file_id", document))
+            return None
+        self.uploads += 1
+        if self.uploads == self.fail_upload:
+            raise NetworkError("connection reset")
+        self.sent.append((chat_id, filename, document.read()))
+        self.documents.append(document)
+        doc = type("Document", (), {"file_id": f"file-{self.uploads}"})()
+        return type("Message", (), {"document": doc})()
+
+
+def _queue(db, chat_id, count=1, **kw):
+    return [telegram_outbox.enqueue(db, chat_id, f"message {i}", **kw) for i in range(count)]
+
+
+class SlowUploadBot(FakeBot):
+    """Uploads hang until `release` is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = asyncio.Event()
+
+    async def send_document(self, *a, **kw):
+        await self.release.wait()
+        return await super().send_document(*a, **kw)
+
+
+def _drain(bot) -> float:
+    async def drain():
+        sender = telegram_outbox.Sender(bot, TestSession)
+        delay = await sender.drain_once()
+        await sender.join()
+        return delay
+    return asyncio.run(drain())
+
+
+class TestQueue:
+    def test_persisted_without_bot(self, db, admin_user, monkeypatch):
+        monkeypatch.setattr(telegram_outbox, "SessionLocal", TestSession)
+        monkeypatch.setattr("backend.database.SessionLocal", TestSession)
+        admin_user[0].telegram_id = "100"
+        db.commit()
+
+        asyncio.run(telegram_bot.notify_slot_available("200", "ppx-1"))
+        asyncio.run(telegram_bot.send_admin_alert("VM-4 down"))
+        rows = db.query(OutboxMessage).order_by(OutboxMessage.id).all()
+        assert [(r.chat_id, r.status) for r in rows] == [("200", "pending"), ("100", "pending")]
+        assert "VM-4 down" in rows[1].text
+
+
+class TestSender:
+    def test_per_chat_and_global_limits(self, db, monkeypatch):
+        monkeypatch.setattr(telegram_outbox, "GLOBAL_BURST", 3)
+        _queue(db, "a", 2)
+        for chat in "bcd":
+            _queue(db, chat)
+        bot = FakeBot()
+
+        assert _drain(bot) > 0
+        # One per chat (a's second waits for its bucket), three in total
+        assert [chat for chat, _ in bot.sent] == ["a", "b", "c"]
+        assert db.query(OutboxMessage).filter(OutboxMessage.status == "pending").count() == 2
+
+    def test_backlog_coalesced_into_digest(self, db):
+        _queue(db, "a", 5)
+        bot = FakeBot()
+        _drain(bot)
+        (chat, text), = bot.sent
+        assert chat == "a" and text.startswith("📬") and all(f"message {i}" in text for i in range(5))
+        assert {r.status for r in db.query(OutboxMessage)} == {"sent"}
+
+    def test_retry_after_pauses_without_using_attempts(self, db):
+        msg, = _queue(db, "a")
+        sender = telegram_outbox.Sender(FakeBot(fail=RetryAfter(7)), TestSession)
+        asyncio.run(sender.drain_once())
+        db.expire_all()
+        msg = db.get(OutboxMessage, msg.id)
+        assert (msg.status, msg.attempts) == ("pending", 0)
+        assert 5 < (msg.next_attempt_at - datetime.utcnow()).total_seconds() <= 7
+        assert sender.chats["a"].wait_time(sender.chats["a"].updated) > 5
+
+    def test_transient_errors_back_off_then_fail(self, db, monkeypatch):
+        monkeypatch.setattr(telegram_outbox, "MAX_ATTEMPTS", 2)
+        msg, = _queue(db, "a")
+        _drain(FakeBot(fail=NetworkError("timed out")))
+        db.expire_all()
+        row = db.get(OutboxMessage, msg.id)
+        assert (row.status, row.attempts) == ("pending", 1)
+        assert 3 < (row.next_attempt_at - datetime.utcnow()).total_seconds() <= telegram_outbox.RETRY_BASE_SEC
+
+        row.next_attempt_at = datetime.utcnow()
+        db.commit()
+        _drain(FakeBot(fail=NetworkError("timed out")))
+        db.expire_all()
+        assert db.get(OutboxMessage, msg.id).status == "failed"
+
+    def test_blocked_chat_fails_at_once(self, db):
+        msg, = _queue(db, "a")
+        _drain(FakeBot(fail=Forbidden("bot was blocked by the user")))
+        db.expire_all()
+        assert db.get(OutboxMessage, msg.id).status == "failed"
+
+    def test_dump_rebuilt_and_marked_delivered(self, db, tmp_path, monkeypatch, regular_user, sample_slot):
+        monkeypatch.setattr(dump, "DUMP_STORAGE", tmp_path / "dumps")
+        regular_user[0].telegram_id = "a"
+        session = Session(user_id=regular_user[0].id, slot_id=sample_slot.id, ended_at=datetime.utcnow())
+        db.add(session)
+        db.commit()
+        files = {"tabs.txt": b"https://perplexity.ai/|Perplexity\n"}
+        manifest = dump_store.ingest_archive(db, session.id, make_archive(tmp_path / "d.tar.gz", session.id, files))
+        dump.save_dump_path(db, session.id, str(manifest))
+        db.add(DumpJob(session_id=session.id, vm_host="vm1", status="done",
+                       created_at=datetime.utcnow() - timedelta(minutes=1)))
+        db.commit()
+
+        telegram_outbox.enqueue(db, "a", "🔚 Сессия завершена", session_id=session.id)
+        bot = FakeBot()
+        _drain(bot)
+        (chat, filename, data), = bot.sent
+        assert filename == f"session_{session.id}_dump.tar.gz" and data[:2] == b"\x1f\x8b"
+        db.expire_all()
+        assert db.get(Session, session.id).dump_sent is True
+        assert db.query(DumpJob).one().delivered_at is not None
+
+    def test_purge_keeps_pending(self, db):
+        sent, pending = _queue(db, "a", 2)
+        old = datetime.utcnow() - timedelta(days=30)
+        db.query(OutboxMessage).update({"created_at": old})
+        sent.status = "sent"
+        db.commit()
+        assert telegram_outbox.purge(db) == 1
+        assert db.query(OutboxMessage).one().id == pending.id
+
+
+def _archive_bytes(db, session_id) -> bytes:
+    return dump_store.materialize(db, session_id).read_bytes()
+
+
+class TestLargeDumps:
+    def test_file_id_reused_without_rebuild(self, db, stored_dump):
+        telegram_outbox.enqueue(db, "owner", "🔚 Сессия завершена", session_id=stored_dump.id)
+        bot = FakeBot()
+        _drain(bot)
+        (_, filename, data), = bot.sent
+        first = db.query(OutboxMessage).one()
+        assert first.upload_bytes == len(data) and first.upload_ms is not None
+        assert db.query(TelegramFile).one().file_id == "file-1"
+
+        # The cached archive expired; forwarding needs neither it nor an upload
+        dump_store.cache_path(stored_dump.id).unlink()
+        telegram_outbox.enqueue(db, "admin", "📤 Дамп", session_id=stored_dump.id)
+        _drain(bot)
+        assert bot.sent[-1] == ("admin", "file_id", "file-1") and bot.uploads == 1
+        assert not dump_store.cache_path(stored_dump.id).exists()
+        db.expire_all()
+        assert db.query(OutboxMessage).order_by(OutboxMessage.id.desc()).first().upload_bytes == 0
+
+    def test_forward_does_not_mark_delivered(self, db, stored_dump):
+        telegram_outbox.enqueue(db, "admin", "📤 Дамп", session_id=stored_dump.id)
+        _drain(FakeBot())
+        db.expire_all()
+        assert db.get(Session, stored_dump.id).dump_sent is False
+
+    def test_volumes_resume_after_failure(self, db, stored_dump, monkeypatch):
+        monkeypatch.setattr(telegram_outbox, "UPLOAD_LIMIT", 100_000)
+        monkeypatch.setattr(telegram_outbox, "VOLUME_SIZE", 90_000)
+        archive = _archive_bytes(db, stored_dump.id)
+        msg = telegram_outbox.enqueue(db, "owner", "🔚 Сессия завершена", session_id=stored_dump.id)
+
+        bot = FakeBot(fail_upload=2)
+        _drain(bot)
+        db.expire_all()
+        assert db.get(OutboxMessage, msg.id).status == "pending"
+        assert [f.part for f in db.query(TelegramFile)] == [1]
+
+        db.get(OutboxMessage, msg.id).next_attempt_at = datetime.utcnow()
+        db.commit()
+        _drain(bot)
+        volumes = bot.sent[1:]
+        assert volumes[0] == ("owner", "file_id", "file-1")  # not uploaded again
+        assert [v[1] for v in volumes[1:]] == [f"session_{stored_dump.id}_dump.tar.gz.{n:03d}" for n in (2, 3)]
+        assert bot.sent[0][2] + b"".join(v[2] for v in volumes[1:]) == archive
+        assert all(document.closed for document in bot.documents)
+        db.expire_all()
+        assert db.get(Session, stored_dump.id).dump_sent is True
+
+    def test_volume_reads_only_its_range(self, tmp_path):
+        path = tmp_path / "archive"
+        path.write_bytes(bytes(range(100)))
+        with telegram_outbox._Volume(str(path), 10, 20) as volume:
+            assert volume.read(5) == bytes(range(10, 15))
+            assert volume.read() == bytes(range(15, 30))
+            assert volume.read() == b""
+        assert volume.closed
+
+    def test_upload_does_not_hold_up_text(self, db, stored_dump):
+        telegram_outbox.enqueue(db, "owner", "🔚 Сессия завершена", session_id=stored_dump.id)
+        _queue(db, "b")
+        bot = SlowUploadBot()
+
+        async def scenario():
+            sender = telegram_outbox.Sender(bot, TestSession)
+            await sender.drain_once()
+            assert bot.sent == [("b", "message 0")]  # while the upload hangs
+            _queue(db, "c")
+            owner_text, = _queue(db, "owner")
+            await sender.drain_once()
+            assert [chat for chat, *_ in bot.sent] == ["b", "c"]  # owner's text waits its turn
+            bot.release.set()
+            await sender.join()
+            return owner_text
+
+        owner_text = asyncio.run(scenario())
+        assert [chat for chat, *_ in bot.sent] == ["b", "c", "owner"]
+        db.expire_all()
+        assert db.get(OutboxMessage, owner_text.id).status == "pending"
+        assert db.get(Session, stored_dump.id).dump_sent is True
+
+    def test_signed_link_over_limit(self, client, db, stored_dump, monkeypatch):
+        monkeypatch.setattr(telegram_outbox, "UPLOAD_LIMIT", 100_000)
+        monkeypatch.setattr("backend.config.settings.public_url", "https://taxi.test/")
+        telegram_outbox.enqueue(db, "owner", "🔚 Сессия завершена", session_id=stored_dump.id)
+        bot = FakeBot()
+        _drain(bot)
+        (chat, text), = bot.sent
+        link = text.split()[-1]
+        assert link.startswith(f"https://taxi.test/api/sessions/{stored_dump.id}/dump/link?")
+
+        url = urlsplit(link)
+        resp = client.get(f"{url.path}?{url.query}")  # no login
+        assert resp.status_code == 200 and resp.content == _archive_bytes(db, stored_dump.id)
+        assert client.get(f"{url.path}?{url.query}0").status_code == 403
+        old = urlsplit(signed_dump_url(stored_dump.id, datetime.utcnow() - timedelta(minutes=1)))
+        assert client.get(f"{old.path}?{old.query}").status_code == 410
+
+
+@pytest.mark.parametrize("value", [3, timedelta(seconds=3)])
+def test_retry_after_value_forms(value):
+    class Err:
+        retry_after = value
+    assert telegram_outbox._retry_after_seconds(Err()) == 3
@@ -0,0 +1,145 @@
+"""Tests for webhook mode: the secret-checked endpoint, and bot leadership."""
+
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from backend import leases, telegram_bot
+from backend.models import Lease
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 5, "date": 0, "text": "/status",
+        "chat": {"id": 42, "type": "private"},
+        "entities": [{"type": "bot_command", "offset": 0, "length": 7}],
+    },
+}
+
+
+class FakeBot:
+    def __init__(self):
+        self.calls = []
+
+    async def set_my_commands(self, commands):
+        self.calls.append("set_my_commands")
+
+    async def set_webhook(self, url, secret_token, allowed_updates):
+        self.calls.append(("set_webhook", url, secret_token))
+
+
+class FakeApp:
+    def __init__(self):
+        self.bot = FakeBot()
+        self.update_queue = asyncio.Queue()
+        self.updater = None
+
+
+@pytest.fixture
+def webhook(monkeypatch):
+    monkeypatch.setattr("backend.config.settings.telegram_bot_token", "123:abc")
+    monkeypatch.setattr("backend.config.settings.telegram_webhook_url", "https://taxi.test/")
+    app = FakeApp()
+    monkeypatch.setattr(telegram_bot, "_bot_app", app)
+    return app
+
+
+class TestLeases:
+    def test_one_holder_until_expiry(self, db):
+        ttl = timedelta(seconds=60)
+        assert leases.acquire(db, "bot", ttl, holder="a")
+        assert not leases.acquire(db, "bot", ttl, holder="b")
+        assert leases.acquire(db, "bot", ttl, holder="a")  # renewal
+        assert leases.holder_of(db, "bot") == "a"
+
+        db.query(Lease).update({"expires_at": leases._now() - timedelta(seconds=1)})
+        db.commit()
+        assert leases.holder_of(db, "bot") is None
+        assert leases.acquire(db, "bot", ttl, holder="b")
+        assert not leases.acquire(db, "bot", ttl, holder="a")
+
+    def test_release_frees_at_once(self, db):
+        leases.acquire(db, "bot", timedelta(minutes=5), holder="a")
+        leases.release(db, "bot", holder="b")  # not b's to give up
+        assert leases.holder_of(db, "bot") == "a"
+        leases.release(db, "bot", holder="a")
+        assert leases.acquire(db, "bot", timedelta(minutes=5), holder="b")
+
+
+class TestWebhook:
+    def test_off_without_url(self, client):
+        assert client.post("/api/telegram/webhook", json=UPDATE).status_code == 404
+
+    def test_secret_required(self, client, webhook):
+        assert client.post("/api/telegram/webhook", json=UPDATE).status_code == 403
+        bad = {"X-Telegram-Bot-Api-Secret-Token": "guess"}
+        assert client.post("/api/telegram/webhook", json=UPDATE, headers=bad).status_code == 403
+        assert webhook.update_queue.empty()
+
+    def test_update_queued_for_application(self, client, webhook, monkeypatch):
+        headers = {"X-Telegram-Bot-Api-Secret-Token": telegram_bot.webhook_secret()}
+        monkeypatch.setattr(webhook, "bot", None)  # Update.de_json only keeps a reference
+        resp = client.post("/api/telegram/webhook", json=UPDATE, headers=headers)
+        assert resp.status_code == 200
+        update = webhook.update_queue.get_nowait()
+        assert update.update_id == 1 and update.message.text == "/status"
+        assert update.effective_chat.id == 42
+
+    def test_not_running(self, client, webhook, monkeypatch):
+        monkeypatch.setattr(telegram_bot, "_bot_app", None)
+        headers = {"X-Telegram-Bot-Api-Secret-Token": telegram_bot.webhook_secret()}
+        assert client.post("/api/telegram/webhook", json=UPDATE, headers=headers).status_code == 503
+
+    def test_secret_shared_by_workers(self, webhook, monkeypatch):
+        derived = telegram_bot.webhook_secret()
+        assert derived == telegram_bot.webhook_secret() and "123:abc" not in derived
+        monkeypatch.setattr("backend.config.settings.telegram_webhook_secret", "configured")
+        assert telegram_bot.webhook_secret() == "configured"
+
+
+class TestLeadership:
+    def test_leader_registers_webhook_and_sends(self, webhook, monkeypatch):
+        started = []
+
+        async def start_sender(bot):
+            started.append(bot)
+
+        async def stop_sender():
+            started.clear()
+
+        monkeypatch.setattr("backend.telegram_outbox.start_sender", start_sender)
+        monkeypatch.setattr("backend.telegram_outbox.stop_sender", stop_sender)
+
+        asyncio.run(telegram_bot._become_leader())
+        assert telegram_bot._is_leader and started == [webhook.bot]
+        assert webhook.bot.calls[-1] == (
+            "set_webhook", "https://taxi.test/api/telegram/webhook", telegram_bot.webhook_secret(),
+        )
+        asyncio.run(telegram_bot._step_down())
+        assert not telegram_bot._is_leader and started == []
+
+    def test_failed_takeover_steps_down_and_releases(self, webhook, monkeypatch):
+        started, released = [], []
+
+        async def start_sender(bot):
+            started.append(bot)
+
+        async def stop_sender():
+            started.clear()
+
+        async def db(fn, *args):
+            released.append((fn, *args))
+
+        async def set_webhook(**_):
+            raise RuntimeError("Telegram unavailable")
+
+        monkeypatch.setattr("backend.telegram_outbox.start_sender", start_sender)
+        monkeypatch.setattr("backend.telegram_outbox.stop_sender", stop_sender)
+        monkeypatch.setattr(telegram_bot, "_db", db)
+        monkeypatch.setattr(webhook.bot, "set_webhook", set_webhook)
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(telegram_bot._become_leader())
+        assert not telegram_bot._is_leader and started == []
+        assert released == [(leases.release, telegram_bot.LEADER_LEASE)]
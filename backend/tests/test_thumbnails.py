@@ -0,0 +1,115 @@
+"""Tests for screenshot thumbnails: rendering, endpoint caching, LRU budget."""
+
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import dump, dump_store, thumbnails
+from backend.models import DumpFile, SessionDump
+from backend.tests.conftest import ended_session, get_auth_header, make_archive
+
+Image = pytest.importorskip("PIL.Image")
+
+
+@pytest.fixture(autouse=True)
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(dump, "DUMP_STORAGE", tmp_path / "dumps")
+    yield tmp_path / "dumps"
+    thumbnails.shutdown()
+
+
+def _png(width=1920, height=1080) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), (30, 90, 160)).save(out, "PNG")
+    return out.getvalue()
+
+
+def _stored(db, tmp_path, user, slot, screenshot: bytes | None = None) -> int:
+    files = {"tabs.txt": b"https://perplexity.ai/|Perplexity\n"}
+    if screenshot is not None:
+        files[thumbnails.SCREENSHOT] = screenshot
+    session = ended_session(db, user, slot)
+    archive = make_archive(tmp_path / f"d{session.id}.tar.gz", session.id, files)
+    manifest = dump_store.ingest_archive(db, session.id, archive)
+    db.add(SessionDump(session_id=session.id, tabs_count=1, has_screenshot=screenshot is not None))
+    dump.save_dump_path(db, session.id, str(manifest))
+    return session.id
+
+
+class TestRender:
+    def test_webp_within_bounds(self):
+        webp = thumbnails.render_thumbnail(_png())
+        with Image.open(io.BytesIO(webp)) as img:
+            assert img.format == "WEBP"
+            assert img.width <= thumbnails.THUMB_MAX_SIZE[0] and img.height <= thumbnails.THUMB_MAX_SIZE[1]
+        assert len(webp) < 20_000
+
+    def test_ensure_renders_once_and_indexes(self, db, tmp_path, regular_user, sample_slot):
+        sid = _stored(db, tmp_path, regular_user[0], sample_slot, _png())
+        path = thumbnails.ensure_thumbnail(db, sid)
+        assert path == dump_store.thumb_path(sid)
+        mtime = path.stat().st_mtime_ns
+        assert thumbnails.ensure_thumbnail(db, sid).stat().st_mtime_ns == mtime
+        row = db.query(DumpFile).filter(DumpFile.kind == "thumb").one()
+        assert row.size == path.stat().st_size
+        assert dump_store.totals(db)["thumb"]["files"] == 1
+
+    def test_undecodable_screenshot(self, db, tmp_path, regular_user, sample_slot):
+        sid = _stored(db, tmp_path, regular_user[0], sample_slot, b"not a png")
+        assert thumbnails.ensure_thumbnail(db, sid) is None
+
+    def test_release_drops_thumbnail(self, db, tmp_path, regular_user, sample_slot):
+        sid = _stored(db, tmp_path, regular_user[0], sample_slot, _png())
+        path = thumbnails.ensure_thumbnail(db, sid)
+        dump_store.release(db, sid)
+        assert not path.exists()
+        assert dump_store.totals(db)["thumb"] == {"files": 0, "bytes": 0}
+
+
+class TestBudget:
+    def test_evicts_least_recently_used(self, db, tmp_path, regular_user, sample_slot):
+        sids = [_stored(db, tmp_path, regular_user[0], sample_slot, _png()) for _ in range(3)]
+        for sid in sids:
+            thumbnails.ensure_thumbnail(db, sid)
+        # The first one was viewed most recently
+        thumbnails.ensure_thumbnail(db, sids[0])
+        db.query(DumpFile).filter(DumpFile.path == str(dump_store.thumb_path(sids[1]))).update(
+            {"expires_at": datetime.utcnow() + timedelta(days=1)},
+        )
+        db.commit()
+
+        size = dump_store.thumb_path(sids[0]).stat().st_size
+        assert thumbnails.enforce_budget(db, budget=size + size // 2) == 2
+        assert dump_store.thumb_path(sids[0]).exists()
+        assert not dump_store.thumb_path(sids[1]).exists()
+        assert not dump_store.thumb_path(sids[2]).exists()
+        assert dump_store.totals(db)["thumb"]["files"] == 1
+
+
+class TestEndpoint:
+    def _get(self, client, path):
+        return client.get(path, headers=get_auth_header(client, "testuser", "user123"))
+
+    def test_serves_webp_with_immutable_cache(self, client, db, tmp_path, regular_user, sample_slot):
+        sid = _stored(db, tmp_path, regular_user[0], sample_slot, _png())
+        summary = self._get(client, f"/api/sessions/{sid}/summary").json()
+        assert summary["thumbnail_url"] == f"/api/sessions/{sid}/thumbnail"
+
+        resp = self._get(client, summary["thumbnail_url"])
+        assert resp.status_code == 200
+        assert resp.headers["content-type"] == "image/webp"
+        assert "immutable" in resp.headers["cache-control"]
+        assert resp.content[:4] == b"RIFF"
+
+        history = self._get(client, "/api/profile/sessions").json()
+        assert history[0]["thumbnail_url"] == summary["thumbnail_url"]
+
+    def test_no_screenshot(self, client, db, tmp_path, regular_user, sample_slot):
+        sid = _stored(db, tmp_path, regular_user[0], sample_slot)
+        assert self._get(client, f"/api/sessions/{sid}/summary").json()["thumbnail_url"] is None
+        assert self._get(client, f"/api/sessions/{sid}/thumbnail").status_code == 404
+
+    def test_other_users_thumbnail_forbidden(self, client, db, tmp_path, admin_user, regular_user, sample_slot):
+        sid = _stored(db, tmp_path, admin_user[0], sample_slot, _png())
+        assert self._get(client, f"/api/sessions/{sid}/thumbnail").status_code == 403
@@ -0,0 +1,128 @@
+"""Screenshot thumbnails for session history and summaries.
+
+Dumps carry a full-resolution screenshot.png from scrot — far too heavy for
+a history list. A small WebP thumbnail is rendered in a process pool
+(Pillow's resize and encode are CPU-bound and would hold the GIL):
+
+- eagerly by the dump worker right after ingest, and
+- lazily on first request if it is missing (evicted, or an older dump).
+
+Thumbnails live next to the manifest (manifests/session_<id>.thumb.webp)
+and are indexed in dump_files as kind "thumb". Every use pushes their
+expiry out by THUMB_TTL, so the oldest expiry is the least recently used;
+when the thumb total in storage_totals goes over THUMB_BUDGET_BYTES the
+least recently used ones are deleted first.
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy.orm import Session as DbSession
+
+from backend import dump_store
+from backend.models import DumpFile, StorageTotal
+
+logger = logging.getLogger(__name__)
+
+SCREENSHOT = "screenshot.png"
+THUMB_MAX_SIZE = (480, 300)
+THUMB_QUALITY = 70
+THUMB_TTL = timedelta(days=30)
+THUMB_BUDGET_BYTES = 64 * 1024 * 1024
+MAX_SCREENSHOT_BYTES = 32 * 1024 * 1024  # refuse to decode anything larger
+RENDER_WORKERS = 2
+
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)  # naive UTC, like the DB columns
+
+
+def render_thumbnail(png: bytes) -> bytes:
+    """PNG bytes → WebP thumbnail bytes. Runs in a worker process."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(png)) as img:
+        img = img.convert("RGB")
+        img.thumbnail(THUMB_MAX_SIZE, Image.Resampling.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, "WEBP", quality=THUMB_QUALITY, method=4)
+        return out.getvalue()
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=RENDER_WORKERS)
+        return _executor
+
+
+def shutdown() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def ensure_thumbnail(db: DbSession, session_id: int) -> Path | None:
+    """Return the session's thumbnail, rendering it if needed.
+
+    None when the dump has no screenshot (or it can't be decoded).
+    Blocking — call from a worker thread.
+    """
+    path = dump_store.thumb_path(session_id)
+    if not path.exists():
+        manifest = dump_store.load_manifest(session_id)
+        member = dump_store.find_member(manifest, SCREENSHOT) if manifest else None
+        if member is None or member["size"] > MAX_SCREENSHOT_BYTES:
+            return None
+        png = b"".join(dump_store.iter_member(member))
+        try:
+            webp = _pool().submit(render_thumbnail, png).result()
+        except Exception as e:
+            logger.warning("Thumbnail for session %d failed: %s", session_id, e)
+            return None
+        dump_store.write_atomic(path, webp)
+    dump_store.index_file(
+        db, path, "thumb", path.stat().st_size,
+        session_id=session_id, expires_at=_now() + THUMB_TTL,
+    )
+    db.commit()
+    enforce_budget(db)
+    return path if path.exists() else None
+
+
+def enforce_budget(db: DbSession, budget: int = THUMB_BUDGET_BYTES) -> int:
+    """Delete least recently used thumbnails until under budget. Returns how many."""
+    total = db.query(StorageTotal.bytes).filter(StorageTotal.kind == "thumb").scalar() or 0
+    evicted = 0
+    while total > budget:
+        oldest = (
+            db.query(DumpFile)
+            .filter(DumpFile.kind == "thumb")
+            .order_by(DumpFile.expires_at)
+            .limit(50)
+            .all()
+        )
+        if not oldest:
+            break
+        for row in oldest:
+            if total <= budget:
+                break
+            total -= row.size
+            dump_store.unindex_file(db, row.path)
+            evicted += 1
+        db.commit()
+    if evicted:
+        logger.info("Evicted %d thumbnails (budget %d bytes)", evicted, budget)
+    return evicted
@@ -1,6 +1,9 @@
-"""WebSocket endpoint for real-time slot status updates.
+"""WebSocket endpoints for real-time updates.
 
-Broadcasts slot changes (occupy/release/queue) to all connected clients.
+/ws/slots — slot changes (occupy/release/queue), open to every client.
+/ws/admin — health transitions (VM up/down, service status, VPN peers),
+            admins only; the JWT is passed as ?token= since browsers can't
+            set headers on WebSocket requests.
 """
 
 from __future__ import annotations
@@ -10,7 +13,12 @@ import json
 import logging
 from typing import Any
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, status
+from sqlalchemy.orm import Session as DbSession
+
+from backend.auth import decode_token
+from backend.database import get_db
+from backend.models import User
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +26,7 @@ router = APIRouter()
 
 # Connected WebSocket clients
 _clients: set[WebSocket] = set()
+_admin_clients: set[WebSocket] = set()
 
 
 @router.websocket("/ws/slots")
@@ -40,27 +49,66 @@ async def slots_websocket(websocket: WebSocket):
         logger.info("WS client disconnected. Total: %d", len(_clients))
 
 
-async def broadcast(event: str, payload: dict[str, Any]) -> None:
-    """Broadcast an event to all connected WebSocket clients.
-
-    Args:
-        event: Event type ("slot_occupied", "slot_released", "queue_changed")
-        payload: Event data to send
-    """
-    if not _clients:
+@router.websocket("/ws/admin")
+async def admin_websocket(
+    websocket: WebSocket,
+    token: str = "",
+    db: DbSession = Depends(get_db),
+):
+    """WebSocket connection for admin health events."""
+    user_id = decode_token(token)
+    user = db.query(User).filter(User.id == user_id).first() if user_id else None
+    db.close()  # don't hold a DB session for the lifetime of the socket
+    if not user or not user.is_admin:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
 
-    message = json.dumps({"event": event, **payload})
+    await websocket.accept()
+    _admin_clients.add(websocket)
+    logger.info("Admin WS client connected. Total: %d", len(_admin_clients))
+
+    try:
+        while True:
+            data = await websocket.receive_text()
+            if data == "ping":
+                await websocket.send_text("pong")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        _admin_clients.discard(websocket)
+        logger.info("Admin WS client disconnected. Total: %d", len(_admin_clients))
+
+
+async def _send_all(clients: set[WebSocket], message: str) -> None:
     dead: list[WebSocket] = []
 
-    for ws in _clients:
+    for ws in list(clients):
         try:
             await ws.send_text(message)
         except Exception:
             dead.append(ws)
 
     for ws in dead:
-        _clients.discard(ws)
+        clients.discard(ws)
+
+
+async def broadcast(event: str, payload: dict[str, Any]) -> None:
+    """Broadcast an event to all connected WebSocket clients.
+
+    Args:
+        event: Event type ("slot_occupied", "slot_released", "slot_reserved", "queue_changed")
+        payload: Event data to send
+    """
+    if not _clients:
+        return
+    await _send_all(_clients, json.dumps({"event": event, **payload}))
+
+
+async def broadcast_admin(event: str, payload: dict[str, Any]) -> None:
+    """Broadcast an event to connected admin clients ("health_transition")."""
+    if not _admin_clients:
+        return
+    await _send_all(_admin_clients, json.dumps({"event": event, **payload}))
 
 
 def broadcast_sync(event: str, payload: dict[str, Any]) -> None:
@@ -1,83 +1,154 @@
 #!/bin/bash
 # collect_dump.sh — Collect session artifacts from a VDI VM.
 #
-# Usage: ./collect_dump.sh <session_id> <chrome_profile>
+# Usage:
+#   ./collect_dump.sh prepare <session_id> <chrome_profile> [since_epoch] [until_epoch]
+#       Stage artifacts in /tmp/session_<id>_dump and print metadata JSON
+#       (incl. archive_sha256 / archive_size of the archive stream) to stdout.
+#       since_epoch: session start (unix seconds), default: 2 hours ago.
+#       until_epoch: session end (unix seconds), default: now — History rows
+#       after it belong to whoever used the VM next.
+#   ./collect_dump.sh stream <session_id> [offset]
+#       Write the archive to stdout, starting at byte <offset> (resume).
+#   ./collect_dump.sh cleanup <session_id>
+#       Remove the staging directory.
+#   ./collect_dump.sh <session_id> <chrome_profile>
+#       Legacy: format 1 + write /tmp/session_<id>_dump.tar.gz + _meta.json.
+#
+# Dump formats (DUMP_FORMAT env, recorded as "format_version" in metadata):
+#   2 (default) — only the session-window rows of Chrome History are
+#       extracted on the VM into history.json; the archive is compressed
+#       with zstd (ZSTD_LEVEL, default 12) if installed, else gzip.
+#   1 — full copy of the Chrome History database, gzip.
+#
+# The archive is never written to disk in streaming mode: it is produced on
+# the fly from the staging dir, deterministically (sorted names, fixed
+# mtimes/owners, gzip -n), so every `stream` call yields identical bytes and
+# an interrupted transfer can resume from any offset.
 #
 # Collects:
-#   - Chrome History (tabs, downloads)
+#   - Chrome History: session-window tabs and downloads (v2) or the whole DB (v1)
 #   - Clipboard content (xclip)
 #   - Screenshot (scrot)
 #   - Downloads folder listing
 #   - Metadata JSON
 #
-# Outputs: /tmp/session_<id>_dump.tar.gz + _meta.json
+# Exit codes: 0 ok, 2 usage, 3 staging dir missing (run prepare again).
 
 set -euo pipefail
 
-SESSION_ID="${1:?Usage: $0 <session_id> <chrome_profile>}"
-CHROME_PROFILE="${2:-Default}"
-
-DUMP_DIR="/tmp/session_${SESSION_ID}_dump"
-ARCHIVE="/tmp/session_${SESSION_ID}_dump.tar.gz"
-META_FILE="/tmp/session_${SESSION_ID}_dump_meta.json"
-
-# Clean up previous dump
-rm -rf "$DUMP_DIR" "$ARCHIVE" "$META_FILE"
-mkdir -p "$DUMP_DIR"
-
-echo "[dump] Collecting session ${SESSION_ID} artifacts..."
-
-# ── 1. Chrome History (tabs + downloads) ──
-HISTORY_DB="$HOME/.config/google-chrome/${CHROME_PROFILE}/History"
-TABS_COUNT=0
-FILES_COUNT=0
-
-if [ -f "$HISTORY_DB" ]; then
-    # Copy to avoid lock issues
-    cp "$HISTORY_DB" "$DUMP_DIR/History"
-
-    # Extract recent URLs (last 2 hours)
-    TABS_COUNT=$(sqlite3 "$DUMP_DIR/History" \
-        "SELECT COUNT(*) FROM urls WHERE last_visit_time > (strftime('%s','now')-7200)*1000000+11644473600000000;" \
-        2>/dev/null || echo "0")
-
-    # Extract recent downloads
-    FILES_COUNT=$(sqlite3 "$DUMP_DIR/History" \
-        "SELECT COUNT(*) FROM downloads WHERE start_time > (strftime('%s','now')-7200)*1000000+11644473600000000;" \
-        2>/dev/null || echo "0")
-
-    # Save tab list as text
-    sqlite3 "$DUMP_DIR/History" \
-        "SELECT url, title FROM urls WHERE last_visit_time > (strftime('%s','now')-7200)*1000000+11644473600000000 ORDER BY last_visit_time DESC LIMIT 50;" \
-        > "$DUMP_DIR/tabs.txt" 2>/dev/null || true
-
-    # Save download list
-    sqlite3 "$DUMP_DIR/History" \
-        "SELECT target_path FROM downloads WHERE start_time > (strftime('%s','now')-7200)*1000000+11644473600000000;" \
-        > "$DUMP_DIR/downloads.txt" 2>/dev/null || true
-else
-    echo "[dump] Chrome History not found at ${HISTORY_DB}"
-fi
-
-# ── 2. Clipboard ──
-if command -v xclip &>/dev/null; then
-    xclip -selection clipboard -o > "$DUMP_DIR/clipboard.txt" 2>/dev/null || true
-fi
-
-# ── 3. Screenshot ──
-if command -v scrot &>/dev/null; then
-    scrot "$DUMP_DIR/screenshot.png" 2>/dev/null || true
-elif command -v gnome-screenshot &>/dev/null; then
-    gnome-screenshot -f "$DUMP_DIR/screenshot.png" 2>/dev/null || true
-fi
-
-# ── 4. Downloads folder listing ──
-ls -la "$HOME/Downloads/" > "$DUMP_DIR/downloads_dir.txt" 2>/dev/null || true
-
-# ── 5. Metadata JSON ──
-cat > "$META_FILE" <<EOJSON
+log() { echo "[dump] $*" >&2; }
+
+usage() {
+    echo "Usage: $0 {prepare <session_id> <chrome_profile> | stream <session_id> [offset] | cleanup <session_id>}" >&2
+    exit 2
+}
+
+DUMP_FORMAT="${DUMP_FORMAT:-2}"
+ZSTD_LEVEL="${ZSTD_LEVEL:-12}"
+
+# Deterministic archive of the staging dir on stdout. The compressor is
+# read back from the staged metadata, so `stream` always matches `prepare`.
+archive_stream() {
+    local compression=gzip
+    if grep -q '"compression": "zstd"' "$DUMP_DIR/metadata.json" 2>/dev/null; then
+        compression=zstd
+    fi
+    tar --sort=name --mtime='@0' --owner=0 --group=0 --numeric-owner \
+        -C /tmp -cf - "session_${SESSION_ID}_dump" |
+    if [ "$compression" = zstd ]; then
+        zstd -q -T1 -"${ZSTD_LEVEL}" -c  # single-threaded: byte-identical output
+    else
+        gzip -n -6
+    fi
+}
+
+# Rows of a query as a JSON array ("[]" when empty)
+json_rows() {
+    local out
+    out=$(sqlite3 -json "$1" "$2" 2>/dev/null || true)
+    echo "${out:-[]}"
+}
+
+collect() {
+    rm -rf "$DUMP_DIR"
+    mkdir -p "$DUMP_DIR"
+
+    log "Collecting session ${SESSION_ID} artifacts (format ${DUMP_FORMAT})..."
+
+    COMPRESSION=gzip
+    if [ "$DUMP_FORMAT" = "2" ] && command -v zstd &>/dev/null; then
+        COMPRESSION=zstd
+    fi
+
+    # ── 1. Chrome History (tabs + downloads) ──
+    HISTORY_DB="$HOME/.config/google-chrome/${CHROME_PROFILE}/History"
+    TABS_COUNT=0
+    FILES_COUNT=0
+    # Chrome timestamps: microseconds since 1601-01-01
+    CHROME_SINCE=$(( (SINCE + 11644473600) * 1000000 ))
+    CHROME_UNTIL=$(( (UNTIL + 1 + 11644473600) * 1000000 - 1 ))  # through the end of that second
+    URLS_WHERE="last_visit_time > ${CHROME_SINCE} AND last_visit_time <= ${CHROME_UNTIL}"
+    DOWNLOADS_WHERE="start_time > ${CHROME_SINCE} AND start_time <= ${CHROME_UNTIL}"
+
+    if [ -f "$HISTORY_DB" ]; then
+        # Copy to avoid lock issues (outside the staging dir: v2 ships rows only)
+        WORK_DB="/tmp/session_${SESSION_ID}_History"
+        cp "$HISTORY_DB" "$WORK_DB"
+
+        TABS_COUNT=$(sqlite3 "$WORK_DB" "SELECT COUNT(*) FROM urls WHERE ${URLS_WHERE};" 2>/dev/null || echo "0")
+        FILES_COUNT=$(sqlite3 "$WORK_DB" "SELECT COUNT(*) FROM downloads WHERE ${DOWNLOADS_WHERE};" 2>/dev/null || echo "0")
+
+        # Save tab list as text
+        sqlite3 "$WORK_DB" \
+            "SELECT url, title FROM urls WHERE ${URLS_WHERE} ORDER BY last_visit_time DESC LIMIT 50;" \
+            > "$DUMP_DIR/tabs.txt" 2>/dev/null || true
+
+        # Save download list
+        sqlite3 "$WORK_DB" \
+            "SELECT target_path FROM downloads WHERE ${DOWNLOADS_WHERE};" \
+            > "$DUMP_DIR/downloads.txt" 2>/dev/null || true
+
+        if [ "$DUMP_FORMAT" = "2" ]; then
+            # Session-window rows only, instead of the whole database
+            {
+                printf '{"urls": '
+                json_rows "$WORK_DB" "SELECT url, title, last_visit_time FROM urls WHERE ${URLS_WHERE} ORDER BY last_visit_time DESC;"
+                printf ', "downloads": '
+                json_rows "$WORK_DB" "SELECT target_path, start_time FROM downloads WHERE ${DOWNLOADS_WHERE} ORDER BY start_time DESC;"
+                printf '}\n'
+            } > "$DUMP_DIR/history.json"
+            rm -f "$WORK_DB"
+        else
+            mv "$WORK_DB" "$DUMP_DIR/History"
+        fi
+    else
+        log "Chrome History not found at ${HISTORY_DB}"
+    fi
+
+    # ── 2. Clipboard ──
+    if command -v xclip &>/dev/null; then
+        xclip -selection clipboard -o > "$DUMP_DIR/clipboard.txt" 2>/dev/null || true
+    fi
+
+    # ── 3. Screenshot ──
+    if command -v scrot &>/dev/null; then
+        scrot "$DUMP_DIR/screenshot.png" 2>/dev/null || true
+    elif command -v gnome-screenshot &>/dev/null; then
+        gnome-screenshot -f "$DUMP_DIR/screenshot.png" 2>/dev/null || true
+    fi
+
+    # ── 4. Downloads folder listing ──
+    ls -la "$HOME/Downloads/" > "$DUMP_DIR/downloads_dir.txt" 2>/dev/null || true
+
+    # ── 5. Metadata JSON ──
+    cat > "$DUMP_DIR/metadata.json" <<EOJSON
 {
     "session_id": ${SESSION_ID},
+    "format_version": ${DUMP_FORMAT},
+    "compression": "${COMPRESSION}",
+    "window_start": ${SINCE},
+    "window_end": ${UNTIL},
     "chrome_profile": "${CHROME_PROFILE}",
     "tabs_count": ${TABS_COUNT},
     "files_count": ${FILES_COUNT},
@@ -86,15 +157,83 @@ cat > "$META_FILE" <<EOJSON
 }
 EOJSON
 
-cp "$META_FILE" "$DUMP_DIR/metadata.json"
-
-# ── 6. Archive ──
-tar -czf "$ARCHIVE" -C /tmp "session_${SESSION_ID}_dump"
-
-echo "[dump] Archive created: ${ARCHIVE}"
-echo "[dump] Tabs: ${TABS_COUNT}, Files: ${FILES_COUNT}"
-
-# Clean up temp dir
-rm -rf "$DUMP_DIR"
+    log "Tabs: ${TABS_COUNT}, Files: ${FILES_COUNT}"
+}
 
-echo "[dump] Done."
+CMD="${1:-}"
+case "$CMD" in
+    prepare)
+        [ -n "${2:-}" ] || usage
+        SESSION_ID="$2"
+        CHROME_PROFILE="${3:-Default}"
+        SINCE="${4:-$(( $(date +%s) - 7200 ))}"
+        UNTIL="${5:-$(date +%s)}"
+        DUMP_DIR="/tmp/session_${SESSION_ID}_dump"
+        collect
+
+        # Checksum + size of the exact byte stream `stream` will send,
+        # computed in one pass without writing the archive anywhere.
+        FIFO="/tmp/session_${SESSION_ID}_dump.size.fifo"
+        rm -f "$FIFO"
+        mkfifo "$FIFO"
+        wc -c < "$FIFO" > "${FIFO}.out" &
+        WC_PID=$!
+        ARCHIVE_SHA=$(archive_stream | tee "$FIFO" | sha256sum | cut -d' ' -f1)
+        wait "$WC_PID"
+        ARCHIVE_SIZE=$(tr -d ' ' < "${FIFO}.out")
+        rm -f "$FIFO" "${FIFO}.out"
+
+        # metadata.json + archive fields, on stdout for the backend
+        sed '$d' "$DUMP_DIR/metadata.json"
+        cat <<EOJSON
+    ,"archive_sha256": "${ARCHIVE_SHA}",
+    "archive_size": ${ARCHIVE_SIZE}
+}
+EOJSON
+        ;;
+
+    stream)
+        [ -n "${2:-}" ] || usage
+        SESSION_ID="$2"
+        OFFSET="${3:-0}"
+        DUMP_DIR="/tmp/session_${SESSION_ID}_dump"
+        if [ ! -d "$DUMP_DIR" ]; then
+            log "Staging dir ${DUMP_DIR} missing"
+            exit 3
+        fi
+        if [ "$OFFSET" -gt 0 ]; then
+            archive_stream | tail -c +"$((OFFSET + 1))"
+        else
+            archive_stream
+        fi
+        ;;
+
+    cleanup)
+        [ -n "${2:-}" ] || usage
+        SESSION_ID="$2"
+        rm -rf "/tmp/session_${SESSION_ID}_dump"
+        ;;
+
+    ""|-h|--help)
+        usage
+        ;;
+
+    *)
+        # Legacy mode: <session_id> <chrome_profile> → /tmp archive + meta
+        SESSION_ID="$1"
+        CHROME_PROFILE="${2:-Default}"
+        SINCE=$(( $(date +%s) - 7200 ))
+        UNTIL=$(date +%s)
+        DUMP_FORMAT=1
+        DUMP_DIR="/tmp/session_${SESSION_ID}_dump"
+        ARCHIVE="/tmp/session_${SESSION_ID}_dump.tar.gz"
+        META_FILE="/tmp/session_${SESSION_ID}_dump_meta.json"
+        rm -f "$ARCHIVE" "$META_FILE"
+        collect
+        cp "$DUMP_DIR/metadata.json" "$META_FILE"
+        archive_stream > "$ARCHIVE"
+        log "Archive created: ${ARCHIVE}"
+        rm -rf "$DUMP_DIR"
+        log "Done."
+        ;;
+esac
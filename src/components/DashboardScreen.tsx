@@ -35,6 +35,9 @@ interface SlotFromApi {
   occupant_name: string | null;
   session_minutes: number | null;
   queue_size: number;
+  reserved_for: string | null;
+  reserved_until: string | null;
+  free_until: string | null;
 }
 
 interface Category {
@@ -66,8 +69,25 @@ interface BookingOut {
   created_at: string;
 }
 
+interface AvailabilityOut {
+  start: string;
+  cell_min: number;
+  cells: number;
+  slots: Record<string, string>; // base64 busy bitmap, cell i = bit i % 8 of byte i / 8
+}
+
 /* ───── Helpers ───── */
 
+/** Whether any cell of a free/busy bitmap in [first, first + count) is busy. */
+function isBusy(bitmap: string, first: number, count: number): boolean {
+  const bytes = atob(bitmap);
+  for (let i = first; i < first + count; i++) {
+    if (i >= bytes.length * 8) break;
+    if ((bytes.charCodeAt(i >> 3) >> (i & 7)) & 1) return true;
+  }
+  return false;
+}
+
 function groupByCategory(slots: SlotFromApi[]): Category[] {
   const map = new Map<string, Category>();
   for (const s of slots) {
@@ -181,6 +201,7 @@ const DashboardScreen = () => {
       api.post<BookingOut>("/bookings", body),
     onSuccess: () => {
       queryClient.invalidateQueries({ queryKey: ["bookings"] });
+      queryClient.invalidateQueries({ queryKey: ["availability"] });
       toast({ title: "Бронь подтверждена", description: "Напомним в Telegram за 5 мин" });
       setBookingSlotId(null);
     },
@@ -194,6 +215,7 @@ const DashboardScreen = () => {
     mutationFn: (id: number) => api.delete(`/bookings/${id}`),
     onSuccess: () => {
       queryClient.invalidateQueries({ queryKey: ["bookings"] });
+      queryClient.invalidateQueries({ queryKey: ["availability"] });
       toast({ title: "Бронь отменена" });
     },
   });
@@ -213,6 +235,21 @@ const DashboardScreen = () => {
   const [bookingTime, setBookingTime] = useState("10:00");
   const [bookingDuration, setBookingDuration] = useState("60");
 
+  // Free/busy grid of the slot being booked, so taken times can't be picked
+  const bookingDay = bookingDate ? format(bookingDate, "yyyy-MM-dd") : null;
+  const { data: availability } = useQuery<AvailabilityOut>({
+    queryKey: ["availability", bookingSlotId, bookingDay],
+    queryFn: () => api.get<AvailabilityOut>(`/bookings/availability?from=${bookingDay}&slots=${bookingSlotId}`),
+    enabled: !!bookingSlotId && !!bookingDay,
+  });
+  const isTimeTaken = (t: string) => {
+    const bitmap = bookingSlotId ? availability?.slots[bookingSlotId] : undefined;
+    if (!bitmap || !availability) return false;
+    const [h, m] = t.split(":").map(Number);
+    const first = Math.floor((h * 60 + m) / availability.cell_min);
+    return isBusy(bitmap, first, Math.ceil(Number(bookingDuration) / availability.cell_min));
+  };
+
   // Tutorial modal state
   const [tutorialSlot, setTutorialSlot] = useState<string | null>(null);
 
@@ -474,10 +511,16 @@ const DashboardScreen = () => {
                       <div className="mt-1 flex items-center gap-1.5 text-sm">
                         <span className="inline-block h-2 w-2 rounded-full" style={{ backgroundColor: slot.available ? "hsl(var(--success))" : "hsl(var(--destructive))" }} />
                         {slot.available ? (
-                          <span className="text-[hsl(var(--success))]">Свободен</span>
+                          <span className="text-[hsl(var(--success))]">
+                            Свободен
+                            {slot.free_until &&
+                              ` до ${new Date(slot.free_until + "Z").toLocaleTimeString("ru-RU", { hour: "2-digit", minute: "2-digit" })} (бронь)`}
+                          </span>
                         ) : (
                           <span className="text-muted-foreground">
-                            Занято: {slot.occupant_name} — {slot.session_minutes} мин
+                            {slot.occupant_name
+                              ? `Занято: ${slot.occupant_name} — ${slot.session_minutes} мин`
+                              : `Зарезервировано: ${slot.reserved_for}`}
                             {slot.queue_size > 0 && ` · Очередь: ${slot.queue_size}`}
                           </span>
                         )}
@@ -588,7 +631,11 @@ const DashboardScreen = () => {
               <Select value={bookingTime} onValueChange={setBookingTime}>
                 <SelectTrigger className="mt-1"><SelectValue /></SelectTrigger>
                 <SelectContent>
-                  {timeSlots.map((t) => <SelectItem key={t} value={t}>{t}</SelectItem>)}
+                  {timeSlots.map((t) => (
+                    <SelectItem key={t} value={t} disabled={isTimeTaken(t)}>
+                      {t}{isTimeTaken(t) && " — занято"}
+                    </SelectItem>
+                  ))}
                 </SelectContent>
               </Select>
             </div>
@@ -7,6 +7,7 @@ import { Checkbox } from "@/components/ui/checkbox";
 import { Dialog, DialogContent, DialogHeader, DialogTitle } from "@/components/ui/dialog";
 import { ArrowLeft, Clock, FileText, CheckCircle } from "lucide-react";
 import { useToast } from "@/hooks/use-toast";
+import { useAuthedImage } from "@/hooks/use-authed-image";
 
 interface SlotFromApi {
   id: string;
@@ -22,6 +23,9 @@ interface SessionHistoryItem {
   duration_min: number;
   end_reason: string | null;
   dump_path: string | null;
+  tabs_count: number;
+  files_count: number;
+  thumbnail_url: string | null;
 }
 
 interface ProfileData {
@@ -182,10 +186,17 @@ const ProfileScreen = () => {
                 return (
                   <div key={s.id} className="flex items-center justify-between rounded-lg border bg-card px-4 py-3">
                     <div className="flex items-center gap-3">
-                      <Clock className="h-4 w-4 text-muted-foreground shrink-0" />
+                      {s.thumbnail_url ? (
+                        <SessionThumb url={s.thumbnail_url} />
+                      ) : (
+                        <Clock className="h-4 w-4 text-muted-foreground shrink-0" />
+                      )}
                       <div>
                         <p className="text-sm font-medium text-foreground">{s.service_name}</p>
-                        <p className="text-xs text-muted-foreground">{dateStr}, {timeStr} — {s.duration_min} мин</p>
+                        <p className="text-xs text-muted-foreground">
+                          {dateStr}, {timeStr} — {s.duration_min} мин
+                          {s.tabs_count > 0 && ` · ${s.tabs_count} вкладок`}
+                        </p>
                       </div>
                     </div>
                     <div className="flex items-center gap-2">
@@ -238,4 +249,13 @@ const ProfileScreen = () => {
   );
 };
 
+const SessionThumb = ({ url }: { url: string }) => {
+  const src = useAuthedImage(url);
+  return src ? (
+    <img src={src} alt="" className="h-10 w-16 rounded object-cover shrink-0" loading="lazy" />
+  ) : (
+    <Clock className="h-4 w-4 text-muted-foreground shrink-0" />
+  );
+};
+
 export default ProfileScreen;
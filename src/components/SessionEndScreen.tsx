@@ -1,6 +1,7 @@
 import { useParams, useNavigate, useSearchParams } from "react-router-dom";
 import { useQuery } from "@tanstack/react-query";
 import { api } from "@/lib/api";
+import { useAuthedImage } from "@/hooks/use-authed-image";
 import { Button } from "@/components/ui/button";
 import { CheckCircle2, Loader2 } from "lucide-react";
 
@@ -15,6 +16,7 @@ interface SessionSummaryData {
   dump_sent: boolean;
   tabs_count: number;
   files_count: number;
+  thumbnail_url: string | null;
   telegram_status: string;
 }
 
@@ -38,6 +40,8 @@ const SessionEndScreen = () => {
     enabled: !!sessionId,
   });
 
+  const thumbnail = useAuthedImage(summary?.thumbnail_url);
+
   const onBack = () => navigate("/dashboard");
 
   const serviceName = summary?.service_name ?? slotId ?? "Unknown";
@@ -60,6 +64,10 @@ const SessionEndScreen = () => {
           </div>
         ) : (
           <>
+            {thumbnail && (
+              <img src={thumbnail} alt="Последний экран сессии" className="w-full rounded-xl border" />
+            )}
+
             {/* Details card */}
             <div className="rounded-xl border bg-card p-4 text-left text-sm space-y-1">
               <Row label="Сервис" value={serviceName} />
@@ -4,6 +4,7 @@ import { api } from "@/lib/api";
 import { Button } from "@/components/ui/button";
 import { RefreshCw, Wifi, WifiOff, CheckCircle, AlertTriangle, XCircle, Loader2 } from "lucide-react";
 import { useToast } from "@/hooks/use-toast";
+import { useAdminHealthWebSocket } from "@/hooks/use-admin-health-ws";
 import { cn } from "@/lib/utils";
 
 interface VmInfo {
@@ -19,6 +20,9 @@ interface ServiceStatus {
   service_name: string;
   status: string;
   detail: string | null;
+  latency_ms: number | null;
+  checked_at: string | null;
+  last_failure: string | null;
 }
 
 interface VpnStatus {
@@ -33,6 +37,34 @@ interface HealthData {
   vpn: VpnStatus;
 }
 
+interface HealthHistory {
+  step: number;
+  series: Record<string, [number, number, number, number][]>; // [bucket, avg, min, max]
+}
+
+/** Tiny inline SVG sparkline of bucket averages (values normalised to the series range). */
+const Sparkline = ({ points, color }: { points?: [number, number, number, number][]; color: string }) => {
+  if (!points || points.length < 2) return null;
+  const width = 120;
+  const height = 20;
+  const values = points.map((p) => p[1]);
+  const lo = Math.min(...values);
+  const hi = Math.max(...values);
+  const span = hi - lo || 1;
+  const path = values
+    .map((v, i) => {
+      const x = (i / (values.length - 1)) * width;
+      const y = height - 1 - ((v - lo) / span) * (height - 2);
+      return `${x.toFixed(1)},${y.toFixed(1)}`;
+    })
+    .join(" ");
+  return (
+    <svg width={width} height={height} viewBox={`0 0 ${width} ${height}`} className="block">
+      <polyline points={path} fill="none" stroke={color} strokeWidth={1.5} />
+    </svg>
+  );
+};
+
 const statusLabel = (s: string) => {
   if (s === "ok") return { text: "Активна", color: "hsl(var(--success))", icon: <CheckCircle className="h-3.5 w-3.5" /> };
   if (s === "warn") return { text: "Cookie истекла", color: "hsl(45, 93%, 47%)", icon: <AlertTriangle className="h-3.5 w-3.5" /> };
@@ -44,6 +76,11 @@ const HealthTab = () => {
   const queryClient = useQueryClient();
   const [lastRefresh, setLastRefresh] = useState<Date>(new Date());
 
+  // Health transitions are pushed over /ws/admin; poll only while it is down
+  const live = useAdminHealthWebSocket((t) => {
+    toast({ title: `${t.subject}: ${t.from} → ${t.to}`, description: t.detail ?? undefined });
+  });
+
   const { data: health, isLoading, isFetching } = useQuery<HealthData>({
     queryKey: ["admin-health"],
     queryFn: async () => {
@@ -51,8 +88,16 @@ const HealthTab = () => {
       setLastRefresh(new Date());
       return data;
     },
-    refetchInterval: 30_000, // Refresh every 30s
+    refetchInterval: live ? false : 30_000, // Fallback polling every 30s
+  });
+
+  // 7-day history (15-minute buckets) for sparklines
+  const { data: history } = useQuery<HealthHistory>({
+    queryKey: ["admin-health-history"],
+    queryFn: () => api.get<HealthHistory>("/admin/health/history?hours=168"),
+    refetchInterval: 15 * 60_000,
   });
+  const series = history?.series ?? {};
 
   const handleManualRefresh = () => {
     queryClient.invalidateQueries({ queryKey: ["admin-health"] });
@@ -90,7 +135,7 @@ const HealthTab = () => {
       {/* Refresh bar */}
       <div className="flex items-center justify-between">
         <span className="text-xs text-muted-foreground">
-          Обновлено: {refreshTimeStr} · Авто-обновление каждые 30с
+          Обновлено: {refreshTimeStr} · {live ? "Live-обновления" : "Авто-обновление каждые 30с"}
         </span>
         <Button size="sm" variant="outline" onClick={handleManualRefresh} disabled={isFetching} className="gap-1.5">
           <RefreshCw className={cn("h-3.5 w-3.5", isFetching && "animate-spin")} /> Обновить
@@ -117,6 +162,7 @@ const HealthTab = () => {
                 {vm.active_user ? `${vm.active_user}${vm.active_slot ? ` — ${vm.active_slot}` : ""}` : "Свободна"}
               </p>
               {vm.uptime && <p className="text-xs text-muted-foreground">Uptime: {vm.uptime}</p>}
+              <Sparkline points={series[`vm:${vm.vm_id}:up`]} color="hsl(var(--success))" />
               {!vm.is_healthy && (
                 <Button
                   size="sm"
@@ -167,6 +213,8 @@ const HealthTab = () => {
                 <div>
                   <span className="text-sm text-foreground">{s.service_name}</span>
                   {s.detail && <p className="text-xs text-muted-foreground">{s.detail}</p>}
+                  {s.latency_ms != null && <p className="text-xs text-muted-foreground">{s.latency_ms} мс</p>}
+                  <Sparkline points={series[`service:${s.slot_id}:latency_ms`]} color="hsl(var(--muted-foreground))" />
                 </div>
                 <span className="flex items-center gap-1.5 text-xs" style={{ color: st.color }}>
                   {st.icon} {st.text}
@@ -0,0 +1,104 @@
+import { useEffect, useRef, useCallback, useState } from "react";
+import { useQueryClient } from "@tanstack/react-query";
+
+export interface HealthTransition {
+  event: "health_transition";
+  kind: "vm" | "service" | "vpn" | "vpn_peer";
+  subject: string;
+  from: string;
+  to: string;
+  detail: string | null;
+  at: number;
+}
+
+const WS_BASE =
+  (window.location.protocol === "https:" ? "wss://" : "ws://") +
+  window.location.host +
+  "/api/ws/admin";
+
+const RECONNECT_DELAY = 3000;
+const PING_INTERVAL = 30000;
+
+/**
+ * WebSocket hook for admin health transitions.
+ * Invalidates the "admin-health" query on each transition and hands it to
+ * `onTransition` (for toasts). Returns whether the socket is connected, so
+ * the caller can fall back to polling only while it is down.
+ */
+export function useAdminHealthWebSocket(onTransition?: (t: HealthTransition) => void) {
+  const queryClient = useQueryClient();
+  const [connected, setConnected] = useState(false);
+  const wsRef = useRef<WebSocket | null>(null);
+  const reconnectTimer = useRef<ReturnType<typeof setTimeout>>();
+  const pingTimer = useRef<ReturnType<typeof setInterval>>();
+  const mountedRef = useRef(true);
+  const onTransitionRef = useRef(onTransition);
+  onTransitionRef.current = onTransition;
+
+  const connect = useCallback(() => {
+    if (!mountedRef.current) return;
+    if (wsRef.current?.readyState === WebSocket.OPEN) return;
+
+    const token = localStorage.getItem("token") ?? "";
+    try {
+      const ws = new WebSocket(`${WS_BASE}?token=${encodeURIComponent(token)}`);
+      wsRef.current = ws;
+
+      ws.onopen = () => {
+        setConnected(true);
+        pingTimer.current = setInterval(() => {
+          if (ws.readyState === WebSocket.OPEN) {
+            ws.send("ping");
+          }
+        }, PING_INTERVAL);
+      };
+
+      ws.onmessage = (evt) => {
+        if (evt.data === "pong") return;
+
+        try {
+          const data = JSON.parse(evt.data);
+          if (data.event === "health_transition") {
+            queryClient.invalidateQueries({ queryKey: ["admin-health"] });
+            onTransitionRef.current?.(data as HealthTransition);
+          }
+        } catch {
+          // Ignore non-JSON messages
+        }
+      };
+
+      ws.onclose = () => {
+        setConnected(false);
+        if (pingTimer.current) clearInterval(pingTimer.current);
+        if (mountedRef.current) {
+          reconnectTimer.current = setTimeout(connect, RECONNECT_DELAY);
+        }
+      };
+
+      ws.onerror = () => {
+        ws.close();
+      };
+    } catch {
+      if (mountedRef.current) {
+        reconnectTimer.current = setTimeout(connect, RECONNECT_DELAY);
+      }
+    }
+  }, [queryClient]);
+
+  useEffect(() => {
+    mountedRef.current = true;
+    connect();
+
+    return () => {
+      mountedRef.current = false;
+      if (reconnectTimer.current) clearTimeout(reconnectTimer.current);
+      if (pingTimer.current) clearInterval(pingTimer.current);
+      if (wsRef.current) {
+        wsRef.current.close();
+        wsRef.current = null;
+      }
+    };
+  }, [connect]);
+
+  return connected;
+}
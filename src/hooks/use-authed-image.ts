@@ -0,0 +1,34 @@
+import { useEffect, useState } from "react";
+import { api } from "@/lib/api";
+
+/**
+ * Object URL for an image behind the API's Bearer auth (an <img src> can't
+ * send the header). The browser HTTP cache still applies: thumbnails are
+ * served with long-lived Cache-Control, so revisits don't hit the backend.
+ */
+export function useAuthedImage(url: string | null | undefined): string | null {
+  const [objectUrl, setObjectUrl] = useState<string | null>(null);
+
+  useEffect(() => {
+    if (!url) {
+      setObjectUrl(null);
+      return;
+    }
+    let revoked = false;
+    let created: string | null = null;
+    api
+      .blob(url)
+      .then((blob) => {
+        if (revoked) return;
+        created = URL.createObjectURL(blob);
+        setObjectUrl(created);
+      })
+      .catch(() => setObjectUrl(null));
+    return () => {
+      revoked = true;
+      if (created) URL.revokeObjectURL(created);
+    };
+  }, [url]);
+
+  return objectUrl;
+}
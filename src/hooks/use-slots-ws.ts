@@ -6,6 +6,7 @@ interface WsEvent {
   slot_id?: string;
   occupant_name?: string;
   next_in_queue?: string;
+  hold_until?: string;
 }
 
 const WS_URL =
@@ -54,6 +55,7 @@ export function useSlotsWebSocket() {
           if (
             data.event === "slot_occupied" ||
             data.event === "slot_released" ||
+            data.event === "slot_reserved" ||
             data.event === "queue_changed"
           ) {
             // Invalidate slots query to trigger refetch
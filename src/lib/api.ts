@@ -29,6 +29,16 @@ async function request<T>(path: string, options: RequestInit = {}): Promise<T> {
   return res.json();
 }
 
+/** Fetch a binary resource (e.g. a thumbnail) with the auth header. `url` is as returned by the API. */
+async function fetchBlob(url: string): Promise<Blob> {
+  const token = localStorage.getItem("token");
+  const res = await fetch(url, {
+    headers: token ? { Authorization: `Bearer ${token}` } : {},
+  });
+  if (!res.ok) throw new ApiError(res.statusText, res.status);
+  return res.blob();
+}
+
 export const api = {
   get: <T>(path: string) => request<T>(path),
 
@@ -39,6 +49,8 @@ export const api = {
     request<T>(path, { method: "PUT", body: body ? JSON.stringify(body) : undefined }),
 
   delete: <T>(path: string) => request<T>(path, { method: "DELETE" }),
+
+  blob: fetchBlob,
 };
 
 export { ApiError };